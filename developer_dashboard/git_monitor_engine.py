@@ -14,8 +14,16 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass, asdict
 from pathlib import Path
+import sys
 import logging
 
+# 批量Git狀態採集器 (與 development_intervention_mcp 的 GitMonitor 共用)
+try:
+    from mcp.adapter.git_status_collector import GitStatusCollector, GitStatusSnapshot, GitCommandError
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parent.parent / "mcp" / "adapter"))
+    from git_status_collector import GitStatusCollector, GitStatusSnapshot, GitCommandError
+
 @dataclass
 class GitFileStatus:
     """單個文件的Git狀態"""
@@ -83,6 +91,21 @@ class GitMonitorEngine:
         self.logger = logging.getLogger("PowerAutomation.GitMonitor")
         self.monitored_repos: Dict[str, DetailedGitStatus] = {}
         self.scan_history: List[Dict[str, Any]] = []
+        # 每個倉庫一個採集器，常駐的 cat-file 進程在多次掃描間複用
+        self.collectors: Dict[str, GitStatusCollector] = {}
+        
+    def _get_collector(self, repo_path: str) -> GitStatusCollector:
+        collector = self.collectors.get(repo_path)
+        if collector is None:
+            collector = GitStatusCollector(repo_path)
+            self.collectors[repo_path] = collector
+        return collector
+    
+    def close(self):
+        """關閉所有採集器"""
+        for collector in self.collectors.values():
+            collector.close()
+        self.collectors.clear()
         
     def scan_repository_detailed(self, repo_path: str) -> DetailedGitStatus:
         """深度掃描單個Git倉庫"""
@@ -96,14 +119,20 @@ class GitMonitorEngine:
             # 獲取基本信息
             repo_name = os.path.basename(repo_path)
             
+            # 一次採集分支、文件狀態、stash和行數變化，子進程數不隨分支數和文件數增長
+            try:
+                snapshot = self._get_collector(repo_path).collect()
+            except GitCommandError as e:
+                raise ValueError(f"無法讀取Git倉庫狀態: {repo_path}, 錯誤: {e}")
+            
             # 獲取分支信息
-            current_branch = self._get_current_branch_info()
-            all_branches = self._get_all_branches()
+            current_branch = self._get_current_branch_info(snapshot)
+            all_branches = self._get_all_branches(snapshot)
             
             # 獲取文件狀態
-            modified_files = self._get_modified_files()
-            staged_files = self._get_staged_files()
-            untracked_files = self._get_untracked_files()
+            modified_files = self._get_modified_files(snapshot)
+            staged_files = self._get_staged_files(snapshot)
+            untracked_files = self._get_untracked_files(snapshot)
             
             # 獲取提交歷史
             recent_commits = self._get_recent_commits(limit=10)
@@ -112,8 +141,8 @@ class GitMonitorEngine:
             remotes = self._get_remotes_info()
             
             # 獲取其他信息
-            stash_count = self._get_stash_count()
-            conflicts = self._get_conflicts()
+            stash_count = snapshot.stash_count
+            conflicts = self._get_conflicts(snapshot)
             submodules = self._get_submodules()
             total_commits = self._get_total_commits()
             repo_size_mb = self._get_repo_size()
@@ -161,134 +190,102 @@ class GitMonitorEngine:
             self.logger.error(f"Git命令執行失敗: {command}, 錯誤: {e}")
             return ""
     
-    def _get_current_branch_info(self) -> GitBranchInfo:
+    def _get_current_branch_info(self, snapshot: GitStatusSnapshot) -> GitBranchInfo:
         """獲取當前分支信息"""
-        branch_name = self._run_git_command("git branch --show-current")
-        if not branch_name:
-            branch_name = "HEAD"
+        branch_name = snapshot.branch or "HEAD"
         
-        last_commit = self._run_git_command("git log -1 --format=%H")
-        
-        # 獲取與遠程分支的差異
-        tracking_branch = self._run_git_command(f"git config branch.{branch_name}.merge")
-        if tracking_branch:
-            tracking_branch = tracking_branch.replace('refs/heads/', '')
-            
-            # 計算ahead/behind
-            try:
-                ahead_behind = self._run_git_command(f"git rev-list --left-right --count HEAD...origin/{tracking_branch}")
-                if ahead_behind:
-                    parts = ahead_behind.split('\t')
-                    commits_ahead = int(parts[0]) if len(parts) > 0 else 0
-                    commits_behind = int(parts[1]) if len(parts) > 1 else 0
-                else:
-                    commits_ahead = commits_behind = 0
-            except:
-                commits_ahead = commits_behind = 0
-        else:
-            tracking_branch = None
-            commits_ahead = commits_behind = 0
+        # 跟蹤分支及ahead/behind來自status的上游信息
+        tracking_branch = None
+        for ref in snapshot.refs:
+            if ref.is_head and ref.upstream_branch:
+                tracking_branch = ref.upstream_branch.replace('refs/heads/', '')
+                break
+        if tracking_branch is None and snapshot.upstream:
+            tracking_branch = snapshot.upstream.split('/', 1)[-1]
         
         return GitBranchInfo(
             name=branch_name,
             is_current=True,
-            last_commit=last_commit,
-            commits_ahead=commits_ahead,
-            commits_behind=commits_behind,
+            last_commit=snapshot.head_oid or "",
+            commits_ahead=snapshot.ahead if tracking_branch else 0,
+            commits_behind=snapshot.behind if tracking_branch else 0,
             tracking_branch=tracking_branch
         )
     
-    def _get_all_branches(self) -> List[GitBranchInfo]:
+    def _get_all_branches(self, snapshot: GitStatusSnapshot) -> List[GitBranchInfo]:
         """獲取所有分支信息"""
         branches = []
-        current_branch = self._run_git_command("git branch --show-current")
         
-        branch_output = self._run_git_command("git branch -a")
-        for line in branch_output.split('\n'):
-            line = line.strip()
-            if not line or line.startswith('remotes/origin/HEAD'):
-                continue
-                
-            is_current = line.startswith('*')
-            branch_name = line.replace('*', '').strip()
-            
-            if branch_name.startswith('remotes/origin/'):
-                branch_name = branch_name.replace('remotes/origin/', '')
+        for ref in snapshot.refs:
+            if ref.is_remote:
+                if ref.refname.endswith('/HEAD'):
+                    continue
+                branch_name = ref.short_name
+                if branch_name.startswith('origin/'):
+                    branch_name = branch_name[len('origin/'):]
+                else:
+                    branch_name = f"remotes/{branch_name}"
+            else:
+                branch_name = ref.short_name
             
-            if branch_name == current_branch:
+            if branch_name == snapshot.branch:
                 continue  # 已經在current_branch中處理
             
-            last_commit = self._run_git_command(f"git log -1 --format=%H {branch_name}")
-            
             branches.append(GitBranchInfo(
                 name=branch_name,
-                is_current=is_current,
-                last_commit=last_commit,
-                commits_ahead=0,  # 簡化處理
-                commits_behind=0,
-                tracking_branch=None
+                is_current=ref.is_head,
+                last_commit=ref.object_name,
+                commits_ahead=ref.ahead,
+                commits_behind=ref.behind,
+                tracking_branch=ref.upstream_branch.replace('refs/heads/', '') if ref.upstream_branch else None
             ))
         
         return branches
     
-    def _get_modified_files(self) -> List[GitFileStatus]:
+    def _get_modified_files(self, snapshot: GitStatusSnapshot) -> List[GitFileStatus]:
         """獲取修改的文件"""
         files = []
-        status_output = self._run_git_command("git status --porcelain")
         
-        for line in status_output.split('\n'):
-            if not line.strip():
+        for entry in snapshot.files:
+            if entry.is_untracked or entry.code == '!!':
                 continue
-                
-            status_code = line[:2]
-            file_path = line[3:]
-            
-            if status_code.strip() and not status_code.startswith('??'):
-                file_status = self._parse_status_code(status_code)
-                file_info = self._get_file_details(file_path, file_status)
-                if file_info:
-                    files.append(file_info)
+            file_status = self._parse_status_code(entry.code)
+            file_info = self._get_file_details(entry.path, file_status, snapshot.numstat)
+            if file_info:
+                files.append(file_info)
         
         return files
     
-    def _get_staged_files(self) -> List[GitFileStatus]:
+    def _get_staged_files(self, snapshot: GitStatusSnapshot) -> List[GitFileStatus]:
         """獲取暫存的文件"""
         files = []
-        staged_output = self._run_git_command("git diff --cached --name-status")
         
-        for line in staged_output.split('\n'):
-            if not line.strip():
-                continue
-                
-            parts = line.split('\t')
-            if len(parts) >= 2:
-                status_code = parts[0]
-                file_path = parts[1]
-                
-                file_status = self._parse_diff_status(status_code)
-                file_info = self._get_file_details(file_path, file_status)
-                if file_info:
-                    files.append(file_info)
+        for entry in snapshot.staged:
+            file_status = self._parse_diff_status(entry.index_status)
+            file_info = self._get_file_details(entry.path, file_status, snapshot.numstat)
+            if file_info:
+                files.append(file_info)
         
         return files
     
-    def _get_untracked_files(self) -> List[GitFileStatus]:
+    def _get_untracked_files(self, snapshot: GitStatusSnapshot) -> List[GitFileStatus]:
         """獲取未跟蹤的文件"""
         files = []
-        untracked_output = self._run_git_command("git ls-files --others --exclude-standard")
         
-        for file_path in untracked_output.split('\n'):
-            if file_path.strip():
-                file_info = self._get_file_details(file_path, 'untracked')
-                if file_info:
-                    files.append(file_info)
+        for entry in snapshot.untracked:
+            file_info = self._get_file_details(entry.path, 'untracked')
+            if file_info:
+                files.append(file_info)
         
         return files
     
-    def _get_file_details(self, file_path: str, status: str) -> Optional[GitFileStatus]:
+    def _get_file_details(self, file_path: str, status: str,
+                          numstat: Optional[Dict[str, Tuple[int, int]]] = None) -> Optional[GitFileStatus]:
         """獲取文件詳細信息"""
         try:
-            if not os.path.exists(file_path):
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
                 return GitFileStatus(
                     path=file_path,
                     status=status,
@@ -298,25 +295,14 @@ class GitMonitorEngine:
                     last_modified="文件不存在"
                 )
             
-            # 獲取文件大小
-            size_bytes = os.path.getsize(file_path)
-            
-            # 獲取最後修改時間
-            mtime = os.path.getmtime(file_path)
-            last_modified = datetime.fromtimestamp(mtime).isoformat()
+            # 獲取文件大小和最後修改時間
+            size_bytes = stat.st_size
+            last_modified = datetime.fromtimestamp(stat.st_mtime).isoformat()
             
-            # 獲取行數變化（如果不是untracked文件）
+            # 獲取行數變化（如果不是untracked文件），來自批量採集的 diff --numstat
             lines_added = lines_deleted = 0
-            if status != 'untracked':
-                diff_output = self._run_git_command(f"git diff --numstat {file_path}")
-                if diff_output:
-                    parts = diff_output.split('\t')
-                    if len(parts) >= 2:
-                        try:
-                            lines_added = int(parts[0]) if parts[0] != '-' else 0
-                            lines_deleted = int(parts[1]) if parts[1] != '-' else 0
-                        except ValueError:
-                            pass
+            if status != 'untracked' and numstat:
+                lines_added, lines_deleted = numstat.get(file_path, (0, 0))
             
             return GitFileStatus(
                 path=file_path,
@@ -465,21 +451,9 @@ class GitMonitorEngine:
         
         return remotes
     
-    def _get_stash_count(self) -> int:
-        """獲取stash數量"""
-        stash_output = self._run_git_command("git stash list")
-        return len([line for line in stash_output.split('\n') if line.strip()])
-    
-    def _get_conflicts(self) -> List[str]:
+    def _get_conflicts(self, snapshot: GitStatusSnapshot) -> List[str]:
         """獲取衝突文件"""
-        conflicts = []
-        status_output = self._run_git_command("git status --porcelain")
-        
-        for line in status_output.split('\n'):
-            if line.startswith('UU') or line.startswith('AA') or line.startswith('DD'):
-                conflicts.append(line[3:])
-        
-        return conflicts
+        return [entry.path for entry in snapshot.conflicts]
     
     def _get_submodules(self) -> List[str]:
         """獲取子模組"""
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+批量HTTP客户端 - 云端模型API的并发批处理
+供 local_model_mcp 的 MistralOCREngine 和 cloud_search_mcp 的 CloudModelClient 共用
+
+- 共享一个aiohttp连接池, 批量请求按并发上限同时发出
+- 每个模型独立的令牌桶限速
+- 429/5xx和连接错误按带抖动的指数退避重试, 优先遵循Retry-After
+- 批量结果按输入顺序或按完成顺序流式产出
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, FrozenSet, Iterable, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchClientConfig:
+    """批量客户端配置"""
+    concurrency: int = 8                    # 同时在途的请求数
+    requests_per_second: float = 0.0       # 每个模型的限速, 0表示不限
+    burst: Optional[int] = None             # 令牌桶容量, 默认为1秒的配额
+    max_retries: int = 3                    # 最大重试次数 (不含首次请求)
+    backoff_base: float = 0.5               # 退避基数 (秒)
+    backoff_max: float = 30.0               # 单次退避上限 (秒)
+    timeout: float = 60.0                   # 单次请求超时 (秒)
+    retry_statuses: FrozenSet[int] = field(default_factory=lambda: frozenset({429, 500, 502, 503, 504}))
+
+
+class HTTPStatusError(Exception):
+    """HTTP请求失败"""
+
+    def __init__(self, status: int, text: str):
+        super().__init__(f"API请求失败: {status} - {text}")
+        self.status = status
+        self.text = text
+
+
+class TokenBucket:
+    """令牌桶限速器"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """获取一个令牌, 返回等待时间 (含排队)"""
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - start
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class BatchHTTPClient:
+    """共享连接池的批量HTTP客户端"""
+
+    def __init__(self, config: Optional[BatchClientConfig] = None):
+        self.config = config or BatchClientConfig()
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._rates: Dict[str, float] = {}
+
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "rate_limit_wait": 0.0,
+            "status_counts": {}
+        }
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def open(self):
+        """创建共享连接池"""
+        loop = asyncio.get_running_loop()
+        if self.session is not None and self._loop is not loop:
+            # 连接池绑定事件循环, 换了循环 (如同步接口的多次调用) 后需关闭旧连接池并重建
+            self._close_foreign_session()
+        if self.session is None or self.session.closed:
+            self._loop = loop
+            connector = aiohttp.TCPConnector(limit=self.config.concurrency)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.config.timeout)
+            )
+
+    async def close(self):
+        if self.session is not None:
+            if self._loop is asyncio.get_running_loop():
+                await self.session.close()
+                self.session = None
+            else:
+                self._close_foreign_session()
+
+    def _close_foreign_session(self):
+        """关闭属于另一个事件循环的连接池 (不等待)"""
+        session, self.session = self.session, None
+        if session.closed:
+            return
+        if self._loop is not None and not self._loop.is_closed():
+            # 在连接池所属的循环中关闭; 循环已停止时在其下次运行时完成
+            asyncio.run_coroutine_threadsafe(session.close(), self._loop)
+        else:
+            # 原循环已关闭, 无法再关闭其中的连接: 分离连接器交给回收
+            session.detach()
+            logger.warning("⚠️ 连接池所属的事件循环已关闭, 已分离未关闭的连接器")
+
+    def set_rate_limit(self, model: str, requests_per_second: float, burst: Optional[int] = None):
+        """为指定模型设置限速"""
+        self._rates[model] = requests_per_second
+        self._buckets.pop(model, None)
+        if requests_per_second > 0:
+            self._buckets[model] = TokenBucket(requests_per_second, burst)
+
+    def _bucket(self, model: str) -> Optional[TokenBucket]:
+        if model not in self._buckets and model not in self._rates and self.config.requests_per_second > 0:
+            self._buckets[model] = TokenBucket(self.config.requests_per_second, self.config.burst)
+        return self._buckets.get(model)
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        """带完全抖动的指数退避, Retry-After优先"""
+        delay = random.uniform(0, min(self.config.backoff_max, self.config.backoff_base * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.config.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    async def post_json(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+                        model: str = "default", max_retries: Optional[int] = None,
+                        timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        发送JSON请求, 按模型限速并在可重试错误时退避重试
+
+        Raises:
+            HTTPStatusError: 不可重试的状态码或重试耗尽
+        """
+        await self.open()
+        retries = self.config.max_retries if max_retries is None else max_retries
+        bucket = self._bucket(model)
+        request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+
+        for attempt in range(retries + 1):
+            if bucket is not None:
+                self.stats["rate_limit_wait"] += await bucket.acquire()
+
+            self.stats["requests"] += 1
+            retry_after = None
+            try:
+                async with self.session.post(url, json=payload, headers=headers,
+                                             timeout=request_timeout) as response:
+                    status_counts = self.stats["status_counts"]
+                    status_counts[response.status] = status_counts.get(response.status, 0) + 1
+
+                    if response.status == 200:
+                        return await response.json(content_type=None)
+
+                    error = HTTPStatusError(response.status, await response.text())
+                    if response.status not in self.config.retry_statuses:
+                        self.stats["failures"] += 1
+                        raise error
+                    retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+
+            if attempt == retries:
+                self.stats["failures"] += 1
+                raise error
+
+            delay = self._backoff(attempt, retry_after)
+            self.stats["retries"] += 1
+            logger.warning(f"请求失败 ({error}), {delay:.2f}s后重试 ({attempt + 1}/{retries})")
+            await asyncio.sleep(delay)
+
+        raise RuntimeError("unreachable")
+
+    async def iter_batch(self, items: Iterable[Any], func: Callable[[Any], Awaitable[Any]],
+                         ordered: bool = False) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        并发执行批量任务, 流式产出 (索引, 结果)
+
+        任务抛出的异常作为结果产出, 不会中断批次; ordered为True时按输入顺序产出,
+        否则按完成顺序产出。调用方提前退出时取消剩余任务。
+        """
+        semaphore = asyncio.Semaphore(self.config.concurrency)
+
+        async def run(index: int, item: Any) -> Tuple[int, Any]:
+            async with semaphore:
+                try:
+                    return index, await func(item)
+                except Exception as e:
+                    return index, e
+
+        tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(items)]
+        try:
+            for next_result in (tasks if ordered else asyncio.as_completed(tasks)):
+                yield await next_result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.config.concurrency,
+            **self.stats,
+            "status_counts": dict(self.stats["status_counts"])
+        }
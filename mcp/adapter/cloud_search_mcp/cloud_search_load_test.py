@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Cloud Search MCP 并发负载测试
+
+启动本地桩服务器模拟云端模型（固定延迟），分别以1、4、16...个并发调用方
+通过 process_async 在同一事件循环中提交OCR请求，报告 请求/秒 随调用方数的变化；
+并以同步 process() 逐个调用作为基线。
+"""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+import toml
+from aiohttp import web
+
+from cloud_search_mcp import CloudSearchMCP
+
+
+async def start_stub_server(latency: float) -> web.AppRunner:
+    """模拟云端chat/completions接口，每个请求固定延迟后返回"""
+
+    async def handle(request: web.Request) -> web.Response:
+        await request.json()
+        await asyncio.sleep(latency)
+        return web.json_response({
+            "choices": [{"message": {"content": "# 保险单\n\n| 字段 | 值 |\n|---|---|\n| 姓名 | 張家銓 |\n" * 4}}]
+        })
+
+    app = web.Application()
+    app.router.add_post("/chat/completions", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner
+
+
+def write_config(base_url: str, concurrency: int, directory: str) -> str:
+    """生成指向桩服务器的配置（关闭缓存，确保每个请求都调用云端）"""
+    config = {
+        "cloud_search_mcp": {"priority": "balanced", "fallback_models": []},
+        "models": {
+            "google_gemini_2_5_flash_preview": {
+                "enabled": True,
+                "model_id": "google/gemini-2.5-flash-preview",
+                "api_key": "stub",
+                "base_url": base_url,
+                "max_tokens": 4000,
+                "temperature": 0.1,
+                "timeout": 30,
+                "cost_per_1k_tokens": 0.00000015,
+                "quality_score": 0.85,
+                "speed_score": 0.95
+            }
+        },
+        "routing": {"quality_threshold": 0.0, "fallback_enabled": False},
+        "cache": {"enable_cache": False},
+        "batch": {"concurrency": concurrency}
+    }
+    path = Path(directory) / "config.toml"
+    path.write_text(toml.dumps(config), encoding="utf-8")
+    return str(path)
+
+
+def make_request(index: int) -> dict:
+    return {
+        "operation": "process_ocr",
+        "params": {"image_data": f"page-{index}".encode(), "task_type": "form_processing"}
+    }
+
+
+async def run_callers(mcp: CloudSearchMCP, callers: int, requests: int) -> float:
+    """callers个并发调用方共提交requests个请求，返回请求/秒"""
+    queue = list(range(requests))
+
+    async def caller():
+        while queue:
+            result = await mcp.process_async(make_request(queue.pop()))
+            if result["status"] != "success":
+                raise RuntimeError(result)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[caller() for _ in range(callers)])
+    return requests / (time.perf_counter() - start)
+
+
+def caller_counts(max_callers: int) -> List[int]:
+    counts = []
+    count = 1
+    while count < max_callers:
+        counts.append(count)
+        count *= 4
+    counts.append(max_callers)
+    return counts
+
+
+def run_sync_baseline(config_path: str, requests: int) -> float:
+    mcp = CloudSearchMCP(config_path)
+    start = time.perf_counter()
+    for index in range(requests):
+        if mcp.process(make_request(index))["status"] != "success":
+            raise RuntimeError("同步请求失败")
+    return requests / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cloud Search MCP 并发负载测试")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--max-callers", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.1, help="模拟云端延迟 (秒)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    print(f"🚀 Cloud Search MCP 负载测试 ({args.requests} 个请求, 模拟延迟 {args.latency * 1000:.0f}ms)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 桩服务器在独立线程的事件循环中运行，同步基线才能在主线程调用 process()
+        ready = threading.Event()
+        server = {}
+
+        def serve():
+            loop = asyncio.new_event_loop()
+            server["loop"] = loop
+            server["runner"] = loop.run_until_complete(start_stub_server(args.latency))
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        ready.wait()
+        port = server["runner"].addresses[0][1]
+        config_path = write_config(f"http://127.0.0.1:{port}", args.max_callers, tmp)
+
+        sync_rps = run_sync_baseline(config_path, min(args.requests, 16))
+        print(f"   同步 process()     调用方   1  {sync_rps:8.2f} 请求/秒")
+
+        async def run_async():
+            mcp = CloudSearchMCP(config_path)
+            try:
+                for callers in caller_counts(args.max_callers):
+                    rps = await run_callers(mcp, callers, args.requests)
+                    print(f"   异步 process_async 调用方 {callers:>3}  {rps:8.2f} 请求/秒  加速 {rps / sync_rps:6.2f}x")
+                print(f"   连接池统计: {mcp.get_statistics()['http']['status_counts']}")
+            finally:
+                await mcp.close()
+
+        asyncio.run(run_async())
+        asyncio.run_coroutine_threadsafe(server["runner"].cleanup(), server["loop"]).result()
+        server["loop"].call_soon_threadsafe(server["loop"].stop)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,7 @@ import logging
 import time
 import base64
 import hashlib
-from typing import Dict, Any, List, Optional, Union, Tuple
+from typing import Dict, Any, List, Optional, Union, Tuple, AsyncIterator
 from datetime import datetime
 from pathlib import Path
 from dataclasses import dataclass, asdict
@@ -55,6 +55,20 @@ except ImportError:
         SYSTEM = "system"
         MCP = "mcp"
 
+# 导入OCR结果缓存
+try:
+    from ..ocr_result_cache import OCRResultCache, OCRCacheConfig
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from ocr_result_cache import OCRResultCache, OCRCacheConfig
+
+# 导入批量HTTP客户端 (共享连接池、限速、退避重试)
+try:
+    from ..batch_http_client import BatchHTTPClient, BatchClientConfig, HTTPStatusError
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from batch_http_client import BatchHTTPClient, BatchClientConfig, HTTPStatusError
+
 logger = logging.getLogger("cloud_search_mcp")
 
 class CloudModel(Enum):
@@ -88,6 +102,7 @@ class ModelConfig:
     quality_score: float
     speed_score: float
     enabled: bool = True
+    requests_per_second: float = 0.0  # 该模型的限速, 0表示不限
 
 @dataclass
 class OCRRequest:
@@ -228,17 +243,28 @@ class ModelSelector:
 class CloudModelClient:
     """云端模型客户端"""
     
-    def __init__(self, config: ModelConfig):
+    def __init__(self, config: ModelConfig, http: Optional[BatchHTTPClient] = None):
+        """
+        Args:
+            config: 模型配置
+            http: 共享的批量HTTP客户端, 不传则在上下文内独占一个连接池
+        """
         self.config = config
+        self.owns_http = http is None
+        self.http = http or BatchHTTPClient(BatchClientConfig(timeout=config.timeout))
+        if config.requests_per_second > 0:
+            self.http.set_rate_limit(config.model_id, config.requests_per_second)
         self.session = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        await self.http.open()
+        self.session = self.http.session
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        if self.owns_http:
+            await self.http.close()
+        self.session = None
     
     async def process_image(self, image_data: bytes, prompt: str) -> Dict[str, Any]:
         """处理图像OCR请求"""
@@ -279,40 +305,37 @@ class CloudModelClient:
         start_time = time.time()
         
         try:
-            async with self.session.post(
+            result = await self.http.post_json(
                 f"{self.config.base_url}/chat/completions",
+                request_data,
                 headers=headers,
-                json=request_data,
-                timeout=aiohttp.ClientTimeout(total=self.config.timeout)
-            ) as response:
-                
-                processing_time = time.time() - start_time
-                
-                if response.status == 200:
-                    result = await response.json()
-                    content = result["choices"][0]["message"]["content"]
-                    
-                    # 估算成本
-                    input_tokens = len(prompt) // 4  # 粗略估算
-                    output_tokens = len(content) // 4
-                    cost = (input_tokens + output_tokens) / 1000 * self.config.cost_per_1k_tokens
-                    
-                    return {
-                        "success": True,
-                        "content": content,
-                        "processing_time": processing_time,
-                        "cost": cost,
-                        "model": self.config.model_id
-                    }
-                else:
-                    error_text = await response.text()
-                    return {
-                        "success": False,
-                        "error": f"API错误 {response.status}: {error_text}",
-                        "processing_time": processing_time,
-                        "cost": 0.0,
-                        "model": self.config.model_id
-                    }
+                model=self.config.model_id,
+                timeout=self.config.timeout
+            )
+            processing_time = time.time() - start_time
+            content = result["choices"][0]["message"]["content"]
+            
+            # 估算成本
+            input_tokens = len(prompt) // 4  # 粗略估算
+            output_tokens = len(content) // 4
+            cost = (input_tokens + output_tokens) / 1000 * self.config.cost_per_1k_tokens
+            
+            return {
+                "success": True,
+                "content": content,
+                "processing_time": processing_time,
+                "cost": cost,
+                "model": self.config.model_id
+            }
+        
+        except HTTPStatusError as e:
+            return {
+                "success": False,
+                "error": f"API错误 {e.status}: {e.text}",
+                "processing_time": time.time() - start_time,
+                "cost": 0.0,
+                "model": self.config.model_id
+            }
                     
         except Exception as e:
             processing_time = time.time() - start_time
@@ -323,6 +346,17 @@ class CloudModelClient:
                 "cost": 0.0,
                 "model": self.config.model_id
             }
+    
+    async def iter_batch(self, images: List[bytes], prompt: str,
+                         ordered: bool = False) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """并发处理一批图像, 按输入顺序或完成顺序流式产出 (索引, 结果)"""
+        async for index, result in self.http.iter_batch(
+                images, lambda image_data: self.process_image(image_data, prompt), ordered=ordered):
+            yield index, result
+    
+    async def process_batch(self, images: List[bytes], prompt: str) -> List[Dict[str, Any]]:
+        """并发处理一批图像, 结果与输入顺序一致"""
+        return [result async for _, result in self.iter_batch(images, prompt, ordered=True)]
 
 class CloudSearchMCP(BaseMCP):
     """
@@ -344,12 +378,32 @@ class CloudSearchMCP(BaseMCP):
         self.model_selector = ModelSelector(self.config)
         self.model_configs = self._load_model_configs()
         
+        # 结果缓存：云端按请求计费，重复提交的图像直接返回缓存结果
+        cache_config = self.config.get("cache", {})
+        self.cache = OCRResultCache(OCRCacheConfig(
+            enabled=cache_config.get("enable_cache", True),
+            max_memory_entries=cache_config.get("max_cache_size", 1000),
+            cache_dir=cache_config.get("cache_dir"),
+            max_disk_bytes=cache_config.get("max_disk_mb", 512) * 1024 * 1024,
+            ttl=cache_config.get("cache_ttl")
+        ))
+        
+        # 所有模型共享一个连接池，批量请求按并发上限同时发出
+        batch_config = self.config.get("batch", {})
+        self.http = BatchHTTPClient(BatchClientConfig(
+            concurrency=batch_config.get("concurrency", 8),
+            max_retries=self.config.get("routing", {}).get("max_retries", 3),
+            backoff_base=batch_config.get("backoff_base", 0.5),
+            backoff_max=batch_config.get("backoff_max", 30.0)
+        ))
+        
         # 统计信息
         self.stats = {
             "total_requests": 0,
             "successful_requests": 0,
             "failed_requests": 0,
             "total_cost": 0.0,
+            "cache_hits": 0,
             "model_usage": {},
             "average_processing_time": 0.0
         }
@@ -438,7 +492,8 @@ class CloudSearchMCP(BaseMCP):
                         cost_per_1k_tokens=model_data["cost_per_1k_tokens"],
                         quality_score=model_data["quality_score"],
                         speed_score=model_data["speed_score"],
-                        enabled=True
+                        enabled=True,
+                        requests_per_second=model_data.get("requests_per_second", 0.0)
                     )
                     model_configs[model_key] = config
                 except KeyError as e:
@@ -446,8 +501,12 @@ class CloudSearchMCP(BaseMCP):
         
         return model_configs
     
-    def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """MCP标准处理接口"""
+    async def process_async(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        MCP标准处理接口 (异步)
+        
+        在调用方的事件循环中执行，多个OCR请求可并发共享同一循环和连接池
+        """
         try:
             operation = input_data.get("operation", "process_ocr")
             params = input_data.get("params", {})
@@ -460,13 +519,9 @@ class CloudSearchMCP(BaseMCP):
                 }
             
             # 执行对应操作
-            if asyncio.iscoroutinefunction(self.operations[operation]):
-                # 异步操作
-                loop = asyncio.get_event_loop()
-                result = loop.run_until_complete(self.operations[operation](**params))
-            else:
-                # 同步操作
-                result = self.operations[operation](**params)
+            result = self.operations[operation](**params)
+            if asyncio.iscoroutine(result):
+                result = await result
             
             log_info(LogCategory.MCP, f"Cloud Search MCP操作完成: {operation}", {
                 "operation": operation,
@@ -485,6 +540,25 @@ class CloudSearchMCP(BaseMCP):
                 "message": f"处理失败: {str(e)}"
             }
     
+    def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """MCP标准处理接口 (同步)，在事件循环内请使用 await process_async()"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self._process_once(input_data))
+        
+        return {
+            "status": "error",
+            "message": "process()不能在运行中的事件循环内调用，请使用 await process_async()"
+        }
+    
+    async def _process_once(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """同步调用的单次执行：连接池随临时事件循环一起关闭"""
+        try:
+            return await self.process_async(input_data)
+        finally:
+            await self.http.close()
+    
     @performance_monitor("process_ocr_request")
     async def process_ocr_request(self, **kwargs) -> Dict[str, Any]:
         """处理OCR请求"""
@@ -527,8 +601,31 @@ class CloudSearchMCP(BaseMCP):
             # 更新统计
             self.stats["total_requests"] += 1
             
-            # 选择最优模型
+            # 查找缓存（键包含图像内容、任务参数和提示词）
             priority = self.config.get("cloud_search_mcp", {}).get("priority", "balanced")
+            cache_key = OCRResultCache.make_key(
+                image_data,
+                task_type=task_type.value,
+                language=language,
+                output_format=output_format,
+                quality_level=request.quality_level,
+                prompt=self._build_ocr_prompt(request),
+                priority=priority
+            )
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                self.stats["successful_requests"] += 1
+                self.stats["cache_hits"] += 1
+                # 本次未调用云端，不产生费用
+                cached["cost"] = 0.0
+                cached["processing_time"] = 0.0
+                cached["metadata"] = {**(cached.get("metadata") or {}), "cached": True}
+                return {
+                    "status": "success",
+                    "result": cached
+                }
+            
+            # 选择最优模型
             optimal_model = self.model_selector.select_optimal_model(task_type, priority)
             
             if not optimal_model:
@@ -562,11 +659,14 @@ class CloudSearchMCP(BaseMCP):
                     self.stats["model_usage"][model_name] = 0
                 self.stats["model_usage"][model_name] += 1
                 
-                # 更新平均处理时间
+                # 更新平均处理时间（不含缓存命中）
+                api_requests = self.stats["successful_requests"] - self.stats["cache_hits"]
                 total_time = (self.stats["average_processing_time"] * 
-                             (self.stats["successful_requests"] - 1) + 
+                             (api_requests - 1) + 
                              response.processing_time)
-                self.stats["average_processing_time"] = total_time / self.stats["successful_requests"]
+                self.stats["average_processing_time"] = total_time / api_requests
+                
+                await self.cache.aput(cache_key, asdict(response), image_bytes=len(image_data))
             else:
                 self.stats["failed_requests"] += 1
             
@@ -605,7 +705,7 @@ class CloudSearchMCP(BaseMCP):
             )
         
         # 执行API调用
-        async with CloudModelClient(model_config) as client:
+        async with CloudModelClient(model_config, self.http) as client:
             result = await client.process_image(request.image_data, prompt)
         
         if result["success"]:
@@ -790,9 +890,15 @@ class CloudSearchMCP(BaseMCP):
         """获取统计信息"""
         return {
             "status": "success",
-            "statistics": self.stats.copy()
+            "statistics": self.stats.copy(),
+            "cache": self.cache.get_stats(),
+            "http": self.http.get_stats()
         }
     
+    async def close(self):
+        """关闭共享连接池"""
+        await self.http.close()
+    
     def health_check(self) -> Dict[str, Any]:
         """健康检查"""
         enabled_models = len([c for c in self.model_configs.values() if c.enabled])
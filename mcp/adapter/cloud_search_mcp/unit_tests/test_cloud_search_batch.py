@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+cloud_search_mcp 批量请求测试
+使用本地桩HTTP服务器回放录制的响应，测试共享连接池、并发批处理、429重试
+以及异步process_async接口
+"""
+
+import unittest
+import asyncio
+from unittest.mock import patch
+from pathlib import Path
+import sys
+
+from aiohttp import web
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cloud_search_mcp import CloudSearchMCP, CloudModelClient, ModelConfig, CloudModel, OCRRequest, TaskType
+from batch_http_client import BatchHTTPClient, BatchClientConfig
+from ocr_result_cache import OCRResultCache, OCRCacheConfig
+
+
+class ReplayServer:
+    """按请求顺序回放录制响应的桩服务器，录制用完后返回成功响应"""
+
+    def __init__(self, recordings):
+        self.recordings = list(recordings)
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        await request.json()
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.02)
+            if self.recordings:
+                status, text = self.recordings.pop(0)
+                return web.Response(status=status, text=text, headers={"Retry-After": "0"})
+            return web.json_response({"choices": [{"message": {"content": "# 保险单\n| 字段 | 值 |"}}]})
+        finally:
+            self.in_flight -= 1
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/chat/completions", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+
+class TestCloudSearchBatch(unittest.IsolatedAsyncioTestCase):
+    """云端批量请求测试类"""
+
+    async def asyncSetUp(self):
+        self.server = ReplayServer([(429, "rate limited"), (502, "bad gateway")])
+        base_url = await self.server.start()
+        self.model_config = ModelConfig(
+            model_id="google/gemini-2.5-flash-preview",
+            api_key="key",
+            base_url=base_url,
+            max_tokens=1000,
+            temperature=0.1,
+            timeout=10,
+            cost_per_1k_tokens=0.1,
+            quality_score=0.9,
+            speed_score=0.9
+        )
+
+    async def asyncTearDown(self):
+        await self.server.runner.cleanup()
+
+    async def test_process_batch_with_shared_pool(self):
+        """测试批量请求并发发出，429/502重试后全部成功，结果按输入顺序返回"""
+        http = BatchHTTPClient(BatchClientConfig(concurrency=3, backoff_base=0.001))
+        images = [f"image-{i}".encode() for i in range(6)]
+
+        async with CloudModelClient(self.model_config, http) as client:
+            results = await client.process_batch(images, "提取文字")
+
+        # 共享连接池不随客户端关闭
+        self.assertFalse(http.session.closed)
+        await http.close()
+
+        self.assertTrue(all(result["success"] for result in results))
+        self.assertEqual(self.server.requests, 8)
+        self.assertEqual(self.server.max_in_flight, 3)
+        self.assertEqual(http.get_stats()["retries"], 2)
+
+    async def test_mcp_reuses_one_session(self):
+        """测试CloudSearchMCP的多次请求复用同一个连接池"""
+        mcp = CloudSearchMCP()
+        mcp.http.config.backoff_base = 0.001
+        mcp.model_configs = {"google_gemini_2_5_flash_preview": self.model_config}
+
+        request = OCRRequest(image_data=b"form", task_type=TaskType.FORM_PROCESSING)
+        first = await mcp._execute_ocr(CloudModel.GEMINI_FLASH, request)
+        session = mcp.http.session
+        second = await mcp._execute_ocr(CloudModel.GEMINI_FLASH, request)
+
+        self.assertTrue(first.success and second.success)
+        self.assertIs(mcp.http.session, session)
+        self.assertEqual(mcp.get_statistics()["http"]["status_counts"], {429: 1, 502: 1, 200: 2})
+        await mcp.close()
+
+    async def test_process_async_serves_concurrent_callers(self):
+        """测试在运行中的事件循环内并发调用process_async，请求同时在途；同步process拒绝阻塞循环"""
+        mcp = CloudSearchMCP()
+        mcp.cache = OCRResultCache(OCRCacheConfig(enabled=False))
+        mcp.http.config.backoff_base = 0.001
+        mcp.model_configs = {"google_gemini_2_5_flash_preview": self.model_config}
+        self.server.recordings.clear()
+
+        requests = [{
+            "operation": "process_ocr",
+            "params": {"image_data": f"page-{i}".encode(), "task_type": "form_processing"}
+        } for i in range(8)]
+
+        with patch.object(mcp.model_selector, "select_optimal_model", return_value=CloudModel.GEMINI_FLASH):
+            results = await asyncio.gather(*[mcp.process_async(request) for request in requests])
+
+        self.assertTrue(all(result["status"] == "success" for result in results))
+        self.assertEqual(self.server.max_in_flight, 8)
+        self.assertEqual((await mcp.process_async({"operation": "get_statistics"}))["statistics"]["successful_requests"], 8)
+        self.assertEqual(mcp.process({"operation": "get_statistics"})["status"], "error")
+        await mcp.close()
+
+
+class TestCloudSearchSyncShim(unittest.TestCase):
+    """同步process封装测试类"""
+
+    def test_process_without_running_loop(self):
+        """测试无事件循环时同步process可用，连接池随调用关闭"""
+        mcp = CloudSearchMCP()
+        result = mcp.process({"operation": "get_statistics"})
+
+        self.assertEqual(result["status"], "success")
+        self.assertIsNone(mcp.http.session)
+
+
+if __name__ == "__main__":
+    unittest.main()
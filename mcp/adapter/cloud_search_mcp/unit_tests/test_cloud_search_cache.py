@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+cloud_search_mcp OCR结果缓存测试
+重复提交的图像不再调用云端模型，不产生费用
+"""
+
+import unittest
+from unittest.mock import AsyncMock, patch
+from pathlib import Path
+import sys
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cloud_search_mcp import CloudSearchMCP, CloudModel, OCRResponse
+from ocr_result_cache import OCRResultCache, OCRCacheConfig
+
+
+class TestCloudSearchCache(unittest.IsolatedAsyncioTestCase):
+    """云端OCR缓存测试类"""
+
+    async def asyncSetUp(self):
+        self.mcp = CloudSearchMCP()
+        # 只使用内存层，避免读到其他运行留下的磁盘缓存
+        self.mcp.cache = OCRResultCache(OCRCacheConfig())
+
+    async def test_repeated_request_served_from_cache(self):
+        """测试相同图像和参数第二次命中缓存，节省的费用计入统计"""
+        response = OCRResponse(
+            success=True,
+            content="# 保险单",
+            confidence=0.95,
+            model_used=CloudModel.GEMINI_FLASH.value,
+            processing_time=1.5,
+            cost=0.003
+        )
+
+        with patch.object(self.mcp.model_selector, "select_optimal_model", return_value=CloudModel.GEMINI_FLASH), \
+             patch.object(self.mcp, "_execute_ocr", AsyncMock(return_value=response)) as execute:
+            first = await self.mcp.process_ocr_request(image_data=b"form-bytes", task_type="form_processing")
+            second = await self.mcp.process_ocr_request(image_data=b"form-bytes", task_type="form_processing")
+            await self.mcp.process_ocr_request(image_data=b"form-bytes", task_type="table_extraction")
+
+        self.assertEqual(execute.await_count, 2)
+        self.assertEqual(second["status"], "success")
+        self.assertEqual(second["result"]["content"], first["result"]["content"])
+        self.assertEqual(second["result"]["cost"], 0.0)
+        self.assertTrue(second["result"]["metadata"]["cached"])
+
+        statistics = self.mcp.get_statistics()
+        self.assertEqual(statistics["statistics"]["cache_hits"], 1)
+        self.assertAlmostEqual(statistics["statistics"]["total_cost"], 0.006)
+        self.assertAlmostEqual(statistics["cache"]["cost_saved"], 0.003)
+        self.assertEqual(statistics["cache"]["bytes_saved"], len(b"form-bytes"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,368 @@
+"""
+增量架构合规扫描器
+
+按文件缓存扫描结果，键为 (路径, mtime, 大小, 内容哈希)：
+- stat 未变化的文件直接复用缓存，不读取内容
+- stat 变化但内容哈希相同 (如 touch、checkout 回原版本) 只更新 stat
+- 内容变化的文件分块提交到进程池，在子进程中读取、解析 AST 并做正则扫描；
+  prefer_local 判定为真的文件 (如父进程已有解析结果) 留在当前进程分析
+
+实时模式由 ProjectChangeWatcher 收集文件系统变更通知，只重新扫描变更的文件。
+"""
+
+import os
+import time
+import json
+import hashlib
+import logging
+import threading
+import concurrent.futures
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 不包含源码的目录
+DEFAULT_EXCLUDED_DIRS = frozenset({'.git', '__pycache__', '.mypy_cache', '.pytest_cache'})
+
+@dataclass
+class FileScanEntry:
+    """单个文件的缓存扫描结果"""
+    mtime_ns: int
+    size: int
+    content_hash: str
+    violations: List[Any] = field(default_factory=list)
+
+# ----------------------------------------------------------------------------
+# 子进程工作函数 (模块级函数才能被进程池序列化)
+# ----------------------------------------------------------------------------
+
+_worker_analyze: Optional[Callable[[str, str, Dict[str, Any]], List[Any]]] = None
+_worker_rules: Dict[str, Any] = {}
+_in_pool_worker = False
+
+def _init_worker(analyze: Callable[[str, str, Dict[str, Any]], List[Any]], rules: Dict[str, Any],
+                 pool_worker: bool = False):
+    global _worker_analyze, _worker_rules, _in_pool_worker
+    _worker_analyze = analyze
+    _worker_rules = rules
+    _in_pool_worker = pool_worker
+
+def in_pool_worker() -> bool:
+    """当前是否在扫描进程池的子进程中 (子进程内的缓存不会回到父进程)"""
+    return _in_pool_worker
+
+def _scan_chunk(items: List[Tuple[str, Optional[str]]]) -> List[Tuple[str, Optional[FileScanEntry], Optional[str]]]:
+    """
+    扫描一批文件
+
+    Args:
+        items: [(路径, 已缓存的内容哈希)]
+
+    Returns:
+        [(路径, 扫描结果, 错误)]；内容哈希与缓存相同时扫描结果的 violations 为 None
+    """
+    results = []
+    for path, known_hash in items:
+        try:
+            stat = os.stat(path)
+            with open(path, 'rb') as f:
+                data = f.read()
+            content_hash = hashlib.blake2b(data, digest_size=16).hexdigest()
+            entry = FileScanEntry(stat.st_mtime_ns, stat.st_size, content_hash, None)
+            if content_hash != known_hash:
+                entry.violations = _worker_analyze(data.decode('utf-8'), path, _worker_rules)
+            results.append((path, entry, None))
+        except Exception as e:
+            results.append((path, None, str(e)))
+    return results
+
+# ----------------------------------------------------------------------------
+# 增量扫描器
+# ----------------------------------------------------------------------------
+
+class IncrementalComplianceScanner:
+    """带文件级缓存和进程池的增量合规扫描器"""
+
+    def __init__(self, analyze: Callable[[str, str, Dict[str, Any]], List[Any]],
+                 rules: Dict[str, Any], max_workers: Optional[int] = None,
+                 chunk_size: int = 32, pool_threshold: int = 16,
+                 cache_file: Optional[str] = None,
+                 excluded_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS,
+                 encode_violation: Optional[Callable[[Any], Dict[str, Any]]] = None,
+                 decode_violation: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                 prefer_local: Optional[Callable[[str], bool]] = None):
+        """
+        Args:
+            analyze: 模块级分析函数 (content, file_path, rules) -> 违规列表
+            rules: 违规检测规则，进程池初始化时传给子进程一次
+            max_workers: 进程池大小，默认 CPU 数
+            chunk_size: 每个子任务扫描的文件数
+            pool_threshold: 需要分析的文件数达到此值才使用进程池，否则在当前进程分析
+            cache_file: 缓存持久化文件 (JSON)，为空时只缓存在内存
+            excluded_dirs: 遍历时跳过的目录名
+            encode_violation / decode_violation: 违规对象与 JSON 字典的互相转换，为空时原样保存
+            prefer_local: (路径) -> 是否在当前进程分析；子进程无法访问当前进程的缓存，
+                已有解析结果的文件在当前进程分析可直接复用，不在子进程中重新解析
+        """
+        self.analyze = analyze
+        self.rules = rules
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.pool_threshold = pool_threshold
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.excluded_dirs = set(excluded_dirs)
+        self.encode_violation = encode_violation or (lambda violation: violation)
+        self.decode_violation = decode_violation or (lambda data: data)
+        self.prefer_local = prefer_local
+
+        self.cache: Dict[str, FileScanEntry] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+        self.stats = {
+            "scans": 0,
+            "files_seen": 0,
+            "stat_hits": 0,
+            "hash_hits": 0,
+            "files_analyzed": 0,
+            "files_kept_local": 0,
+            "last_scan_seconds": 0.0
+        }
+        self._load_cache()
+
+    # ------------------------------------------------------------------ 缓存持久化
+
+    def _load_cache(self):
+        if not self.cache_file or not self.cache_file.exists():
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get("rules") == self._rules_signature():
+                self.cache = {
+                    path: FileScanEntry(entry["mtime_ns"], entry["size"], entry["content_hash"],
+                                        [self.decode_violation(v) for v in entry["violations"]])
+                    for path, entry in cached["entries"].items()
+                }
+        except Exception as e:
+            logger.warning(f"合规扫描缓存加载失败，将全量扫描: {e}")
+
+    def save_cache(self):
+        """保存缓存；规则变化时旧缓存在加载时自动失效"""
+        if not self.cache_file:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = self.cache_file.with_suffix('.tmp')
+        with self._lock:
+            entries = {
+                path: {"mtime_ns": entry.mtime_ns, "size": entry.size, "content_hash": entry.content_hash,
+                       "violations": [self.encode_violation(v) for v in entry.violations]}
+                for path, entry in self.cache.items()
+            }
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({"rules": self._rules_signature(), "entries": entries}, f, ensure_ascii=False)
+        os.replace(temp_file, self.cache_file)
+
+    def _rules_signature(self) -> str:
+        # 包含严重性、提示信息和修复模板，任何一项变化都会使缓存的违规结果失效
+        definition = json.dumps(self.rules, sort_keys=True, ensure_ascii=False, default=repr)
+        return hashlib.blake2b(definition.encode('utf-8'), digest_size=16).hexdigest()
+
+    # ------------------------------------------------------------------ 文件发现
+
+    def discover(self, project_path: str) -> Dict[str, os.stat_result]:
+        """遍历项目中的 .py 文件及其 stat"""
+        found = {}
+        stack = [project_path]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for item in it:
+                        try:
+                            if item.is_dir(follow_symlinks=False):
+                                if item.name not in self.excluded_dirs:
+                                    stack.append(item.path)
+                            elif item.name.endswith('.py') and item.is_file():
+                                found[item.path] = item.stat()
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return found
+
+    # ------------------------------------------------------------------ 扫描
+
+    def scan_project(self, project_path: str) -> Dict[str, FileScanEntry]:
+        """
+        增量扫描整个项目，已删除文件从缓存中移除
+
+        Returns:
+            Dict[str, FileScanEntry]: 本次项目中所有 .py 文件的扫描结果
+        """
+        start = time.perf_counter()
+        files = self.discover(project_path)
+
+        prefix = os.path.join(project_path, '')
+        with self._lock:
+            for path in [p for p in self.cache if p.startswith(prefix) and p not in files]:
+                del self.cache[path]
+
+        results = self._scan(files)
+        self.stats["scans"] += 1
+        self.stats["last_scan_seconds"] = time.perf_counter() - start
+        return results
+
+    def scan_paths(self, paths: Iterable[str]) -> Dict[str, FileScanEntry]:
+        """只扫描指定文件 (实时模式)；不存在的文件从缓存中移除"""
+        files = {}
+        for path in paths:
+            try:
+                files[path] = os.stat(path)
+            except OSError:
+                with self._lock:
+                    self.cache.pop(path, None)
+        return self._scan(files)
+
+    def _scan(self, files: Dict[str, os.stat_result]) -> Dict[str, FileScanEntry]:
+        results: Dict[str, FileScanEntry] = {}
+        pending: List[Tuple[str, Optional[str]]] = []
+
+        with self._lock:
+            for path, stat in files.items():
+                entry = self.cache.get(path)
+                if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                    results[path] = entry
+                    self.stats["stat_hits"] += 1
+                else:
+                    pending.append((path, entry.content_hash if entry else None))
+        self.stats["files_seen"] += len(files)
+
+        for path, entry, error in self._run(pending):
+            if entry is None:
+                logger.error(f"文件扫描失败 {path}: {error}")
+                continue
+            with self._lock:
+                if entry.violations is None:
+                    # 内容未变，只是 stat 变化
+                    cached = self.cache.get(path)
+                    if cached is None:
+                        continue
+                    cached.mtime_ns, cached.size = entry.mtime_ns, entry.size
+                    entry = cached
+                    self.stats["hash_hits"] += 1
+                else:
+                    self.cache[path] = entry
+                    self.stats["files_analyzed"] += 1
+            results[path] = entry
+        return results
+
+    def _run(self, pending: List[Tuple[str, Optional[str]]]):
+        if not pending:
+            return []
+        if len(pending) < self.pool_threshold or self.max_workers <= 1:
+            _init_worker(self.analyze, self.rules)
+            return _scan_chunk(pending)
+
+        local: List[Tuple[str, Optional[str]]] = []
+        if self.prefer_local is not None:
+            remote = []
+            for item in pending:
+                (local if self.prefer_local(item[0]) else remote).append(item)
+            pending = remote
+            self.stats["files_kept_local"] += len(local)
+        if not pending:
+            _init_worker(self.analyze, self.rules)
+            return _scan_chunk(local)
+
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_worker,
+                initargs=(self.analyze, self.rules, True))
+        chunks = [pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size)]
+        # 子进程处理其余文件的同时，在当前进程分析保留的文件
+        chunk_results_iter = self._pool.map(_scan_chunk, chunks)
+        _init_worker(self.analyze, self.rules)
+        results = _scan_chunk(local)
+        for chunk_results in chunk_results_iter:
+            results.extend(chunk_results)
+        return results
+
+    def shutdown(self):
+        """关闭进程池并保存缓存"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        self.save_cache()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "cached_files": len(self.cache), "workers": self.max_workers}
+
+# ----------------------------------------------------------------------------
+# 文件系统变更通知
+# ----------------------------------------------------------------------------
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
+class ProjectChangeWatcher(FileSystemEventHandler):
+    """收集项目中变更的 .py 文件路径，通过 asyncio 事件通知监控循环"""
+
+    CHANGE_EVENTS = frozenset({'created', 'modified', 'moved', 'deleted', 'closed'})
+
+    def __init__(self, project_path: str, loop, excluded_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS):
+        super().__init__()
+        self.project_path = project_path
+        self.loop = loop
+        self.excluded_dirs = set(excluded_dirs)
+        self.changed: Set[str] = set()
+        self._lock = threading.Lock()
+        self._event = None
+        self.observer = None
+
+    def start(self, event) -> bool:
+        """开始监听，watchdog 不可用时返回 False"""
+        if not WATCHDOG_AVAILABLE:
+            return False
+        self._event = event
+        self.observer = Observer()
+        self.observer.schedule(self, self.project_path, recursive=True)
+        self.observer.start()
+        return True
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join(timeout=5)
+            self.observer = None
+
+    def drain(self) -> Set[str]:
+        """取出并清空已收集的变更"""
+        with self._lock:
+            changed, self.changed = self.changed, set()
+        return changed
+
+    def _record(self, path: str):
+        if not path.endswith('.py') or self.excluded_dirs.intersection(Path(path).parts):
+            return
+        with self._lock:
+            self.changed.add(path)
+        # watchdog 回调在观察者线程中执行
+        self.loop.call_soon_threadsafe(self._event.set)
+
+    def on_any_event(self, event):
+        # 忽略打开/关闭等只读事件 (扫描器自身读取文件也会产生)
+        if event.is_directory or event.event_type not in self.CHANGE_EVENTS:
+            return
+        self._record(os.fsdecode(event.src_path))
+        dest_path = getattr(event, 'dest_path', None)
+        if dest_path:
+            self._record(os.fsdecode(dest_path))
@@ -16,6 +16,13 @@ from enum import Enum
 import logging
 import requests
 
+# 导入共享的源码解析缓存
+try:
+    from ..parsed_source_cache import get_shared_source_cache
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from parsed_source_cache import get_shared_source_cache
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -56,6 +63,7 @@ class DevelopmentInterventionMCP:
         
         # 违规检测规则
         self.violation_rules = self._initialize_violation_rules()
+        self.source_cache = get_shared_source_cache()
         
         # 统计信息
         self.intervention_stats = {
@@ -146,9 +154,9 @@ class DevelopmentInterventionMCP:
         violations = []
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                lines = content.split('\n')
+            # 与其他代码分析MCP共享读取结果和行索引
+            parsed = self.source_cache.get(file_path)
+            content = parsed.source
             
             # 应用违规检测规则
             for rule_name, rule_config in self.violation_rules.items():
@@ -157,7 +165,7 @@ class DevelopmentInterventionMCP:
                     matches = re.finditer(pattern, content, re.MULTILINE | re.IGNORECASE)
                     
                     for match in matches:
-                        line_number = content[:match.start()].count('\n') + 1
+                        line_number = parsed.line_number(match.start())
                         
                         violation = ViolationReport(
                             violation_type=ViolationType(rule_name),
@@ -6,16 +6,32 @@ PowerAutomation 开发智能介入MCP
 
 import ast
 import os
+import sys
 import re
 import json
+import bisect
 import logging
 import time
 from datetime import datetime
+from pathlib import Path
+from functools import lru_cache
 from typing import Dict, List, Any, Optional, Set
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from enum import Enum
 import asyncio
 
+try:
+    from .compliance_scanner import IncrementalComplianceScanner, ProjectChangeWatcher, in_pool_worker
+except ImportError:
+    from compliance_scanner import IncrementalComplianceScanner, ProjectChangeWatcher, in_pool_worker
+
+# 导入共享的源码解析缓存
+try:
+    from ..parsed_source_cache import ImportFact, collect_source_facts, get_shared_source_cache, parse_source
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from parsed_source_cache import ImportFact, collect_source_facts, get_shared_source_cache, parse_source
+
 logger = logging.getLogger(__name__)
 
 class ViolationType(Enum):
@@ -45,6 +61,112 @@ class ViolationReport:
     fix_suggestion: str
     auto_fixable: bool = False
 
+@lru_cache(maxsize=256)
+def _compile_rule_pattern(pattern: str) -> re.Pattern:
+    return re.compile(pattern, re.MULTILINE | re.IGNORECASE)
+
+def analyze_import_violations(imports: List[ImportFact], file_path: str, lines: List[str]) -> List[ViolationReport]:
+    """根据解析缓存收集的导入语句分析违规行为"""
+    violations = []
+    
+    for fact in imports:
+        code_snippet = lines[fact.lineno - 1] if fact.lineno <= len(lines) else ""
+        if not fact.is_from:
+            for name in fact.names:
+                if 'mcp' in name.lower() and 'coordinator' not in name.lower():
+                    violations.append(ViolationReport(
+                        violation_type=ViolationType.DIRECT_MCP_IMPORT,
+                        severity=SeverityLevel.HIGH,
+                        file_path=file_path,
+                        line_number=fact.lineno,
+                        code_snippet=code_snippet,
+                        message=f"直接导入MCP模块: {name}",
+                        fix_suggestion=f"# 通过中央协调器获取MCP\n{name} = coordinator.get_mcp('{name.lower()}')",
+                        auto_fixable=True
+                    ))
+        elif fact.module and 'mcp' in fact.module.lower() and 'coordinator' not in fact.module.lower():
+            for name in fact.names:
+                violations.append(ViolationReport(
+                    violation_type=ViolationType.DIRECT_MCP_IMPORT,
+                    severity=SeverityLevel.HIGH,
+                    file_path=file_path,
+                    line_number=fact.lineno,
+                    code_snippet=code_snippet,
+                    message=f"直接从MCP模块导入: {fact.module}.{name}",
+                    fix_suggestion=f"# 通过中央协调器获取MCP\n{name} = coordinator.get_mcp('{fact.module}')",
+                    auto_fixable=True
+                ))
+    
+    return violations
+
+def analyze_ast_violations(tree: ast.AST, file_path: str, lines: List[str]) -> List[ViolationReport]:
+    """使用AST分析违规行为"""
+    return analyze_import_violations(collect_source_facts(tree).imports, file_path, lines)
+
+def analyze_regex_violations(content: str, file_path: str, lines: List[str],
+                             violation_rules: Dict[str, Dict[str, Any]],
+                             line_starts: Optional[List[int]] = None) -> List[ViolationReport]:
+    """使用正则表达式分析违规行为"""
+    violations = []
+    if line_starts is None:
+        # 行首偏移，用二分查找计算匹配所在行号
+        line_starts = [0]
+        for line in lines[:-1]:
+            line_starts.append(line_starts[-1] + len(line) + 1)
+    
+    for rule_name, rule_config in violation_rules.items():
+        for pattern in rule_config["patterns"]:
+            for match in _compile_rule_pattern(pattern).finditer(content):
+                # 计算行号
+                line_number = bisect.bisect_right(line_starts, match.start())
+                
+                violation = ViolationReport(
+                    violation_type=ViolationType(rule_name),
+                    severity=rule_config["severity"],
+                    file_path=file_path,
+                    line_number=line_number,
+                    code_snippet=lines[line_number - 1] if line_number <= len(lines) else "",
+                    message=rule_config["message"],
+                    fix_suggestion=rule_config["fix_template"],
+                    auto_fixable=True
+                )
+                violations.append(violation)
+    
+    return violations
+
+def analyze_file_compliance(content: str, file_path: str,
+                            violation_rules: Dict[str, Dict[str, Any]]) -> List[ViolationReport]:
+    """分析单个文件内容的合规性 (模块级函数，可在进程池中执行)"""
+    # 进程池子进程直接解析，不填充只属于该子进程的缓存 (主进程已解析的文件由
+    # has_shared_parse 留在主进程分析)；在主进程中与其他代码分析MCP共享解析结果
+    parsed = parse_source(content) if in_pool_worker() else get_shared_source_cache().parse(content)
+    violations = []
+    
+    # 使用AST进行深度分析；AST解析失败时只使用正则表达式
+    if parsed.facts.syntax_error is None:
+        violations.extend(analyze_import_violations(parsed.facts.imports, file_path, parsed.lines))
+    
+    # 使用正则表达式检测违规模式
+    violations.extend(analyze_regex_violations(content, file_path, parsed.lines, violation_rules,
+                                               parsed.line_starts))
+    return violations
+
+def has_shared_parse(file_path: str) -> bool:
+    """共享解析缓存中是否已有该文件的当前解析结果 (扫描器据此把文件留在主进程分析)"""
+    return get_shared_source_cache().peek(file_path) is not None
+
+def violation_to_dict(violation: ViolationReport) -> Dict[str, Any]:
+    """转换为可 JSON 序列化的字典 (扫描缓存持久化)"""
+    data = asdict(violation)
+    data["violation_type"] = violation.violation_type.value
+    data["severity"] = violation.severity.value
+    return data
+
+def violation_from_dict(data: Dict[str, Any]) -> ViolationReport:
+    """从 violation_to_dict 的结果还原违规报告"""
+    return ViolationReport(**{**data, "violation_type": ViolationType(data["violation_type"]),
+                              "severity": SeverityLevel(data["severity"])})
+
 class DevelopmentInterventionMCP:
     """
     开发智能介入MCP
@@ -82,6 +204,18 @@ class DevelopmentInterventionMCP:
         
         # 实时监控状态
         self.monitoring_active = False
+        self.monitor_task: Optional[asyncio.Task] = None
+        
+        # 增量合规扫描：文件级结果缓存 + 进程池分析变更文件
+        self.compliance_scanner = IncrementalComplianceScanner(
+            analyze_file_compliance,
+            self.violation_rules,
+            max_workers=self.config.get("scan_workers"),
+            cache_file=self.config.get("scan_cache_file"),
+            encode_violation=violation_to_dict,
+            decode_violation=violation_from_dict,
+            prefer_local=has_shared_parse
+        )
         
         logger.info(f"🛡️ {self.name} 初始化完成 - 架构守护者已就位")
     
@@ -201,19 +335,15 @@ class DevelopmentInterventionMCP:
             }
     
     async def scan_project_compliance(self, project_path: str) -> Dict[str, Any]:
-        """扫描项目架构合规性"""
+        """扫描项目架构合规性 (增量：只重新分析内容变化的文件)"""
         violations = []
-        scanned_files = 0
         
         try:
-            # 遍历项目文件
-            for root, dirs, files in os.walk(project_path):
-                for file in files:
-                    if file.endswith('.py'):
-                        file_path = os.path.join(root, file)
-                        file_violations = await self._scan_file_compliance(file_path)
-                        violations.extend(file_violations)
-                        scanned_files += 1
+            # 遍历和分析都在线程/进程池中执行，不阻塞事件循环
+            results = await asyncio.to_thread(self.compliance_scanner.scan_project, project_path)
+            for path in sorted(results):
+                violations.extend(results[path].violations)
+            scanned_files = len(results)
             
             # 更新性能指标
             self.performance_metrics["scans_performed"] += 1
@@ -230,7 +360,9 @@ class DevelopmentInterventionMCP:
                 "total_violations": len(violations),
                 "violations": violations,
                 "compliance_rate": compliance_rate,
-                "scan_timestamp": datetime.now().isoformat()
+                "scan_timestamp": datetime.now().isoformat(),
+                "scan_duration": self.compliance_scanner.stats["last_scan_seconds"],
+                "scanner_stats": self.compliance_scanner.get_stats()
             }
             
         except Exception as e:
@@ -241,101 +373,19 @@ class DevelopmentInterventionMCP:
             }
     
     async def _scan_file_compliance(self, file_path: str) -> List[ViolationReport]:
-        """扫描单个文件的合规性"""
-        violations = []
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                lines = content.split('\n')
-            
-            # 使用AST进行深度分析
-            try:
-                tree = ast.parse(content)
-                ast_violations = self._analyze_ast_violations(tree, file_path, lines)
-                violations.extend(ast_violations)
-            except SyntaxError:
-                # 如果AST解析失败，使用正则表达式
-                pass
-            
-            # 使用正则表达式检测违规模式
-            regex_violations = self._analyze_regex_violations(content, file_path, lines)
-            violations.extend(regex_violations)
-            
-        except Exception as e:
-            logger.error(f"文件扫描失败 {file_path}: {e}")
-        
-        return violations
+        """扫描单个文件的合规性 (命中缓存时不重新分析)"""
+        file_path = str(file_path)
+        results = await asyncio.to_thread(self.compliance_scanner.scan_paths, [file_path])
+        entry = results.get(file_path)
+        return list(entry.violations) if entry else []
     
     def _analyze_ast_violations(self, tree: ast.AST, file_path: str, lines: List[str]) -> List[ViolationReport]:
         """使用AST分析违规行为"""
-        violations = []
-        
-        class ViolationVisitor(ast.NodeVisitor):
-            def __init__(self, outer_self):
-                self.outer = outer_self
-                
-            def visit_Import(self, node):
-                for alias in node.names:
-                    if 'mcp' in alias.name.lower() and 'coordinator' not in alias.name.lower():
-                        violation = ViolationReport(
-                            violation_type=ViolationType.DIRECT_MCP_IMPORT,
-                            severity=SeverityLevel.HIGH,
-                            file_path=file_path,
-                            line_number=node.lineno,
-                            code_snippet=lines[node.lineno - 1] if node.lineno <= len(lines) else "",
-                            message=f"直接导入MCP模块: {alias.name}",
-                            fix_suggestion=f"# 通过中央协调器获取MCP\n{alias.name} = coordinator.get_mcp('{alias.name.lower()}')",
-                            auto_fixable=True
-                        )
-                        violations.append(violation)
-                self.generic_visit(node)
-            
-            def visit_ImportFrom(self, node):
-                if node.module and 'mcp' in node.module.lower() and 'coordinator' not in node.module.lower():
-                    for alias in node.names:
-                        violation = ViolationReport(
-                            violation_type=ViolationType.DIRECT_MCP_IMPORT,
-                            severity=SeverityLevel.HIGH,
-                            file_path=file_path,
-                            line_number=node.lineno,
-                            code_snippet=lines[node.lineno - 1] if node.lineno <= len(lines) else "",
-                            message=f"直接从MCP模块导入: {node.module}.{alias.name}",
-                            fix_suggestion=f"# 通过中央协调器获取MCP\n{alias.name} = coordinator.get_mcp('{node.module}')",
-                            auto_fixable=True
-                        )
-                        violations.append(violation)
-                self.generic_visit(node)
-        
-        visitor = ViolationVisitor(self)
-        visitor.visit(tree)
-        return violations
+        return analyze_ast_violations(tree, file_path, lines)
     
     def _analyze_regex_violations(self, content: str, file_path: str, lines: List[str]) -> List[ViolationReport]:
         """使用正则表达式分析违规行为"""
-        violations = []
-        
-        for rule_name, rule_config in self.violation_rules.items():
-            for pattern in rule_config["patterns"]:
-                matches = re.finditer(pattern, content, re.MULTILINE | re.IGNORECASE)
-                
-                for match in matches:
-                    # 计算行号
-                    line_number = content[:match.start()].count('\n') + 1
-                    
-                    violation = ViolationReport(
-                        violation_type=ViolationType(rule_name),
-                        severity=rule_config["severity"],
-                        file_path=file_path,
-                        line_number=line_number,
-                        code_snippet=lines[line_number - 1] if line_number <= len(lines) else "",
-                        message=rule_config["message"],
-                        fix_suggestion=rule_config["fix_template"],
-                        auto_fixable=True
-                    )
-                    violations.append(violation)
-        
-        return violations
+        return analyze_regex_violations(content, file_path, lines, self.violation_rules)
     
     async def auto_fix_violations(self, violations: List[ViolationReport]) -> Dict[str, Any]:
         """自动修复违规行为"""
@@ -426,7 +476,7 @@ class DevelopmentInterventionMCP:
         self.monitoring_active = True
         
         # 启动文件监控任务
-        asyncio.create_task(self._real_time_monitor_loop(project_path))
+        self.monitor_task = asyncio.create_task(self._real_time_monitor_loop(project_path))
         
         return {
             "status": "started",
@@ -434,37 +484,82 @@ class DevelopmentInterventionMCP:
             "message": "实时架构合规监控已启动"
         }
     
-    async def _real_time_monitor_loop(self, project_path: str):
-        """实时监控循环"""
-        while self.monitoring_active:
-            try:
-                # 扫描项目合规性
-                scan_result = await self.scan_project_compliance(project_path)
-                
-                # 如果发现违规，立即处理
-                if scan_result["total_violations"] > 0:
-                    logger.warning(f"🚨 检测到 {scan_result['total_violations']} 个架构违规")
+    async def _real_time_monitor_loop(self, project_path: str, debounce: float = 0.5,
+                                      poll_interval: float = 5):
+        """实时监控循环：首次全量扫描，之后只扫描文件系统通知的变更文件
+        
+        watchdog 不可用时退化为每 poll_interval 秒一次增量扫描 (未变化的文件只做 stat)
+        """
+        changed_event = asyncio.Event()
+        watcher = ProjectChangeWatcher(os.path.abspath(project_path), asyncio.get_running_loop(),
+                                       self.compliance_scanner.excluded_dirs)
+        use_notifications = watcher.start(changed_event)
+        if not use_notifications:
+            logger.info("watchdog 不可用，实时监控使用定时增量扫描")
+        
+        try:
+            # 首次全量扫描建立缓存
+            scan_result = await self.scan_project_compliance(project_path)
+            if scan_result.get("status") == "completed":
+                await self._handle_monitor_violations(scan_result["violations"])
+            
+            while self.monitoring_active:
+                try:
+                    if use_notifications:
+                        await changed_event.wait()
+                        # 合并短时间内的连续写入
+                        await asyncio.sleep(debounce)
+                        changed_event.clear()
+                        changed = watcher.drain()
+                        if not changed:
+                            continue
+                        results = await asyncio.to_thread(self.compliance_scanner.scan_paths, changed)
+                        violations = [v for path in sorted(results) for v in results[path].violations]
+                    else:
+                        await asyncio.sleep(poll_interval)
+                        scan_result = await self.scan_project_compliance(project_path)
+                        violations = scan_result.get("violations", [])
                     
-                    # 自动修复可修复的违规
-                    auto_fixable = [v for v in scan_result["violations"] if v.auto_fixable]
-                    if auto_fixable:
-                        await self.auto_fix_violations(auto_fixable)
-                
-                # 等待下次扫描
-                await asyncio.sleep(5)  # 每5秒扫描一次
-                
-            except Exception as e:
-                logger.error(f"实时监控错误: {e}")
-                await asyncio.sleep(10)
+                    await self._handle_monitor_violations(violations)
+                    
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"实时监控错误: {e}")
+                    await asyncio.sleep(10)
+        finally:
+            watcher.stop()
+    
+    async def _handle_monitor_violations(self, violations: List[ViolationReport]):
+        """处理实时监控发现的违规"""
+        # 如果发现违规，立即处理
+        if violations:
+            logger.warning(f"🚨 检测到 {len(violations)} 个架构违规")
+            
+            # 自动修复可修复的违规
+            auto_fixable = [v for v in violations if v.auto_fixable]
+            if auto_fixable:
+                await self.auto_fix_violations(auto_fixable)
     
     def stop_real_time_monitoring(self) -> Dict[str, Any]:
         """停止实时监控"""
         self.monitoring_active = False
+        if self.monitor_task is not None:
+            self.monitor_task.cancel()
+            self.monitor_task = None
+        self.close()
         return {
             "status": "stopped",
             "message": "实时架构合规监控已停止"
         }
     
+    def close(self):
+        """保存增量扫描缓存并关闭扫描进程池；之后的扫描会按需重新创建进程池"""
+        try:
+            self.compliance_scanner.shutdown()
+        except Exception as e:
+            logger.error(f"❌ 合规扫描器关闭失败: {e}")
+    
     def get_compliance_report(self) -> Dict[str, Any]:
         """获取合规报告"""
         return {
@@ -624,181 +719,6 @@ class DevelopmentInterventionMCP:
 # Flask MCP Server Integration
 # ============================================================================
 
-def create_development_intervention_mcp_server():
-    """创建Development Intervention MCP服务器"""
-    from flask import Flask, request, jsonify
-    from flask_cors import CORS
-    
-    app = Flask(__name__)
-    CORS(app)
-    
-    # 创建MCP实例
-    dev_mcp = DevelopmentInterventionMCP()
-    
-    @app.route('/health', methods=['GET'])
-    def health_check():
-        """健康检查"""
-        return jsonify({
-            "mcp_id": "development_intervention_mcp",
-            "status": "healthy",
-            "version": "2.0.0",
-            "timestamp": datetime.now().isoformat(),
-            "prevention_enabled": hasattr(dev_mcp, 'pr_prevention')
-        })
-    
-    @app.route('/mcp/info', methods=['GET'])
-    def mcp_info():
-        """MCP基本信息"""
-        return jsonify({
-            "mcp_id": "development_intervention_mcp",
-            "version": "2.0.0",
-            "capabilities": [
-                "architecture_compliance_scanning",
-                "real_time_code_monitoring", 
-                "auto_fix_generation",
-                "pr_review_prevention",
-                "violation_detection"
-            ],
-            "description": "Development Intervention MCP - 智能开发介入与PR预防"
-        })
-    
-    @app.route('/mcp/request', methods=['POST'])
-    def mcp_request():
-        """标准MCP请求处理"""
-        try:
-            data = request.get_json()
-            action = data.get('action')
-            params = data.get('params', {})
-            
-            if action == 'enable_pr_prevention':
-                result = dev_mcp.enable_pr_review_prevention()
-            elif action == 'check_pr_compliance':
-                result = dev_mcp.check_pr_compliance(params)
-            elif action == 'scan_project_compliance':
-                project_path = params.get('project_path', '/home/ubuntu/kilocode_integrated_repo')
-                result = asyncio.run(dev_mcp.scan_project_compliance(project_path))
-            elif action == 'get_prevention_stats':
-                result = dev_mcp.get_prevention_stats()
-            elif action == 'register_mcp':
-                mcp_id = params.get('mcp_id')
-                mcp_info = params.get('mcp_info', {})
-                result = asyncio.run(dev_mcp.register_mcp(mcp_id, mcp_info))
-            else:
-                result = {
-                    "status": "error",
-                    "error": f"未知操作: {action}"
-                }
-            
-            return jsonify(result)
-            
-        except Exception as e:
-            logger.error(f"MCP请求处理失败: {e}")
-            return jsonify({
-                "status": "error",
-                "error": f"MCP请求处理失败: {e}"
-            }), 500
-    
-    return app
-
-if __name__ == '__main__':
-    # 创建并启动MCP服务器
-    app = create_development_intervention_mcp_server()
-    
-    print(f"🚀 启动Development Intervention MCP服务器...")
-    print(f"🔧 MCP ID: development_intervention_mcp")
-    print(f"📡 端口: 8092")
-    print(f"🛡️ PR Review预防: 已集成")
-    
-    app.run(host='0.0.0.0', port=8092, debug=False)
-
-
-                }
-            else:
-                logger.error(f"❌ PR Review预防机制启用失败: {hook_result['error']}")
-                return {
-                    "status": "error",
-                    "error": hook_result["error"]
-                }
-                
-        except Exception as e:
-            logger.error(f"启用PR Review预防机制失败: {e}")
-            return {
-                "status": "error",
-                "error": str(e)
-            }
-    
-    def check_pr_compliance(self, pr_data: Dict[str, Any]) -> Dict[str, Any]:
-        """检查PR合规性"""
-        try:
-            if not hasattr(self, 'pr_prevention'):
-                return {
-                    "status": "error",
-                    "error": "PR预防机制未启用"
-                }
-            
-            # 检查暂存文件
-            check_result = self.pr_prevention.check_staged_files()
-            
-            if check_result["success"]:
-                # 如果有可自动修复的问题，尝试修复
-                if check_result["total_issues"] > 0:
-                    auto_fix_result = self.pr_prevention.auto_fix_issues([
-                        result for result in check_result.get("results", [])
-                        if result.get("auto_fixable", False)
-                    ])
-                    
-                    check_result["auto_fix_applied"] = auto_fix_result["fixed_count"]
-                
-                return {
-                    "status": "completed",
-                    "pr_compliant": not check_result["should_block_commit"],
-                    "total_issues": check_result["total_issues"],
-                    "critical_issues": check_result["critical_issues"],
-                    "error_issues": check_result["error_issues"],
-                    "warning_issues": check_result["warning_issues"],
-                    "blocked_files": check_result["blocked_files"],
-                    "auto_fixes_applied": check_result.get("auto_fix_applied", 0),
-                    "details": check_result["results"]
-                }
-            else:
-                return {
-                    "status": "error",
-                    "error": check_result["error"]
-                }
-                
-        except Exception as e:
-            logger.error(f"PR合规性检查失败: {e}")
-            return {
-                "status": "error",
-                "error": str(e)
-            }
-    
-    def get_prevention_stats(self) -> Dict[str, Any]:
-        """获取预防统计信息"""
-        try:
-            if not hasattr(self, 'pr_prevention'):
-                return {
-                    "prevention_enabled": False,
-                    "message": "PR预防机制未启用"
-                }
-            
-            stats = self.pr_prevention.get_prevention_stats()
-            return {
-                "prevention_enabled": True,
-                **stats
-            }
-            
-        except Exception as e:
-            logger.error(f"获取预防统计失败: {e}")
-            return {
-                "prevention_enabled": False,
-                "error": str(e)
-            }
-
-# ============================================================================
-# Flask MCP Server Integration
-# ============================================================================
-
 def create_development_intervention_mcp_server():
     """创建Development Intervention MCP服务器"""
     from flask import Flask, request, jsonify
@@ -13,8 +13,16 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, asdict
 from pathlib import Path
+import sys
 import logging
 
+# 导入批量Git状态采集器
+try:
+    from ..git_status_collector import GitStatusCollector, GitCommandError
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from git_status_collector import GitStatusCollector, GitCommandError
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -54,6 +62,8 @@ class GitMonitor:
         self.last_status = None
         self.checkin_events = []
         self.callbacks = []
+        # 每次轮询只运行一次 git status，提交详情由常驻的 cat-file 进程读取
+        self.collector = GitStatusCollector(repository_path, timeout=10)
         
         # 监控配置
         self.monitor_interval = 5  # 秒
@@ -92,6 +102,7 @@ class GitMonitor:
             self.monitoring = False
             if self.monitor_thread:
                 self.monitor_thread.join(timeout=5)
+            self.collector.close()
             
             logger.info("⏹️ Git监控已停止")
             return {"success": True, "message": "Git监控已停止"}
@@ -172,80 +183,54 @@ class GitMonitor:
     def _get_git_status(self) -> GitStatus:
         """获取Git状态"""
         try:
-            # 切换到仓库目录
-            original_cwd = os.getcwd()
-            os.chdir(self.repository_path)
-            
-            # 获取当前分支
-            current_branch = self._run_git_command(['git', 'branch', '--show-current']).strip()
-            
-            # 获取最后一次提交信息
-            last_commit_info = self._run_git_command([
-                'git', 'log', '-1', '--format=%H|%s|%ct'
-            ]).strip()
-            
-            if last_commit_info:
-                commit_hash, commit_message, commit_timestamp = last_commit_info.split('|', 2)
-                last_commit_time = datetime.fromtimestamp(int(commit_timestamp))
-            else:
-                commit_hash = ""
-                commit_message = ""
-                last_commit_time = datetime.now()
-            
-            # 获取未提交的更改
-            status_output = self._run_git_command(['git', 'status', '--porcelain'])
-            uncommitted_changes = []
-            untracked_files = []
-            staged_files = []
-            
-            for line in status_output.split('\n'):
-                if line.strip():
-                    status_code = line[:2]
-                    file_path = line[3:]
-                    
-                    if status_code[0] in ['M', 'A', 'D', 'R', 'C']:
-                        staged_files.append(file_path)
-                    if status_code[1] in ['M', 'D']:
-                        uncommitted_changes.append(file_path)
-                    if status_code == '??':
-                        untracked_files.append(file_path)
-            
-            # 检查是否有远程跟踪分支
-            ahead_commits = 0
-            behind_commits = 0
-            
-            try:
-                # 获取ahead/behind信息
-                ahead_behind = self._run_git_command([
-                    'git', 'rev-list', '--left-right', '--count', f'{current_branch}...origin/{current_branch}'
-                ]).strip()
-                
-                if ahead_behind:
-                    ahead_str, behind_str = ahead_behind.split('\t')
-                    ahead_commits = int(ahead_str)
-                    behind_commits = int(behind_str)
-            except:
-                # 如果没有远程分支，忽略错误
-                pass
-            
-            is_clean = not (uncommitted_changes or untracked_files or staged_files)
-            
-            return GitStatus(
-                repository_path=self.repository_path,
-                current_branch=current_branch,
-                last_commit_hash=commit_hash,
-                last_commit_message=commit_message,
-                last_commit_time=last_commit_time,
-                uncommitted_changes=uncommitted_changes,
-                untracked_files=untracked_files,
-                staged_files=staged_files,
-                is_clean=is_clean,
-                ahead_commits=ahead_commits,
-                behind_commits=behind_commits
-            )
+            snapshot = self.collector.collect(
+                include_refs=False, include_numstat=False,
+                untracked_files="normal", include_head_commit=True)
+        except GitCommandError as e:
+            raise RuntimeError(f"获取Git状态失败: {e}") from e
+        
+        # 获取最后一次提交信息
+        if snapshot.head_commit:
+            commit_hash = snapshot.head_commit.hash
+            commit_message = snapshot.head_commit.subject
+            last_commit_time = datetime.fromtimestamp(snapshot.head_commit.committer_time)
+        else:
+            commit_hash = ""
+            commit_message = ""
+            last_commit_time = datetime.now()
+        
+        # 获取未提交的更改
+        uncommitted_changes = []
+        untracked_files = []
+        staged_files = []
+        
+        for entry in snapshot.files:
+            status_code = entry.code
+            file_path = entry.path
             
-        finally:
-            os.chdir(original_cwd)
+            if status_code[0] in ['M', 'A', 'D', 'R', 'C']:
+                staged_files.append(file_path)
+            if status_code[1] in ['M', 'D']:
+                uncommitted_changes.append(file_path)
+            if status_code == '??':
+                untracked_files.append(file_path)
+        
+        # ahead/behind 来自 status 的上游信息，没有远程跟踪分支时为0
+        is_clean = not (uncommitted_changes or untracked_files or staged_files)
+        
+        return GitStatus(
+            repository_path=self.repository_path,
+            current_branch=snapshot.branch,
+            last_commit_hash=commit_hash,
+            last_commit_message=commit_message,
+            last_commit_time=last_commit_time,
+            uncommitted_changes=uncommitted_changes,
+            untracked_files=untracked_files,
+            staged_files=staged_files,
+            is_clean=is_clean,
+            ahead_commits=snapshot.ahead,
+            behind_commits=snapshot.behind
+        )
     
     def _run_git_command(self, command: List[str]) -> str:
         """执行Git命令"""
@@ -16,6 +16,13 @@ import logging
 from dataclasses import dataclass
 from enum import Enum
 
+# 导入共享的源码解析缓存
+try:
+    from ..parsed_source_cache import get_shared_source_cache
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from parsed_source_cache import get_shared_source_cache
+
 logger = logging.getLogger(__name__)
 
 class PreventionLevel(Enum):
@@ -43,6 +50,7 @@ class PRReviewPrevention:
     def __init__(self, repo_root: str = "/home/ubuntu/kilocode_integrated_repo"):
         self.repo_root = Path(repo_root)
         self.prevention_rules = self._initialize_prevention_rules()
+        self.source_cache = get_shared_source_cache()
         self.git_hooks_installed = False
         
         # 预防统计
@@ -295,9 +303,9 @@ exit 0
             if not file_path.exists():
                 return results
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                lines = content.split('\n')
+            # 与其他代码分析MCP共享读取结果和行索引
+            parsed = self.source_cache.get(file_path)
+            content = parsed.source
             
             # 应用所有预防规则
             for rule_name, rule_config in self.prevention_rules.items():
@@ -305,7 +313,7 @@ exit 0
                     matches = re.finditer(pattern, content, re.MULTILINE | re.IGNORECASE)
                     
                     for match in matches:
-                        line_number = content[:match.start()].count('\n') + 1
+                        line_number = parsed.line_number(match.start())
                         
                         result = PreventionResult(
                             level=rule_config["level"],
@@ -0,0 +1,166 @@
+"""
+批量Git状态采集测试
+测试 porcelain v2 / for-each-ref / numstat 解析、常驻 cat-file 进程，以及子进程数不随分支数和文件数增长
+"""
+
+import unittest
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+import sys
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from git_status_collector import GitStatusCollector, GitCommandError
+from git_monitor import GitMonitor
+
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "tester", "GIT_AUTHOR_EMAIL": "tester@example.com",
+    "GIT_COMMITTER_NAME": "tester", "GIT_COMMITTER_EMAIL": "tester@example.com",
+    "GIT_CONFIG_NOSYSTEM": "1"
+}
+
+
+class TestGitStatusCollector(unittest.TestCase):
+    """批量Git状态采集测试类"""
+
+    def setUp(self):
+        self.repo = tempfile.mkdtemp()
+        self.env_backup = {key: os.environ.get(key) for key in GIT_ENV}
+        os.environ.update(GIT_ENV)
+        self.git("init", "-q", "-b", "main")
+        self.write("a.txt", "one\ntwo\n")
+        self.write("b.txt", "b\n")
+        self.write("old name.txt", "rename me\n")
+        self.git("add", ".")
+        self.git("commit", "-q", "-m", "initial commit")
+
+    def tearDown(self):
+        for key, value in self.env_backup.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        shutil.rmtree(self.repo, ignore_errors=True)
+
+    def git(self, *args):
+        return subprocess.run(["git", *args], cwd=self.repo, check=True,
+                              capture_output=True, text=True).stdout
+
+    def write(self, name, content):
+        path = Path(self.repo) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+
+    def test_snapshot_contents(self):
+        """测试文件状态、分支、stash和行数变化"""
+        self.write("b.txt", "stashed\n")
+        self.git("stash", "-q")
+        self.git("branch", "feature")
+        self.git("branch", "--set-upstream-to=feature", "main")
+        self.write("a.txt", "one\ntwo\nthree\n")
+        self.write("b.txt", "b\nstaged\n")
+        self.git("add", "b.txt")
+        self.git("mv", "old name.txt", "new name.txt")
+        self.write("new dir/untracked.txt", "u\n")
+
+        collector = GitStatusCollector(self.repo)
+        try:
+            snapshot = collector.collect(include_head_commit=True)
+        finally:
+            collector.close()
+
+        self.assertEqual(snapshot.branch, "main")
+        self.assertEqual(snapshot.stash_count, 1)
+        self.assertEqual(snapshot.upstream, "feature")
+        files = {f.path: f for f in snapshot.files}
+        self.assertEqual(files["a.txt"].code, " M")
+        self.assertEqual(files["b.txt"].code, "M ")
+        self.assertEqual((files["new name.txt"].code, files["new name.txt"].orig_path), ("R ", "old name.txt"))
+        self.assertTrue(files["new dir/untracked.txt"].is_untracked)
+        self.assertEqual(sorted(f.path for f in snapshot.staged), ["b.txt", "new name.txt"])
+        self.assertEqual(snapshot.numstat, {"a.txt": (1, 0)})
+
+        refs = {ref.short_name: ref for ref in snapshot.refs}
+        self.assertEqual(set(refs), {"main", "feature"})
+        self.assertTrue(refs["main"].is_head)
+        self.assertEqual(refs["main"].upstream_branch, "refs/heads/feature")
+        self.assertEqual(refs["feature"].object_name, snapshot.head_oid)
+        self.assertEqual(refs["feature"].subject, "initial commit")
+
+        self.assertEqual(snapshot.head_commit.hash, snapshot.head_oid)
+        self.assertEqual(snapshot.head_commit.subject, "initial commit")
+        self.assertEqual(snapshot.head_commit.author, "tester")
+
+    def test_command_count_independent_of_size(self):
+        """测试分支数和文件数增长时子进程数不变"""
+        collector = GitStatusCollector(self.repo)
+        small = collector.collect()
+
+        for i in range(30):
+            self.git("branch", f"branch-{i}")
+            self.write(f"generated/file_{i}.txt", "x\n")
+        self.git("add", "generated")
+        self.git("commit", "-q", "-m", "generated")
+        for i in range(30):
+            self.write(f"generated/file_{i}.txt", "x\ny\n")
+
+        large = collector.collect(include_head_commit=True)
+        collector.close()
+        self.assertEqual(len(large.refs), 31)
+        self.assertEqual(len(large.unstaged), 30)
+        self.assertEqual(large.numstat["generated/file_7.txt"], (1, 0))
+        # status + for-each-ref + diff --numstat; 提交详情来自常驻 cat-file 进程
+        self.assertEqual(large.commands_run, 3)
+        self.assertLessEqual(small.commands_run, large.commands_run)
+        self.assertEqual(collector.get_stats()["cat_file_requests"], 1)
+
+    def test_cat_file_restarts_and_fallback(self):
+        """测试 cat-file 进程退出后自动重启，以及不使用 cat-file 时的 git log 回退"""
+        collector = GitStatusCollector(self.repo)
+        first = collector.commit_details()
+        collector.cat_file._process.kill()
+        collector.cat_file._process.wait()
+        self.assertEqual(collector.commit_details(), first)
+        self.assertIsNone(collector.commit_details("no-such-branch"))
+        collector.close()
+
+        fallback = GitStatusCollector(self.repo, use_cat_file=False)
+        self.assertEqual(fallback.commit_details(), first)
+
+    def test_not_a_repository(self):
+        """测试非Git目录抛出 GitCommandError"""
+        plain_dir = tempfile.mkdtemp()
+        try:
+            with self.assertRaises(GitCommandError):
+                GitStatusCollector(plain_dir).collect()
+        finally:
+            shutil.rmtree(plain_dir, ignore_errors=True)
+
+    def test_git_monitor_status(self):
+        """测试 GitMonitor 使用批量采集得到的状态"""
+        self.write("a.txt", "changed\n")
+        self.write("c.txt", "new\n")
+        self.git("add", "c.txt")
+        self.write("untracked/x.txt", "x\n")
+
+        monitor = GitMonitor(self.repo)
+        try:
+            status = monitor._get_git_status()
+        finally:
+            monitor.collector.close()
+        self.assertEqual(status.current_branch, "main")
+        self.assertEqual(status.last_commit_message, "initial commit")
+        self.assertEqual(status.uncommitted_changes, ["a.txt"])
+        self.assertEqual(status.staged_files, ["c.txt"])
+        self.assertEqual(status.untracked_files, ["untracked/"])
+        self.assertFalse(status.is_clean)
+        self.assertEqual(monitor.collector.stats["commands_run"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+"""
+增量合规扫描测试
+测试文件级缓存 (stat/内容哈希)、进程池分析、缓存持久化以及基于文件系统通知的实时监控
+"""
+
+import unittest
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+import sys
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from development_intervention_mcp_new import DevelopmentInterventionMCP, SeverityLevel, analyze_file_compliance
+from compliance_scanner import WATCHDOG_AVAILABLE
+
+VIOLATING_SOURCE = "from local_model_mcp import LocalModelMCP\n\nresult = local_model_mcp.process(data)\n"
+CLEAN_SOURCE = "def add(a, b):\n    return a + b\n"
+
+
+class TestIncrementalComplianceScan(unittest.IsolatedAsyncioTestCase):
+    """增量合规扫描测试类"""
+
+    def setUp(self):
+        self.project = tempfile.mkdtemp()
+        self.write("pkg/violating.py", VIOLATING_SOURCE)
+        self.write("pkg/clean.py", CLEAN_SOURCE)
+        self.write("main.py", CLEAN_SOURCE + "import other_mcp\n")
+        self.write("__pycache__/ignored.py", VIOLATING_SOURCE)
+
+    def tearDown(self):
+        shutil.rmtree(self.project, ignore_errors=True)
+
+    def write(self, relative_path, content):
+        path = Path(self.project) / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+        return str(path)
+
+    def expected_violations(self):
+        violations = []
+        for name in ("main.py", "pkg/clean.py", "pkg/violating.py"):
+            path = os.path.join(self.project, name)
+            with open(path, encoding="utf-8") as f:
+                violations.extend(analyze_file_compliance(f.read(), path, DevelopmentInterventionMCP().violation_rules))
+        return violations
+
+    async def test_unchanged_files_not_reanalyzed(self):
+        """测试未变化文件复用缓存，只重新分析内容变化的文件"""
+        mcp = DevelopmentInterventionMCP()
+        scanner = mcp.compliance_scanner
+
+        first = await mcp.scan_project_compliance(self.project)
+        self.assertEqual(first["scanned_files"], 3)
+        self.assertEqual(scanner.stats["files_analyzed"], 3)
+        self.assertEqual(sorted(map(repr, first["violations"])), sorted(map(repr, self.expected_violations())))
+
+        second = await mcp.scan_project_compliance(self.project)
+        self.assertEqual(scanner.stats["files_analyzed"], 3)
+        self.assertEqual(scanner.stats["stat_hits"], 3)
+        self.assertEqual(second["total_violations"], first["total_violations"])
+
+        # 内容变化：重新分析；只改 mtime：按内容哈希复用
+        self.write("pkg/clean.py", VIOLATING_SOURCE)
+        later = time.time() + 5
+        os.utime(os.path.join(self.project, "main.py"), (later, later))
+        third = await mcp.scan_project_compliance(self.project)
+        self.assertEqual(scanner.stats["files_analyzed"], 4)
+        self.assertEqual(scanner.stats["hash_hits"], 1)
+        self.assertEqual(sorted(map(repr, third["violations"])), sorted(map(repr, self.expected_violations())))
+
+        # 删除的文件从结果和缓存中移除
+        os.remove(os.path.join(self.project, "pkg/violating.py"))
+        fourth = await mcp.scan_project_compliance(self.project)
+        self.assertEqual(fourth["scanned_files"], 2)
+        self.assertEqual(len(scanner.cache), 2)
+
+    async def test_process_pool_matches_inline_analysis(self):
+        """测试进程池分析结果与当前进程分析一致"""
+        for i in range(20):
+            self.write(f"generated/module_{i}.py", VIOLATING_SOURCE if i % 2 else CLEAN_SOURCE)
+
+        inline = DevelopmentInterventionMCP({"scan_workers": 1})
+        pooled = DevelopmentInterventionMCP({"scan_workers": 2})
+        pooled.compliance_scanner.pool_threshold = 4
+        pooled.compliance_scanner.chunk_size = 3
+        try:
+            inline_result = await inline.scan_project_compliance(self.project)
+            pooled_result = await pooled.scan_project_compliance(self.project)
+        finally:
+            pooled.close()
+        self.assertIsNone(pooled.compliance_scanner._pool)
+
+        self.assertEqual(pooled_result["scanned_files"], 23)
+        self.assertEqual(list(map(repr, pooled_result["violations"])), list(map(repr, inline_result["violations"])))
+
+    async def test_cache_persisted_across_instances(self):
+        """测试停止监控时以JSON保存缓存，新实例复用缓存得到相同的违规"""
+        cache_file = os.path.join(self.project, ".scan_cache", "compliance.json")
+        first = DevelopmentInterventionMCP({"scan_cache_file": cache_file})
+        expected = await first.scan_project_compliance(self.project)
+        first.stop_real_time_monitoring()
+        with open(cache_file, encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)["entries"]), 3)
+
+        second = DevelopmentInterventionMCP({"scan_cache_file": cache_file})
+        result = await second.scan_project_compliance(self.project)
+        self.assertEqual(second.compliance_scanner.stats["files_analyzed"], 0)
+        self.assertEqual(list(map(repr, result["violations"])), list(map(repr, expected["violations"])))
+
+    async def test_cache_invalidated_by_rule_definition(self):
+        """测试规则的严重性、提示信息变化时缓存失效"""
+        cache_file = os.path.join(self.project, ".scan_cache", "compliance.json")
+        first = DevelopmentInterventionMCP({"scan_cache_file": cache_file})
+        await first.scan_project_compliance(self.project)
+        first.close()
+
+        changed = DevelopmentInterventionMCP({"scan_cache_file": cache_file})
+        changed.violation_rules["direct_mcp_call"]["severity"] = SeverityLevel.LOW
+        changed.violation_rules["bypass_coordinator"]["message"] = "changed"
+        changed.compliance_scanner.cache.clear()
+        changed.compliance_scanner._load_cache()
+        self.assertEqual(changed.compliance_scanner.cache, {})
+
+        result = await changed.scan_project_compliance(self.project)
+        self.assertEqual(changed.compliance_scanner.stats["files_analyzed"], 3)
+        self.assertIn(SeverityLevel.LOW, {v.severity for v in result["violations"]})
+
+    @unittest.skipUnless(WATCHDOG_AVAILABLE, "需要 watchdog")
+    async def test_real_time_monitor_scans_only_changed_files(self):
+        """测试实时监控按文件系统通知只扫描变更的文件"""
+        mcp = DevelopmentInterventionMCP()
+        handled = []
+
+        async def record(violations):
+            handled.append(violations)
+
+        mcp._handle_monitor_violations = record
+        await mcp.start_real_time_monitoring(self.project)
+        try:
+            for _ in range(50):
+                if handled:
+                    break
+                await asyncio.sleep(0.1)
+            analyzed_after_initial_scan = mcp.compliance_scanner.stats["files_analyzed"]
+
+            new_file = self.write("pkg/new_module.py", VIOLATING_SOURCE)
+            for _ in range(50):
+                if len(handled) > 1:
+                    break
+                await asyncio.sleep(0.1)
+        finally:
+            mcp.stop_real_time_monitoring()
+
+        self.assertGreater(len(handled), 1)
+        self.assertTrue(handled[-1])
+        self.assertTrue(all(v.file_path == new_file for v in handled[-1]))
+        self.assertEqual(mcp.compliance_scanner.stats["files_analyzed"], analyzed_after_initial_scan + 1)
+        self.assertEqual(mcp.compliance_scanner.stats["scans"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,240 @@
+"""
+共享源码解析缓存测试
+测试按内容哈希复用解析结果、预先收集的事实、内存上限、磁盘持久化、各代码分析MCP共用同一缓存，
+以及进程池扫描时已解析的文件留在主进程复用解析结果
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+import sys
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "workflow" / "operations_workflow_mcp" / "src"))
+
+import parsed_source_cache
+import compliance_scanner
+from parsed_source_cache import ParsedSourceCache, SourceCacheConfig, configure_shared_source_cache, parse_source
+from development_intervention_mcp_new import analyze_file_compliance, has_shared_parse, DevelopmentInterventionMCP
+from pr_review_prevention import PRReviewPrevention
+from continuous_refactoring_mcp import ContinuousRefactoringMcp
+from mcp_registry_manager import MCPRegistryManager
+
+SAMPLE_SOURCE = '''"""示例模块"""
+import os
+from local_model_mcp import LocalModelMCP
+
+class SampleMCP(Base):
+    def process(self, data):
+        if data and self.ready or data is None:
+            for item in data:
+                if item:
+                    pass
+        return data
+
+    async def fetch(self):
+        return None
+
+def _helper():
+    api_key = "sk-1234567890"
+'''
+
+
+class TestParsedSourceCache(unittest.TestCase):
+    """共享源码解析缓存测试类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = ParsedSourceCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def write(self, name, content):
+        path = Path(self.temp_dir) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+        return path
+
+    def test_facts_collected_in_single_pass(self):
+        """测试解析时收集导入、函数复杂度、类名和文档字符串"""
+        facts = self.cache.get(self.write("sample.py", SAMPLE_SOURCE)).facts
+        self.assertIsNone(facts.syntax_error)
+        self.assertEqual(facts.docstring, "示例模块")
+        self.assertEqual([(i.lineno, i.module, i.names, i.is_from) for i in facts.imports],
+                         [(2, None, ["os"], False), (3, "local_model_mcp", ["LocalModelMCP"], True)])
+        self.assertEqual([(c.name, c.bases) for c in facts.classes], [("SampleMCP", ["Base"])])
+        self.assertEqual([(f.name, f.complexity, f.is_async, f.class_name) for f in facts.functions],
+                         [("process", 6, False, "SampleMCP"), ("fetch", 1, True, "SampleMCP"),
+                          ("_helper", 1, False, None)])
+
+    def test_unchanged_file_parsed_once(self):
+        """测试 stat 未变化时不重新读取，内容相同的文件共享解析结果"""
+        path = self.write("a.py", SAMPLE_SOURCE)
+        copy = self.write("copy/a.py", SAMPLE_SOURCE)
+        first = self.cache.get(path)
+        self.assertIs(self.cache.get(path), first)
+        self.assertIs(self.cache.get(copy), first)
+        self.assertIs(self.cache.parse(SAMPLE_SOURCE), first)
+        self.assertEqual(self.cache.stats["parses"], 1)
+        self.assertEqual(self.cache.stats["files_read"], 2)
+        self.assertEqual(self.cache.stats["stat_hits"], 1)
+
+        path.write_text(SAMPLE_SOURCE + "x = 1\n", encoding="utf-8")
+        later = time.time() + 5
+        os.utime(path, (later, later))
+        changed = self.cache.get(path)
+        self.assertIsNot(changed, first)
+        self.assertEqual(self.cache.stats["parses"], 2)
+
+    def test_line_index(self):
+        """测试行号换算与原先按换行计数一致"""
+        parsed = self.cache.parse(SAMPLE_SOURCE)
+        for offset in (0, 5, SAMPLE_SOURCE.index("class"), len(SAMPLE_SOURCE) - 1, len(SAMPLE_SOURCE)):
+            self.assertEqual(parsed.line_number(offset), SAMPLE_SOURCE[:offset].count("\n") + 1)
+        self.assertEqual(parsed.line_text(3), "from local_model_mcp import LocalModelMCP")
+
+    def test_syntax_error_recorded(self):
+        """测试语法错误的文件只记录错误，不抛出"""
+        parsed = self.cache.parse("def broken(:\n")
+        self.assertIsNotNone(parsed.facts.syntax_error)
+        self.assertIsNone(parsed.tree)
+
+    def test_memory_bound(self):
+        """测试内存层按估算字节数淘汰最久未访问的条目"""
+        one_entry = self.cache.parse(SAMPLE_SOURCE).memory_cost
+        cache = ParsedSourceCache(SourceCacheConfig(max_memory_bytes=one_entry * 3))
+        for i in range(10):
+            cache.parse(SAMPLE_SOURCE + f"value = {i}\n")
+        stats = cache.get_stats()
+        self.assertLessEqual(stats["memory_bytes"], one_entry * 3)
+        self.assertEqual(stats["entries"] + stats["evictions"], 10)
+
+    def test_disk_persistence(self):
+        """测试新实例从磁盘层读取事实而不重新解析，AST按需解析"""
+        cache_dir = os.path.join(self.temp_dir, ".parse_cache")
+        path = self.write("sample.py", SAMPLE_SOURCE)
+        expected = ParsedSourceCache(SourceCacheConfig(cache_dir=cache_dir)).get(path).facts
+
+        cache = ParsedSourceCache(SourceCacheConfig(cache_dir=cache_dir))
+        parsed = cache.get(path)
+        self.assertEqual(parsed.facts, expected)
+        self.assertEqual(cache.stats["parses"], 0)
+        self.assertEqual(cache.stats["disk_hits"], 1)
+        self.assertIsNotNone(parsed.tree)
+
+    def test_peek_without_reading(self):
+        """测试peek只在stat未变化且结果在内存中时命中，且从不读取文件"""
+        path = self.write("peek.py", SAMPLE_SOURCE)
+        self.assertIsNone(self.cache.peek(path))
+        parsed = self.cache.get(path)
+        self.assertIs(self.cache.peek(path), parsed)
+
+        path.write_text(SAMPLE_SOURCE + "\n# changed\n", encoding="utf-8")
+        self.assertIsNone(self.cache.peek(path))
+        self.assertIsNone(self.cache.peek(Path(self.temp_dir) / "missing.py"))
+        self.assertEqual(self.cache.stats["files_read"], 1)
+
+    def test_parse_source_bypasses_cache(self):
+        """测试不经过缓存的解析与缓存解析得到相同的事实"""
+        parsed = parse_source(SAMPLE_SOURCE)
+        cached = self.cache.parse(SAMPLE_SOURCE)
+        self.assertEqual(parsed.facts, cached.facts)
+        self.assertEqual(parsed.content_hash, cached.content_hash)
+        self.assertIsNot(parsed, self.cache.parse(SAMPLE_SOURCE))
+
+
+class TestSharedAcrossMCPs(unittest.IsolatedAsyncioTestCase):
+    """各代码分析MCP共用解析缓存"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = configure_shared_source_cache(SourceCacheConfig())
+        self.path = Path(self.temp_dir) / "sample_mcp" / "sample_mcp.py"
+        self.path.parent.mkdir(parents=True)
+        self.path.write_text(SAMPLE_SOURCE, encoding="utf-8")
+
+    def tearDown(self):
+        configure_shared_source_cache(SourceCacheConfig())
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    async def test_file_parsed_once_for_all_consumers(self):
+        """测试四个分析入口对同一文件只读取和解析一次"""
+        refactoring = ContinuousRefactoringMcp()
+        refactoring.refactoring_rules["code_complexity"]["threshold"] = 4
+        quality = await refactoring.scan_code_quality(self.temp_dir)
+        self.assertEqual([(i["function"], i["line"], i["complexity"]) for i in quality["issues"]],
+                         [("process", 6, 6)])
+
+        prevention = PRReviewPrevention(repo_root=self.temp_dir)
+        results = prevention._check_file_prevention(self.path)
+        self.assertTrue(results)
+        for result in results:
+            self.assertGreater(result.line_number, 0)
+
+        registry = MCPRegistryManager(repo_root=self.temp_dir)
+        info = registry._analyze_python_file(self.path)
+        self.assertEqual(info["main_class"], "SampleMCP")
+        self.assertEqual(info["description"], "示例模块")
+        self.assertEqual(info["capabilities"], ["process", "fetch"])
+
+        violations = analyze_file_compliance(SAMPLE_SOURCE, str(self.path),
+                                             DevelopmentInterventionMCP().violation_rules)
+        self.assertTrue(any(v.line_number == 3 for v in violations))
+
+        self.assertIs(parsed_source_cache.get_shared_source_cache(), self.cache)
+        self.assertEqual(self.cache.stats["parses"], 1)
+        self.assertEqual(self.cache.stats["files_read"], 1)
+
+    def test_pool_worker_does_not_fill_cache(self):
+        """测试进程池子进程中的合规分析不填充共享缓存"""
+        rules = DevelopmentInterventionMCP().violation_rules
+        compliance_scanner._init_worker(analyze_file_compliance, rules, pool_worker=True)
+        try:
+            violations = analyze_file_compliance(SAMPLE_SOURCE, str(self.path), rules)
+        finally:
+            compliance_scanner._init_worker(None, {})
+        self.assertTrue(any(v.line_number == 3 for v in violations))
+        self.assertEqual(self.cache.get_stats()["entries"], 0)
+
+        analyze_file_compliance(SAMPLE_SOURCE, str(self.path), rules)
+        self.assertEqual(self.cache.get_stats()["entries"], 1)
+
+    def test_pooled_scan_reuses_parent_parses(self):
+        """测试进程池扫描时，其他MCP已解析的文件在主进程复用解析结果，其余文件在子进程解析"""
+        self.path.unlink()
+        paths = []
+        for i in range(8):
+            path = Path(self.temp_dir) / f"module_{i}.py"
+            path.write_text(SAMPLE_SOURCE + f"\n# 模块 {i}\n", encoding="utf-8")
+            paths.append(path)
+        for path in paths[:4]:
+            self.cache.get(path)
+        self.assertEqual(self.cache.stats["parses"], 4)
+
+        scanner = compliance_scanner.IncrementalComplianceScanner(
+            analyze_file_compliance, DevelopmentInterventionMCP().violation_rules,
+            max_workers=2, chunk_size=2, pool_threshold=2, prefer_local=has_shared_parse)
+        try:
+            results = scanner.scan_project(self.temp_dir)
+        finally:
+            scanner.shutdown()
+
+        self.assertEqual(sorted(results), sorted(str(path) for path in paths))
+        for entry in results.values():
+            self.assertTrue(any(v.line_number == 3 for v in entry.violations))
+        self.assertEqual(scanner.get_stats()["files_kept_local"], 4)
+        self.assertEqual(scanner.get_stats()["files_analyzed"], 8)
+        # 已解析的文件没有重新解析，子进程解析的文件不进入主进程缓存
+        self.assertEqual(self.cache.stats["parses"], 4)
+        self.assertEqual(self.cache.get_stats()["entries"], 4)
+        self.assertGreaterEqual(self.cache.stats["memory_hits"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
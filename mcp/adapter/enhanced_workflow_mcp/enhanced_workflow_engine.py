@@ -13,8 +13,9 @@ import logging
 import time
 import uuid
 from datetime import datetime
+from collections import deque
 from enum import Enum
-from typing import Dict, Any, List, Optional, Union
+from typing import Callable, Dict, Any, Iterable, List, Optional, Union
 from dataclasses import dataclass, field
 from pathlib import Path
 import sys
@@ -151,6 +152,106 @@ class WorkflowEdge:
         if self.data_mapping is None:
             self.data_mapping = {}
 
+class _TrackedList(list):
+    """变更时通知所属工作流的列表，用于增量维护图索引"""
+    
+    __slots__ = ("_on_change",)
+    
+    def __init__(self, iterable: Iterable = (), on_change: Optional[Callable[[str, List[Any]], None]] = None):
+        super().__init__(iterable)
+        self._on_change = on_change
+    
+    def _notify(self, kind: str, items: List[Any] = None):
+        if self._on_change is not None:
+            self._on_change(kind, items or [])
+    
+    def append(self, item):
+        super().append(item)
+        self._notify("add", [item])
+    
+    def extend(self, items):
+        items = list(items)
+        super().extend(items)
+        self._notify("add", items)
+    
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+    
+    def __reduce_ex__(self, protocol):
+        # 序列化为普通列表，反序列化后由工作流重新包装
+        return (list, (list(self),))
+
+
+def _tracked_mutator(name: str):
+    def mutator(self, *args, **kwargs):
+        result = getattr(list, name)(self, *args, **kwargs)
+        self._notify("reset")
+        return result
+    mutator.__name__ = name
+    return mutator
+
+
+for _name in ("insert", "remove", "pop", "clear", "sort", "reverse", "__setitem__", "__delitem__"):
+    setattr(_TrackedList, _name, _tracked_mutator(_name))
+
+
+class WorkflowGraphIndex:
+    """
+    工作流图索引
+    
+    维护 id->节点 与入边/出边邻接表，节点或边追加时增量更新；
+    拓扑顺序按需计算并缓存，仅在边发生变化时失效
+    """
+    
+    __slots__ = ("node_by_id", "predecessors", "successors", "_topological_order")
+    
+    def __init__(self, nodes: Iterable['WorkflowNode'], edges: Iterable['WorkflowEdge']):
+        self.node_by_id: Dict[str, WorkflowNode] = {}
+        self.predecessors: Dict[str, List[str]] = {}
+        self.successors: Dict[str, List[str]] = {}
+        self._topological_order: Optional[List[str]] = None
+        for node in nodes:
+            self.add_node(node)
+        for edge in edges:
+            self.add_edge(edge)
+    
+    def add_node(self, node: 'WorkflowNode'):
+        if node.id in self.node_by_id:
+            # 与线性查找一致：重复ID时保留第一个节点
+            return
+        self.node_by_id[node.id] = node
+        if self._topological_order is not None:
+            # 新节点尚无边，追加到末尾仍是合法的拓扑顺序
+            self._topological_order.append(node.id)
+    
+    def add_edge(self, edge: 'WorkflowEdge'):
+        self.successors.setdefault(edge.source, []).append(edge.target)
+        self.predecessors.setdefault(edge.target, []).append(edge.source)
+        self._topological_order = None
+    
+    def topological_order(self) -> List[str]:
+        """Kahn拓扑排序（节点按声明顺序入队），处于环中的节点不会出现在结果中"""
+        if self._topological_order is None:
+            in_degree = {node_id: 0 for node_id in self.node_by_id}
+            for target, sources in self.predecessors.items():
+                if target in in_degree:
+                    in_degree[target] += len(sources)
+            
+            queue = deque(node_id for node_id, degree in in_degree.items() if degree == 0)
+            order = []
+            while queue:
+                current = queue.popleft()
+                order.append(current)
+                for target in self.successors.get(current, ()):
+                    if target in in_degree:
+                        in_degree[target] -= 1
+                        if in_degree[target] == 0:
+                            queue.append(target)
+            self._topological_order = order
+        return list(self._topological_order)
+
+
 @dataclass
 class EnhancedWorkflow:
     """增强型工作流定义"""
@@ -179,6 +280,49 @@ class EnhancedWorkflow:
         if self.updated_at is None:
             self.updated_at = datetime.now()
     
+    def __setattr__(self, name: str, value: Any):
+        if name in ("nodes", "edges") and value is not None:
+            value = _TrackedList(value, on_change=self._graph_change_handler(name))
+            self.__dict__.pop("_graph_index", None)
+        super().__setattr__(name, value)
+    
+    def __setstate__(self, state: Dict[str, Any]):
+        state.pop("_graph_index", None)
+        self.__dict__.update(state)
+        for name in ("nodes", "edges"):
+            if state.get(name) is not None:
+                setattr(self, name, state[name])
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(self.__dict__)
+        state.pop("_graph_index", None)
+        return state
+    
+    def _graph_change_handler(self, name: str) -> Callable[[str, List[Any]], None]:
+        def on_change(kind: str, items: List[Any]):
+            index = self.__dict__.get("_graph_index")
+            if index is None:
+                return
+            if kind != "add":
+                # 删除或替换元素时整体重建（罕见操作）
+                del self.__dict__["_graph_index"]
+            elif name == "nodes":
+                for node in items:
+                    index.add_node(node)
+            else:
+                for edge in items:
+                    index.add_edge(edge)
+        return on_change
+    
+    @property
+    def graph_index(self) -> WorkflowGraphIndex:
+        """图索引（首次访问时构建，之后随节点/边的追加增量维护）"""
+        index = self.__dict__.get("_graph_index")
+        if index is None:
+            index = WorkflowGraphIndex(self.nodes, self.edges)
+            self.__dict__["_graph_index"] = index
+        return index
+    
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
         return {
@@ -196,26 +340,19 @@ class EnhancedWorkflow:
     
     def get_node_by_id(self, node_id: str) -> Optional[WorkflowNode]:
         """根据ID获取节点"""
-        for node in self.nodes:
-            if node.id == node_id:
-                return node
-        return None
+        return self.graph_index.node_by_id.get(node_id)
     
     def get_dependencies(self, node_id: str) -> List[str]:
         """获取节点的依赖关系"""
-        dependencies = []
-        for edge in self.edges:
-            if edge.target == node_id:
-                dependencies.append(edge.source)
-        return dependencies
+        return list(self.graph_index.predecessors.get(node_id, ()))
     
     def get_dependents(self, node_id: str) -> List[str]:
         """获取依赖于指定节点的节点列表"""
-        dependents = []
-        for edge in self.edges:
-            if edge.source == node_id:
-                dependents.append(edge.target)
-        return dependents
+        return list(self.graph_index.successors.get(node_id, ()))
+    
+    def get_topological_order(self) -> List[str]:
+        """获取缓存的拓扑顺序"""
+        return self.graph_index.topological_order()
 
 class EnhancedWorkflowEngine(BaseMCP):
     """增强型工作流引擎 - 主控制器"""
@@ -544,30 +681,8 @@ class EnhancedWorkflowEngine(BaseMCP):
             }
     
     def _calculate_execution_order(self, workflow: EnhancedWorkflow) -> List[str]:
-        """计算执行顺序（拓扑排序）"""
-        # 简单的拓扑排序实现
-        in_degree = {node.id: 0 for node in workflow.nodes}
-        
-        # 计算入度
-        for edge in workflow.edges:
-            in_degree[edge.target] += 1
-        
-        # 找到入度为0的节点
-        queue = [node_id for node_id, degree in in_degree.items() if degree == 0]
-        result = []
-        
-        while queue:
-            current = queue.pop(0)
-            result.append(current)
-            
-            # 更新依赖节点的入度
-            for edge in workflow.edges:
-                if edge.source == current:
-                    in_degree[edge.target] -= 1
-                    if in_degree[edge.target] == 0:
-                        queue.append(edge.target)
-        
-        return result
+        """计算执行顺序（拓扑排序，使用工作流缓存的结果）"""
+        return workflow.get_topological_order()
     
     async def _execute_node_basic(self, node: WorkflowNode, context: Dict[str, Any]) -> Dict[str, Any]:
         """基础节点执行"""
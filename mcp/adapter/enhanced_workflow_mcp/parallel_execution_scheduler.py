@@ -13,12 +13,17 @@ import logging
 import time
 import uuid
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Set, Tuple
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
 import heapq
 from collections import defaultdict, deque
 
+try:
+    from .task_executors import TaskExecutorManager, TaskExecutorType, WorkerSlot, resolve_executor_type
+except ImportError:
+    from task_executors import TaskExecutorManager, TaskExecutorType, WorkerSlot, resolve_executor_type
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -123,6 +128,11 @@ class ExecutionTask:
     parallel_group: Optional[str] = None
     max_parallel_instances: int = 1
     
+    # 执行配置（未提供handler时模拟执行estimated_duration秒）
+    executor_type: TaskExecutorType = TaskExecutorType.INLINE
+    handler: Optional[Callable[[Dict[str, Any]], Any]] = None
+    payload: Dict[str, Any] = field(default_factory=dict)
+    
     # 状态信息
     status: str = "pending"
     created_at: datetime = field(default_factory=datetime.now)
@@ -191,15 +201,32 @@ class ParallelExecutionScheduler:
         self.max_concurrent_tasks = self.config.get("max_concurrent_tasks", 10)
         self.resource_utilization_threshold = self.config.get("resource_utilization_threshold", 0.8)
         
+        # 执行后端（inline/thread/process），进程池大小受资源池CPU与内存预算约束
+        self.executor_manager = TaskExecutorManager(
+            self.config.get("executors", {}),
+            self.resource_pool.cpu_cores,
+            self.resource_pool.memory_mb
+        )
+        self.task_handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        
         # 任务队列和状态
-        self.task_queue = []  # 优先级队列
+        self.task_queue = []  # 就绪队列（堆），只包含依赖已全部满足的任务
+        self.waiting_tasks: Dict[str, ExecutionTask] = {}  # 等待前置任务完成的任务
+        self.remaining_dependencies: Dict[str, int] = {}  # 任务ID -> 未完成的前置任务数
         self.running_tasks: Dict[str, ExecutionTask] = {}
         self.completed_tasks: Dict[str, ExecutionTask] = {}
         self.failed_tasks: Dict[str, ExecutionTask] = {}
+        self._ready_sequence = 0
+        self.workflow_outstanding: Dict[str, int] = defaultdict(int)  # 工作流ID -> 未结束的任务数
+        self._execution_handles: Set[asyncio.Task] = set()
         
         # 调度状态
         self.scheduler_running = False
         self.scheduler_task = None
+        self.timeout_check_interval = self.config.get("timeout_check_interval", 1.0)
+        self._dispatch_event: Optional[asyncio.Event] = None  # 有任务就绪或资源释放时触发调度
+        self._completion_event: Optional[asyncio.Event] = None  # 有任务结束时唤醒等待方
+        self._last_metrics_at = 0.0
         
         # 统计信息
         self.metrics = {
@@ -289,12 +316,18 @@ class ParallelExecutionScheduler:
     def _topological_sort(self, dependency_graph: Dict[str, Set[str]]) -> List[List[str]]:
         """拓扑排序，返回分层结果"""
         in_degree = {node: len(deps) for node, deps in dependency_graph.items()}
+        position = {node: index for index, node in enumerate(dependency_graph)}
+        
+        # 反向邻接表：依赖节点 -> 依赖它的节点
+        dependents = defaultdict(list)
+        for node, deps in dependency_graph.items():
+            for dep in deps:
+                dependents[dep].append(node)
+        
         layers = []
+        current_layer = [node for node, degree in in_degree.items() if degree == 0]
         
         while in_degree:
-            # 找到入度为0的节点
-            current_layer = [node for node, degree in in_degree.items() if degree == 0]
-            
             if not current_layer:
                 # 检测到循环依赖
                 remaining_nodes = list(in_degree.keys())
@@ -304,14 +337,20 @@ class ParallelExecutionScheduler:
             
             layers.append(current_layer)
             
-            # 移除当前层的节点并更新入度
+            # 移除当前层的节点并更新入度，入度归零的节点组成下一层
+            next_layer = []
             for node in current_layer:
                 del in_degree[node]
-                
-                # 更新依赖于当前节点的其他节点的入度
-                for other_node, deps in dependency_graph.items():
-                    if node in deps and other_node in in_degree:
+            for node in current_layer:
+                for other_node in dependents.get(node, ()):
+                    if other_node in in_degree:
                         in_degree[other_node] -= 1
+                        if in_degree[other_node] == 0:
+                            next_layer.append(other_node)
+            
+            # 保持与声明顺序一致的层内顺序
+            next_layer.sort(key=position.__getitem__)
+            current_layer = next_layer
         
         return layers
     
@@ -520,19 +559,25 @@ class ParallelExecutionScheduler:
     
     async def execute_workflow(self, workflow: 'EnhancedWorkflow', execution_context: Dict[str, Any]) -> Dict[str, Any]:
         """执行工作流"""
+        # 创建执行任务
+        tasks = self._create_execution_tasks(workflow)
+        return await self.execute_tasks(workflow.id, tasks, execution_context)
+    
+    async def execute_tasks(self, workflow_id: str, tasks: List[ExecutionTask], execution_context: Dict[str, Any]) -> Dict[str, Any]:
+        """执行一组已创建的任务（按依赖关系调度）"""
         try:
-            # 创建执行任务
-            tasks = self._create_execution_tasks(workflow)
-            
             # 启动调度器
             await self._start_scheduler()
             
+            # 同一工作流再次执行时，上一次的完成/失败记录不能参与本次的依赖判断
+            self._reset_workflow_state(workflow_id)
+            
             # 提交任务到队列
             for task in tasks:
                 await self._submit_task(task)
             
             # 等待所有任务完成
-            result = await self._wait_for_completion(workflow.id, execution_context)
+            result = await self._wait_for_completion(workflow_id, execution_context)
             
             # 停止调度器
             await self._stop_scheduler()
@@ -544,6 +589,21 @@ class ParallelExecutionScheduler:
             await self._stop_scheduler()
             return {"status": "error", "message": str(e)}
     
+    def _reset_workflow_state(self, workflow_id: str):
+        """清除工作流上一次执行留下的完成/失败任务和未结束任务计数"""
+        for finished in (self.completed_tasks, self.failed_tasks):
+            for task_id in [task_id for task_id, task in finished.items() if task.workflow_id == workflow_id]:
+                del finished[task_id]
+        self.workflow_outstanding.pop(workflow_id, None)
+    
+    def register_task_handler(self, node_type: str, handler: Callable[[Dict[str, Any]], Any]):
+        """
+        注册节点类型的处理函数
+        
+        处理函数接收节点payload字典；进程池执行的处理函数必须是可pickle的模块级函数
+        """
+        self.task_handlers[node_type] = handler
+    
     def _create_execution_tasks(self, workflow: 'EnhancedWorkflow') -> List[ExecutionTask]:
         """创建执行任务"""
         tasks = []
@@ -553,11 +613,24 @@ class ParallelExecutionScheduler:
             dependencies = set(workflow.get_dependencies(node.id))
             dependents = set(workflow.get_dependents(node.id))
             
+            # 选择执行器：节点显式声明的executor，或按声明的资源类型映射
+            executor_type = resolve_executor_type(
+                node.executor if node.executor != "default" else None,
+                node.config.get("resource_type")
+            )
+            cpu_requirement = node.cpu_requirement
+            if executor_type == TaskExecutorType.PROCESS:
+                # 每个进程工作者实际占用至少一个核心
+                cpu_requirement = max(cpu_requirement, 1.0)
+            
+            payload = {key: value for key, value in node.config.items() if key != "handler"}
+            payload.update({"node_id": node.id, "node_type": node.type, "workflow_id": workflow.id})
+            
             task = ExecutionTask(
                 task_id=f"task_{node.id}",
                 node_id=node.id,
                 workflow_id=workflow.id,
-                cpu_requirement=node.cpu_requirement,
+                cpu_requirement=cpu_requirement,
                 memory_requirement=node.memory_requirement,
                 disk_requirement=node.disk_requirement,
                 gpu_requirement=node.config.get("gpu_requirement", 0),
@@ -569,7 +642,10 @@ class ParallelExecutionScheduler:
                 dependencies=dependencies,
                 dependents=dependents,
                 can_parallel=node.can_parallel,
-                parallel_group=node.parallel_group
+                parallel_group=node.parallel_group,
+                executor_type=executor_type,
+                handler=node.config.get("handler") or self.task_handlers.get(node.type),
+                payload=payload
             )
             
             tasks.append(task)
@@ -597,6 +673,8 @@ class ParallelExecutionScheduler:
         """启动调度器"""
         if not self.scheduler_running:
             self.scheduler_running = True
+            self._dispatch_event = asyncio.Event()
+            self._completion_event = asyncio.Event()
             self.scheduler_task = asyncio.create_task(self._scheduler_loop())
             logger.info("调度器已启动")
     
@@ -613,10 +691,12 @@ class ParallelExecutionScheduler:
             logger.info("调度器已停止")
     
     async def _scheduler_loop(self):
-        """调度器主循环"""
+        """调度器主循环（事件驱动：任务就绪或资源释放时立即调度）"""
         try:
             while self.scheduler_running:
-                # 检查是否有可执行的任务
+                self._dispatch_event.clear()
+                
+                # 调度所有就绪且资源允许的任务
                 await self._schedule_ready_tasks()
                 
                 # 检查运行中任务的状态
@@ -625,8 +705,11 @@ class ParallelExecutionScheduler:
                 # 更新资源利用率统计
                 self._update_resource_metrics()
                 
-                # 短暂休眠
-                await asyncio.sleep(1)
+                # 等待下一次调度事件，超时用于检查运行中任务是否超时
+                try:
+                    await asyncio.wait_for(self._dispatch_event.wait(), self.timeout_check_interval)
+                except asyncio.TimeoutError:
+                    pass
                 
         except asyncio.CancelledError:
             logger.info("调度器循环被取消")
@@ -634,61 +717,68 @@ class ParallelExecutionScheduler:
             logger.error(f"调度器循环异常: {e}")
     
     async def _submit_task(self, task: ExecutionTask):
-        """提交任务到队列"""
-        # 根据调度策略插入任务
-        if self.scheduling_strategy == SchedulingStrategy.PRIORITY:
-            heapq.heappush(self.task_queue, (task.priority, task.created_at, task))
-        else:
-            self.task_queue.append(task)
-        
+        """提交任务：依赖已满足的进入就绪队列，否则记录未完成的前置任务数"""
         self.metrics["tasks_scheduled"] += 1
-        logger.info(f"任务已提交: {task.task_id}")
-    
-    async def _schedule_ready_tasks(self):
-        """调度就绪的任务"""
-        if not self.task_queue:
-            return
+        self.workflow_outstanding[task.workflow_id] += 1
         
-        # 检查资源可用性
-        if len(self.running_tasks) >= self.max_concurrent_tasks:
+        failed_dependency = next(
+            (dep for dep in task.dependencies if f"task_{dep}" in self.failed_tasks), None
+        )
+        if failed_dependency is not None:
+            self._fail_task(task, f"依赖任务失败: task_{failed_dependency}")
             return
         
-        # 获取下一个任务
-        if self.scheduling_strategy == SchedulingStrategy.PRIORITY:
-            if self.task_queue:
-                _, _, task = heapq.heappop(self.task_queue)
-            else:
-                return
+        remaining = sum(1 for dep in task.dependencies if f"task_{dep}" not in self.completed_tasks)
+        if remaining:
+            self.waiting_tasks[task.task_id] = task
+            self.remaining_dependencies[task.task_id] = remaining
         else:
-            task = self.task_queue.pop(0)
+            self._push_ready(task)
         
-        # 检查依赖是否满足
-        if not self._are_dependencies_satisfied(task):
-            # 重新放回队列
-            await self._submit_task(task)
-            return
+        logger.debug(f"任务已提交: {task.task_id}")
+    
+    def _ready_key(self, task: ExecutionTask) -> Tuple:
+        """就绪队列排序键"""
+        if self.scheduling_strategy == SchedulingStrategy.PRIORITY:
+            return (task.priority,)
+        if self.scheduling_strategy == SchedulingStrategy.SHORTEST_JOB_FIRST:
+            return (task.estimated_duration,)
+        return ()
+    
+    def _push_ready(self, task: ExecutionTask):
+        """任务进入就绪队列并触发调度"""
+        self._ready_sequence += 1
+        heapq.heappush(self.task_queue, (self._ready_key(task), self._ready_sequence, task))
+        if self._dispatch_event is not None:
+            self._dispatch_event.set()
+    
+    async def _schedule_ready_tasks(self):
+        """在一次调度中启动所有就绪且资源允许的任务"""
+        deferred = []
         
-        # 检查资源是否可用
-        if not self.resource_pool.can_allocate(
-            task.cpu_requirement,
-            task.memory_requirement,
-            task.disk_requirement,
-            task.gpu_requirement,
-            task.network_requirement
-        ):
-            # 重新放回队列
-            await self._submit_task(task)
-            return
+        while self.task_queue and len(self.running_tasks) < self.max_concurrent_tasks:
+            entry = heapq.heappop(self.task_queue)
+            task = entry[2]
+            
+            # 执行器没有空闲工作者时暂缓（只对真实执行的任务生效）
+            if task.handler is not None and not self.executor_manager.has_capacity(task.executor_type):
+                deferred.append(entry)
+                continue
+            
+            # 分配资源并启动任务；资源不足的任务暂缓，让后面较小的任务先执行
+            if self.resource_pool.allocate(
+                task.cpu_requirement,
+                task.memory_requirement,
+                task.disk_requirement,
+                task.gpu_requirement,
+                task.network_requirement
+            ):
+                await self._start_task(task)
+            else:
+                deferred.append(entry)
         
-        # 分配资源并启动任务
-        if self.resource_pool.allocate(
-            task.cpu_requirement,
-            task.memory_requirement,
-            task.disk_requirement,
-            task.gpu_requirement,
-            task.network_requirement
-        ):
-            await self._start_task(task)
+        for entry in deferred:
+            heapq.heappush(self.task_queue, entry)
     
     def _are_dependencies_satisfied(self, task: ExecutionTask) -> bool:
         """检查任务依赖是否满足"""
@@ -698,6 +788,46 @@ class ParallelExecutionScheduler:
                 return False
         return True
     
+    def _on_task_completed(self, task: ExecutionTask):
+        """任务完成：递减后继任务的未完成依赖数，归零的立即进入就绪队列"""
+        self.workflow_outstanding[task.workflow_id] -= 1
+        for dependent_node_id in task.dependents:
+            dependent_id = f"task_{dependent_node_id}"
+            if dependent_id not in self.remaining_dependencies:
+                continue
+            self.remaining_dependencies[dependent_id] -= 1
+            if self.remaining_dependencies[dependent_id] <= 0:
+                del self.remaining_dependencies[dependent_id]
+                self._push_ready(self.waiting_tasks.pop(dependent_id))
+        self._notify_task_finished()
+    
+    def _fail_task(self, task: ExecutionTask, error: str):
+        """将任务标记为失败，并级联失败所有等待它的后继任务"""
+        pending = [(task, error)]
+        while pending:
+            current, reason = pending.pop()
+            current.status = "failed"
+            current.error = reason
+            current.completed_at = datetime.now()
+            self.failed_tasks[current.task_id] = current
+            self.metrics["tasks_failed"] += 1
+            self.workflow_outstanding[current.workflow_id] -= 1
+            
+            for dependent_node_id in current.dependents:
+                dependent_id = f"task_{dependent_node_id}"
+                dependent = self.waiting_tasks.pop(dependent_id, None)
+                if dependent is not None:
+                    self.remaining_dependencies.pop(dependent_id, None)
+                    pending.append((dependent, f"依赖任务失败: {current.task_id}"))
+        self._notify_task_finished()
+    
+    def _notify_task_finished(self):
+        """资源已释放或任务状态变化，唤醒调度循环与等待方"""
+        if self._dispatch_event is not None:
+            self._dispatch_event.set()
+        if self._completion_event is not None:
+            self._completion_event.set()
+    
     async def _start_task(self, task: ExecutionTask):
         """启动任务"""
         task.status = "running"
@@ -705,23 +835,51 @@ class ParallelExecutionScheduler:
         task.started_at = datetime.now()
         
         self.running_tasks[task.task_id] = task
+        self.metrics["total_wait_time"] += task.get_wait_time()
+        
+        # 在创建协程前同步占用工作者，同一轮调度的后续任务才能看到占用
+        slot = self.executor_manager.get(task.executor_type).reserve() if task.handler is not None else None
         
         # 创建任务执行协程
-        asyncio.create_task(self._execute_task(task))
+        handle = asyncio.create_task(self._execute_task(task, slot))
+        self._execution_handles.add(handle)
+        handle.add_done_callback(self._execution_handles.discard)
+        if slot is not None:
+            handle.add_done_callback(lambda _: self._release_unused_slot(slot))
         
-        logger.info(f"任务开始执行: {task.task_id}")
+        logger.debug(f"任务开始执行: {task.task_id}")
     
-    async def _execute_task(self, task: ExecutionTask):
-        """执行任务"""
+    @staticmethod
+    def _release_unused_slot(slot: WorkerSlot):
+        """协程未开始就被取消、或处理函数未交给池执行时，执行协程结束即释放工作者"""
+        if not slot.detached:
+            slot.release()
+    
+    async def _execute_task(self, task: ExecutionTask, slot: Optional[WorkerSlot] = None):
+        """执行任务（slot为派发时预占的工作者）"""
         try:
-            # 模拟任务执行
-            execution_time = min(task.estimated_duration, task.timeout)
-            await asyncio.sleep(execution_time)
+            if task.handler is not None:
+                # 通过节点声明的执行器真实执行
+                started = time.perf_counter()
+                output = await asyncio.wait_for(
+                    self.executor_manager.get(task.executor_type).run(task.handler, task.payload, slot),
+                    task.timeout
+                )
+                execution_time = time.perf_counter() - started
+            else:
+                # 模拟任务执行
+                execution_time = min(task.estimated_duration, task.timeout)
+                await asyncio.sleep(execution_time)
+                output = f"任务 {task.task_id} 执行完成"
+            
+            # 已被超时检查处理的任务不再更新状态
+            if task.task_id not in self.running_tasks:
+                return
             
-            # 模拟执行结果
             task.result = {
                 "status": "completed",
-                "output": f"任务 {task.task_id} 执行完成",
+                "output": output,
+                "executor": task.executor_type.value,
                 "execution_time": execution_time
             }
             task.status = "completed"
@@ -744,18 +902,16 @@ class ParallelExecutionScheduler:
             self.metrics["tasks_completed"] += 1
             self.metrics["total_execution_time"] += task.get_execution_time()
             
-            logger.info(f"任务执行完成: {task.task_id}")
+            logger.debug(f"任务执行完成: {task.task_id}")
             
-        except Exception as e:
-            # 任务执行失败
-            task.status = "failed"
-            task.error = str(e)
-            task.completed_at = datetime.now()
+            # 唤醒后继任务
+            self._on_task_completed(task)
             
-            # 移动到失败队列
-            if task.task_id in self.running_tasks:
-                del self.running_tasks[task.task_id]
-            self.failed_tasks[task.task_id] = task
+        except Exception as e:
+            # 任务执行失败（已被超时检查处理的任务不再重复处理）
+            if task.task_id not in self.running_tasks:
+                return
+            del self.running_tasks[task.task_id]
             
             # 释放资源
             self.resource_pool.release(
@@ -766,10 +922,14 @@ class ParallelExecutionScheduler:
                 task.network_requirement
             )
             
-            # 更新统计
-            self.metrics["tasks_failed"] += 1
+            # 移动到失败队列并级联失败后继任务
+            if isinstance(e, asyncio.TimeoutError):
+                self._fail_task(task, "任务执行超时")
+                task.status = "timeout"
+            else:
+                self._fail_task(task, str(e) or type(e).__name__)
             
-            logger.error(f"任务执行失败: {task.task_id}, 错误: {e}")
+            logger.error(f"任务执行失败: {task.task_id}, 错误: {task.error}")
     
     async def _check_running_tasks(self):
         """检查运行中任务的状态"""
@@ -785,13 +945,9 @@ class ParallelExecutionScheduler:
         # 处理超时任务
         for task in timeout_tasks:
             logger.warning(f"任务超时: {task.task_id}")
-            task.status = "timeout"
-            task.error = "任务执行超时"
-            task.completed_at = current_time
             
             # 移动到失败队列
             del self.running_tasks[task.task_id]
-            self.failed_tasks[task.task_id] = task
             
             # 释放资源
             self.resource_pool.release(
@@ -802,10 +958,16 @@ class ParallelExecutionScheduler:
                 task.network_requirement
             )
             
-            self.metrics["tasks_failed"] += 1
+            self._fail_task(task, "任务执行超时")
+            task.status = "timeout"
     
     def _update_resource_metrics(self):
-        """更新资源利用率统计"""
+        """更新资源利用率统计（按检查间隔采样，避免每次调度都记录）"""
+        now = time.monotonic()
+        if now - self._last_metrics_at < self.timeout_check_interval:
+            return
+        self._last_metrics_at = now
+        
         utilization = self.resource_pool.get_utilization()
         utilization["timestamp"] = datetime.now().isoformat()
         
@@ -821,14 +983,12 @@ class ParallelExecutionScheduler:
         timeout = execution_context.get("timeout", 3600)  # 默认1小时超时
         
         while True:
-            # 检查是否所有任务都完成
-            workflow_tasks = [task for task in list(self.completed_tasks.values()) + list(self.failed_tasks.values()) 
-                           if task.workflow_id == workflow_id]
+            self._completion_event.clear()
             
-            total_tasks = len([task for task in list(self.running_tasks.values()) + list(self.completed_tasks.values()) + list(self.failed_tasks.values())
-                             if task.workflow_id == workflow_id])
-            
-            if len(workflow_tasks) == total_tasks and not any(task.workflow_id == workflow_id for task in self.running_tasks.values()):
+            # 检查是否所有任务都完成（就绪、等待或运行中的任务都视为未完成）
+            if self.workflow_outstanding.get(workflow_id, 0) <= 0:
+                workflow_tasks = [task for task in list(self.completed_tasks.values()) + list(self.failed_tasks.values())
+                                  if task.workflow_id == workflow_id]
                 # 所有任务完成
                 completed_tasks = [task for task in workflow_tasks if task.status == "completed"]
                 failed_tasks = [task for task in workflow_tasks if task.status in ["failed", "timeout"]]
@@ -852,7 +1012,8 @@ class ParallelExecutionScheduler:
                     }
             
             # 检查超时
-            if (datetime.now() - start_time).total_seconds() > timeout:
+            remaining_time = timeout - (datetime.now() - start_time).total_seconds()
+            if remaining_time <= 0:
                 return {
                     "status": "timeout",
                     "workflow_id": workflow_id,
@@ -861,8 +1022,11 @@ class ParallelExecutionScheduler:
                     "metrics": self._get_workflow_metrics(workflow_id)
                 }
             
-            # 短暂等待
-            await asyncio.sleep(2)
+            # 等待任务结束事件
+            try:
+                await asyncio.wait_for(self._completion_event.wait(), remaining_time)
+            except asyncio.TimeoutError:
+                pass
     
     def _get_workflow_metrics(self, workflow_id: str) -> Dict[str, Any]:
         """获取工作流执行指标"""
@@ -906,11 +1070,18 @@ class ParallelExecutionScheduler:
                 "utilization": self.resource_pool.get_utilization()
             },
             "task_queues": {
-                "pending": len(self.task_queue),
+                "pending": len(self.task_queue) + len(self.waiting_tasks),
+                "ready": len(self.task_queue),
+                "waiting": len(self.waiting_tasks),
                 "running": len(self.running_tasks),
                 "completed": len(self.completed_tasks),
                 "failed": len(self.failed_tasks)
             },
+            "executors": self.executor_manager.get_status(),
             "metrics": self.metrics
         }
+    
+    def shutdown(self):
+        """关闭线程池与进程池执行器"""
+        self.executor_manager.shutdown()
 
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作流状态增量编码
+Structural Delta Encoding for Workflow State
+
+状态以 StateSnapshot.to_dict() 的字典形式表示，相邻状态之间记录结构差异：
+- ("set", path, value): 设置路径上的值
+- ("del", path): 删除路径上的键
+- ("ext", path, items): 列表追加（如errors）
+
+快照中的嵌套字典/列表可能被调用方就地修改，因此上一状态保存为深拷贝，
+比较时只对不可变的标量做身份判断，容器总是逐项比较
+"""
+
+import copy
+from collections import deque
+from dataclasses import dataclass, fields
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+DeltaOp = Tuple[Any, ...]
+
+# 可以用身份判断代替相等比较的不可变类型
+_IMMUTABLE_SCALARS = (str, int, float, bool, bytes, type(None))
+
+
+def snapshot_view(snapshot) -> Dict[str, Any]:
+    """返回与 to_dict() 同结构、但直接引用快照子结构的字典（不复制）"""
+    view = {f.name: getattr(snapshot, f.name) for f in fields(snapshot)}
+    view["timestamp"] = snapshot.timestamp.isoformat()
+    view["workflow_status"] = snapshot.workflow_status.value
+    return view
+
+
+def compute_delta(old: Dict[str, Any], new: Dict[str, Any]) -> List[DeltaOp]:
+    """计算从old到new的结构差异"""
+    ops: List[DeltaOp] = []
+    _diff_dict(old, new, (), ops)
+    return ops
+
+
+def _diff_dict(old: Dict[str, Any], new: Dict[str, Any], path: Tuple[Any, ...], ops: List[DeltaOp]):
+    for key, value in new.items():
+        if key in old:
+            previous = old[key]
+            if previous is value and isinstance(value, _IMMUTABLE_SCALARS):
+                continue
+            if isinstance(previous, dict) and isinstance(value, dict):
+                _diff_dict(previous, value, path + (key,), ops)
+                continue
+            if isinstance(previous, list) and isinstance(value, list) and len(value) >= len(previous) \
+                    and value[:len(previous)] == previous:
+                if len(value) > len(previous):
+                    ops.append(("ext", path + (key,), value[len(previous):]))
+                continue
+            if type(previous) is type(value) and previous == value:
+                continue
+        ops.append(("set", path + (key,), value))
+    for key in old:
+        if key not in new:
+            ops.append(("del", path + (key,)))
+
+
+def apply_delta(state: Dict[str, Any], ops: List[DeltaOp]) -> Dict[str, Any]:
+    """将差异就地应用到state（state必须是调用方独占的副本）"""
+    for op in ops:
+        kind, path = op[0], op[1]
+        parent = state
+        for key in path[:-1]:
+            parent = parent.setdefault(key, {})
+        key = path[-1]
+        if kind == "set":
+            parent[key] = copy.deepcopy(op[2])
+        elif kind == "del":
+            parent.pop(key, None)
+        elif kind == "ext":
+            parent.setdefault(key, []).extend(copy.deepcopy(op[2]))
+    return state
+
+
+@dataclass
+class HistoryEntry:
+    """增量历史记录：相对上一条记录的差异"""
+    seq: int
+    ops: List[DeltaOp]
+
+
+class DeltaHistory:
+    """
+    增量编码的快照历史
+
+    只保存最早一条记录的完整状态（基线）和其后各记录的差异；超出maxlen时
+    把最早的差异折叠进基线。读取时从基线重放差异重建各快照
+    """
+
+    def __init__(self, maxlen: int = 100, start_seq: int = 0):
+        self.maxlen = max(1, maxlen)
+        self.next_seq = start_seq
+        self._base: Optional[Dict[str, Any]] = None
+        self._entries: Deque[HistoryEntry] = deque()
+        self._last_view: Optional[Dict[str, Any]] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def append(self, snapshot) -> Tuple[int, Optional[List[DeltaOp]]]:
+        """
+        追加快照，返回 (序号, 相对上一快照的差异)；首条记录差异为None
+        返回的差异是独立副本，可安全地延迟序列化
+        """
+        view = snapshot_view(snapshot)
+        seq = self.next_seq
+        self.next_seq += 1
+
+        if self._last_view is None:
+            ops = None
+            self._base = copy.deepcopy(view)
+            self._entries.append(HistoryEntry(seq, []))
+        else:
+            ops = copy.deepcopy(compute_delta(self._last_view, view))
+            self._entries.append(HistoryEntry(seq, ops))
+            if len(self._entries) > self.maxlen:
+                self._entries.popleft()
+                apply_delta(self._base, self._entries[0].ops)
+                self._entries[0] = HistoryEntry(self._entries[0].seq, [])
+        # 上一状态必须与调用方的对象隔离，否则就地修改的嵌套结构会同时改变新旧两侧
+        self._last_view = copy.deepcopy(view)
+        return seq, ops
+
+    def materialize(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """重放差异重建最近limit条快照（最新的在前）"""
+        if self._base is None:
+            return []
+        count = len(self._entries) if limit is None else min(limit, len(self._entries))
+        first_wanted = len(self._entries) - count
+        state = copy.deepcopy(self._base)
+        result = []
+        for index, entry in enumerate(self._entries):
+            apply_delta(state, entry.ops)
+            if index >= first_wanted:
+                result.append(copy.deepcopy(state))
+        result.reverse()
+        return result
+
+    def encoded_size(self) -> int:
+        """差异操作总数（用于统计）"""
+        return sum(len(entry.ops) for entry in self._entries)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作流状态写后持久化
+Write-behind Persistence for Workflow State
+
+- 单个长连接，WAL模式
+- 有界内存队列，后台线程按批量大小或时间间隔在一个事务中批量写入
+- 批次中有写入失败时回滚并逐条重写，只丢弃失败的那几条
+- 显式flush()与按写入指定的持久化级别
+- 可选的提交回调：每条写入最终提交或被丢弃后在写线程中回调一次
+"""
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+class DurabilityLevel(Enum):
+    """持久化级别"""
+    BUFFERED = "buffered"  # 进入写队列后立即返回，由后台线程批量提交
+    FLUSHED = "flushed"    # 等待所在批次提交后返回（WAL + synchronous=NORMAL）
+    SYNC = "sync"          # 等待提交并fsync后返回（该批次使用synchronous=FULL）
+
+
+# 写入项：(SQL语句, 参数或返回参数的函数, 提交回调)。参数函数在后台线程中调用，用于延迟序列化；
+# 批次失败后逐条重写时参数函数会再次调用，只应在提交回调中统计
+WriteParams = Union[Tuple[Any, ...], Callable[[], Tuple[Any, ...]]]
+CommitCallback = Callable[[bool], None]
+
+
+class _FlushRequest:
+    """队列中的刷新标记"""
+
+    __slots__ = ("event", "sync", "error")
+
+    def __init__(self, sync: bool):
+        self.event = threading.Event()
+        self.sync = sync
+        self.error: Optional[BaseException] = None
+
+
+class WriteBehindPersistence:
+    """写后持久化层"""
+
+    def __init__(self, db_path: Union[str, Path], batch_size: int = 256,
+                 flush_interval: float = 0.5, max_queue_size: int = 10000):
+        self.db_path = Path(db_path)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._conn_lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._closed = False
+
+        self.stats = {
+            "enqueued": 0,
+            "rows_written": 0,
+            "batches_committed": 0,
+            "write_errors": 0,
+            "rows_dropped": 0,
+            "max_queue_depth": 0,
+            "total_commit_time": 0.0
+        }
+
+        self._writer = threading.Thread(target=self._writer_loop, name="workflow-state-writer", daemon=True)
+        self._writer.start()
+
+    # ------------------------------------------------------------------
+    # 写入接口
+    # ------------------------------------------------------------------
+
+    def write(self, sql: str, params: WriteParams,
+              durability: DurabilityLevel = DurabilityLevel.BUFFERED, timeout: Optional[float] = 30.0,
+              on_commit: Optional[CommitCallback] = None):
+        """提交一条写入；队列已满时阻塞（背压）。on_commit(成功与否) 在该条写入提交或被丢弃后调用"""
+        if self._closed:
+            raise RuntimeError("持久化层已关闭")
+        self._queue.put((sql, params, on_commit))
+        self.stats["enqueued"] += 1
+        depth = self._queue.qsize()
+        if depth > self.stats["max_queue_depth"]:
+            self.stats["max_queue_depth"] = depth
+        if durability != DurabilityLevel.BUFFERED:
+            self.flush(sync=durability == DurabilityLevel.SYNC, timeout=timeout)
+
+    def flush(self, sync: bool = False, timeout: Optional[float] = 30.0) -> bool:
+        """等待此前提交的所有写入落库；sync=True时该批次以synchronous=FULL提交"""
+        if self._closed or not self._writer.is_alive():
+            return True
+        request = _FlushRequest(sync)
+        self._queue.put(request)
+        if not request.event.wait(timeout):
+            logger.warning(f"等待状态写入刷新超时 ({timeout}s)")
+            return False
+        if request.error is not None:
+            raise request.error
+        return True
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """独占使用长连接（用于读取、清理等同步操作），调用前会先刷新写队列"""
+        self.flush()
+        with self._conn_lock:
+            yield self._conn
+
+    def close(self):
+        """刷新剩余写入并关闭连接"""
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout=10)
+        with self._conn_lock:
+            self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["average_batch_size"] = (
+            stats["rows_written"] / stats["batches_committed"] if stats["batches_committed"] else 0
+        )
+        return stats
+
+    # ------------------------------------------------------------------
+    # 后台写线程
+    # ------------------------------------------------------------------
+
+    def _writer_loop(self):
+        batch: List[Tuple[str, WriteParams, Optional[CommitCallback]]] = []
+        waiters: List[_FlushRequest] = []
+        deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False  # 批次到期
+
+            stop = item is None
+            if isinstance(item, _FlushRequest):
+                waiters.append(item)
+            elif item:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (item is False or stop or waiters or len(batch) >= self.batch_size):
+                self._commit_batch(batch, any(w.sync for w in waiters), waiters)
+                batch = []
+                deadline = None
+
+            for waiter in waiters:
+                waiter.event.set()
+            waiters = []
+
+            if stop:
+                return
+
+    def _commit_batch(self, batch: List[Tuple[str, WriteParams, Optional[CommitCallback]]], sync: bool,
+                      waiters: List[_FlushRequest]):
+        started = time.perf_counter()
+        with self._conn_lock:
+            try:
+                if sync:
+                    self._conn.execute("PRAGMA synchronous=FULL")
+                try:
+                    self._execute_in_transaction(batch)
+                    written, errors = len(batch), []
+                    for row in batch:
+                        self._notify(row, True)
+                except Exception as e:
+                    # 一条坏数据不应连带丢弃整个批次：回滚后逐条重写
+                    logger.warning(f"批量写入工作流状态失败 ({len(batch)}条)，改为逐条写入: {e}")
+                    written, errors = self._write_rows_individually(batch)
+
+                self.stats["rows_written"] += written
+                if written:
+                    self.stats["batches_committed"] += 1
+                if errors:
+                    self.stats["write_errors"] += len(errors)
+                    self.stats["rows_dropped"] += len(errors)
+                    logger.error(f"工作流状态写入失败，已丢弃 {len(errors)} 条 (批次共 {len(batch)} 条): {errors[0]}")
+                    for waiter in waiters:
+                        waiter.error = errors[0]
+            finally:
+                if sync:
+                    self._conn.execute("PRAGMA synchronous=NORMAL")
+        self.stats["total_commit_time"] += time.perf_counter() - started
+
+    def _execute_in_transaction(self, rows: List[Tuple[str, WriteParams, Optional[CommitCallback]]]):
+        try:
+            self._conn.execute("BEGIN")
+            for sql, params, _ in rows:
+                self._conn.execute(sql, params() if callable(params) else params)
+            self._conn.execute("COMMIT")
+        except Exception:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            raise
+
+    def _write_rows_individually(self, batch: List[Tuple[str, WriteParams, Optional[CommitCallback]]]
+                                 ) -> Tuple[int, List[Exception]]:
+        """每条写入单独提交，返回 (写入条数, 失败的异常列表)"""
+        written = 0
+        errors: List[Exception] = []
+        for row in batch:
+            try:
+                self._execute_in_transaction([row])
+                written += 1
+            except Exception as e:
+                errors.append(e)
+                self._notify(row, False)
+            else:
+                self._notify(row, True)
+        return written, errors
+
+    @staticmethod
+    def _notify(row: Tuple[str, WriteParams, Optional[CommitCallback]], committed: bool):
+        callback = row[2]
+        if callback is None:
+            return
+        try:
+            callback(committed)
+        except Exception as e:
+            logger.error(f"写入提交回调失败: {e}")
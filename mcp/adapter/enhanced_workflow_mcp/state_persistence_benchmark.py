@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+状态持久化吞吐基准测试
+State Persistence Throughput Benchmark
+
+对比两种持久化方式每秒可记录的状态转换数：
+- 逐行持久化：每次状态变化新建连接、插入一行并提交（优化前的实现方式）
+- 写后持久化：WorkflowStateManager 通过长连接 + 批量事务异步落库（含最终flush）
+"""
+
+import argparse
+import asyncio
+import logging
+import pickle
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from workflow_state_manager import StateTransition, WorkflowStateManager, WorkflowStatus
+
+
+def legacy_persist_transition(db_path: Path, transition: StateTransition):
+    """逐行持久化：每条记录一个连接和一次提交"""
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO state_transitions
+            (transition_id, workflow_id, timestamp, from_status, to_status, trigger, transition_data)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            transition.transition_id,
+            transition.workflow_id,
+            transition.timestamp.isoformat(),
+            transition.from_status.value,
+            transition.to_status.value,
+            transition.trigger,
+            pickle.dumps(transition.to_dict())
+        ))
+        conn.commit()
+
+
+def make_transition(index: int) -> StateTransition:
+    return StateTransition(
+        workflow_id="bench_wf",
+        from_status=WorkflowStatus.RUNNING,
+        to_status=WorkflowStatus.RUNNING,
+        trigger="node_update",
+        operation="update_node_state",
+        node_transitions=[{"node_id": f"node_{index % 50}", "status": "running", "progress": index}]
+    )
+
+
+def bench_legacy(workdir: Path, count: int) -> float:
+    db_path = workdir / "legacy.db"
+    # 建表沿用管理器的表结构（传统回滚日志模式，与优化前一致）
+    WorkflowStateManager({"db_path": str(db_path), "auto_checkpoint_interval": 0}).close()
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode=DELETE")
+
+    start = time.perf_counter()
+    for index in range(count):
+        legacy_persist_transition(db_path, make_transition(index))
+    return count / (time.perf_counter() - start)
+
+
+async def bench_write_behind(workdir: Path, count: int) -> float:
+    manager = WorkflowStateManager({"db_path": str(workdir / "write_behind.db"), "auto_checkpoint_interval": 0})
+    try:
+        start = time.perf_counter()
+        for index in range(count):
+            await manager._persist_transition(make_transition(index))
+        manager.flush()
+        elapsed = time.perf_counter() - start
+        stats = manager.persistence.get_stats()
+        print(f"   写后持久化: 批次数 {stats['batches_committed']}  平均批量 {stats['average_batch_size']:.1f}")
+        return count / elapsed
+    finally:
+        manager.close()
+
+
+async def bench_node_updates(workdir: Path, count: int) -> float:
+    """端到端：update_node_state（每次生成并持久化一个快照）"""
+    manager = WorkflowStateManager({"db_path": str(workdir / "node_updates.db"), "auto_checkpoint_interval": 0})
+    try:
+        await manager.create_workflow_state("bench_wf", {"name": "基准"})
+        start = time.perf_counter()
+        for index in range(count):
+            await manager.update_node_state("bench_wf", f"node_{index % 50}", {"status": "running", "progress": index})
+        manager.flush()
+        elapsed = time.perf_counter() - start
+        delta = manager.get_statistics()["statistics"]["delta_encoding"]
+        print(f"   快照存储: 完整 {delta['snapshot_rows']['full']} 条 (平均 {delta['average_full_bytes']:.0f}B)  "
+              f"差异 {delta['snapshot_rows']['delta']} 条 (平均 {delta['average_delta_bytes']:.0f}B)")
+        return count / elapsed
+    finally:
+        manager.close()
+
+
+async def run(count: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        print(f"🚀 状态持久化吞吐基准测试 ({count} 条状态转换)")
+        legacy = bench_legacy(workdir, count)
+        print(f"   逐行持久化: {legacy:10.0f} 条/秒")
+        write_behind = await bench_write_behind(workdir, count)
+        print(f"   写后持久化: {write_behind:10.0f} 条/秒  (提升 {write_behind / legacy:.1f}x)")
+        node_updates = await bench_node_updates(workdir, count)
+        print(f"   节点状态更新(端到端): {node_updates:10.0f} 次/秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="状态持久化吞吐基准测试")
+    parser.add_argument("--count", type=int, default=5000)
+    args = parser.parse_args()
+
+    logging.getLogger("workflow_state_manager").setLevel(logging.WARNING)
+    asyncio.run(run(args.count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务执行后端
+Task Execution Backends
+
+为并行执行调度器提供可插拔的节点执行器：
+- inline: 直接在事件循环中执行协程（轻量、非阻塞节点）
+- thread: 线程池执行阻塞I/O节点
+- process: 进程池执行CPU密集型节点（如OCR预处理、代码分析）
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TaskExecutorType(Enum):
+    """执行器类型"""
+    INLINE = "inline"
+    THREAD = "thread"
+    PROCESS = "process"
+
+
+# 节点声明的资源类型 -> 执行器类型
+RESOURCE_EXECUTOR_MAP = {
+    "cpu": TaskExecutorType.PROCESS,
+    "gpu": TaskExecutorType.PROCESS,
+    "disk": TaskExecutorType.THREAD,
+    "network": TaskExecutorType.THREAD,
+    "memory": TaskExecutorType.THREAD
+}
+
+
+def resolve_executor_type(executor: Optional[str], resource_type: Optional[str]) -> TaskExecutorType:
+    """
+    根据节点声明选择执行器：显式的executor优先，其次按资源类型映射，默认inline
+    """
+    if executor:
+        try:
+            return TaskExecutorType(executor)
+        except ValueError:
+            pass
+    if resource_type:
+        return RESOURCE_EXECUTOR_MAP.get(str(resource_type).lower(), TaskExecutorType.INLINE)
+    return TaskExecutorType.INLINE
+
+
+class WorkerSlot:
+    """调度时同步占用的一个工作者，释放是幂等的"""
+
+    def __init__(self, executor: 'TaskExecutor'):
+        self.executor = executor
+        self.released = False
+        # 已交给池中的future，由future结束时释放（超时取消等待不会虚报空闲）
+        self.detached = False
+
+    def release(self, error: Optional[BaseException] = None):
+        if self.released:
+            return
+        self.released = True
+        self.executor._mark_done(error)
+
+
+class TaskExecutor:
+    """执行器基类：统计真实占用的工作者数量"""
+
+    executor_type = TaskExecutorType.INLINE
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max(1, max_workers)
+        self.busy_workers = 0
+        self.completed = 0
+        self.failed = 0
+
+    def has_capacity(self) -> bool:
+        return self.busy_workers < self.max_workers
+
+    def reserve(self) -> WorkerSlot:
+        """派发时立即占用工作者，同一轮调度中后续任务即可看到占用"""
+        self.busy_workers += 1
+        return WorkerSlot(self)
+
+    async def run(self, handler: Callable, payload: Dict[str, Any], slot: Optional[WorkerSlot] = None) -> Any:
+        """
+        执行处理函数
+
+        slot为调度时预占的工作者；未提供时在此占用。执行结束后释放
+        """
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "type": self.executor_type.value,
+            "max_workers": self.max_workers,
+            "busy_workers": self.busy_workers,
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+    def _mark_done(self, error: Optional[BaseException]):
+        self.busy_workers -= 1
+        if error is None:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+
+class InlineTaskExecutor(TaskExecutor):
+    """在事件循环中直接执行（协程节点或快速同步函数）"""
+
+    executor_type = TaskExecutorType.INLINE
+
+    async def run(self, handler: Callable, payload: Dict[str, Any], slot: Optional[WorkerSlot] = None) -> Any:
+        slot = slot or self.reserve()
+        error = None
+        try:
+            result = handler(payload)
+            if asyncio.iscoroutine(result):
+                result = await result
+            return result
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            slot.release(error)
+
+
+class PoolTaskExecutor(TaskExecutor):
+    """基于concurrent.futures池的执行器"""
+
+    def __init__(self, max_workers: int):
+        super().__init__(max_workers)
+        self._pool: Optional[Executor] = None
+
+    def _create_pool(self) -> Executor:
+        raise NotImplementedError
+
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None:
+            self._pool = self._create_pool()
+        return self._pool
+
+    async def run(self, handler: Callable, payload: Dict[str, Any], slot: Optional[WorkerSlot] = None) -> Any:
+        slot = slot or self.reserve()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self.pool.submit(handler, payload)
+        except BaseException as e:
+            slot.release(e)
+            raise
+        # 工作者在底层任务真正结束时才释放，超时取消等待不会虚报空闲
+        slot.detached = True
+        future.add_done_callback(lambda f: self._on_future_done(loop, slot, f))
+        return await asyncio.wrap_future(future)
+
+    def _on_future_done(self, loop: asyncio.AbstractEventLoop, slot: WorkerSlot, future):
+        error = asyncio.CancelledError() if future.cancelled() else future.exception()
+        try:
+            loop.call_soon_threadsafe(slot.release, error)
+        except RuntimeError:
+            # 事件循环已关闭
+            slot.release(error)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class ThreadPoolTaskExecutor(PoolTaskExecutor):
+    """线程池执行器（阻塞I/O节点）"""
+
+    executor_type = TaskExecutorType.THREAD
+
+    def _create_pool(self) -> Executor:
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="workflow-node")
+
+
+class ProcessPoolTaskExecutor(PoolTaskExecutor):
+    """进程池执行器（CPU密集型节点，处理函数需可pickle）"""
+
+    executor_type = TaskExecutorType.PROCESS
+
+    def _create_pool(self) -> Executor:
+        return ProcessPoolExecutor(max_workers=self.max_workers)
+
+
+class TaskExecutorManager:
+    """
+    执行器管理器
+
+    进程池工作者数按资源池的CPU与内存预算计算（每个进程占一个核心和
+    process_worker_memory_mb内存），调度器据此只在有空闲工作者时派发任务
+    """
+
+    def __init__(self, config: Dict[str, Any], cpu_cores: float, memory_mb: int):
+        self.config = config or {}
+        per_worker_memory = self.config.get("process_worker_memory_mb", 1024)
+        process_workers = self.config.get(
+            "process_workers",
+            min(int(cpu_cores), os.cpu_count() or 1, max(1, memory_mb // max(1, per_worker_memory)))
+        )
+        self.executors: Dict[TaskExecutorType, TaskExecutor] = {
+            TaskExecutorType.INLINE: InlineTaskExecutor(self.config.get("inline_concurrency", 1000)),
+            TaskExecutorType.THREAD: ThreadPoolTaskExecutor(self.config.get("thread_workers", 16)),
+            TaskExecutorType.PROCESS: ProcessPoolTaskExecutor(process_workers)
+        }
+
+    def get(self, executor_type: TaskExecutorType) -> TaskExecutor:
+        return self.executors[executor_type]
+
+    def has_capacity(self, executor_type: TaskExecutorType) -> bool:
+        return self.executors[executor_type].has_capacity()
+
+    def shutdown(self):
+        for executor in self.executors.values():
+            executor.shutdown()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {executor_type.value: executor.get_status() for executor_type, executor in self.executors.items()}
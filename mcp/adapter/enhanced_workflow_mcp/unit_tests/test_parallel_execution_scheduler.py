@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+parallel_execution_scheduler 单元测试
+验证基于依赖计数的就绪队列调度
+"""
+
+import unittest
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加模块路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from parallel_execution_scheduler import ParallelExecutionScheduler, ExecutionTask
+from task_executors import TaskExecutorType
+
+
+def make_task(node_id: str, deps=(), dependents=(), duration: float = 0, cpu: float = 1.0,
+              handler=None, executor_type=TaskExecutorType.INLINE) -> ExecutionTask:
+    return ExecutionTask(
+        task_id=f"task_{node_id}",
+        node_id=node_id,
+        workflow_id="wf_test",
+        cpu_requirement=cpu,
+        memory_requirement=64,
+        estimated_duration=duration,
+        dependencies=set(deps),
+        dependents=set(dependents),
+        handler=handler,
+        executor_type=executor_type,
+        payload={"node_id": node_id}
+    )
+
+
+def cpu_bound_handler(payload):
+    """进程池处理函数（模块级，可pickle）"""
+    return {"pid": os.getpid(), "sum": sum(range(10000))}
+
+
+def blocking_handler(payload):
+    return {"thread": threading.current_thread().name}
+
+
+def failing_handler(payload):
+    raise ValueError("节点执行出错")
+
+
+class FailOnceHandler:
+    """第一次执行失败，之后成功"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, payload):
+        self.calls += 1
+        if self.calls == 1:
+            raise ValueError("节点执行出错")
+        return payload["node_id"]
+
+
+class ConcurrencyProbe:
+    """记录同时执行的处理函数数量，以及调度器中同时处于运行状态的任务数"""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.peak_running = 0
+
+    def __call__(self, payload):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.peak_running = max(self.peak_running, len(self.scheduler.running_tasks))
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        return payload["node_id"]
+
+
+class TestParallelExecutionScheduler(unittest.IsolatedAsyncioTestCase):
+    """ParallelExecutionScheduler 就绪队列测试"""
+
+    def setUp(self):
+        self.scheduler = ParallelExecutionScheduler({"max_concurrent_tasks": 8, "cpu_cores": 8.0})
+
+    async def test_diamond_dag_runs_in_dependency_order(self):
+        """菱形依赖按顺序执行，且不受1秒轮询影响"""
+        tasks = [
+            make_task("a", dependents=["b", "c"]),
+            make_task("b", deps=["a"], dependents=["d"]),
+            make_task("c", deps=["a"], dependents=["d"]),
+            make_task("d", deps=["b", "c"])
+        ]
+        result = await self.scheduler.execute_tasks("wf_test", tasks, {"timeout": 10})
+
+        self.assertEqual(result["status"], "completed")
+        self.assertEqual(len(result["completed_tasks"]), 4)
+        self.assertLess(result["execution_time"], 0.5)
+        completed = self.scheduler.completed_tasks
+        self.assertLessEqual(completed["task_a"].completed_at, completed["task_b"].started_at)
+        self.assertLessEqual(completed["task_c"].completed_at, completed["task_d"].started_at)
+
+    async def test_all_ready_tasks_dispatched_in_one_pass(self):
+        """一次调度启动所有资源允许的就绪任务"""
+        for index in range(6):
+            await self.scheduler._submit_task(make_task(f"n{index}", duration=5))
+        await self.scheduler._schedule_ready_tasks()
+
+        self.assertEqual(len(self.scheduler.running_tasks), 6)
+        self.assertEqual(self.scheduler.resource_pool.used_cpu, 6.0)
+        for handle in list(self.scheduler._execution_handles):
+            handle.cancel()
+
+    async def test_resource_limited_task_is_deferred(self):
+        """资源不足的任务暂缓，较小的任务可以先执行"""
+        await self.scheduler._submit_task(make_task("big", cpu=6.0, duration=5))
+        await self.scheduler._submit_task(make_task("huge", cpu=4.0, duration=5))
+        await self.scheduler._submit_task(make_task("small", cpu=1.0, duration=5))
+        await self.scheduler._schedule_ready_tasks()
+
+        self.assertEqual(set(self.scheduler.running_tasks), {"task_big", "task_small"})
+        self.assertEqual(len(self.scheduler.task_queue), 1)
+        for handle in list(self.scheduler._execution_handles):
+            handle.cancel()
+
+    async def test_failed_dependency_cascades(self):
+        """前置任务失败时后继任务级联失败，工作流立即结束"""
+        tasks = [
+            make_task("a", dependents=["b"], handler=failing_handler),
+            make_task("b", deps=["a"], dependents=["c"]),
+            make_task("c", deps=["b"])
+        ]
+        result = await self.scheduler.execute_tasks("wf_test", tasks, {"timeout": 5})
+
+        self.assertEqual(result["status"], "failed")
+        errors = {item["task_id"]: item["error"] for item in result["failed_tasks"]}
+        self.assertEqual(set(errors), {"task_a", "task_b", "task_c"})
+        self.assertEqual(errors["task_a"], "节点执行出错")
+        self.assertIn("task_a", errors["task_b"])
+        self.assertEqual(self.scheduler.resource_pool.used_cpu, 0)
+
+    async def test_rerun_ignores_previous_results(self):
+        """同一工作流再次执行时不受上一次的失败和完成记录影响"""
+        handler = FailOnceHandler()
+
+        def make_tasks():
+            return [
+                make_task("a", dependents=["b"], handler=handler),
+                make_task("b", deps=["a"], duration=0.05)
+            ]
+
+        first = await self.scheduler.execute_tasks("wf_test", make_tasks(), {"timeout": 5})
+        self.assertEqual(first["status"], "failed")
+
+        second_tasks = make_tasks()
+        second = await self.scheduler.execute_tasks("wf_test", second_tasks, {"timeout": 5})
+        self.assertEqual(second["status"], "completed")
+        self.assertEqual(sorted(second["completed_tasks"]), ["task_a", "task_b"])
+        self.assertEqual(second["metrics"]["total_tasks"], 2)
+        self.assertEqual(self.scheduler.failed_tasks, {})
+
+        # 第三次执行中 b 必须等待本次的 a 完成，而不是沿用上一次的完成记录
+        third_tasks = make_tasks()
+        third = await self.scheduler.execute_tasks("wf_test", third_tasks, {"timeout": 5})
+        self.assertEqual(third["status"], "completed")
+        self.assertIs(self.scheduler.completed_tasks["task_a"], third_tasks[0])
+        self.assertLessEqual(third_tasks[0].completed_at, third_tasks[1].started_at)
+        self.assertEqual(self.scheduler.workflow_outstanding["wf_test"], 0)
+
+    async def test_timeout_cascades(self):
+        """前置任务超时时后继任务级联失败"""
+        tasks = [
+            make_task("a", dependents=["b"], duration=10),
+            make_task("b", deps=["a"], dependents=["c"]),
+            make_task("c", deps=["b"])
+        ]
+        tasks[0].timeout = -1  # 立即判定超时
+        self.scheduler.timeout_check_interval = 0.01
+        result = await self.scheduler.execute_tasks("wf_test", tasks, {"timeout": 5})
+
+        self.assertEqual(result["status"], "failed")
+        errors = {item["task_id"]: item["error"] for item in result["failed_tasks"]}
+        self.assertEqual(set(errors), {"task_a", "task_b", "task_c"})
+        self.assertEqual(self.scheduler.failed_tasks["task_a"].status, "timeout")
+        self.assertIn("task_a", errors["task_b"])
+        self.assertEqual(self.scheduler.resource_pool.used_cpu, 0)
+        for handle in list(self.scheduler._execution_handles):
+            handle.cancel()
+
+    async def test_thread_and_process_executors(self):
+        """阻塞节点在线程池执行，CPU密集节点在进程池执行"""
+        tasks = [
+            make_task("io", handler=blocking_handler, executor_type=TaskExecutorType.THREAD),
+            make_task("cpu", handler=cpu_bound_handler, executor_type=TaskExecutorType.PROCESS)
+        ]
+        try:
+            result = await self.scheduler.execute_tasks("wf_test", tasks, {"timeout": 30})
+        finally:
+            self.scheduler.shutdown()
+
+        self.assertEqual(result["status"], "completed")
+        completed = self.scheduler.completed_tasks
+        self.assertTrue(completed["task_io"].result["output"]["thread"].startswith("workflow-node"))
+        self.assertNotEqual(completed["task_cpu"].result["output"]["pid"], os.getpid())
+        self.assertEqual(completed["task_cpu"].result["executor"], "process")
+
+    async def test_process_tasks_limited_by_worker_count(self):
+        """进程池没有空闲工作者时任务保持在就绪队列"""
+        scheduler = ParallelExecutionScheduler({
+            "max_concurrent_tasks": 8,
+            "cpu_cores": 8.0,
+            "executors": {"process_workers": 2}
+        })
+        process_executor = scheduler.executor_manager.get(TaskExecutorType.PROCESS)
+        process_executor.busy_workers = 2
+        await scheduler._submit_task(make_task("p", handler=cpu_bound_handler,
+                                               executor_type=TaskExecutorType.PROCESS))
+        await scheduler._schedule_ready_tasks()
+
+        self.assertEqual(len(scheduler.running_tasks), 0)
+        self.assertEqual(len(scheduler.task_queue), 1)
+
+    async def test_dispatch_reserves_workers(self):
+        """同一轮调度中派发的进程任务不超过工作者数"""
+        scheduler = ParallelExecutionScheduler({
+            "max_concurrent_tasks": 8,
+            "cpu_cores": 8.0,
+            "executors": {"process_workers": 2}
+        })
+        for index in range(6):
+            await scheduler._submit_task(make_task(f"p{index}", handler=cpu_bound_handler,
+                                                   executor_type=TaskExecutorType.PROCESS))
+        try:
+            await scheduler._schedule_ready_tasks()
+            self.assertEqual(len(scheduler.running_tasks), 2)
+            self.assertEqual(len(scheduler.task_queue), 4)
+            self.assertEqual(scheduler.executor_manager.get(TaskExecutorType.PROCESS).busy_workers, 2)
+        finally:
+            for handle in list(scheduler._execution_handles):
+                handle.cancel()
+            scheduler.shutdown()
+
+    async def test_running_tasks_never_exceed_worker_count(self):
+        """整个工作流执行期间同时运行的处理函数不超过工作者数"""
+        scheduler = ParallelExecutionScheduler({
+            "max_concurrent_tasks": 8,
+            "cpu_cores": 8.0,
+            "executors": {"thread_workers": 2}
+        })
+        probe = ConcurrencyProbe(scheduler)
+        tasks = [make_task(f"t{index}", handler=probe, executor_type=TaskExecutorType.THREAD)
+                 for index in range(6)]
+        try:
+            result = await scheduler.execute_tasks("wf_test", tasks, {"timeout": 10})
+        finally:
+            scheduler.shutdown()
+
+        self.assertEqual(result["status"], "completed")
+        self.assertEqual(len(result["completed_tasks"]), 6)
+        self.assertEqual(probe.peak, 2)
+        self.assertLessEqual(probe.peak_running, 2)
+        self.assertEqual(scheduler.executor_manager.get(TaskExecutorType.THREAD).busy_workers, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+EnhancedWorkflow 图索引单元测试
+验证邻接索引的增量维护与拓扑顺序缓存
+"""
+
+import unittest
+import pickle
+import sys
+from pathlib import Path
+
+# 添加模块路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from enhanced_workflow_engine import EnhancedWorkflow, WorkflowNode, WorkflowEdge
+
+
+def make_node(node_id: str) -> WorkflowNode:
+    return WorkflowNode(id=node_id, type="validation", name=node_id, description="")
+
+
+class TestWorkflowGraphIndex(unittest.TestCase):
+    """WorkflowGraphIndex 测试"""
+
+    def setUp(self):
+        self.workflow = EnhancedWorkflow(
+            id="wf_index",
+            name="索引测试",
+            description="",
+            nodes=[make_node("a"), make_node("b"), make_node("c")],
+            edges=[WorkflowEdge(source="a", target="b"), WorkflowEdge(source="b", target="c")]
+        )
+
+    def test_lookups_use_index(self):
+        """节点与依赖查询结果与声明一致"""
+        self.assertIs(self.workflow.get_node_by_id("b"), self.workflow.nodes[1])
+        self.assertIsNone(self.workflow.get_node_by_id("missing"))
+        self.assertEqual(self.workflow.get_dependencies("b"), ["a"])
+        self.assertEqual(self.workflow.get_dependents("b"), ["c"])
+        self.assertEqual(self.workflow.get_topological_order(), ["a", "b", "c"])
+
+    def test_incremental_append_updates_index(self):
+        """追加节点和边后索引与拓扑顺序同步更新"""
+        index = self.workflow.graph_index
+        self.workflow.get_topological_order()
+
+        self.workflow.nodes.append(make_node("d"))
+        self.assertIs(self.workflow.graph_index, index)
+        self.assertEqual(self.workflow.get_topological_order(), ["a", "b", "c", "d"])
+
+        self.workflow.edges.append(WorkflowEdge(source="d", target="a"))
+        self.assertIs(self.workflow.graph_index, index)
+        self.assertEqual(self.workflow.get_dependencies("a"), ["d"])
+        self.assertEqual(self.workflow.get_topological_order(), ["d", "a", "b", "c"])
+
+    def test_removal_and_reassignment_rebuild_index(self):
+        """删除边或整体替换列表后索引重建"""
+        self.workflow.graph_index
+        self.workflow.edges.pop()
+        self.assertEqual(self.workflow.get_dependents("b"), [])
+
+        self.workflow.nodes = [make_node("x")]
+        self.assertIsNone(self.workflow.get_node_by_id("a"))
+        self.assertIsNotNone(self.workflow.get_node_by_id("x"))
+
+    def test_cycle_nodes_excluded_from_order(self):
+        """环中的节点不出现在拓扑顺序中"""
+        self.workflow.edges.append(WorkflowEdge(source="c", target="b"))
+        self.assertEqual(self.workflow.get_topological_order(), ["a"])
+
+    def test_pickle_round_trip_keeps_tracking(self):
+        """序列化后恢复的工作流仍能增量维护索引"""
+        restored = pickle.loads(pickle.dumps(self.workflow))
+        self.assertEqual(restored.get_dependencies("c"), ["b"])
+        restored.edges.append(WorkflowEdge(source="a", target="c"))
+        self.assertEqual(restored.get_dependencies("c"), ["b", "a"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+WorkflowStateManager 增量编码单元测试
+验证结构差异、差异重放重建历史与检查点、压缩折叠基线，以及写入失败后差异链的校验
+"""
+
+import unittest
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加模块路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from state_delta import DeltaHistory, apply_delta, compute_delta
+from workflow_state_manager import WorkflowStateManager, StateSnapshot
+
+
+class TestStateDelta(unittest.TestCase):
+    """结构差异测试"""
+
+    def test_delta_round_trip(self):
+        """set/del/ext 差异重放后与目标一致"""
+        old = {"a": 1, "nested": {"x": 1, "y": 2}, "errors": [{"id": 1}], "gone": True}
+        new = {"a": 2, "nested": {"x": 1, "z": 3}, "errors": [{"id": 1}, {"id": 2}], "added": "v"}
+        ops = compute_delta(old, new)
+
+        kinds = {op[0] for op in ops}
+        self.assertEqual(kinds, {"set", "del", "ext"})
+        self.assertEqual(apply_delta({"a": 1, "nested": {"x": 1, "y": 2}, "errors": [{"id": 1}], "gone": True}, ops), new)
+
+    def test_in_place_nested_mutation_recorded(self):
+        """嵌套字典和列表被就地修改后再次追加同一快照，差异中包含修改"""
+        history = DeltaHistory(maxlen=10)
+        snapshot = StateSnapshot(workflow_id="wf", node_states={"n1": {"status": "pending", "log": []}})
+        history.append(snapshot)
+
+        snapshot.node_states["n1"]["status"] = "running"
+        snapshot.node_states["n1"]["log"].append("started")
+        _, ops = history.append(snapshot)
+
+        self.assertIn(("set", ("node_states", "n1", "status"), "running"), ops)
+        self.assertIn(("ext", ("node_states", "n1", "log"), ["started"]), ops)
+        states = history.materialize()
+        self.assertEqual(states[0]["node_states"]["n1"], {"status": "running", "log": ["started"]})
+        self.assertEqual(states[1]["node_states"]["n1"], {"status": "pending", "log": []})
+
+    def test_history_folds_into_base(self):
+        """超过maxlen时最早的差异折叠进基线"""
+        history = DeltaHistory(maxlen=3)
+        snapshot = StateSnapshot(workflow_id="wf")
+        for index in range(10):
+            snapshot = StateSnapshot(workflow_id="wf", node_states={**snapshot.node_states, f"n{index}": {"i": index}})
+            history.append(snapshot)
+
+        self.assertEqual(len(history), 3)
+        states = history.materialize()
+        self.assertEqual(len(states), 3)
+        self.assertEqual(states[0]["node_states"], snapshot.to_dict()["node_states"])
+        self.assertEqual(len(states[2]["node_states"]), 8)
+
+
+class TestDeltaEncodedPersistence(unittest.IsolatedAsyncioTestCase):
+    """增量持久化测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmpdir.name) / "state.db"
+        self.config = {
+            "db_path": str(self.db_path),
+            "auto_checkpoint_interval": 0,
+            "full_snapshot_interval": 5,
+            "full_checkpoint_interval": 3
+        }
+        self.manager = WorkflowStateManager(self.config)
+
+    def tearDown(self):
+        self.manager.close()
+        self.tmpdir.cleanup()
+
+    def encodings(self, table: str):
+        with sqlite3.connect(self.db_path) as conn:
+            return [row[0] for row in conn.execute(f"SELECT encoding FROM {table} ORDER BY seq")]
+
+    async def test_history_rebuilt_from_deltas(self):
+        """快照以基线+差异存储，新进程可从数据库重放出相同历史"""
+        await self.manager.create_workflow_state("wf", {"name": "增量"})
+        for index in range(11):
+            await self.manager.update_node_state("wf", f"n{index % 4}", {"progress": index})
+        await self.manager.add_error("wf", {"message": "失败"})
+        expected = self.manager.get_state_history("wf", limit=6)["history"]
+        self.manager.flush()
+
+        self.assertEqual(self.encodings("state_snapshots"), ["full", "delta", "delta", "delta", "delta"] * 2 + ["full", "delta", "delta"])
+
+        reloaded = WorkflowStateManager(self.config)
+        try:
+            history = reloaded.get_state_history("wf", limit=6)
+        finally:
+            reloaded.close()
+        self.assertEqual(history["total_count"], 13)
+        self.assertEqual(history["history"], expected)
+        self.assertEqual(history["history"][0]["errors"][0]["message"], "失败")
+
+    async def test_delta_checkpoints_restore(self):
+        """差异检查点从数据库加载时重放到正确状态"""
+        await self.manager.create_workflow_state("wf")
+        checkpoint_ids = []
+        for index in range(5):
+            await self.manager.update_node_state("wf", f"n{index}", {"status": "done"})
+            checkpoint_ids.append(self.manager.create_checkpoint("wf")["checkpoint_id"])
+
+        self.assertEqual(self.encodings("workflow_checkpoints"), ["full", "delta", "delta", "full", "delta"])
+        for index, checkpoint_id in enumerate(checkpoint_ids):
+            checkpoint = await self.manager._load_checkpoint(checkpoint_id)
+            self.assertEqual(sorted(checkpoint.state_snapshot.node_states), [f"n{i}" for i in range(index + 1)])
+
+        reloaded = WorkflowStateManager(self.config)
+        try:
+            result = await reloaded.restore_from_checkpoint("wf", checkpoint_ids[2])
+            self.assertEqual(result["status"], "success")
+            self.assertEqual(len(reloaded.get_current_state("wf")["current_state"]["node_states"]), 3)
+            stats = reloaded.get_statistics()["statistics"]["delta_encoding"]
+            self.assertEqual(stats["restore_latency_ms"]["count"], 1)
+        finally:
+            reloaded.close()
+
+    async def test_compaction_folds_old_deltas(self):
+        """压缩后旧记录被删除，保留的最早记录成为完整基线"""
+        await self.manager.create_workflow_state("wf")
+        for index in range(12):
+            await self.manager.update_node_state("wf", f"n{index}", {"status": "done"})
+        expected = self.manager.get_state_history("wf", limit=4)["history"]
+
+        result = self.manager.compact_state_storage(keep_recent=4)
+        self.assertEqual(result["deleted_rows"], 9)
+        self.assertEqual(result["folded_rows"], 1)
+        self.assertEqual(self.encodings("state_snapshots"), ["full", "full", "delta", "delta"])
+
+        reloaded = WorkflowStateManager(self.config)
+        try:
+            self.assertEqual(reloaded.get_state_history("wf", limit=10)["history"], expected)
+        finally:
+            reloaded.close()
+
+    async def test_failed_delta_write_breaks_chain(self):
+        """差异写入失败后，重放跳过缺口之后的差异，下一条快照写完整基线"""
+        serialize = self.manager._serialize
+
+        def failing_serialize(data, compress):
+            if isinstance(data, list) and "poison" in repr(data):
+                raise ValueError("序列化失败")
+            return serialize(data, compress)
+
+        self.manager._serialize = failing_serialize
+        await self.manager.create_workflow_state("wf")
+        await self.manager.update_node_state("wf", "n0", {"status": "done"})
+        await self.manager.update_node_state("wf", "poison", {"status": "done"})
+        # 失败前已排队的差异依赖丢失的记录
+        await self.manager.update_node_state("wf", "n1", {"status": "done"})
+        with self.assertLogs("state_persistence", level="ERROR"):
+            with self.assertRaises(ValueError):
+                self.manager.flush()
+
+        await self.manager.update_node_state("wf", "n2", {"status": "done"})
+        await self.manager.update_node_state("wf", "n3", {"status": "done"})
+        expected = self.manager.get_state_history("wf", limit=10)["history"]
+        self.manager.flush()
+        # #4 因断链强制为完整基线，#5 是周期性基线
+        self.assertEqual(self.encodings("state_snapshots"), ["full", "delta", "delta", "full", "full"])
+
+        reloaded = WorkflowStateManager(self.config)
+        try:
+            with self.assertLogs("workflow_state_manager", level="WARNING"):
+                history = reloaded.get_state_history("wf", limit=10)["history"]
+            with reloaded.persistence.connection() as conn:
+                with self.assertRaises(ValueError):
+                    reloaded._rebuild_state(conn, "state_snapshots", "wf", 3)
+        finally:
+            reloaded.close()
+        # 缺口处的快照 (#2 丢失, #3 无法重建) 被跳过，其余与内存历史一致
+        self.assertEqual(history, [expected[0], expected[1], expected[4], expected[5]])
+        self.assertEqual(sorted(history[1]["node_states"]), ["n0", "n1", "n2", "poison"])
+
+    async def test_failed_checkpoint_write_forces_full_base(self):
+        """检查点写入失败后，下一个检查点写完整基线"""
+        serialize = self.manager._serialize
+
+        def failing_serialize(data, compress):
+            if "state_delta" in data and data["description"] == "poison":
+                return object(), 0  # sqlite 无法绑定的参数，写入时失败
+            return serialize(data, compress)
+
+        self.manager._serialize = failing_serialize
+        await self.manager.create_workflow_state("wf")
+        self.manager.create_checkpoint("wf")
+        with self.assertLogs("state_persistence", level="ERROR"):
+            self.manager.create_checkpoint("wf", description="poison")
+        await self.manager.update_node_state("wf", "n0", {"status": "done"})
+        checkpoint_id = self.manager.create_checkpoint("wf")["checkpoint_id"]
+        self.manager.create_checkpoint("wf")
+
+        self.assertEqual(self.encodings("workflow_checkpoints"), ["full", "full", "delta"])
+        checkpoint = await self.manager._load_checkpoint(checkpoint_id)
+        self.assertEqual(list(checkpoint.state_snapshot.node_states), ["n0"])
+
+
+if __name__ == '__main__':
+    unittest.main()
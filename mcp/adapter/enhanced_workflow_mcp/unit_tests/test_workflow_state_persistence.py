@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+WorkflowStateManager 写后持久化单元测试
+验证批量提交、显式刷新、检查点持久化级别与批次中单条写入失败的处理
+"""
+
+import unittest
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加模块路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from state_persistence import DurabilityLevel, WriteBehindPersistence
+from workflow_state_manager import WorkflowStateManager
+
+
+def count_rows(db_path: Path, table: str) -> int:
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+class TestWorkflowStatePersistence(unittest.IsolatedAsyncioTestCase):
+    """写后持久化测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmpdir.name) / "state.db"
+        self.manager = WorkflowStateManager({
+            "db_path": str(self.db_path),
+            "auto_checkpoint_interval": 0,
+            "persist_flush_interval": 60
+        })
+
+    def tearDown(self):
+        self.manager.close()
+        self.tmpdir.cleanup()
+
+    async def test_writes_are_batched_until_flush(self):
+        """状态变化先进入队列，flush后在同一批次中提交"""
+        await self.manager.create_workflow_state("wf", {"name": "测试"})
+        for index in range(20):
+            await self.manager.update_node_state("wf", f"n{index}", {"status": "running"})
+        self.assertEqual(count_rows(self.db_path, "state_snapshots"), 0)
+
+        self.assertTrue(self.manager.flush())
+        self.assertEqual(count_rows(self.db_path, "state_snapshots"), 21)
+        self.assertEqual(count_rows(self.db_path, "state_transitions"), 1)
+        stats = self.manager.get_statistics()["statistics"]["persistence"]
+        self.assertEqual(stats["batches_committed"], 1)
+        self.assertEqual(stats["rows_written"], 22)
+
+    async def test_wal_mode_enabled(self):
+        """长连接使用WAL日志模式"""
+        with self.manager.persistence.connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    async def test_checkpoint_durable_on_return(self):
+        """检查点默认在返回前落库，可从数据库重新加载"""
+        await self.manager.create_workflow_state("wf")
+        result = self.manager.create_checkpoint("wf", description="持久化测试")
+        self.assertEqual(self.manager.checkpoint_durability, DurabilityLevel.FLUSHED)
+        self.assertEqual(count_rows(self.db_path, "workflow_checkpoints"), 1)
+
+        checkpoint = await self.manager._load_checkpoint(result["checkpoint_id"])
+        self.assertEqual(checkpoint.description, "持久化测试")
+        self.assertEqual(checkpoint.state_snapshot.workflow_id, "wf")
+
+    async def test_close_flushes_pending_writes(self):
+        """关闭时写入剩余队列"""
+        await self.manager.create_workflow_state("wf")
+        self.manager.close()
+        self.assertEqual(count_rows(self.db_path, "state_snapshots"), 1)
+
+    async def test_batch_size_triggers_commit(self):
+        """达到批量大小时无需等待时间间隔即提交"""
+        manager = WorkflowStateManager({
+            "db_path": str(Path(self.tmpdir.name) / "batch.db"),
+            "auto_checkpoint_interval": 0,
+            "persist_batch_size": 5,
+            "persist_flush_interval": 60
+        })
+        try:
+            await manager.create_workflow_state("wf")
+            for index in range(8):
+                await manager.update_node_state("wf", f"n{index}", {"status": "done"})
+            manager.flush()
+            self.assertEqual(manager.persistence.get_stats()["batches_committed"], 2)
+        finally:
+            manager.close()
+
+    async def test_retried_rows_counted_once(self):
+        """批次失败后逐条重写的快照只在提交成功后统计一次"""
+        def broken_params():
+            raise ValueError("序列化失败")
+
+        await self.manager.create_workflow_state("wf")
+        for index in range(5):
+            await self.manager.update_node_state("wf", f"n{index}", {"status": "done"})
+        self.manager.persistence.write("INSERT INTO state_snapshots (snapshot_id) VALUES (?)", broken_params)
+
+        with self.assertLogs("state_persistence", level="ERROR"):
+            with self.assertRaises(ValueError):
+                self.manager.flush()
+
+        rows = self.manager.delta_stats["snapshot_rows"]
+        self.assertEqual(rows["full"] + rows["delta"], count_rows(self.db_path, "state_snapshots"))
+        self.assertEqual(rows["full"] + rows["delta"], 6)
+
+
+class TestWriteBehindFailures(unittest.TestCase):
+    """批次中有写入失败时只丢弃失败的那一条"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmpdir.name) / "rows.db"
+        self.persistence = WriteBehindPersistence(self.db_path, flush_interval=60)
+        with self.persistence.connection() as conn:
+            conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, value TEXT NOT NULL)")
+
+    def tearDown(self):
+        self.persistence.close()
+        self.tmpdir.cleanup()
+
+    def test_failing_row_does_not_discard_batch(self):
+        """注入一条违反约束的写入和一条参数函数出错的写入，其余写入仍然落库"""
+        def broken_params():
+            raise ValueError("序列化失败")
+
+        for index in range(10):
+            self.persistence.write("INSERT INTO items (id, value) VALUES (?, ?)", (index, f"v{index}"))
+        self.persistence.write("INSERT INTO items (id, value) VALUES (?, ?)", (3, "duplicate"))
+        self.persistence.write("INSERT INTO items (id, value) VALUES (?, ?)", broken_params)
+        self.persistence.write("INSERT INTO items (id, value) VALUES (?, ?)", (10, "after"))
+
+        with self.assertLogs("state_persistence", level="ERROR") as logs:
+            with self.assertRaises(sqlite3.IntegrityError):
+                self.persistence.flush()
+
+        self.assertIn("已丢弃 2 条", logs.output[0])
+        self.assertEqual(count_rows(self.db_path, "items"), 11)
+        stats = self.persistence.get_stats()
+        self.assertEqual((stats["rows_written"], stats["rows_dropped"], stats["write_errors"]), (11, 2, 2))
+
+        # 之后的批次不受影响
+        self.persistence.write("INSERT INTO items (id, value) VALUES (?, ?)", (11, "next"))
+        self.assertTrue(self.persistence.flush())
+        self.assertEqual(count_rows(self.db_path, "items"), 12)
+
+    def test_commit_callback_reports_each_row_once(self):
+        """提交回调对每条写入只调用一次，批次失败后按逐条重写的结果回调"""
+        results = []
+        for index in (1, 2, 1):
+            self.persistence.write("INSERT INTO items (id, value) VALUES (?, ?)", (index, "v"),
+                                   on_commit=lambda committed, index=index: results.append((index, committed)))
+
+        with self.assertLogs("state_persistence", level="ERROR"):
+            with self.assertRaises(sqlite3.IntegrityError):
+                self.persistence.flush()
+        self.assertEqual(results, [(1, True), (2, True), (1, False)])
+
+        self.persistence.write("INSERT INTO items (id, value) VALUES (?, ?)", (3, "v"),
+                               on_commit=lambda committed: results.append((3, committed)))
+        self.persistence.flush()
+        self.assertEqual(results[-1], (3, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
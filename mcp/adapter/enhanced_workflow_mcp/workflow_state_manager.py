@@ -7,14 +7,14 @@ Workflow State Management System
 管理工作流的状态、历史记录、持久化和恢复
 """
 
+import copy
 import json
 import logging
-import sqlite3
 import threading
 import time
 import uuid
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Set, Tuple
+from typing import Dict, Iterator, List, Any, Optional, Set, Tuple
 from dataclasses import dataclass, field, asdict
 from enum import Enum
 from pathlib import Path
@@ -22,6 +22,13 @@ import pickle
 import gzip
 from collections import defaultdict, deque
 
+try:
+    from .state_persistence import DurabilityLevel, WriteBehindPersistence
+    from .state_delta import DeltaHistory, DeltaOp, apply_delta, compute_delta, snapshot_view
+except ImportError:
+    from state_persistence import DurabilityLevel, WriteBehindPersistence
+    from state_delta import DeltaHistory, DeltaOp, apply_delta, compute_delta, snapshot_view
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -161,7 +168,7 @@ class WorkflowStateManager:
         
         # 内存状态缓存
         self.workflow_states: Dict[str, StateSnapshot] = {}
-        self.state_history: Dict[str, deque] = defaultdict(lambda: deque(maxlen=100))
+        self.state_history: Dict[str, DeltaHistory] = {}
         self.transitions: Dict[str, List[StateTransition]] = defaultdict(list)
         self.checkpoints: Dict[str, List[WorkflowCheckpoint]] = defaultdict(list)
         
@@ -170,6 +177,32 @@ class WorkflowStateManager:
         self.auto_checkpoint_interval = self.config.get("auto_checkpoint_interval", 300)  # 5分钟
         self.state_persistence_enabled = self.config.get("state_persistence_enabled", True)
         self.compression_enabled = self.config.get("compression_enabled", True)
+        self.checkpoint_durability = DurabilityLevel(self.config.get("checkpoint_durability", "flushed"))
+        
+        # 增量编码：每隔N条写一个完整基线，其余记录相对上一条的结构差异
+        self.full_snapshot_interval = max(1, self.config.get("full_snapshot_interval", 20))
+        self.full_checkpoint_interval = max(1, self.config.get("full_checkpoint_interval", 10))
+        self.compaction_interval = self.config.get("compaction_interval", 3600)
+        self._last_compaction = time.time()
+        self._checkpoint_chain: Dict[str, Tuple[int, Dict[str, Any]]] = {}  # workflow_id -> (上一检查点序号, 状态视图)
+        self._broken_chains: Set[Tuple[str, str]] = set()  # 有记录写入失败的 (表, workflow_id)，下一条强制写完整基线
+        self.delta_stats = {
+            "snapshot_rows": {"full": 0, "delta": 0},
+            "checkpoint_rows": {"full": 0, "delta": 0},
+            "stored_bytes": {"full": 0, "delta": 0},
+            "compactions": 0,
+            "folded_rows": 0,
+            "restore_latency": deque(maxlen=100),
+            "history_rebuild_latency": deque(maxlen=100)
+        }
+        
+        # 写后持久化层：单个WAL长连接，按批量大小或时间间隔批量提交
+        self.persistence = WriteBehindPersistence(
+            self.db_path,
+            batch_size=self.config.get("persist_batch_size", 256),
+            flush_interval=self.config.get("persist_flush_interval", 0.5),
+            max_queue_size=self.config.get("persist_max_queue_size", 10000)
+        )
         
         # 线程锁
         self.state_lock = threading.RLock()
@@ -186,7 +219,7 @@ class WorkflowStateManager:
     def _init_database(self):
         """初始化数据库"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.persistence.connection() as conn:
                 cursor = conn.cursor()
                 
                 # 创建状态快照表
@@ -230,11 +263,21 @@ class WorkflowStateManager:
                     )
                 """)
                 
+                # 增量编码列（兼容旧库：旧记录seq为空，按完整记录处理）
+                for table in ("state_snapshots", "workflow_checkpoints"):
+                    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+                    if "seq" not in columns:
+                        cursor.execute(f"ALTER TABLE {table} ADD COLUMN seq INTEGER")
+                    if "encoding" not in columns:
+                        cursor.execute(f"ALTER TABLE {table} ADD COLUMN encoding TEXT DEFAULT 'full'")
+                
                 # 创建索引
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_workflow_id ON state_snapshots(workflow_id)")
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_timestamp ON state_snapshots(timestamp)")
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_transitions_workflow_id ON state_transitions(workflow_id)")
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_checkpoints_workflow_id ON workflow_checkpoints(workflow_id)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_workflow_seq ON state_snapshots(workflow_id, seq)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_checkpoints_workflow_seq ON workflow_checkpoints(workflow_id, seq)")
                 
                 conn.commit()
                 logger.info("数据库初始化完成")
@@ -250,6 +293,8 @@ class WorkflowStateManager:
                 try:
                     time.sleep(self.auto_checkpoint_interval)
                     self._create_auto_checkpoints()
+                    if self.compaction_interval > 0 and time.time() - self._last_compaction >= self.compaction_interval:
+                        self.compact_state_storage()
                 except Exception as e:
                     logger.error(f"自动检查点线程异常: {e}")
         
@@ -289,11 +334,11 @@ class WorkflowStateManager:
                 
                 # 保存到内存
                 self.workflow_states[workflow_id] = snapshot
-                self.state_history[workflow_id].append(snapshot)
+                history_record = self._append_history(snapshot)
                 
                 # 持久化
                 if self.state_persistence_enabled:
-                    await self._persist_snapshot(snapshot)
+                    await self._persist_snapshot(snapshot, history_record)
                 
                 # 记录状态转换
                 transition = StateTransition(
@@ -353,11 +398,11 @@ class WorkflowStateManager:
                 
                 # 保存到内存
                 self.workflow_states[workflow_id] = new_snapshot
-                self.state_history[workflow_id].append(new_snapshot)
+                history_record = self._append_history(new_snapshot)
                 
                 # 持久化
                 if self.state_persistence_enabled:
-                    await self._persist_snapshot(new_snapshot)
+                    await self._persist_snapshot(new_snapshot, history_record)
                 
                 # 记录状态转换
                 transition = StateTransition(
@@ -435,11 +480,11 @@ class WorkflowStateManager:
                 
                 # 保存到内存
                 self.workflow_states[workflow_id] = new_snapshot
-                self.state_history[workflow_id].append(new_snapshot)
+                history_record = self._append_history(new_snapshot)
                 
                 # 持久化
                 if self.state_persistence_enabled:
-                    await self._persist_snapshot(new_snapshot)
+                    await self._persist_snapshot(new_snapshot, history_record)
                 
                 logger.info(f"节点状态已更新: {workflow_id}/{node_id}")
                 
@@ -486,11 +531,11 @@ class WorkflowStateManager:
                 
                 # 保存到内存
                 self.workflow_states[workflow_id] = new_snapshot
-                self.state_history[workflow_id].append(new_snapshot)
+                history_record = self._append_history(new_snapshot)
                 
                 # 持久化
                 if self.state_persistence_enabled:
-                    await self._persist_snapshot(new_snapshot)
+                    await self._persist_snapshot(new_snapshot, history_record)
                 
                 logger.warning(f"错误信息已添加: {workflow_id} - {error_info.get('message', 'Unknown error')}")
                 
@@ -533,11 +578,11 @@ class WorkflowStateManager:
                 
                 # 保存到内存
                 self.workflow_states[workflow_id] = new_snapshot
-                self.state_history[workflow_id].append(new_snapshot)
+                history_record = self._append_history(new_snapshot)
                 
                 # 持久化
                 if self.state_persistence_enabled:
-                    await self._persist_snapshot(new_snapshot)
+                    await self._persist_snapshot(new_snapshot, history_record)
                 
                 logger.info(f"性能指标已更新: {workflow_id}")
                 
@@ -599,6 +644,7 @@ class WorkflowStateManager:
     async def restore_from_checkpoint(self, workflow_id: str, checkpoint_id: str) -> Dict[str, Any]:
         """从检查点恢复"""
         try:
+            started = time.perf_counter()
             with self.state_lock:
                 # 查找检查点
                 checkpoint = None
@@ -621,11 +667,11 @@ class WorkflowStateManager:
                 
                 # 保存到内存
                 self.workflow_states[workflow_id] = restored_snapshot
-                self.state_history[workflow_id].append(restored_snapshot)
+                history_record = self._append_history(restored_snapshot)
                 
                 # 持久化
                 if self.state_persistence_enabled:
-                    await self._persist_snapshot(restored_snapshot)
+                    await self._persist_snapshot(restored_snapshot, history_record)
                 
                 # 记录状态转换
                 transition = StateTransition(
@@ -641,6 +687,7 @@ class WorkflowStateManager:
                 if self.state_persistence_enabled:
                     await self._persist_transition(transition)
                 
+                self.delta_stats["restore_latency"].append(time.perf_counter() - started)
                 logger.info(f"已从检查点恢复: {workflow_id} - {checkpoint_id}")
                 
                 return {
@@ -675,22 +722,28 @@ class WorkflowStateManager:
             return {"status": "error", "message": str(e)}
     
     def get_state_history(self, workflow_id: str, limit: int = 10) -> Dict[str, Any]:
-        """获取状态历史"""
+        """获取状态历史（从基线重放差异重建）"""
         try:
             with self.state_lock:
-                if workflow_id not in self.state_history:
-                    return {"status": "error", "message": "工作流状态历史不存在"}
-                
-                history = list(self.state_history[workflow_id])
-                history.reverse()  # 最新的在前
+                started = time.perf_counter()
+                history = self.state_history.get(workflow_id)
+                if history is not None:
+                    limited_history = history.materialize(limit)
+                    total_count = len(history)
+                elif self.state_persistence_enabled:
+                    limited_history, total_count = self._load_snapshot_history(workflow_id, limit)
+                else:
+                    limited_history, total_count = [], 0
                 
-                limited_history = history[:limit]
+                if not total_count:
+                    return {"status": "error", "message": "工作流状态历史不存在"}
+                self.delta_stats["history_rebuild_latency"].append(time.perf_counter() - started)
                 
                 return {
                     "status": "success",
                     "workflow_id": workflow_id,
-                    "history": [snapshot.to_dict() for snapshot in limited_history],
-                    "total_count": len(history)
+                    "history": limited_history,  # 最新的在前
+                    "total_count": total_count
                 }
                 
         except Exception as e:
@@ -747,71 +800,119 @@ class WorkflowStateManager:
             logger.error(f"获取检查点列表失败: {e}")
             return {"status": "error", "message": str(e)}
     
-    async def _persist_snapshot(self, snapshot: StateSnapshot):
-        """持久化状态快照"""
+    def _serialize(self, data: Dict[str, Any], compress: bool) -> Tuple[bytes, int]:
+        """序列化数据（可选gzip压缩）"""
+        if compress:
+            return gzip.compress(pickle.dumps(data)), 1
+        return pickle.dumps(data), 0
+    
+    def _append_history(self, snapshot: StateSnapshot) -> Tuple[int, Optional[List[DeltaOp]]]:
+        """追加到增量历史，返回 (序号, 相对上一快照的差异)"""
+        history = self.state_history.get(snapshot.workflow_id)
+        if history is None:
+            history = DeltaHistory(
+                self.max_history_size,
+                start_seq=self._next_persisted_seq("state_snapshots", snapshot.workflow_id)
+            )
+            self.state_history[snapshot.workflow_id] = history
+        return history.append(snapshot)
+    
+    def _next_persisted_seq(self, table: str, workflow_id: str) -> int:
+        """数据库中该工作流的下一个记录序号（进程重启后续接已有链）"""
+        if not self.state_persistence_enabled:
+            return 0
+        with self.persistence.connection() as conn:
+            row = conn.execute(f"SELECT MAX(seq) FROM {table} WHERE workflow_id = ?", (workflow_id,)).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+    
+    def _deserialize(self, blob: bytes, compressed: int) -> Any:
+        """反序列化数据"""
+        return pickle.loads(gzip.decompress(blob) if compressed else blob)
+    
+    def _count_row(self, kind: str, encoding: str, size: int):
+        self.delta_stats[kind][encoding] += 1
+        self.delta_stats["stored_bytes"][encoding] += size
+    
+    async def _persist_snapshot(self, snapshot: StateSnapshot, history_record: Optional[Tuple[int, Optional[List[DeltaOp]]]] = None):
+        """持久化状态快照（写入队列，由后台线程批量提交）"""
         try:
-            # 序列化数据
-            snapshot_data = snapshot.to_dict()
+            seq, ops = history_record if history_record else (None, None)
+            full = (self._take_broken_chain("state_snapshots", snapshot.workflow_id)
+                    or ops is None or seq % self.full_snapshot_interval == 0)
+            encoding = "full" if full else "delta"
+            # 完整记录用to_dict()生成独立副本，差异已是独立副本；序列化与压缩推迟到写线程中执行
+            snapshot_data = snapshot.to_dict() if full else ops
+            key = (
+                snapshot.snapshot_id,
+                snapshot.workflow_id,
+                snapshot.timestamp.isoformat(),
+                snapshot.workflow_status.value
+            )
             
-            if self.compression_enabled:
-                # 压缩数据
-                serialized_data = gzip.compress(pickle.dumps(snapshot_data))
-                compressed = 1
-            else:
-                serialized_data = pickle.dumps(snapshot_data)
-                compressed = 0
+            serialized_size = 0
             
-            # 保存到数据库
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO state_snapshots 
-                    (snapshot_id, workflow_id, timestamp, workflow_status, snapshot_data, compressed)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    snapshot.snapshot_id,
-                    snapshot.workflow_id,
-                    snapshot.timestamp.isoformat(),
-                    snapshot.workflow_status.value,
-                    serialized_data,
-                    compressed
-                ))
-                conn.commit()
+            def params():
+                nonlocal serialized_size
+                serialized_data, compressed = self._serialize(snapshot_data, self.compression_enabled and full)
+                serialized_size = len(serialized_data)
+                return key + (serialized_data, compressed, seq, encoding)
+            
+            def on_commit(committed: bool):
+                # 批次失败后逐条重写会再次调用params()，只在提交成功后统计一次
+                if committed:
+                    self._count_row("snapshot_rows", encoding, serialized_size)
+                else:
+                    self._mark_broken_chain("state_snapshots", snapshot.workflow_id)
+            
+            self.persistence.write("""
+                INSERT INTO state_snapshots 
+                (snapshot_id, workflow_id, timestamp, workflow_status, snapshot_data, compressed, seq, encoding)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, params, on_commit=on_commit)
                 
         except Exception as e:
+            self._mark_broken_chain("state_snapshots", snapshot.workflow_id)
             logger.error(f"持久化状态快照失败: {e}")
     
     async def _persist_transition(self, transition: StateTransition):
-        """持久化状态转换"""
+        """持久化状态转换（写入队列，由后台线程批量提交）"""
         try:
-            # 序列化数据
             transition_data = transition.to_dict()
-            serialized_data = pickle.dumps(transition_data)
+            key = (
+                transition.transition_id,
+                transition.workflow_id,
+                transition.timestamp.isoformat(),
+                transition.from_status.value,
+                transition.to_status.value,
+                transition.trigger
+            )
             
-            # 保存到数据库
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO state_transitions 
-                    (transition_id, workflow_id, timestamp, from_status, to_status, trigger, transition_data)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    transition.transition_id,
-                    transition.workflow_id,
-                    transition.timestamp.isoformat(),
-                    transition.from_status.value,
-                    transition.to_status.value,
-                    transition.trigger,
-                    serialized_data
-                ))
-                conn.commit()
+            def params():
+                return key + (pickle.dumps(transition_data),)
+            
+            self.persistence.write("""
+                INSERT INTO state_transitions 
+                (transition_id, workflow_id, timestamp, from_status, to_status, trigger, transition_data)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, params)
                 
         except Exception as e:
             logger.error(f"持久化状态转换失败: {e}")
     
     def _persist_checkpoint(self, checkpoint: WorkflowCheckpoint):
-        """持久化检查点"""
+        """持久化检查点（周期性完整基线 + 相对上一检查点的差异，按checkpoint_durability等待落库）"""
         try:
+            view = snapshot_view(checkpoint.state_snapshot)
+            previous = self._checkpoint_chain.get(checkpoint.workflow_id)
+            if self._take_broken_chain("workflow_checkpoints", checkpoint.workflow_id):
+                previous = None
+            if previous is None:
+                seq, ops = self._next_persisted_seq("workflow_checkpoints", checkpoint.workflow_id), None
+            else:
+                seq, ops = previous[0] + 1, compute_delta(previous[1], view)
+            full = ops is None or seq % self.full_checkpoint_interval == 0
+            encoding = "full" if full else "delta"
+            
             # 序列化数据
             checkpoint_data = {
                 "checkpoint_id": checkpoint.checkpoint_id,
@@ -819,48 +920,205 @@ class WorkflowStateManager:
                 "timestamp": checkpoint.timestamp.isoformat(),
                 "checkpoint_type": checkpoint.checkpoint_type,
                 "description": checkpoint.description,
-                "state_snapshot": checkpoint.state_snapshot.to_dict(),
                 "recovery_data": checkpoint.recovery_data,
                 "tags": checkpoint.tags,
                 "metadata": checkpoint.metadata
             }
-            
-            if self.compression_enabled:
-                # 压缩数据
-                serialized_data = gzip.compress(pickle.dumps(checkpoint_data))
-                compressed = 1
+            if full:
+                checkpoint_data["state_snapshot"] = checkpoint.state_snapshot.to_dict()
             else:
-                serialized_data = pickle.dumps(checkpoint_data)
-                compressed = 0
+                checkpoint_data["state_delta"] = ops
+            serialized_data, compressed = self._serialize(checkpoint_data, self.compression_enabled)
             
-            # 保存到数据库
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO workflow_checkpoints 
-                    (checkpoint_id, workflow_id, timestamp, checkpoint_type, description, checkpoint_data, compressed)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    checkpoint.checkpoint_id,
-                    checkpoint.workflow_id,
-                    checkpoint.timestamp.isoformat(),
-                    checkpoint.checkpoint_type,
-                    checkpoint.description,
-                    serialized_data,
-                    compressed
-                ))
-                conn.commit()
+            def on_commit(committed: bool):
+                if committed:
+                    self._count_row("checkpoint_rows", encoding, len(serialized_data))
+                else:
+                    self._mark_broken_chain("workflow_checkpoints", checkpoint.workflow_id)
+            
+            # 入队即占用该序号；写入失败时由回调标记断链
+            self._checkpoint_chain[checkpoint.workflow_id] = (seq, copy.deepcopy(view))
+            self.persistence.write("""
+                INSERT INTO workflow_checkpoints 
+                (checkpoint_id, workflow_id, timestamp, checkpoint_type, description, checkpoint_data, compressed, seq, encoding)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                checkpoint.checkpoint_id,
+                checkpoint.workflow_id,
+                checkpoint.timestamp.isoformat(),
+                checkpoint.checkpoint_type,
+                checkpoint.description,
+                serialized_data,
+                compressed,
+                seq,
+                encoding
+            ), durability=self.checkpoint_durability, on_commit=on_commit)
                 
         except Exception as e:
+            self._mark_broken_chain("workflow_checkpoints", checkpoint.workflow_id)
             logger.error(f"持久化检查点失败: {e}")
     
+    def _mark_broken_chain(self, table: str, workflow_id: str):
+        """记录写入失败：之后已排队的差异在重放时会因序号缺口被跳过，下一条记录写完整基线"""
+        self._broken_chains.add((table, workflow_id))
+    
+    def _take_broken_chain(self, table: str, workflow_id: str) -> bool:
+        key = (table, workflow_id)
+        if key not in self._broken_chains:
+            return False
+        self._broken_chains.discard(key)
+        return True
+    
+    def _row_state(self, table: str, encoding: str, data: Any) -> Any:
+        """从记录中取出完整状态或差异"""
+        if table == "state_snapshots":
+            return data
+        return data["state_snapshot"] if encoding == "full" else data["state_delta"]
+    
+    def _replay_chain(self, conn, table: str, workflow_id: str, first_seq: int,
+                      last_seq: int) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+        """
+        从不晚于first_seq的最近完整基线开始按序号重放到last_seq，逐条产出 (序号, 状态)
+        
+        差异只能应用在紧邻的上一条记录上：序号出现缺口（如写入失败被丢弃的记录）时差异链断开，
+        此后的差异无法重建，产出None，直到下一个完整基线。产出的状态在迭代中被就地修改
+        """
+        data_column = "snapshot_data" if table == "state_snapshots" else "checkpoint_data"
+        base_seq = conn.execute(
+            f"SELECT MAX(seq) FROM {table} WHERE workflow_id = ? AND seq <= ? AND encoding = 'full'",
+            (workflow_id, first_seq)
+        ).fetchone()[0]
+        
+        state = None
+        previous_seq = None
+        rows = conn.execute(
+            f"SELECT seq, encoding, {data_column}, compressed FROM {table} "
+            f"WHERE workflow_id = ? AND seq BETWEEN ? AND ? ORDER BY seq",
+            (workflow_id, first_seq if base_seq is None else base_seq, last_seq)
+        ).fetchall()
+        for seq, encoding, blob, compressed in rows:
+            row_state = self._row_state(table, encoding, self._deserialize(blob, compressed))
+            if encoding == "full":
+                state = row_state
+            elif state is not None and seq == previous_seq + 1:
+                apply_delta(state, row_state)
+            else:
+                if state is not None:
+                    logger.warning(f"⚠️ 差异链在 {table} {workflow_id}#{seq} 处断开 (上一条 #{previous_seq})，"
+                                   f"跳过至下一个完整基线")
+                state = None
+            previous_seq = seq
+            yield seq, state
+    
+    def _rebuild_state(self, conn, table: str, workflow_id: str, seq: int) -> Dict[str, Any]:
+        """从不晚于seq的最近完整基线开始重放差异，重建seq处的状态；差异链断开时抛出ValueError"""
+        state = None
+        for row_seq, row_state in self._replay_chain(conn, table, workflow_id, seq, seq):
+            state = row_state if row_seq == seq else None
+        if state is None:
+            raise ValueError(f"差异链不完整，无法重建: {table} {workflow_id}#{seq}")
+        return state
+    
+    def _load_snapshot_history(self, workflow_id: str, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        """从数据库重放差异重建最近limit条快照（最新的在前）；差异链断开处的快照被跳过"""
+        with self.persistence.connection() as conn:
+            min_seq, max_seq, total_count = conn.execute(
+                "SELECT MIN(seq), MAX(seq), COUNT(*) FROM state_snapshots WHERE workflow_id = ? AND seq IS NOT NULL",
+                (workflow_id,)
+            ).fetchone()
+            if max_seq is None or limit <= 0:
+                return [], total_count
+            first_seq = max(min_seq, max_seq - limit + 1)
+            history = [
+                copy.deepcopy(state)
+                for seq, state in self._replay_chain(conn, "state_snapshots", workflow_id, first_seq, max_seq)
+                if seq >= first_seq and state is not None
+            ]
+        history.reverse()
+        return history, total_count
+    
+    def _fold_into_base(self, conn, table: str, workflow_id: str, seq: int) -> bool:
+        """把seq处的差异记录改写为完整基线，使更早的记录可以安全删除"""
+        data_column = "snapshot_data" if table == "state_snapshots" else "checkpoint_data"
+        id_column = "snapshot_id" if table == "state_snapshots" else "checkpoint_id"
+        row = conn.execute(
+            f"SELECT {id_column}, encoding, {data_column}, compressed FROM {table} WHERE workflow_id = ? AND seq = ?",
+            (workflow_id, seq)
+        ).fetchone()
+        if not row or row[1] == "full":
+            return False
+        
+        record_id, _, blob, compressed = row
+        state = self._rebuild_state(conn, table, workflow_id, seq)
+        if table == "state_snapshots":
+            data = state
+        else:
+            data = self._deserialize(blob, compressed)
+            data.pop("state_delta", None)
+            data["state_snapshot"] = state
+        serialized_data, compressed = self._serialize(data, self.compression_enabled)
+        conn.execute(
+            f"UPDATE {table} SET {data_column} = ?, compressed = ?, encoding = 'full' WHERE {id_column} = ?",
+            (serialized_data, compressed, record_id)
+        )
+        return True
+    
+    def compact_state_storage(self, keep_recent: Optional[int] = None) -> Dict[str, Any]:
+        """
+        压缩增量存储：每个工作流只保留最近keep_recent条快照，
+        把被淘汰的差异折叠进新的完整基线后删除旧记录
+        """
+        try:
+            keep = keep_recent or self.max_history_size
+            folded = 0
+            deleted = 0
+            
+            with self.persistence.connection() as conn:
+                conn.execute("BEGIN")
+                chains = conn.execute(
+                    "SELECT workflow_id, MIN(seq), MAX(seq) FROM state_snapshots WHERE seq IS NOT NULL GROUP BY workflow_id"
+                ).fetchall()
+                for workflow_id, min_seq, max_seq in chains:
+                    new_base = max_seq - keep + 1
+                    if new_base <= min_seq:
+                        continue
+                    try:
+                        folded += self._fold_into_base(conn, "state_snapshots", workflow_id, new_base)
+                    except ValueError as e:
+                        # 新基线落在断开的差异链上，保留旧记录等待后续完整基线
+                        logger.warning(f"⚠️ 跳过压缩 {workflow_id}: {e}")
+                        continue
+                    deleted += conn.execute(
+                        "DELETE FROM state_snapshots WHERE workflow_id = ? AND seq < ?", (workflow_id, new_base)
+                    ).rowcount
+                conn.commit()
+            
+            self._last_compaction = time.time()
+            self.delta_stats["compactions"] += 1
+            self.delta_stats["folded_rows"] += folded
+            logger.info(f"增量存储压缩完成: 折叠 {folded} 条, 删除 {deleted} 条")
+            
+            return {"status": "success", "folded_rows": folded, "deleted_rows": deleted}
+            
+        except Exception as e:
+            logger.error(f"增量存储压缩失败: {e}")
+            return {"status": "error", "message": str(e)}
+    
+    def flush(self, sync: bool = False, timeout: Optional[float] = 30.0) -> bool:
+        """等待所有已排队的状态写入提交到数据库"""
+        return self.persistence.flush(sync=sync, timeout=timeout)
+    
+    def close(self):
+        """刷新剩余写入并关闭数据库连接"""
+        self.persistence.close()
+    
     async def _load_checkpoint(self, checkpoint_id: str) -> Optional[WorkflowCheckpoint]:
-        """从数据库加载检查点"""
+        """从数据库加载检查点（差异记录从最近的完整基线重放）"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.persistence.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
-                    SELECT checkpoint_data, compressed FROM workflow_checkpoints 
+                    SELECT checkpoint_data, compressed, seq, encoding FROM workflow_checkpoints 
                     WHERE checkpoint_id = ?
                 """, (checkpoint_id,))
                 
@@ -868,13 +1126,14 @@ class WorkflowStateManager:
                 if not row:
                     return None
                 
-                checkpoint_data, compressed = row
+                checkpoint_data, compressed, seq, encoding = row
                 
                 # 反序列化数据
-                if compressed:
-                    data = pickle.loads(gzip.decompress(checkpoint_data))
+                data = self._deserialize(checkpoint_data, compressed)
+                if encoding == "delta":
+                    state = self._rebuild_state(conn, "workflow_checkpoints", data["workflow_id"], seq)
                 else:
-                    data = pickle.loads(checkpoint_data)
+                    state = data["state_snapshot"]
                 
                 # 重建检查点对象
                 checkpoint = WorkflowCheckpoint()
@@ -883,7 +1142,7 @@ class WorkflowStateManager:
                 checkpoint.timestamp = datetime.fromisoformat(data["timestamp"])
                 checkpoint.checkpoint_type = data["checkpoint_type"]
                 checkpoint.description = data["description"]
-                checkpoint.state_snapshot = StateSnapshot.from_dict(data["state_snapshot"])
+                checkpoint.state_snapshot = StateSnapshot.from_dict(state)
                 checkpoint.recovery_data = data["recovery_data"]
                 checkpoint.tags = data["tags"]
                 checkpoint.metadata = data["metadata"]
@@ -902,8 +1161,18 @@ class WorkflowStateManager:
             
             deleted_counts = {"snapshots": 0, "transitions": 0, "checkpoints": 0}
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self.persistence.connection() as conn:
                 cursor = conn.cursor()
+                cursor.execute("BEGIN")
+                
+                # 保留下来的最早差异记录先折叠为完整基线，避免链断开
+                for table in ("state_snapshots", "workflow_checkpoints"):
+                    survivors = cursor.execute(
+                        f"SELECT workflow_id, MIN(seq) FROM {table} WHERE timestamp >= ? AND seq IS NOT NULL GROUP BY workflow_id",
+                        (cutoff_str,)
+                    ).fetchall()
+                    for workflow_id, first_seq in survivors:
+                        self._fold_into_base(conn, table, workflow_id, first_seq)
                 
                 # 清理旧的状态快照
                 cursor.execute("DELETE FROM state_snapshots WHERE timestamp < ?", (cutoff_str,))
@@ -931,6 +1200,31 @@ class WorkflowStateManager:
             logger.error(f"数据清理失败: {e}")
             return {"status": "error", "message": str(e)}
     
+    def _delta_statistics(self) -> Dict[str, Any]:
+        """增量编码的存储与恢复延迟统计"""
+        def latency_ms(samples) -> Dict[str, float]:
+            values = list(samples)
+            return {
+                "count": len(values),
+                "average": sum(values) / len(values) * 1000 if values else 0.0,
+                "max": max(values) * 1000 if values else 0.0
+            }
+        
+        stored_bytes = dict(self.delta_stats["stored_bytes"])
+        delta_rows = self.delta_stats["snapshot_rows"]["delta"] + self.delta_stats["checkpoint_rows"]["delta"]
+        full_rows = self.delta_stats["snapshot_rows"]["full"] + self.delta_stats["checkpoint_rows"]["full"]
+        return {
+            "snapshot_rows": dict(self.delta_stats["snapshot_rows"]),
+            "checkpoint_rows": dict(self.delta_stats["checkpoint_rows"]),
+            "stored_bytes": stored_bytes,
+            "average_full_bytes": stored_bytes["full"] / full_rows if full_rows else 0,
+            "average_delta_bytes": stored_bytes["delta"] / delta_rows if delta_rows else 0,
+            "compactions": self.delta_stats["compactions"],
+            "folded_rows": self.delta_stats["folded_rows"],
+            "restore_latency_ms": latency_ms(self.delta_stats["restore_latency"]),
+            "history_rebuild_latency_ms": latency_ms(self.delta_stats["history_rebuild_latency"])
+        }
+    
     def get_statistics(self) -> Dict[str, Any]:
         """获取统计信息"""
         try:
@@ -941,9 +1235,12 @@ class WorkflowStateManager:
                     "total_transitions": sum(len(transitions) for transitions in self.transitions.values()),
                     "total_checkpoints": sum(len(checkpoints) for checkpoints in self.checkpoints.values()),
                     "workflow_status_distribution": defaultdict(int),
+                    "persistence": self.persistence.get_stats(),
+                    "delta_encoding": self._delta_statistics(),
                     "memory_usage": {
                         "workflow_states": len(self.workflow_states),
                         "state_history_size": sum(len(history) for history in self.state_history.values()),
+                        "state_history_delta_ops": sum(history.encoded_size() for history in self.state_history.values()),
                         "transitions_size": sum(len(transitions) for transitions in self.transitions.values()),
                         "checkpoints_size": sum(len(checkpoints) for checkpoints in self.checkpoints.values())
                     }
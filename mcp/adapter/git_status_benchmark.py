@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Git状态采集基准测试
+在临时目录生成合成仓库 (N个分支, M个已修改的跟踪文件), 对比:
+  - legacy: 原 GitMonitorEngine 的方式, 每个分支一次 git log -1, 每个文件一次 git diff --numstat,
+            外加两次 git status --porcelain
+  - batched: GitStatusCollector, status v2 + for-each-ref + diff --numstat 各一次
+
+用法:
+    python git_status_benchmark.py --scales 50x500,200x2000,500x5000 --repeat 5
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import List, Tuple
+
+try:
+    from .git_status_collector import GitStatusCollector
+except ImportError:
+    from git_status_collector import GitStatusCollector
+
+GIT_ENV = {
+    **os.environ,
+    "GIT_AUTHOR_NAME": "bench", "GIT_AUTHOR_EMAIL": "bench@example.com",
+    "GIT_COMMITTER_NAME": "bench", "GIT_COMMITTER_EMAIL": "bench@example.com"
+}
+
+
+def git(repo: str, *args: str, input_data: bytes = None) -> bytes:
+    return subprocess.run(["git", *args], cwd=repo, env=GIT_ENV, input=input_data,
+                          check=True, capture_output=True).stdout
+
+
+def build_repo(root: str, branches: int, files: int) -> str:
+    """生成合成仓库: 提交 files 个文件, 建立 branches 个分支, 再修改全部文件"""
+    repo = os.path.join(root, f"repo_{branches}x{files}")
+    os.makedirs(repo)
+    git(repo, "init", "-q", "-b", "main")
+    for i in range(files):
+        directory = os.path.join(repo, f"pkg_{i // 100:03d}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"module_{i:05d}.py"), "w") as f:
+            f.write(f"VALUE = {i}\n")
+    git(repo, "add", ".")
+    git(repo, "commit", "-q", "-m", "synthetic tree")
+
+    head = git(repo, "rev-parse", "HEAD").decode().strip()
+    updates = "".join(f"create refs/heads/feature/branch-{i:04d} {head}\n" for i in range(branches - 1))
+    git(repo, "update-ref", "--stdin", input_data=updates.encode())
+
+    for i in range(files):
+        with open(os.path.join(repo, f"pkg_{i // 100:03d}", f"module_{i:05d}.py"), "a") as f:
+            f.write("CHANGED = True\n")
+    # 刷新索引中的 stat 信息, 避免第一次测量包含索引刷新
+    git(repo, "status", "--porcelain")
+    return repo
+
+
+def legacy_collect(repo: str) -> int:
+    """模拟原实现的逐分支/逐文件子进程调用, 返回子进程数"""
+    commands = 0
+
+    def run(*args: str) -> str:
+        nonlocal commands
+        commands += 1
+        return subprocess.run(["git", *args], cwd=repo, capture_output=True, text=True).stdout
+
+    current = run("branch", "--show-current").strip()
+    run("log", "-1", "--format=%H")
+    for line in run("branch", "-a").split("\n"):
+        name = line.replace("*", "").strip()
+        if name and name != current:
+            run("log", "-1", "--format=%H", name)
+    status = run("status", "--porcelain")
+    for line in status.split("\n"):
+        if line.strip() and not line.startswith("??"):
+            run("diff", "--numstat", line[3:])
+    run("diff", "--cached", "--name-status")
+    run("ls-files", "--others", "--exclude-standard")
+    run("stash", "list")
+    run("status", "--porcelain")
+    return commands
+
+
+def measure(func, repeat: int) -> Tuple[float, List[float]]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), samples
+
+
+def parse_scales(value: str) -> List[Tuple[int, int]]:
+    scales = []
+    for item in value.split(","):
+        branches, files = item.lower().split("x")
+        scales.append((int(branches), int(files)))
+    return scales
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Git状态采集基准测试")
+    parser.add_argument("--scales", default="50x500,200x2000,500x5000", help="分支数x修改文件数, 逗号分隔")
+    parser.add_argument("--repeat", type=int, default=5, help="batched 每个规模的测量次数")
+    parser.add_argument("--legacy-repeat", type=int, default=1, help="legacy 每个规模的测量次数, 0 表示跳过")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="git_status_bench_")
+    try:
+        print("🚀 Git状态采集基准测试")
+        print(f"   {'规模':<14}{'legacy':>12}{'子进程':>8}{'batched':>12}{'子进程':>8}{'加速':>9}")
+        for branches, files in parse_scales(args.scales):
+            start = time.perf_counter()
+            repo = build_repo(root, branches, files)
+            build_seconds = time.perf_counter() - start
+
+            collector = GitStatusCollector(repo)
+            snapshot = collector.collect(include_head_commit=True)
+            assert len(snapshot.refs) == branches and len(snapshot.numstat) == files, "采集结果不完整"
+            batched, _ = measure(lambda: collector.collect(include_head_commit=True), args.repeat)
+            collector.close()
+
+            if args.legacy_repeat > 0:
+                legacy_commands = legacy_collect(repo)
+                legacy, _ = measure(lambda: legacy_collect(repo), args.legacy_repeat)
+                legacy_text = f"{legacy * 1000:>10.0f}ms{legacy_commands:>8}"
+                speedup = f"{legacy / batched:>8.0f}x"
+            else:
+                legacy_text, speedup = f"{'-':>12}{'-':>8}", f"{'-':>9}"
+
+            print(f"   {f'{branches}分支/{files}文件':<14}{legacy_text}"
+                  f"{batched * 1000:>10.0f}ms{snapshot.commands_run:>8}{speedup}"
+                  f"   (建库 {build_seconds:.1f}s)")
+            shutil.rmtree(repo, ignore_errors=True)
+        print("✅ 基准测试完成")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+批量Git状态采集器
+供 developer_dashboard 的 GitMonitorEngine 和 development_intervention_mcp 的 GitMonitor 共用
+
+一次采集的 git 子进程数固定, 与分支数和文件数无关:
+- git status --porcelain=v2 --branch --show-stash -z: 分支、HEAD、上游及 ahead/behind、stash 数、所有文件状态
+- git for-each-ref: 所有本地/远程分支的提交、上游、跟踪状态和提交时间 (可选)
+- git diff --numstat -z: 所有工作区变更文件的增删行数 (可选, 无变更时跳过)
+提交详情通过常驻的 git cat-file --batch 进程读取, 不再为每个提交启动子进程
+"""
+
+import logging
+import os
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# for-each-ref 字段, 以 NUL 分隔, 每个分支一行 (主题行不含换行)
+REF_FORMAT = "%00".join([
+    "%(refname)",
+    "%(objectname)",
+    "%(upstream:short)",
+    "%(upstream:remoteref)",
+    "%(upstream:track,nobracket)",
+    "%(HEAD)",
+    "%(committerdate:unix)",
+    "%(contents:subject)"
+])
+
+# 冲突状态 (porcelain v2 中 u 开头的条目)
+UNMERGED_CODES = frozenset({"DD", "AU", "UD", "UA", "DU", "AA", "UU"})
+
+
+@dataclass
+class GitFileEntry:
+    """一个文件的状态; 状态码与 porcelain v1 一致, 未修改为空格"""
+    path: str
+    index_status: str               # X: 暂存区相对HEAD
+    worktree_status: str            # Y: 工作区相对暂存区
+    orig_path: Optional[str] = None # 重命名/复制前的路径
+
+    @property
+    def code(self) -> str:
+        return self.index_status + self.worktree_status
+
+    @property
+    def is_untracked(self) -> bool:
+        return self.code == "??"
+
+    @property
+    def is_unmerged(self) -> bool:
+        return self.code in UNMERGED_CODES
+
+
+@dataclass
+class GitRefEntry:
+    """一个分支引用"""
+    refname: str                    # refs/heads/main, refs/remotes/origin/main
+    object_name: str
+    upstream: Optional[str] = None          # origin/main
+    upstream_branch: Optional[str] = None   # 上游仓库中的分支名, 如 refs/heads/main
+    ahead: int = 0
+    behind: int = 0
+    upstream_gone: bool = False
+    is_head: bool = False
+    committer_time: int = 0
+    subject: str = ""
+
+    @property
+    def is_remote(self) -> bool:
+        return self.refname.startswith("refs/remotes/")
+
+    @property
+    def short_name(self) -> str:
+        for prefix in ("refs/heads/", "refs/remotes/"):
+            if self.refname.startswith(prefix):
+                return self.refname[len(prefix):]
+        return self.refname
+
+
+@dataclass
+class GitCommitDetails:
+    """从 cat-file 读取的提交详情"""
+    hash: str
+    author: str
+    author_time: int
+    committer_time: int
+    subject: str
+
+
+@dataclass
+class GitStatusSnapshot:
+    """一次批量采集的结果"""
+    repo_path: str
+    branch: str                     # 分离HEAD时为空字符串
+    head_oid: Optional[str]         # 尚无提交时为 None
+    upstream: Optional[str] = None
+    ahead: int = 0
+    behind: int = 0
+    stash_count: int = 0
+    files: List[GitFileEntry] = field(default_factory=list)
+    refs: List[GitRefEntry] = field(default_factory=list)
+    numstat: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    head_commit: Optional[GitCommitDetails] = None
+    commands_run: int = 0
+    collect_seconds: float = 0.0
+
+    @property
+    def is_detached(self) -> bool:
+        return not self.branch
+
+    @property
+    def staged(self) -> List[GitFileEntry]:
+        return [f for f in self.files if f.index_status not in (" ", "?", "!") and not f.is_unmerged]
+
+    @property
+    def unstaged(self) -> List[GitFileEntry]:
+        return [f for f in self.files if f.worktree_status not in (" ", "?", "!") and not f.is_unmerged]
+
+    @property
+    def untracked(self) -> List[GitFileEntry]:
+        return [f for f in self.files if f.is_untracked]
+
+    @property
+    def conflicts(self) -> List[GitFileEntry]:
+        return [f for f in self.files if f.is_unmerged]
+
+
+class GitCommandError(RuntimeError):
+    """git 命令执行失败"""
+
+
+class GitCatFileBatch:
+    """常驻的 git cat-file --batch 进程, 按需读取对象 (线程安全, 进程退出后自动重启)"""
+
+    def __init__(self, repo_path: str, timeout: float = 10.0):
+        self.repo_path = repo_path
+        self.timeout = timeout
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def _ensure_process(self) -> subprocess.Popen:
+        if self._process is None or self._process.poll() is not None:
+            self._process = subprocess.Popen(
+                ["git", "cat-file", "--batch"], cwd=self.repo_path,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return self._process
+
+    def read(self, rev: str) -> Optional[Tuple[str, str, bytes]]:
+        """读取对象, 返回 (对象名, 类型, 内容); 对象不存在时返回 None"""
+        if "\n" in rev:
+            raise ValueError(f"无效的版本: {rev!r}")
+        with self._lock:
+            for attempt in range(2):
+                process = self._ensure_process()
+                try:
+                    process.stdin.write(rev.encode("utf-8") + b"\n")
+                    process.stdin.flush()
+                    header = process.stdout.readline()
+                    if not header:
+                        raise BrokenPipeError("cat-file 进程已退出")
+                    parts = header.split()
+                    if len(parts) != 3:
+                        # "<rev> missing" 或 "<rev> ambiguous"
+                        return None
+                    oid, obj_type, size = parts[0].decode(), parts[1].decode(), int(parts[2])
+                    data = process.stdout.read(size + 1)[:size]
+                    self.requests += 1
+                    return oid, obj_type, data
+                except (BrokenPipeError, OSError, ValueError) as e:
+                    self._kill()
+                    if attempt:
+                        raise GitCommandError(f"git cat-file --batch 失败: {e}") from e
+        return None
+
+    def commit_details(self, rev: str = "HEAD") -> Optional[GitCommitDetails]:
+        """读取提交的作者、时间和主题行"""
+        obj = self.read(rev)
+        if obj is None or obj[1] != "commit":
+            return None
+        oid, _, data = obj
+        header, _, message = data.decode("utf-8", "replace").partition("\n\n")
+        author, author_time, committer_time = "", 0, 0
+        for line in header.split("\n"):
+            if line.startswith("author "):
+                author, author_time = _parse_signature(line[len("author "):])
+            elif line.startswith("committer "):
+                committer_time = _parse_signature(line[len("committer "):])[1]
+        return GitCommitDetails(oid, author, author_time, committer_time,
+                                message.split("\n", 1)[0])
+
+    def _kill(self):
+        if self._process is not None:
+            try:
+                self._process.kill()
+                self._process.wait(timeout=self.timeout)
+            except Exception:
+                pass
+            self._release()
+
+    def _release(self):
+        for stream in (self._process.stdin, self._process.stdout):
+            try:
+                stream.close()
+            except Exception:
+                pass
+        self._process = None
+
+    def close(self):
+        """关闭常驻进程"""
+        with self._lock:
+            if self._process is None:
+                return
+            try:
+                self._process.stdin.close()
+                self._process.wait(timeout=self.timeout)
+            except Exception:
+                self._kill()
+            else:
+                self._release()
+
+
+def _parse_signature(value: str) -> Tuple[str, int]:
+    """解析 'Name <email> 1700000000 +0800', 返回 (名字, 时间戳)"""
+    name, _, rest = value.rpartition(">")
+    name = name.split("<", 1)[0].strip()
+    parts = rest.split()
+    try:
+        return name, int(parts[0]) if parts else 0
+    except ValueError:
+        return name, 0
+
+
+def _status_code(code: str) -> str:
+    """porcelain v2 用 '.' 表示未修改, 转为 v1 的空格"""
+    return " " if code == "." else code
+
+
+def parse_status_v2(output: bytes, snapshot: GitStatusSnapshot):
+    """解析 git status --porcelain=v2 --branch -z 的输出"""
+    records = output.split(b"\0")
+    i = 0
+    while i < len(records):
+        record = records[i].decode("utf-8", "surrogateescape")
+        i += 1
+        if not record:
+            continue
+        kind = record[0]
+        if kind == "#":
+            key, _, value = record[2:].partition(" ")
+            if key == "branch.oid":
+                snapshot.head_oid = None if value == "(initial)" else value
+            elif key == "branch.head":
+                snapshot.branch = "" if value == "(detached)" else value
+            elif key == "branch.upstream":
+                snapshot.upstream = value
+            elif key == "branch.ab":
+                ahead, _, behind = value.partition(" ")
+                snapshot.ahead, snapshot.behind = int(ahead), abs(int(behind))
+            elif key == "stash":
+                snapshot.stash_count = int(value)
+        elif kind == "1":
+            # 1 XY sub mH mI mW hH hI path
+            fields = record.split(" ", 8)
+            snapshot.files.append(GitFileEntry(fields[8], _status_code(fields[1][0]), _status_code(fields[1][1])))
+        elif kind == "2":
+            # 2 XY sub mH mI mW hH hI Xscore path \0 origPath
+            fields = record.split(" ", 9)
+            orig_path = records[i].decode("utf-8", "surrogateescape") if i < len(records) else None
+            i += 1
+            snapshot.files.append(GitFileEntry(fields[9], _status_code(fields[1][0]),
+                                               _status_code(fields[1][1]), orig_path))
+        elif kind == "u":
+            # u XY sub m1 m2 m3 mW h1 h2 h3 path
+            fields = record.split(" ", 10)
+            snapshot.files.append(GitFileEntry(fields[10], fields[1][0], fields[1][1]))
+        elif kind in "?!":
+            snapshot.files.append(GitFileEntry(record[2:], kind, kind))
+
+
+def parse_for_each_ref(output: bytes) -> List[GitRefEntry]:
+    """解析按 REF_FORMAT 输出的 for-each-ref 结果"""
+    refs = []
+    for line in output.decode("utf-8", "replace").split("\n"):
+        if not line:
+            continue
+        fields = line.split("\0")
+        if len(fields) < 8:
+            continue
+        refname, object_name, upstream, upstream_branch, track, head, committer_time, subject = fields[:8]
+        ref = GitRefEntry(
+            refname=refname,
+            object_name=object_name,
+            upstream=upstream or None,
+            upstream_branch=upstream_branch or None,
+            is_head=head == "*",
+            committer_time=int(committer_time) if committer_time.isdigit() else 0,
+            subject=subject
+        )
+        # "ahead 1, behind 2" / "gone" / ""
+        for part in track.split(", "):
+            name, _, count = part.partition(" ")
+            if name == "ahead" and count.isdigit():
+                ref.ahead = int(count)
+            elif name == "behind" and count.isdigit():
+                ref.behind = int(count)
+            elif name == "gone":
+                ref.upstream_gone = True
+        refs.append(ref)
+    return refs
+
+
+def parse_numstat(output: bytes) -> Dict[str, Tuple[int, int]]:
+    """解析 git diff --numstat -z 的输出; 二进制文件记为 0 行"""
+    numstat = {}
+    records = output.split(b"\0")
+    i = 0
+    while i < len(records):
+        record = records[i].decode("utf-8", "surrogateescape")
+        i += 1
+        if not record:
+            continue
+        parts = record.split("\t", 2)
+        if len(parts) != 3:
+            continue
+        added = int(parts[0]) if parts[0].isdigit() else 0
+        deleted = int(parts[1]) if parts[1].isdigit() else 0
+        path = parts[2]
+        if not path:
+            # 重命名: 后跟 \0 原路径 \0 新路径
+            path = records[i + 1].decode("utf-8", "surrogateescape") if i + 1 < len(records) else ""
+            i += 2
+        numstat[path] = (added, deleted)
+    return numstat
+
+
+class GitStatusCollector:
+    """批量采集Git仓库状态, 子进程数不随分支数和文件数增长"""
+
+    def __init__(self, repo_path: str, timeout: float = 30.0, use_cat_file: bool = True):
+        """
+        Args:
+            repo_path: 仓库工作区路径
+            timeout: 单个 git 命令超时 (秒)
+            use_cat_file: 是否保持常驻的 cat-file --batch 进程读取提交详情
+        """
+        self.repo_path = os.path.abspath(repo_path)
+        self.timeout = timeout
+        self.cat_file = GitCatFileBatch(self.repo_path, timeout) if use_cat_file else None
+        self.stats = {
+            "collections": 0,
+            "commands_run": 0,
+            "last_collect_seconds": 0.0
+        }
+
+    def _run(self, args: List[str]) -> bytes:
+        """执行 git 命令并返回原始输出; 失败时抛出 GitCommandError"""
+        try:
+            result = subprocess.run(
+                ["git", *args], cwd=self.repo_path, capture_output=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired as e:
+            raise GitCommandError(f"Git命令超时: git {' '.join(args)}") from e
+        except OSError as e:
+            raise GitCommandError(f"Git命令执行失败: git {' '.join(args)} - {e}") from e
+        finally:
+            self.stats["commands_run"] += 1
+        if result.returncode != 0:
+            raise GitCommandError(
+                f"Git命令失败: git {' '.join(args)} - {result.stderr.decode('utf-8', 'replace').strip()}")
+        return result.stdout
+
+    def collect(self, include_refs: bool = True, include_numstat: bool = True,
+                untracked_files: str = "all", include_head_commit: bool = False) -> GitStatusSnapshot:
+        """
+        采集一次仓库状态
+
+        Args:
+            include_refs: 是否用 for-each-ref 采集所有分支
+            include_numstat: 是否采集工作区变更文件的增删行数
+            untracked_files: 未跟踪文件模式, 'all' 列出每个文件, 'normal' 只列目录
+            include_head_commit: 是否读取HEAD提交的作者、时间和主题行
+
+        Raises:
+            GitCommandError: status 命令失败 (如不是Git仓库)
+        """
+        start = time.perf_counter()
+        commands_before = self.stats["commands_run"]
+        snapshot = GitStatusSnapshot(repo_path=self.repo_path, branch="", head_oid=None)
+
+        parse_status_v2(self._run([
+            "status", "--porcelain=v2", "--branch", "--show-stash", "-z",
+            f"--untracked-files={untracked_files}"
+        ]), snapshot)
+
+        if include_refs:
+            try:
+                snapshot.refs = parse_for_each_ref(self._run([
+                    "for-each-ref", f"--format={REF_FORMAT}", "refs/heads", "refs/remotes"]))
+            except GitCommandError as e:
+                logger.warning(f"采集分支失败: {e}")
+
+        if include_numstat and snapshot.unstaged:
+            try:
+                snapshot.numstat = parse_numstat(self._run(["diff", "--numstat", "-z"]))
+            except GitCommandError as e:
+                logger.warning(f"采集行数变化失败: {e}")
+
+        if include_head_commit and snapshot.head_oid:
+            snapshot.head_commit = self.commit_details(snapshot.head_oid)
+
+        snapshot.commands_run = self.stats["commands_run"] - commands_before
+        snapshot.collect_seconds = time.perf_counter() - start
+        self.stats["collections"] += 1
+        self.stats["last_collect_seconds"] = snapshot.collect_seconds
+        return snapshot
+
+    def commit_details(self, rev: str = "HEAD") -> Optional[GitCommitDetails]:
+        """读取提交详情; 未启用 cat-file 时退回一次 git log"""
+        try:
+            if self.cat_file is not None:
+                return self.cat_file.commit_details(rev)
+            output = self._run(["log", "-1", "--format=%H%x00%an%x00%at%x00%ct%x00%s", rev, "--"])
+        except GitCommandError as e:
+            logger.warning(f"读取提交失败 {rev}: {e}")
+            return None
+        fields = output.decode("utf-8", "replace").rstrip("\n").split("\0")
+        if len(fields) != 5:
+            return None
+        return GitCommitDetails(fields[0], fields[1], int(fields[2]), int(fields[3]), fields[4])
+
+    def close(self):
+        """关闭常驻的 cat-file 进程"""
+        if self.cat_file is not None:
+            self.cat_file.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "cat_file_requests": self.cat_file.requests if self.cat_file else 0
+        }
@@ -6,10 +6,12 @@ import cv2
 import numpy as np
 from PIL import Image, ImageEnhance, ImageFilter
 import logging
-from typing import Tuple, List, Optional
+from typing import Tuple, List, Optional, Union
 from dataclasses import dataclass
 import os
 
+from shared_image import SharedImage
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -48,34 +50,27 @@ class ImagePreprocessor:
     def __init__(self, config: PreprocessConfig = None):
         self.config = config or PreprocessConfig()
         
-    def optimize_for_ocr(self, image_path: str, output_path: str = None) -> str:
+    def optimize_for_ocr(self, image_path: Union[str, SharedImage], output_path: str = None) -> str:
         """
         为OCR优化图像
         
         Args:
-            image_path: 输入图像路径
+            image_path: 输入图像路径或已解码的SharedImage
             output_path: 输出图像路径，None则自动生成
             
         Returns:
             str: 优化后的图像路径
         """
-        logger.info(f"🔧 开始图像预处理: {image_path}")
+        image = SharedImage.load(image_path)
+        logger.info(f"🔧 开始图像预处理: {image.source}")
         
         # 生成输出路径
         if output_path is None:
-            base_name = os.path.splitext(os.path.basename(image_path))[0]
+            base_name = os.path.splitext(os.path.basename(image.source))[0]
             output_path = f"{base_name}_optimized.jpg"
         
-        # 读取图像
-        image = cv2.imread(image_path)
-        if image is None:
-            raise ValueError(f"无法读取图像: {image_path}")
-        
-        original_shape = image.shape
-        logger.info(f"📐 原始图像尺寸: {original_shape[1]}x{original_shape[0]}")
-        
         # 预处理流水线
-        processed_image = self._preprocessing_pipeline(image)
+        processed_image = self.optimize_image(image)
         
         # 保存优化后的图像
         cv2.imwrite(output_path, processed_image, [
@@ -87,6 +82,23 @@ class ImagePreprocessor:
         
         return output_path
     
+    def optimize_image(self, image: Union[str, bytes, SharedImage]) -> np.ndarray:
+        """
+        为OCR优化图像，不写文件
+        
+        直接使用SharedImage的灰度/缩放视图，不重复解码
+        
+        Returns:
+            np.ndarray: 优化后的灰度图像
+        """
+        image = SharedImage.load(image)
+        logger.info(f"📐 原始图像尺寸: {image.width}x{image.height}")
+        
+        # 1. 尺寸优化 + 2. 颜色空间转换（共享的灰度缩放视图）
+        gray = image.resized(self._target_size(image.width, image.height), view="gray")
+        
+        return self._grayscale_pipeline(gray)
+    
     def _preprocessing_pipeline(self, image: np.ndarray) -> np.ndarray:
         """预处理流水线"""
         
@@ -97,7 +109,12 @@ class ImagePreprocessor:
         if len(image.shape) == 3:
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         else:
-            gray = image.copy()
+            gray = image
+        
+        return self._grayscale_pipeline(gray)
+    
+    def _grayscale_pipeline(self, gray: np.ndarray) -> np.ndarray:
+        """灰度图像预处理流水线（不修改输入）"""
         
         # 3. 噪声去除
         denoised = self._remove_noise(gray)
@@ -116,10 +133,8 @@ class ImagePreprocessor:
         
         return final_image
     
-    def _resize_image(self, image: np.ndarray) -> np.ndarray:
-        """智能调整图像尺寸"""
-        height, width = image.shape[:2]
-        
+    def _target_size(self, width: int, height: int) -> Tuple[int, int]:
+        """计算缩放后的尺寸 (宽, 高)"""
         # 计算缩放比例
         scale_w = self.config.max_width / width
         scale_h = self.config.max_height / height
@@ -134,14 +149,23 @@ class ImagePreprocessor:
         if scale != 1.0:
             new_width = int(width * scale)
             new_height = int(height * scale)
-            
+            logger.info(f"📏 图像缩放: {width}x{height} -> {new_width}x{new_height} (比例: {scale:.2f})")
+            return new_width, new_height
+        
+        return width, height
+    
+    def _resize_image(self, image: np.ndarray) -> np.ndarray:
+        """智能调整图像尺寸"""
+        height, width = image.shape[:2]
+        new_width, new_height = self._target_size(width, height)
+        
+        if (new_width, new_height) != (width, height):
             # 使用高质量插值
             image = cv2.resize(
                 image, 
                 (new_width, new_height), 
                 interpolation=cv2.INTER_CUBIC
             )
-            logger.info(f"📏 图像缩放: {width}x{height} -> {new_width}x{new_height} (比例: {scale:.2f})")
         
         return image
     
@@ -289,11 +313,14 @@ class ImagePreprocessor:
         base_name = os.path.splitext(os.path.basename(image_path))[0]
         versions = []
         
+        # 三个版本共用一次解码
+        image = SharedImage.load(image_path)
+        
         # 版本1: 标准预处理
         standard_config = PreprocessConfig()
         standard_processor = ImagePreprocessor(standard_config)
         standard_path = f"{base_name}_standard.jpg"
-        standard_processor.optimize_for_ocr(image_path, standard_path)
+        standard_processor.optimize_for_ocr(image, standard_path)
         versions.append(standard_path)
         
         # 版本2: 高对比度版本（适合Tesseract）
@@ -304,7 +331,7 @@ class ImagePreprocessor:
         )
         high_contrast_processor = ImagePreprocessor(high_contrast_config)
         high_contrast_path = f"{base_name}_high_contrast.jpg"
-        high_contrast_processor.optimize_for_ocr(image_path, high_contrast_path)
+        high_contrast_processor.optimize_for_ocr(image, high_contrast_path)
         versions.append(high_contrast_path)
         
         # 版本3: 平滑版本（适合EasyOCR）
@@ -316,7 +343,7 @@ class ImagePreprocessor:
         )
         smooth_processor = ImagePreprocessor(smooth_config)
         smooth_path = f"{base_name}_smooth.jpg"
-        smooth_processor.optimize_for_ocr(image_path, smooth_path)
+        smooth_processor.optimize_for_ocr(image, smooth_path)
         versions.append(smooth_path)
         
         logger.info(f"✅ 创建了 {len(versions)} 个预处理版本")
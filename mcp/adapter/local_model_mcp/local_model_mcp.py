@@ -10,7 +10,7 @@ import json
 import asyncio
 import logging
 import time
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, AsyncIterator
 from pathlib import Path
 import toml
 
@@ -19,6 +19,7 @@ project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 from .models.model_manager import ModelManager
+from .models.request_coalescer import RequestCoalescer
 from .ocr.ocr_engine import OCREngine
 from .utils.device_utils import DeviceUtils
 from .utils.memory_utils import MemoryUtils
@@ -41,6 +42,12 @@ class LocalModelMCP:
         
         # 初始化组件
         self.model_manager = ModelManager(self.config)
+        coalescing_config = self.config.get("coalescing", {})
+        self.coalescer = RequestCoalescer(
+            self.model_manager,
+            batch_window=coalescing_config.get("batch_window_ms", 10) / 1000,
+            max_batch_size=coalescing_config.get("max_batch_size", 8)
+        ) if coalescing_config.get("enabled", True) else None
         self.ocr_engine = OCREngine(self.config) if self.config.get("ocr", {}).get("enabled", False) else None
         self.device_utils = DeviceUtils()
         self.memory_utils = MemoryUtils()
@@ -68,7 +75,10 @@ class LocalModelMCP:
             "average_response_time": 0,
             "model_switches": 0,
             "ocr_requests": 0,
-            "workflow_requests": 0
+            "workflow_requests": 0,
+            "streaming_requests": 0,
+            "average_time_to_first_token": 0,
+            "average_tokens_per_second": 0
         }
         
         # 初始化OCR工作流接口
@@ -179,13 +189,15 @@ class LocalModelMCP:
             logger.error(f"LocalModelMCP初始化失败: {e}")
             return False
     
-    async def chat_completion(self, messages: List[Dict[str, str]], model: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+    async def chat_completion(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+                              stream: bool = False, **kwargs) -> Dict[str, Any]:
         """
         聊天完成接口
         
         Args:
             messages: 消息列表
             model: 指定模型名称，None则使用当前模型
+            stream: 是否流式输出，为True时结果的"stream"为增量文本的异步迭代器
             **kwargs: 其他参数
             
         Returns:
@@ -193,6 +205,13 @@ class LocalModelMCP:
         """
         start_time = time.time()
         
+        if stream:
+            return {
+                "success": True,
+                "model": model or self.current_model or self.config["models"]["default_model"],
+                "stream": self.stream_chat_completion(messages, model, **kwargs)
+            }
+        
         try:
             if not self.initialized:
                 await self.initialize()
@@ -231,6 +250,42 @@ class LocalModelMCP:
                 "processing_time": time.time() - start_time
             }
     
+    async def stream_chat_completion(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+                                     **kwargs) -> AsyncIterator[str]:
+        """
+        流式聊天完成接口，逐个产出增量文本
+        
+        完成后记录首个token延迟和生成速度 (按流式分块计)
+        
+        Args:
+            messages: 消息列表
+            model: 指定模型名称，None则使用当前模型
+            **kwargs: 其他参数
+        """
+        start_time = time.time()
+        
+        if not self.initialized:
+            await self.initialize()
+        
+        # 选择模型
+        target_model = model or self.current_model or self.config["models"]["default_model"]
+        
+        # 自动切换模型（如果需要）
+        if target_model != self.current_model:
+            if not await self._switch_model(target_model):
+                raise RuntimeError(f"模型切换失败: {target_model}")
+        
+        first_token_time = None
+        tokens = 0
+        async for token in self.model_manager.stream_chat_completion(messages, target_model, **kwargs):
+            if first_token_time is None:
+                first_token_time = time.time()
+            tokens += 1
+            yield token
+        
+        self._update_stats(start_time, {"tokens": tokens})
+        self._update_stream_stats(start_time, first_token_time, tokens)
+    
     async def text_generation(self, prompt: str, model: Optional[str] = None, **kwargs) -> Dict[str, Any]:
         """
         文本生成接口
@@ -261,8 +316,11 @@ class LocalModelMCP:
                         "model": self.current_model
                     }
             
-            # 调用模型生成
-            result = await self.model_manager.text_generation(prompt, target_model, **kwargs)
+            # 调用模型生成（相同的在途请求共享结果，不同请求合并为微批次）
+            if self.coalescer:
+                result = await self.coalescer.submit(prompt, target_model, **kwargs)
+            else:
+                result = await self.model_manager.text_generation(prompt, target_model, **kwargs)
             
             # 更新统计
             self._update_stats(start_time, result)
@@ -335,15 +393,10 @@ class LocalModelMCP:
             bool: 切换是否成功
         """
         try:
+            # 之前的模型保持常驻，超出内存预算时由模型管理器按LRU淘汰
             if not await self.model_manager.load_model(model_name):
                 return False
             
-            # 卸载当前模型（如果配置了自动卸载）
-            if (self.current_model and 
-                self.current_model != model_name and 
-                self.config.get("performance", {}).get("auto_unload_inactive", False)):
-                await self.model_manager.unload_model(self.current_model)
-            
             self.current_model = model_name
             self.stats["model_switches"] += 1
             
@@ -369,6 +422,25 @@ class LocalModelMCP:
         if isinstance(result, dict) and "tokens" in result:
             self.stats["total_tokens_generated"] += result.get("tokens", 0)
     
+    def _update_stream_stats(self, start_time: float, first_token_time: Optional[float], tokens: int):
+        """更新流式统计：首个token延迟和首个token之后的生成速度"""
+        if first_token_time is None:
+            return
+        
+        self.stats["streaming_requests"] += 1
+        count = self.stats["streaming_requests"]
+        
+        ttft = first_token_time - start_time
+        self.stats["average_time_to_first_token"] = (
+            self.stats["average_time_to_first_token"] * (count - 1) + ttft
+        ) / count
+        
+        decode_time = time.time() - first_token_time
+        tokens_per_second = (tokens - 1) / decode_time if tokens > 1 and decode_time > 0 else 0
+        self.stats["average_tokens_per_second"] = (
+            self.stats["average_tokens_per_second"] * (count - 1) + tokens_per_second
+        ) / count
+    
     async def process_ocr_workflow(self, request: Union[Dict[str, Any], OCRWorkflowRequest]) -> OCRWorkflowResult:
         """
         处理OCR工作流请求 - 新的workflow兼容接口
@@ -434,7 +506,8 @@ class LocalModelMCP:
                 "models": model_status,
                 "ocr_enabled": self.ocr_engine is not None,
                 "memory": memory_info,
-                "statistics": self.stats
+                "statistics": self.stats,
+                "coalescing": self.coalescer.get_stats() if self.coalescer else None
             }
             
         except Exception as e:
@@ -462,7 +535,9 @@ class LocalModelMCP:
                 "chat_completion": True,
                 "ocr_processing": self.ocr_engine is not None,
                 "model_switching": True,
-                "batch_processing": False  # 待实现
+                "streaming": True,
+                "request_coalescing": self.coalescer is not None,
+                "batch_processing": self.coalescer is not None
             }
         }
     
@@ -471,6 +546,10 @@ class LocalModelMCP:
         try:
             logger.info("开始关闭LocalModelMCP...")
             
+            # 完成等待中的合并请求
+            if self.coalescer:
+                await self.coalescer.shutdown()
+            
             # 卸载所有模型
             if self.model_manager:
                 await self.model_manager.shutdown()
@@ -6,13 +6,21 @@ import base64
 import json
 import logging
 import time
-from typing import Dict, List, Any, Optional, Tuple
+import sys
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple, AsyncIterator
 from dataclasses import dataclass
 from PIL import Image
 import io
 import asyncio
 import aiohttp
 
+try:
+    from ..batch_http_client import BatchHTTPClient, BatchClientConfig
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from batch_http_client import BatchHTTPClient, BatchClientConfig
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -28,21 +36,31 @@ class MistralOCRResult:
 class MistralOCREngine:
     """Mistral OCR LLM引擎"""
     
-    def __init__(self, api_key: str, base_url: str = "https://openrouter.ai/api/v1"):
+    def __init__(self, api_key: str, base_url: str = "https://openrouter.ai/api/v1",
+                 concurrency: int = 8, requests_per_second: float = 0.0, max_retries: int = 3):
         self.api_key = api_key
         self.base_url = base_url
         self.model_name = "mistralai/mistral-nemo"  # Mistral 12B OCR模型
         self.session = None
         
+        # 共享连接池: 并发上限、按模型限速、429/5xx退避重试
+        # max_retries 与 process_image 一致, 为含首次请求的总尝试次数
+        self.http = BatchHTTPClient(BatchClientConfig(
+            concurrency=concurrency,
+            requests_per_second=requests_per_second,
+            max_retries=max(0, max_retries - 1)
+        ))
+        
     async def __aenter__(self):
         """异步上下文管理器入口"""
-        self.session = aiohttp.ClientSession()
+        await self.http.open()
+        self.session = self.http.session
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """异步上下文管理器出口"""
-        if self.session:
-            await self.session.close()
+        await self.http.close()
+        self.session = None
     
     def _encode_image(self, image_path: str) -> str:
         """将图像编码为base64"""
@@ -124,7 +142,7 @@ class MistralOCREngine:
         Args:
             image_path: 图像路径
             task_type: 任务类型 (comprehensive/table_focus/handwriting_focus/form_focus)
-            max_retries: 最大重试次数
+            max_retries: 最大尝试次数, 含首次请求 (仅429/5xx和连接错误会重试)
             
         Returns:
             MistralOCRResult: OCR结果
@@ -162,28 +180,23 @@ class MistralOCREngine:
             }
         ]
         
-        # 发送请求
-        for attempt in range(max_retries):
-            try:
-                result = await self._send_request(messages)
-                processing_time = time.time() - start_time
-                
-                # 解析结果
-                ocr_result = self._parse_response(result, processing_time)
-                
-                logger.info(f"✅ Mistral OCR完成: {processing_time:.2f}s, 置信度: {ocr_result.confidence:.2f}")
-                return ocr_result
-                
-            except Exception as e:
-                logger.warning(f"⚠️ Mistral OCR尝试 {attempt + 1} 失败: {e}")
-                if attempt == max_retries - 1:
-                    raise
-                await asyncio.sleep(2 ** attempt)  # 指数退避
+        # 发送请求 (退避重试由共享客户端处理)
+        try:
+            result = await self._send_request(messages, max(0, max_retries - 1))
+        except Exception as e:
+            logger.warning(f"⚠️ Mistral OCR失败: {e}")
+            raise
         
-        raise Exception("Mistral OCR处理失败")
+        processing_time = time.time() - start_time
+        
+        # 解析结果
+        ocr_result = self._parse_response(result, processing_time)
+        
+        logger.info(f"✅ Mistral OCR完成: {processing_time:.2f}s, 置信度: {ocr_result.confidence:.2f}")
+        return ocr_result
     
-    async def _send_request(self, messages: List[Dict]) -> str:
-        """发送API请求"""
+    async def _send_request(self, messages: List[Dict], max_retries: Optional[int] = None) -> str:
+        """发送API请求 (max_retries 为首次请求之后的重试次数)"""
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -201,17 +214,14 @@ class MistralOCREngine:
         if not self.session:
             raise Exception("Session未初始化，请使用async with语句")
         
-        async with self.session.post(
+        result = await self.http.post_json(
             f"{self.base_url}/chat/completions",
+            data,
             headers=headers,
-            json=data
-        ) as response:
-            if response.status != 200:
-                error_text = await response.text()
-                raise Exception(f"API请求失败: {response.status} - {error_text}")
-            
-            result = await response.json()
-            return result["choices"][0]["message"]["content"]
+            model=self.model_name,
+            max_retries=max_retries
+        )
+        return result["choices"][0]["message"]["content"]
     
     def _parse_response(self, response: str, processing_time: float) -> MistralOCRResult:
         """解析Mistral响应"""
@@ -266,31 +276,45 @@ class MistralOCREngine:
                 }
             )
     
-    async def batch_process(self, 
-                          image_paths: List[str], 
-                          task_type: str = "comprehensive") -> List[MistralOCRResult]:
-        """批量处理图像"""
-        logger.info(f"📦 Mistral批量OCR处理: {len(image_paths)}张图像")
+    async def iter_batch(self,
+                         image_paths: List[str],
+                         task_type: str = "comprehensive",
+                         ordered: bool = False) -> AsyncIterator[Tuple[int, MistralOCRResult]]:
+        """
+        并发批量处理图像, 流式产出 (索引, 结果)
+        
+        Args:
+            image_paths: 图像路径列表
+            task_type: 任务类型
+            ordered: True按输入顺序产出, False按完成顺序产出
+        """
+        logger.info(f"📦 Mistral批量OCR处理: {len(image_paths)}张图像 (并发: {self.http.config.concurrency})")
         
-        results = []
-        for i, image_path in enumerate(image_paths):
-            logger.info(f"🔄 处理进度: {i+1}/{len(image_paths)}")
-            try:
-                result = await self.process_image(image_path, task_type)
-                results.append(result)
-            except Exception as e:
-                logger.error(f"❌ 图像处理失败 {image_path}: {e}")
+        completed = 0
+        async for index, result in self.http.iter_batch(
+                image_paths, lambda path: self.process_image(path, task_type), ordered=ordered):
+            completed += 1
+            logger.info(f"🔄 处理进度: {completed}/{len(image_paths)}")
+            if isinstance(result, Exception):
+                logger.error(f"❌ 图像处理失败 {image_paths[index]}: {result}")
                 # 创建错误结果
-                error_result = MistralOCRResult(
+                result = MistralOCRResult(
                     text="",
                     confidence=0.0,
                     processing_time=0.0,
                     structured_data={},
                     table_data=[],
-                    metadata={"error": str(e)}
+                    metadata={"error": str(result)}
                 )
-                results.append(error_result)
-        
+            yield index, result
+    
+    async def batch_process(self, 
+                          image_paths: List[str], 
+                          task_type: str = "comprehensive") -> List[MistralOCRResult]:
+        """批量处理图像, 结果与输入顺序一致"""
+        results: List[Optional[MistralOCRResult]] = [None] * len(image_paths)
+        async for index, result in self.iter_batch(image_paths, task_type):
+            results[index] = result
         return results
     
     def compare_with_traditional_ocr(self, 
@@ -9,11 +9,15 @@ import json
 import time
 import os
 import sys
-from typing import Dict, List, Any, Optional, Union
+import threading
+import queue
+from typing import Dict, List, Any, Optional, Union, AsyncIterator
 from pathlib import Path
 import aiohttp
 import torch
 
+from .model_session import BackendSessions, request_timeout, stream_timeout, iter_sse, sse_delta
+
 logger = logging.getLogger(__name__)
 
 class MistralModel:
@@ -55,6 +59,11 @@ class MistralModel:
         self.top_p = config.get("top_p", 0.9)
         self.pad_token_id = config.get("pad_token_id", 2)
         self.eos_token_id = config.get("eos_token_id", 2)
+        # 本地流式生成时两段输出之间的最长等待 (秒)，超时视为生成线程卡死
+        self.stream_token_timeout = config.get("stream_token_timeout", 120)
+        
+        # 云端长连接会话
+        self.sessions = BackendSessions(config.get("connection_limit", 8))
         
         logger.info(f"MistralModel初始化 - 模型: {self.model_name}")
     
@@ -226,18 +235,18 @@ class MistralModel:
                 "Content-Type": "application/json"
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.cloud_base_url}/models",
-                    headers=headers,
-                    timeout=10
-                ) as response:
-                    if response.status == 200:
-                        logger.info("OpenRouter云端API可用")
-                        return True
-                    else:
-                        logger.warning(f"OpenRouter API响应错误: {response.status}")
-                        return False
+            session = self.sessions.get("cloud")
+            async with session.get(
+                f"{self.cloud_base_url}/models",
+                headers=headers,
+                timeout=request_timeout(10)
+            ) as response:
+                if response.status == 200:
+                    logger.info("OpenRouter云端API可用")
+                    return True
+                else:
+                    logger.warning(f"OpenRouter API响应错误: {response.status}")
+                    return False
             
         except Exception as e:
             logger.warning(f"云端API检查失败: {e}")
@@ -261,7 +270,67 @@ class MistralModel:
             return await self._generate_local(prompt, **kwargs)
         else:
             return await self._generate_cloud(prompt, **kwargs)
-    
+
+    def supports_batch(self) -> bool:
+        """本地Transformers模式支持批量推理 (左填充)，云端接口不支持"""
+        return self.initialized and self.current_mode == "local" and self.model is not None
+
+    async def generate_batch(self, prompts: List[str], **kwargs) -> List[Dict[str, Any]]:
+        """
+        批量生成文本
+
+        Args:
+            prompts: 输入提示列表
+            **kwargs: 其他参数
+
+        Returns:
+            List[Dict]: 与prompts顺序一致的生成结果
+        """
+        if not self.initialized:
+            return [{"success": False, "error": "模型未初始化"} for _ in prompts]
+
+        if self.supports_batch():
+            return await self._generate_local_batch(prompts, **kwargs)
+        return await asyncio.gather(*[self.generate(prompt, **kwargs) for prompt in prompts])
+
+    async def _generate_local_batch(self, prompts: List[str], **kwargs) -> List[Dict[str, Any]]:
+        """本地批量生成，一次前向处理整个批次"""
+        try:
+            inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
+            if self.device != "cpu":
+                inputs = inputs.to(self.model.device)
+
+            generation_kwargs = {
+                "max_new_tokens": kwargs.get("max_tokens", self.max_tokens),
+                "temperature": kwargs.get("temperature", self.temperature),
+                "top_p": kwargs.get("top_p", self.top_p),
+                "do_sample": True,
+                "pad_token_id": self.pad_token_id,
+                "eos_token_id": self.eos_token_id
+            }
+
+            with torch.no_grad():
+                outputs = self.model.generate(**inputs, **generation_kwargs)
+
+            # 左填充时所有样本的生成部分都从输入长度之后开始
+            input_length = inputs["input_ids"].shape[1]
+            results = []
+            for output in outputs:
+                generated_text = self.tokenizer.decode(output[input_length:], skip_special_tokens=True)
+                results.append({
+                    "success": True,
+                    "text": generated_text,
+                    "mode": "local",
+                    "model": self.model_name,
+                    "tokens": len(generated_text.split()),
+                    "batch_size": len(prompts)
+                })
+            return results
+
+        except Exception as e:
+            logger.error(f"本地批量生成失败: {e}")
+            return await asyncio.gather(*[self._generate_local(prompt, **kwargs) for prompt in prompts])
+
     async def chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
         """
         聊天完成
@@ -281,6 +350,114 @@ class MistralModel:
         else:
             return await self._chat_completion_cloud(messages, **kwargs)
     
+    async def stream_chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """
+        流式聊天完成，逐个产出增量文本
+        
+        Args:
+            messages: 消息列表
+            **kwargs: 其他参数
+        """
+        if not self.initialized:
+            raise RuntimeError("模型未初始化")
+        
+        if self.current_mode == "local":
+            stream = self._stream_chat_local(messages, **kwargs)
+        else:
+            stream = self._stream_chat_cloud(messages, **kwargs)
+        
+        async for token in stream:
+            yield token
+    
+    async def _stream_chat_local(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """本地流式聊天：生成在后台线程中运行，通过TextIteratorStreamer逐段取出"""
+        if not self.model or not self.tokenizer:
+            raise RuntimeError("本地模型未加载")
+        
+        prompt = self._messages_to_prompt(messages)
+        inputs = self.tokenizer.encode(prompt, return_tensors="pt")
+        if self.device != "cpu":
+            inputs = inputs.to(self.model.device)
+        
+        streamer = self._create_streamer()
+        generation_kwargs = {
+            "inputs": inputs,
+            "streamer": streamer,
+            "max_new_tokens": kwargs.get("max_tokens", self.max_tokens),
+            "temperature": kwargs.get("temperature", self.temperature),
+            "top_p": kwargs.get("top_p", self.top_p),
+            "do_sample": True,
+            "pad_token_id": self.pad_token_id,
+            "eos_token_id": self.eos_token_id
+        }
+        errors: List[BaseException] = []
+        
+        def generate():
+            try:
+                with torch.no_grad():
+                    self.model.generate(**generation_kwargs)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                # 生成异常时streamer不会收到结束信号，这里保证消费方退出等待
+                streamer.end()
+        
+        thread = threading.Thread(target=generate, daemon=True)
+        thread.start()
+        
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                token = await loop.run_in_executor(None, next, streamer, None)
+            except queue.Empty:
+                raise TimeoutError(f"本地流式生成超过 {self.stream_token_timeout} 秒没有输出")
+            if token is None:
+                break
+            if token:
+                yield token
+        
+        if errors:
+            raise errors[0]
+    
+    def _create_streamer(self):
+        """创建带等待超时的TextIteratorStreamer"""
+        from transformers import TextIteratorStreamer
+        
+        return TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True,
+                                    timeout=self.stream_token_timeout)
+    
+    async def _stream_chat_cloud(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """云端流式聊天 (OpenAI兼容SSE)"""
+        headers = {
+            "Authorization": f"Bearer {self.cloud_api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        completion_data = {
+            "model": self.cloud_model_name,
+            "messages": messages,
+            "max_tokens": kwargs.get("max_tokens", self.max_tokens),
+            "temperature": kwargs.get("temperature", self.temperature),
+            "top_p": kwargs.get("top_p", self.top_p),
+            "stream": True
+        }
+        
+        session = self.sessions.get("cloud")
+        async with session.post(
+            f"{self.cloud_base_url}/chat/completions",
+            headers=headers,
+            json=completion_data,
+            timeout=stream_timeout(120)
+        ) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise RuntimeError(f"云端聊天失败: {response.status} - {error_text}")
+            
+            async for event in iter_sse(response):
+                content = sse_delta(event)
+                if content:
+                    yield content
+    
     async def _generate_local(self, prompt: str, **kwargs) -> Dict[str, Any]:
         """本地生成"""
         try:
@@ -346,30 +523,30 @@ class MistralModel:
                 "top_p": kwargs.get("top_p", self.top_p)
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.cloud_base_url}/chat/completions",
-                    headers=headers,
-                    json=completion_data,
-                    timeout=120
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        choice = data["choices"][0]
-                        return {
-                            "success": True,
-                            "text": choice["message"]["content"],
-                            "mode": "cloud",
-                            "model": self.cloud_model_name,
-                            "tokens": data.get("usage", {}).get("completion_tokens", 0)
-                        }
-                    else:
-                        error_text = await response.text()
-                        return {
-                            "success": False,
-                            "error": f"云端生成失败: {response.status} - {error_text}",
-                            "mode": "cloud"
-                        }
+            session = self.sessions.get("cloud")
+            async with session.post(
+                f"{self.cloud_base_url}/chat/completions",
+                headers=headers,
+                json=completion_data,
+                timeout=request_timeout(120)
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    choice = data["choices"][0]
+                    return {
+                        "success": True,
+                        "text": choice["message"]["content"],
+                        "mode": "cloud",
+                        "model": self.cloud_model_name,
+                        "tokens": data.get("usage", {}).get("completion_tokens", 0)
+                    }
+                else:
+                    error_text = await response.text()
+                    return {
+                        "success": False,
+                        "error": f"云端生成失败: {response.status} - {error_text}",
+                        "mode": "cloud"
+                    }
             
         except Exception as e:
             logger.error(f"云端生成失败: {e}")
@@ -421,33 +598,33 @@ class MistralModel:
                 "top_p": kwargs.get("top_p", self.top_p)
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.cloud_base_url}/chat/completions",
-                    headers=headers,
-                    json=completion_data,
-                    timeout=120
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        choice = data["choices"][0]
-                        return {
-                            "success": True,
-                            "message": {
-                                "role": "assistant",
-                                "content": choice["message"]["content"]
-                            },
-                            "mode": "cloud",
-                            "model": self.cloud_model_name,
-                            "usage": data.get("usage", {})
-                        }
-                    else:
-                        error_text = await response.text()
-                        return {
-                            "success": False,
-                            "error": f"云端聊天失败: {response.status} - {error_text}",
-                            "mode": "cloud"
-                        }
+            session = self.sessions.get("cloud")
+            async with session.post(
+                f"{self.cloud_base_url}/chat/completions",
+                headers=headers,
+                json=completion_data,
+                timeout=request_timeout(120)
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    choice = data["choices"][0]
+                    return {
+                        "success": True,
+                        "message": {
+                            "role": "assistant",
+                            "content": choice["message"]["content"]
+                        },
+                        "mode": "cloud",
+                        "model": self.cloud_model_name,
+                        "usage": data.get("usage", {})
+                    }
+                else:
+                    error_text = await response.text()
+                    return {
+                        "success": False,
+                        "error": f"云端聊天失败: {response.status} - {error_text}",
+                        "mode": "cloud"
+                    }
             
         except Exception as e:
             logger.error(f"云端聊天失败: {e}")
@@ -521,6 +698,7 @@ class MistralModel:
         """关闭模型"""
         try:
             logger.info("关闭Mistral模型")
+            await self.sessions.close()
             
             # 清理本地模型
             if self.model:
@@ -5,14 +5,36 @@
 import asyncio
 import logging
 import time
-from typing import Dict, List, Any, Optional
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, AsyncIterator
 from pathlib import Path
 
 from .qwen_model import QwenModel
 from .mistral_model import MistralModel
 
+try:
+    from ..utils.memory_utils import MemoryUtils
+except ImportError:
+    from utils.memory_utils import MemoryUtils
+
 logger = logging.getLogger(__name__)
 
+# 未配置memory_gb时按memory_usage估算的常驻内存 (GB)
+MEMORY_USAGE_ESTIMATES = {"low": 2.0, "medium": 5.0, "high": 8.0}
+
+@dataclass
+class ResidentModel:
+    """常驻模型记录"""
+    name: str
+    instance: Any
+    memory_gb: float        # 占用内存 (GB), 加载前后可用内存之差或配置估算
+    load_time: float        # 冷启动耗时 (秒)
+    loaded_at: float
+    last_used: float
+    use_count: int = 0
+    in_use: int = 0         # 正在处理的请求数, 大于0时不会被淘汰
+
 class ModelManager:
     """模型管理器 - 统一管理多个本地模型"""
     
@@ -32,6 +54,34 @@ class ModelManager:
         self.max_concurrent = config.get("performance", {}).get("max_concurrent_requests", 3)
         self.memory_limit = config.get("performance", {}).get("memory_limit_gb", 8)
         self.auto_unload = config.get("performance", {}).get("auto_unload_inactive", True)
+        self.memory_reserve = config.get("performance", {}).get("memory_reserve_gb", 1.0)
+        self.preload_enabled = config.get("performance", {}).get("preload_predicted", True)
+        
+        # 默认模型常驻, 不参与淘汰
+        default_model = self.model_configs.get("default_model")
+        pin_default = config.get("performance", {}).get("pin_default_model", True)
+        self.pinned_models = {default_model} if default_model and pin_default else set()
+        
+        # 常驻模型, 按最近使用排序 (最久未用在前)
+        self.residents: "OrderedDict[str, ResidentModel]" = OrderedDict()
+        self.memory_utils = MemoryUtils()
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+        # 模型最近一次的运行模式 (初始化后才能确定); 云端模式不占本地内存, 不检查预算也不淘汰
+        self.model_modes: Dict[str, str] = {}
+        self._preload_tasks: Dict[str, asyncio.Task] = {}
+        
+        # 模型转移计数 {上一个模型: {下一个模型: 次数}}, 用于预测下一个请求的模型
+        self._transitions: Dict[str, Dict[str, int]] = {}
+        self._last_used_model = None
+        
+        self.residency_stats = {
+            "hits": 0,
+            "cold_starts": 0,
+            "switches": 0,
+            "evictions": 0,
+            "preloads": 0
+        }
+        self.cold_start_times: Dict[str, List[float]] = {}
         
         logger.info("模型管理器初始化完成")
     
@@ -82,12 +132,15 @@ class ModelManager:
             
             logger.info(f"模型配置验证通过: {model_name}")
     
-    async def load_model(self, model_name: str) -> bool:
+    async def load_model(self, model_name: str, preload: bool = False) -> bool:
         """
         加载指定模型
         
+        超出内存预算时按LRU淘汰未固定、空闲的常驻模型
+        
         Args:
             model_name: 模型名称
+            preload: 是否为后台预加载 (预加载不淘汰最近使用的模型, 预算不足时放弃)
             
         Returns:
             bool: 加载是否成功
@@ -113,23 +166,58 @@ class ModelManager:
                 logger.error(f"不支持的模型类型: {model_name}")
                 return False
             
-            logger.info(f"开始加载模型: {model_name}")
-            
-            # 创建模型实例
-            model_class = self.model_classes[model_name]
-            model_instance = model_class(model_config)
-            
-            # 初始化模型
-            if not await model_instance.initialize():
-                logger.error(f"模型 {model_name} 初始化失败")
-                return False
-            
-            # 保存模型实例
-            self.models[model_name] = model_instance
-            self.active_models.add(model_name)
-            
-            logger.info(f"模型 {model_name} 加载成功")
-            return True
+            # 同一模型的并发加载请求只加载一次
+            lock = self._load_locks.setdefault(model_name, asyncio.Lock())
+            async with lock:
+                if model_name in self.active_models:
+                    return True
+                
+                required_gb = self._estimate_memory(model_name)
+                if self.model_modes.get(model_name) == "cloud":
+                    logger.info(f"模型 {model_name} 以云端模式运行，跳过内存预算检查")
+                elif not await self._ensure_capacity(required_gb, model_name, preload):
+                    if preload:
+                        logger.info(f"内存预算不足，跳过预加载: {model_name}")
+                        return False
+                    logger.warning(f"内存预算不足 (需要 {required_gb:.1f}GB)，仍尝试加载模型: {model_name}")
+                
+                logger.info(f"开始加载模型: {model_name}")
+                available_before = await self._available_memory()
+                start_time = time.time()
+                
+                # 创建模型实例
+                model_class = self.model_classes[model_name]
+                model_instance = model_class(model_config)
+                
+                # 初始化模型
+                if not await model_instance.initialize():
+                    logger.error(f"模型 {model_name} 初始化失败")
+                    return False
+                
+                load_time = time.time() - start_time
+                self.model_modes[model_name] = getattr(model_instance, "current_mode", "local")
+                memory_gb = self._measure_memory(
+                    model_instance, required_gb, available_before, await self._available_memory()
+                )
+                
+                # 保存模型实例
+                now = time.time()
+                self.residents[model_name] = ResidentModel(
+                    name=model_name,
+                    instance=model_instance,
+                    memory_gb=memory_gb,
+                    load_time=load_time,
+                    loaded_at=now,
+                    last_used=now
+                )
+                self.models[model_name] = model_instance
+                self.active_models.add(model_name)
+                
+                self.residency_stats["preloads" if preload else "cold_starts"] += 1
+                self.cold_start_times.setdefault(model_name, []).append(load_time)
+                
+                logger.info(f"模型 {model_name} 加载成功: {load_time:.2f}s, 占用 {memory_gb:.1f}GB")
+                return True
             
         except Exception as e:
             logger.error(f"加载模型 {model_name} 失败: {e}")
@@ -155,6 +243,8 @@ class ModelManager:
             # 获取模型实例
             model_instance = self.models.get(model_name)
             if model_instance:
+                # 运行中可能已回退到云端模式, 记录供下次加载使用
+                self.model_modes[model_name] = getattr(model_instance, "current_mode", "local")
                 # 调用模型的清理方法
                 if hasattr(model_instance, 'shutdown'):
                     await model_instance.shutdown()
@@ -162,6 +252,7 @@ class ModelManager:
             # 从管理器中移除
             self.models.pop(model_name, None)
             self.active_models.discard(model_name)
+            self.residents.pop(model_name, None)
             
             logger.info(f"模型 {model_name} 卸载成功")
             return True
@@ -170,6 +261,142 @@ class ModelManager:
             logger.error(f"卸载模型 {model_name} 失败: {e}")
             return False
     
+    def _estimate_memory(self, model_name: str) -> float:
+        """估算模型常驻内存: 优先使用配置的memory_gb, 否则按memory_usage等级"""
+        model_config = self.model_configs.get(model_name, {})
+        if "memory_gb" in model_config:
+            return float(model_config["memory_gb"])
+        return MEMORY_USAGE_ESTIMATES.get(model_config.get("memory_usage", "medium"), 5.0)
+    
+    def _measure_memory(self, model_instance: Any, estimate: float,
+                        available_before: Optional[float], available_after: Optional[float]) -> float:
+        """根据加载前后可用内存之差确定模型占用; 云端模式不占本地内存"""
+        if getattr(model_instance, "current_mode", "local") == "cloud":
+            return 0.0
+        if available_before is not None and available_after is not None:
+            measured = available_before - available_after
+            # 变化太小说明模型在独立进程中延迟加载 (如Ollama), 使用估算值
+            if measured > 0.25:
+                return measured
+        return estimate
+    
+    async def _available_memory(self) -> Optional[float]:
+        memory_info = await self.memory_utils.get_memory_info()
+        return memory_info.get("available_memory_gb")
+    
+    async def _ensure_capacity(self, required_gb: float, model_name: str, preload: bool) -> bool:
+        """
+        淘汰LRU常驻模型直到能容纳新模型
+        
+        同时满足: 常驻总量 + 新模型 <= memory_limit_gb, 且加载后可用内存不低于memory_reserve_gb
+        """
+        while True:
+            resident_gb = sum(resident.memory_gb for resident in self.residents.values())
+            available = await self._available_memory()
+            over_budget = resident_gb + required_gb > self.memory_limit
+            low_memory = available is not None and available - required_gb < self.memory_reserve
+            if not (over_budget or low_memory):
+                return True
+            
+            victim = self._pick_victim(model_name, preload)
+            if victim is None:
+                return False
+            
+            logger.info(f"内存预算不足，淘汰最久未使用的模型: {victim}")
+            await self.unload_model(victim)
+            self.residency_stats["evictions"] += 1
+    
+    def _pick_victim(self, model_name: str, preload: bool) -> Optional[str]:
+        """
+        选择淘汰对象: 最久未使用、未固定且空闲的本地模型; 预加载不淘汰最近使用的模型
+
+        云端模式的模型不占本地内存, 淘汰它们不能腾出空间
+        """
+        candidates = list(self.residents.values())
+        if preload and candidates:
+            candidates = candidates[:-1]
+        for resident in candidates:
+            if resident.name == model_name or resident.name in self.pinned_models or resident.in_use:
+                continue
+            if getattr(resident.instance, "current_mode", "local") == "cloud":
+                continue
+            return resident.name
+        return None
+    
+    async def _acquire(self, model_name: str) -> ResidentModel:
+        """获取常驻模型用于推理, 必要时冷启动加载"""
+        if model_name in self.residents:
+            self.residency_stats["hits"] += 1
+        elif not await self.load_model(model_name):
+            raise Exception(f"模型 {model_name} 加载失败")
+        
+        resident = self.residents[model_name]
+        resident.in_use += 1
+        resident.use_count += 1
+        resident.last_used = time.time()
+        self.residents.move_to_end(model_name)
+        
+        self._record_transition(model_name)
+        self._preload_predicted(model_name)
+        return resident
+    
+    def _record_transition(self, model_name: str):
+        last_model = self._last_used_model
+        if last_model is not None:
+            if last_model != model_name:
+                self.residency_stats["switches"] += 1
+            next_counts = self._transitions.setdefault(last_model, {})
+            next_counts[model_name] = next_counts.get(model_name, 0) + 1
+        self._last_used_model = model_name
+    
+    def predict_next_model(self, model_name: str) -> Optional[str]:
+        """根据历史转移预测下一个请求的模型"""
+        next_counts = self._transitions.get(model_name)
+        if not next_counts:
+            return None
+        return max(next_counts, key=next_counts.get)
+    
+    def _preload_predicted(self, model_name: str):
+        """在后台预加载预测的下一个模型"""
+        if not self.preload_enabled:
+            return
+        predicted = self.predict_next_model(model_name)
+        if (predicted is None or predicted == model_name or predicted in self.residents
+                or predicted in self._preload_tasks):
+            return
+        
+        task = asyncio.create_task(self.load_model(predicted, preload=True))
+        self._preload_tasks[predicted] = task
+        task.add_done_callback(lambda _: self._preload_tasks.pop(predicted, None))
+    
+    def get_residency_stats(self) -> Dict[str, Any]:
+        """获取常驻模型统计"""
+        now = time.time()
+        return {
+            "memory_limit_gb": self.memory_limit,
+            "resident_memory_gb": sum(resident.memory_gb for resident in self.residents.values()),
+            "pinned_models": sorted(self.pinned_models),
+            "residents": {
+                name: {
+                    "memory_gb": resident.memory_gb,
+                    "load_time": resident.load_time,
+                    "idle_seconds": now - resident.last_used,
+                    "use_count": resident.use_count,
+                    "pinned": name in self.pinned_models
+                }
+                for name, resident in self.residents.items()
+            },
+            **self.residency_stats,
+            "cold_start_latency": {
+                name: {
+                    "count": len(times),
+                    "last": times[-1],
+                    "average": sum(times) / len(times)
+                }
+                for name, times in self.cold_start_times.items()
+            }
+        }
+    
     async def get_model_status(self) -> Dict[str, Any]:
         """
         获取所有模型状态
@@ -181,7 +408,8 @@ class ModelManager:
             status = {
                 "active_models": list(self.active_models),
                 "total_models": len(self.model_configs) - 3,  # 排除配置项
-                "model_details": {}
+                "model_details": {},
+                "residency": self.get_residency_stats()
             }
             
             for model_name in self.active_models:
@@ -241,26 +469,31 @@ class ModelManager:
             logger.error(f"自动选择模型失败: {e}")
             return self.model_configs.get("default_model", "qwen")
     
-    async def chat_completion(self, messages: List[Dict[str, str]], model_name: str, **kwargs) -> Dict[str, Any]:
+    async def chat_completion(self, messages: List[Dict[str, str]], model_name: str,
+                              stream: bool = False, **kwargs) -> Dict[str, Any]:
         """
         聊天完成
         
         Args:
             messages: 消息列表
             model_name: 模型名称
+            stream: 是否流式输出, 为True时结果的"stream"为增量文本的异步迭代器
             **kwargs: 其他参数
             
         Returns:
             Dict: 响应结果
         """
+        if stream:
+            return {
+                "success": True,
+                "stream": self.stream_chat_completion(messages, model_name, **kwargs)
+            }
+        
+        resident = None
         try:
             # 确保模型已加载
-            if model_name not in self.active_models:
-                if not await self.load_model(model_name):
-                    raise Exception(f"模型 {model_name} 加载失败")
-            
-            # 获取模型实例
-            model_instance = self.models[model_name]
+            resident = await self._acquire(model_name)
+            model_instance = resident.instance
             
             # 调用模型的聊天完成方法
             if hasattr(model_instance, 'chat_completion'):
@@ -276,6 +509,30 @@ class ModelManager:
                 "success": False,
                 "error": str(e)
             }
+        finally:
+            if resident:
+                resident.in_use -= 1
+    
+    async def stream_chat_completion(self, messages: List[Dict[str, str]], model_name: str,
+                                     **kwargs) -> AsyncIterator[str]:
+        """
+        流式聊天完成, 逐个产出增量文本
+        
+        流结束前模型保持占用, 不会被淘汰; 模型不支持流式时一次性产出完整回复
+        """
+        resident = await self._acquire(model_name)
+        try:
+            model_instance = resident.instance
+            if hasattr(model_instance, 'stream_chat_completion'):
+                async for token in model_instance.stream_chat_completion(messages, **kwargs):
+                    yield token
+            else:
+                result = await model_instance.chat_completion(messages, **kwargs)
+                if not result.get("success", False):
+                    raise RuntimeError(result.get("error", "聊天完成失败"))
+                yield result.get("message", {}).get("content", "")
+        finally:
+            resident.in_use -= 1
     
     async def text_generation(self, prompt: str, model_name: str, **kwargs) -> Dict[str, Any]:
         """
@@ -289,14 +546,11 @@ class ModelManager:
         Returns:
             Dict: 生成结果
         """
+        resident = None
         try:
             # 确保模型已加载
-            if model_name not in self.active_models:
-                if not await self.load_model(model_name):
-                    raise Exception(f"模型 {model_name} 加载失败")
-            
-            # 获取模型实例
-            model_instance = self.models[model_name]
+            resident = await self._acquire(model_name)
+            model_instance = resident.instance
             
             # 调用模型的生成方法
             return await model_instance.generate(prompt, **kwargs)
@@ -307,7 +561,46 @@ class ModelManager:
                 "success": False,
                 "error": str(e)
             }
-    
+        finally:
+            if resident:
+                resident.in_use -= 1
+
+    def supports_batch(self, model_name: str) -> bool:
+        """常驻模型当前后端是否支持批量推理"""
+        resident = self.residents.get(model_name)
+        if resident is None:
+            return False
+        supports = getattr(resident.instance, "supports_batch", None)
+        return bool(supports()) if callable(supports) else False
+
+    async def text_generation_batch(self, prompts: List[str], model_name: str, **kwargs) -> List[Dict[str, Any]]:
+        """
+        批量文本生成，后端不支持批量时并发逐个生成
+
+        Args:
+            prompts: 输入提示列表
+            model_name: 模型名称
+            **kwargs: 其他参数
+
+        Returns:
+            List[Dict]: 与prompts顺序一致的生成结果
+        """
+        resident = None
+        try:
+            resident = await self._acquire(model_name)
+            model_instance = resident.instance
+
+            if self.supports_batch(model_name):
+                return await model_instance.generate_batch(prompts, **kwargs)
+            return await asyncio.gather(*[model_instance.generate(prompt, **kwargs) for prompt in prompts])
+
+        except Exception as e:
+            logger.error(f"批量文本生成失败: {e}")
+            return [{"success": False, "error": str(e)} for _ in prompts]
+        finally:
+            if resident:
+                resident.in_use -= 1
+
     def _messages_to_prompt(self, messages: List[Dict[str, str]]) -> str:
         """将消息列表转换为提示文本"""
         prompt_parts = []
@@ -328,6 +621,10 @@ class ModelManager:
         try:
             logger.info("开始关闭模型管理器...")
             
+            # 取消未完成的预加载
+            for task in list(self._preload_tasks.values()):
+                task.cancel()
+            
             # 卸载所有活跃模型
             for model_name in list(self.active_models):
                 await self.unload_model(model_name)
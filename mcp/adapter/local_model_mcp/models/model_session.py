@@ -0,0 +1,99 @@
+"""
+模型后端HTTP会话 - 每个后端一个长连接会话，以及流式响应解析
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+class BackendSessions:
+    """按后端 (local/cloud) 复用的aiohttp会话"""
+
+    def __init__(self, connection_limit: int = 8):
+        self.connection_limit = connection_limit
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._loops: Dict[str, asyncio.AbstractEventLoop] = {}
+        self.sessions_created = 0
+
+    def get(self, backend: str) -> aiohttp.ClientSession:
+        """获取后端会话，首次使用或事件循环变化时创建"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(backend)
+        if session is None or session.closed or self._loops.get(backend) is not loop:
+            if session is not None:
+                # 旧会话属于另一个事件循环，在其所属循环中关闭
+                _close_on_own_loop(session, self._loops.get(backend))
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connection_limit)
+            )
+            self._sessions[backend] = session
+            self._loops[backend] = loop
+            self.sessions_created += 1
+        return session
+
+    async def close(self):
+        """关闭全部会话；属于其他事件循环的会话调度到其所属循环中关闭"""
+        loop = asyncio.get_running_loop()
+        for backend, session in list(self._sessions.items()):
+            owner = self._loops.get(backend)
+            if owner is loop:
+                if not session.closed:
+                    await session.close()
+            else:
+                _close_on_own_loop(session, owner)
+        self._sessions.clear()
+        self._loops.clear()
+
+def _close_on_own_loop(session: aiohttp.ClientSession, loop: Optional[asyncio.AbstractEventLoop]):
+    """关闭属于另一个事件循环的会话 (不等待)"""
+    if session.closed:
+        return
+    if loop is not None and not loop.is_closed():
+        # 循环已停止时在其下次运行时完成
+        asyncio.run_coroutine_threadsafe(session.close(), loop)
+    else:
+        # 原循环已关闭，无法再关闭其中的连接：分离连接器交给回收
+        session.detach()
+        logger.warning("⚠️ 模型会话所属的事件循环已关闭，已分离未关闭的连接器")
+
+def request_timeout(seconds: float) -> aiohttp.ClientTimeout:
+    return aiohttp.ClientTimeout(total=seconds)
+
+def stream_timeout(idle_seconds: float, connect_seconds: float = 30) -> aiohttp.ClientTimeout:
+    """流式响应超时：不限制总时长，只限制连接建立和相邻两次读取之间的间隔"""
+    return aiohttp.ClientTimeout(total=None, sock_connect=connect_seconds, sock_read=idle_seconds)
+
+async def iter_ndjson(response: aiohttp.ClientResponse) -> AsyncIterator[Dict[str, Any]]:
+    """逐行解析Ollama的NDJSON流式响应"""
+    async for line in response.content:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            logger.warning(f"无法解析流式响应行: {line[:100]!r}")
+
+async def iter_sse(response: aiohttp.ClientResponse) -> AsyncIterator[Dict[str, Any]]:
+    """解析OpenAI兼容接口的SSE流式响应，遇到[DONE]结束"""
+    async for line in response.content:
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            continue
+        payload = line[5:].strip()
+        if payload == b"[DONE]":
+            return
+        try:
+            yield json.loads(payload)
+        except json.JSONDecodeError:
+            logger.warning(f"无法解析SSE事件: {payload[:100]!r}")
+
+def sse_delta(event: Dict[str, Any]) -> Optional[str]:
+    """提取SSE事件中的增量文本"""
+    choices = event.get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content")
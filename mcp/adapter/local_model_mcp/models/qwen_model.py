@@ -6,10 +6,12 @@ import asyncio
 import logging
 import json
 import time
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, AsyncIterator
 import aiohttp
 import requests
 
+from .model_session import BackendSessions, request_timeout, stream_timeout, iter_ndjson, iter_sse, sse_delta
+
 logger = logging.getLogger(__name__)
 
 class QwenModel:
@@ -46,6 +48,9 @@ class QwenModel:
         self.temperature = config.get("temperature", 0.7)
         self.top_p = config.get("top_p", 0.9)
         
+        # 长连接会话，本地Ollama和云端各一个
+        self.sessions = BackendSessions(config.get("connection_limit", 8))
+        
         logger.info(f"QwenModel初始化 - 模型: {self.model_name}")
     
     async def initialize(self) -> bool:
@@ -93,11 +98,11 @@ class QwenModel:
     async def _check_local_ollama(self) -> bool:
         """检查本地Ollama是否可用"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.local_base_url}/api/tags", timeout=5) as response:
-                    if response.status == 200:
-                        logger.info("本地Ollama服务可用")
-                        return True
+            session = self.sessions.get("local")
+            async with session.get(f"{self.local_base_url}/api/tags", timeout=request_timeout(5)) as response:
+                if response.status == 200:
+                    logger.info("本地Ollama服务可用")
+                    return True
         except Exception as e:
             logger.warning(f"本地Ollama不可用: {e}")
         
@@ -107,18 +112,18 @@ class QwenModel:
         """确保模型已下载"""
         try:
             # 检查模型是否存在
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.local_base_url}/api/tags") as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        models = [model["name"] for model in data.get("models", [])]
+            session = self.sessions.get("local")
+            async with session.get(f"{self.local_base_url}/api/tags") as response:
+                if response.status == 200:
+                    data = await response.json()
+                    models = [model["name"] for model in data.get("models", [])]
                         
-                        if self.model_name in models:
-                            logger.info(f"模型 {self.model_name} 已存在")
-                            return True
-                        else:
-                            logger.info(f"模型 {self.model_name} 不存在，开始下载...")
-                            return await self._download_model()
+                    if self.model_name in models:
+                        logger.info(f"模型 {self.model_name} 已存在")
+                        return True
+                    else:
+                        logger.info(f"模型 {self.model_name} 不存在，开始下载...")
+                        return await self._download_model()
             
         except Exception as e:
             logger.error(f"检查模型失败: {e}")
@@ -129,24 +134,24 @@ class QwenModel:
         try:
             logger.info(f"开始下载模型: {self.model_name}")
             
-            async with aiohttp.ClientSession() as session:
-                pull_data = {"name": self.model_name}
-                async with session.post(
-                    f"{self.local_base_url}/api/pull",
-                    json=pull_data,
-                    timeout=300  # 5分钟超时
-                ) as response:
-                    if response.status == 200:
-                        # 读取流式响应
-                        async for line in response.content:
-                            if line:
-                                try:
-                                    data = json.loads(line.decode())
-                                    if data.get("status") == "success":
-                                        logger.info(f"模型 {self.model_name} 下载完成")
-                                        return True
-                                except json.JSONDecodeError:
-                                    continue
+            session = self.sessions.get("local")
+            pull_data = {"name": self.model_name}
+            async with session.post(
+                f"{self.local_base_url}/api/pull",
+                json=pull_data,
+                timeout=request_timeout(300)  # 5分钟超时
+            ) as response:
+                if response.status == 200:
+                    # 读取流式响应
+                    async for line in response.content:
+                        if line:
+                            try:
+                                data = json.loads(line.decode())
+                                if data.get("status") == "success":
+                                    logger.info(f"模型 {self.model_name} 下载完成")
+                                    return True
+                            except json.JSONDecodeError:
+                                continue
             
             logger.error(f"模型 {self.model_name} 下载失败")
             return False
@@ -167,18 +172,18 @@ class QwenModel:
                 "Content-Type": "application/json"
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.cloud_base_url}/models",
-                    headers=headers,
-                    timeout=10
-                ) as response:
-                    if response.status == 200:
-                        logger.info("OpenRouter云端API可用")
-                        return True
-                    else:
-                        logger.warning(f"OpenRouter API响应错误: {response.status}")
-                        return False
+            session = self.sessions.get("cloud")
+            async with session.get(
+                f"{self.cloud_base_url}/models",
+                headers=headers,
+                timeout=request_timeout(10)
+            ) as response:
+                if response.status == 200:
+                    logger.info("OpenRouter云端API可用")
+                    return True
+                else:
+                    logger.warning(f"OpenRouter API响应错误: {response.status}")
+                    return False
             
         except Exception as e:
             logger.warning(f"云端API检查失败: {e}")
@@ -222,6 +227,99 @@ class QwenModel:
         else:
             return await self._chat_completion_cloud(messages, **kwargs)
     
+    async def stream_chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """
+        流式聊天完成，逐个产出增量文本
+        
+        Args:
+            messages: 消息列表
+            **kwargs: 其他参数
+        """
+        if not self.initialized:
+            raise RuntimeError("模型未初始化")
+        
+        if self.current_mode == "local":
+            stream = self._stream_chat_local(messages, **kwargs)
+        else:
+            stream = self._stream_chat_cloud(messages, **kwargs)
+        
+        async for token in stream:
+            yield token
+    
+    async def _stream_chat_local(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """本地流式聊天 (Ollama NDJSON)"""
+        chat_data = {
+            "model": self.model_name,
+            "messages": messages,
+            "stream": True,
+            "options": {
+                "num_predict": kwargs.get("max_tokens", self.max_tokens),
+                "temperature": kwargs.get("temperature", self.temperature),
+                "top_p": kwargs.get("top_p", self.top_p)
+            }
+        }
+        
+        started = False
+        try:
+            session = self.sessions.get("local")
+            async with session.post(
+                f"{self.local_base_url}{self.local_chat_endpoint}",
+                json=chat_data,
+                timeout=stream_timeout(120)
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise RuntimeError(f"本地聊天失败: {response.status} - {error_text}")
+                
+                async for data in iter_ndjson(response):
+                    content = data.get("message", {}).get("content")
+                    if content:
+                        started = True
+                        yield content
+                    if data.get("done"):
+                        break
+        
+        except aiohttp.ClientError as e:
+            # 尚未输出内容时尝试切换到云端
+            if started or not await self._check_cloud_available():
+                raise
+            logger.info(f"本地流式聊天失败 ({e})，切换到云端模式")
+            self.current_mode = "cloud"
+            async for token in self._stream_chat_cloud(messages, **kwargs):
+                yield token
+    
+    async def _stream_chat_cloud(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """云端流式聊天 (OpenAI兼容SSE)"""
+        headers = {
+            "Authorization": f"Bearer {self.cloud_api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        completion_data = {
+            "model": self.cloud_model_name,
+            "messages": messages,
+            "max_tokens": kwargs.get("max_tokens", self.max_tokens),
+            "temperature": kwargs.get("temperature", self.temperature),
+            "top_p": kwargs.get("top_p", self.top_p),
+            "stream": True
+        }
+        
+        session = self.sessions.get("cloud")
+        async with session.post(
+            f"{self.cloud_base_url}/chat/completions",
+            headers=headers,
+            json=completion_data,
+            timeout=stream_timeout(120)
+        ) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise RuntimeError(f"云端聊天失败: {response.status} - {error_text}")
+            
+            async for event in iter_sse(response):
+                content = sse_delta(event)
+                if content:
+                    yield content
+    
     async def _generate_local(self, prompt: str, **kwargs) -> Dict[str, Any]:
         """本地生成"""
         try:
@@ -236,28 +334,28 @@ class QwenModel:
                 }
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.local_base_url}{self.local_api_endpoint}",
-                    json=generate_data,
-                    timeout=120
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return {
-                            "success": True,
-                            "text": data.get("response", ""),
-                            "mode": "local",
-                            "model": self.model_name,
-                            "tokens": len(data.get("response", "").split())
-                        }
-                    else:
-                        error_text = await response.text()
-                        return {
-                            "success": False,
-                            "error": f"本地生成失败: {response.status} - {error_text}",
-                            "mode": "local"
-                        }
+            session = self.sessions.get("local")
+            async with session.post(
+                f"{self.local_base_url}{self.local_api_endpoint}",
+                json=generate_data,
+                timeout=request_timeout(120)
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    return {
+                        "success": True,
+                        "text": data.get("response", ""),
+                        "mode": "local",
+                        "model": self.model_name,
+                        "tokens": len(data.get("response", "").split())
+                    }
+                else:
+                    error_text = await response.text()
+                    return {
+                        "success": False,
+                        "error": f"本地生成失败: {response.status} - {error_text}",
+                        "mode": "local"
+                    }
             
         except Exception as e:
             logger.error(f"本地生成失败: {e}")
@@ -285,30 +383,30 @@ class QwenModel:
                 "top_p": kwargs.get("top_p", self.top_p)
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.cloud_base_url}/chat/completions",
-                    headers=headers,
-                    json=completion_data,
-                    timeout=120
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        choice = data["choices"][0]
-                        return {
-                            "success": True,
-                            "text": choice["message"]["content"],
-                            "mode": "cloud",
-                            "model": self.cloud_model_name,
-                            "tokens": data.get("usage", {}).get("completion_tokens", 0)
-                        }
-                    else:
-                        error_text = await response.text()
-                        return {
-                            "success": False,
-                            "error": f"云端生成失败: {response.status} - {error_text}",
-                            "mode": "cloud"
-                        }
+            session = self.sessions.get("cloud")
+            async with session.post(
+                f"{self.cloud_base_url}/chat/completions",
+                headers=headers,
+                json=completion_data,
+                timeout=request_timeout(120)
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    choice = data["choices"][0]
+                    return {
+                        "success": True,
+                        "text": choice["message"]["content"],
+                        "mode": "cloud",
+                        "model": self.cloud_model_name,
+                        "tokens": data.get("usage", {}).get("completion_tokens", 0)
+                    }
+                else:
+                    error_text = await response.text()
+                    return {
+                        "success": False,
+                        "error": f"云端生成失败: {response.status} - {error_text}",
+                        "mode": "cloud"
+                    }
             
         except Exception as e:
             logger.error(f"云端生成失败: {e}")
@@ -328,27 +426,27 @@ class QwenModel:
                 }
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.local_base_url}{self.local_chat_endpoint}",
-                    json=chat_data,
-                    timeout=120
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return {
-                            "success": True,
-                            "message": data.get("message", {}),
-                            "mode": "local",
-                            "model": self.model_name
-                        }
-                    else:
-                        error_text = await response.text()
-                        return {
-                            "success": False,
-                            "error": f"本地聊天失败: {response.status} - {error_text}",
-                            "mode": "local"
-                        }
+            session = self.sessions.get("local")
+            async with session.post(
+                f"{self.local_base_url}{self.local_chat_endpoint}",
+                json=chat_data,
+                timeout=request_timeout(120)
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    return {
+                        "success": True,
+                        "message": data.get("message", {}),
+                        "mode": "local",
+                        "model": self.model_name
+                    }
+                else:
+                    error_text = await response.text()
+                    return {
+                        "success": False,
+                        "error": f"本地聊天失败: {response.status} - {error_text}",
+                        "mode": "local"
+                    }
             
         except Exception as e:
             logger.error(f"本地聊天失败: {e}")
@@ -376,33 +474,33 @@ class QwenModel:
                 "top_p": kwargs.get("top_p", self.top_p)
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.cloud_base_url}/chat/completions",
-                    headers=headers,
-                    json=completion_data,
-                    timeout=120
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        choice = data["choices"][0]
-                        return {
-                            "success": True,
-                            "message": {
-                                "role": "assistant",
-                                "content": choice["message"]["content"]
-                            },
-                            "mode": "cloud",
-                            "model": self.cloud_model_name,
-                            "usage": data.get("usage", {})
-                        }
-                    else:
-                        error_text = await response.text()
-                        return {
-                            "success": False,
-                            "error": f"云端聊天失败: {response.status} - {error_text}",
-                            "mode": "cloud"
-                        }
+            session = self.sessions.get("cloud")
+            async with session.post(
+                f"{self.cloud_base_url}/chat/completions",
+                headers=headers,
+                json=completion_data,
+                timeout=request_timeout(120)
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    choice = data["choices"][0]
+                    return {
+                        "success": True,
+                        "message": {
+                            "role": "assistant",
+                            "content": choice["message"]["content"]
+                        },
+                        "mode": "cloud",
+                        "model": self.cloud_model_name,
+                        "usage": data.get("usage", {})
+                    }
+                else:
+                    error_text = await response.text()
+                    return {
+                        "success": False,
+                        "error": f"云端聊天失败: {response.status} - {error_text}",
+                        "mode": "cloud"
+                    }
             
         except Exception as e:
             logger.error(f"云端聊天失败: {e}")
@@ -450,6 +548,7 @@ class QwenModel:
         """关闭模型"""
         try:
             logger.info("关闭Qwen模型")
+            await self.sessions.close()
             self.initialized = False
             
         except Exception as e:
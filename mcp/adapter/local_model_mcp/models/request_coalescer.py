@@ -0,0 +1,202 @@
+"""
+请求合并器 - 相同的在途提示共享一次后端调用，不同提示在短时间窗口内合并为微批次
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 排队时间直方图桶上界 (毫秒)
+QUEUE_TIME_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+# 批大小直方图桶上界
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+class Histogram:
+    """累积计数直方图，最后一个桶为+inf"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"<={bound}" for bound in self.bounds] + ["+inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "average": self.total / self.count if self.count else 0
+        }
+
+@dataclass
+class _PendingBatch:
+    """等待窗口结束的微批次"""
+    model_name: str
+    kwargs: Dict[str, Any]
+    entries: List[Tuple[tuple, str, float]] = field(default_factory=list)   # (键, 提示, 入队时间)
+    timer: Optional[asyncio.TimerHandle] = None
+
+class RequestCoalescer:
+    """文本生成请求合并器
+
+    - 模型、参数和提示都相同的在途请求只调用一次后端，每个调用方得到结果的独立副本
+    - 支持批量推理的后端，不同提示在batch_window内按(模型, 参数)分组合并为一个批次
+    - 不支持批量的后端立即调度，不额外等待
+    """
+
+    def __init__(self, model_manager, batch_window: float = 0.01, max_batch_size: int = 8):
+        """
+        初始化请求合并器
+
+        Args:
+            model_manager: 模型管理器
+            batch_window: 微批次等待窗口 (秒)，0表示不做微批次
+            max_batch_size: 单个批次最大提示数，达到后立即调度
+        """
+        self.model_manager = model_manager
+        self.batch_window = batch_window
+        self.max_batch_size = max(1, max_batch_size)
+
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._pending: Dict[tuple, _PendingBatch] = {}
+        self._tasks = set()
+
+        self.queue_time_ms = Histogram(QUEUE_TIME_BUCKETS_MS)
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.stats = {
+            "requests": 0,
+            "coalesced": 0,
+            "backend_calls": 0,
+            "batches": 0
+        }
+
+    @staticmethod
+    def _params_key(kwargs: Dict[str, Any]) -> str:
+        return json.dumps(kwargs, sort_keys=True, default=str)
+
+    async def submit(self, prompt: str, model_name: str, **kwargs) -> Dict[str, Any]:
+        """
+        提交文本生成请求
+
+        Args:
+            prompt: 输入提示
+            model_name: 模型名称
+            **kwargs: 生成参数
+
+        Returns:
+            Dict: 生成结果 (相同请求共享一次后端调用，调用方可修改自己的副本)
+        """
+        self.stats["requests"] += 1
+        params = self._params_key(kwargs)
+        key = (model_name, params, prompt)
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return copy.deepcopy(await asyncio.shield(future))
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        future.add_done_callback(lambda f: self._inflight.pop(key, None) if self._inflight.get(key) is f else None)
+        entry = (key, prompt, time.perf_counter())
+
+        if self.batch_window > 0 and self.model_manager.supports_batch(model_name):
+            self._enqueue((model_name, params), model_name, kwargs, entry)
+        else:
+            self._dispatch(model_name, kwargs, [entry])
+
+        # 调用方取消不影响共享同一结果的其他调用方；发起方同样取副本，
+        # 避免它在其他调用方复制之前修改共享结果
+        return copy.deepcopy(await asyncio.shield(future))
+
+    def _enqueue(self, group: tuple, model_name: str, kwargs: Dict[str, Any], entry: tuple):
+        pending = self._pending.get(group)
+        if pending is None:
+            pending = self._pending[group] = _PendingBatch(model_name, kwargs)
+        pending.entries.append(entry)
+
+        if len(pending.entries) >= self.max_batch_size:
+            self._flush(group)
+        elif pending.timer is None:
+            pending.timer = asyncio.get_running_loop().call_later(self.batch_window, self._flush, group)
+
+    def _flush(self, group: tuple):
+        pending = self._pending.pop(group, None)
+        if pending is None:
+            return
+        if pending.timer is not None:
+            pending.timer.cancel()
+        self._dispatch(pending.model_name, pending.kwargs, pending.entries)
+
+    def _dispatch(self, model_name: str, kwargs: Dict[str, Any], entries: List[tuple]):
+        now = time.perf_counter()
+        for _, _, enqueued_at in entries:
+            self.queue_time_ms.observe((now - enqueued_at) * 1000)
+        self.batch_size.observe(len(entries))
+        self.stats["backend_calls"] += 1
+        if len(entries) > 1:
+            self.stats["batches"] += 1
+
+        task = asyncio.create_task(self._run(model_name, kwargs, entries))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, model_name: str, kwargs: Dict[str, Any], entries: List[tuple]):
+        futures = [self._inflight[key] for key, _, _ in entries]
+        try:
+            if len(entries) == 1:
+                results = [await self.model_manager.text_generation(entries[0][1], model_name, **kwargs)]
+            else:
+                prompts = [prompt for _, prompt, _ in entries]
+                results = await self.model_manager.text_generation_batch(prompts, model_name, **kwargs)
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            logger.error(f"合并请求调度失败: {e}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # 批量结果少于请求数或调度任务被取消时，剩余调用方不能永远等待
+            missing = [future for future in futures if not future.done()]
+            if missing:
+                logger.error(f"合并请求有 {len(missing)} 个未得到结果")
+            for future in missing:
+                future.set_exception(RuntimeError(f"模型 {model_name} 未返回该请求的结果"))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并统计与排队时间/批大小直方图"""
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "in_flight": len(self._inflight),
+            "coalesce_rate": self.stats["coalesced"] / requests if requests else 0,
+            "batch_window_ms": self.batch_window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "queue_time_ms": self.queue_time_ms.snapshot(),
+            "batch_size": self.batch_size.snapshot()
+        }
+
+    async def shutdown(self):
+        """立即调度等待中的批次并等待在途请求完成"""
+        for group in list(self._pending):
+            self._flush(group)
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
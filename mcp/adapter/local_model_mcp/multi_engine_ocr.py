@@ -4,7 +4,7 @@
 
 import os
 import logging
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any, Union
 from dataclasses import dataclass
 from enum import Enum
 import cv2
@@ -12,6 +12,8 @@ import numpy as np
 from PIL import Image
 import asyncio
 
+from shared_image import SharedImage
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -31,6 +33,7 @@ class OCRResult:
     bbox: Optional[List[Tuple[int, int]]] = None
     engine: Optional[str] = None
     processing_time: Optional[float] = None
+    image_stats: Optional[Dict[str, Any]] = None  # 本次请求的解码次数和分配字节数
 
 @dataclass
 class EngineConfig:
@@ -173,7 +176,7 @@ class MultiEngineOCRManager:
     
     async def process_image(
         self, 
-        image_path: str, 
+        image_path: Union[str, bytes, SharedImage], 
         engines: List[OCREngine] = None,
         fusion_strategy: str = "best_confidence"
     ) -> OCRResult:
@@ -181,7 +184,7 @@ class MultiEngineOCRManager:
         使用多引擎处理图像
         
         Args:
-            image_path: 图像路径
+            image_path: 图像路径、图像数据或已解码的SharedImage
             engines: 指定使用的引擎列表，None表示使用所有可用引擎
             fusion_strategy: 融合策略 ("best_confidence", "majority_vote", "weighted_average")
         
@@ -191,16 +194,16 @@ class MultiEngineOCRManager:
         if engines is None:
             engines = self.available_engines
         
-        # 并行处理多个引擎
-        tasks = []
-        for engine in engines:
-            if engine in self.available_engines:
-                task = self._process_with_engine(image_path, engine)
-                tasks.append(task)
-        
-        if not tasks:
+        engines = [engine for engine in engines if engine in self.available_engines]
+        if not engines:
             raise ValueError("没有可用的OCR引擎")
         
+        # 只解码一次，所有引擎共用
+        image = SharedImage.load(image_path)
+        
+        # 并行处理多个引擎
+        tasks = [self._process_with_engine(image, engine) for engine in engines]
+        
         # 等待所有引擎完成
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
@@ -210,24 +213,29 @@ class MultiEngineOCRManager:
             if isinstance(result, OCRResult) and result.confidence > 0
         ]
         
+        image_stats = image.get_stats()
+        logger.info(f"📊 解码 {image_stats['decode_count']} 次, 分配 {image_stats['bytes_allocated'] / 1024 / 1024:.1f} MB")
+        
         if not valid_results:
-            return OCRResult(text="", confidence=0.0, engine="none")
+            return OCRResult(text="", confidence=0.0, engine="none", image_stats=image_stats)
         
         # 应用融合策略
-        return self._apply_fusion_strategy(valid_results, fusion_strategy)
+        result = self._apply_fusion_strategy(valid_results, fusion_strategy)
+        result.image_stats = image_stats
+        return result
     
-    async def _process_with_engine(self, image_path: str, engine: OCREngine) -> OCRResult:
+    async def _process_with_engine(self, image: SharedImage, engine: OCREngine) -> OCRResult:
         """使用指定引擎处理图像"""
         import time
         start_time = time.time()
         
         try:
             if engine == OCREngine.TESSERACT:
-                result = await self._process_with_tesseract(image_path)
+                result = await self._process_with_tesseract(image)
             elif engine == OCREngine.EASYOCR:
-                result = await self._process_with_easyocr(image_path)
+                result = await self._process_with_easyocr(image)
             elif engine == OCREngine.PADDLEOCR:
-                result = await self._process_with_paddleocr(image_path)
+                result = await self._process_with_paddleocr(image)
             else:
                 raise ValueError(f"不支持的引擎: {engine}")
             
@@ -241,20 +249,16 @@ class MultiEngineOCRManager:
             logger.error(f"❌ {engine.value} 处理失败: {e}")
             return OCRResult(text="", confidence=0.0, engine=engine.value)
     
-    async def _process_with_tesseract(self, image_path: str) -> OCRResult:
+    async def _process_with_tesseract(self, image: SharedImage) -> OCRResult:
         """使用Tesseract处理图像"""
         import pytesseract
-        from PIL import Image
-        
-        # 读取图像
-        image = Image.open(image_path)
         
         # 配置Tesseract参数
         config = '--psm 6 --oem 1 -l chi_sim+chi_tra+eng'
         
         # 获取详细结果
         data = pytesseract.image_to_data(
-            image, 
+            image.gray, 
             config=config, 
             output_type=pytesseract.Output.DICT
         )
@@ -278,12 +282,12 @@ class MultiEngineOCRManager:
             confidence=avg_confidence / 100.0  # 转换为0-1范围
         )
     
-    async def _process_with_easyocr(self, image_path: str) -> OCRResult:
+    async def _process_with_easyocr(self, image: SharedImage) -> OCRResult:
         """使用EasyOCR处理图像"""
         reader = self.engines[OCREngine.EASYOCR]
         
         # 处理图像
-        results = reader.readtext(image_path)
+        results = reader.readtext(image.rgb)
         
         # 合并结果
         text_parts = []
@@ -302,12 +306,12 @@ class MultiEngineOCRManager:
             confidence=avg_confidence
         )
     
-    async def _process_with_paddleocr(self, image_path: str) -> OCRResult:
+    async def _process_with_paddleocr(self, image: SharedImage) -> OCRResult:
         """使用PaddleOCR处理图像"""
         ocr = self.engines[OCREngine.PADDLEOCR]
         
         # 处理图像
-        results = ocr.ocr(image_path, cls=True)
+        results = ocr.ocr(image.bgr, cls=True)
         
         # 合并结果
         text_parts = []
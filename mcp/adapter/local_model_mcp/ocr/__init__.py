@@ -3,6 +3,6 @@ OCR模块初始化
 """
 
 from .ocr_engine import OCREngine
+from .ocr_workers import OCRWorkerPool, OCRQueueFullError
 
-__all__ = ["OCREngine"]
-
+__all__ = ["OCREngine", "OCRWorkerPool", "OCRQueueFullError"]
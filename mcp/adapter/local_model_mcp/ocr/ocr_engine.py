@@ -4,14 +4,28 @@ OCR引擎 - 整合OCR Mistral功能到统一MCP中
 """
 
 import asyncio
+import contextlib
 import logging
 import json
+import sys
 import time
 import base64
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, AsyncIterator
 from pathlib import Path
 import io
 
+from .ocr_workers import (
+    OCRWorkerPool, OCRQueueFullError, SharedImageHandle,
+    decode_image_bytes, preprocess_image_bytes, preprocess_shared_image,
+    tesseract_image_to_string
+)
+
+try:
+    from ...ocr_result_cache import OCRResultCache, OCRCacheConfig
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from ocr_result_cache import OCRResultCache, OCRCacheConfig
+
 logger = logging.getLogger(__name__)
 
 class OCREngine:
@@ -42,6 +56,24 @@ class OCREngine:
         self.initialized = False
         self.available_engines = []
         
+        # 工作池：Tesseract和预处理走进程池，模型引擎走常驻模型线程
+        self.worker_pool = OCRWorkerPool(self.config)
+        
+        # 文档流水线：同时在处理中的最大页数，保证提交数不超过工作池容量
+        self.pipeline_window = min(
+            self.config.get("pipeline_window") or 2 * self.worker_pool.process_workers,
+            self.worker_pool.capacity
+        )
+        
+        # 结果缓存：同一图像+参数重复提交时直接返回
+        self.cache = OCRResultCache(OCRCacheConfig(
+            enabled=self.config.get("cache_enabled", True),
+            max_memory_entries=self.config.get("cache_max_entries", 256),
+            cache_dir=self.config.get("cache_dir"),
+            max_disk_bytes=self.config.get("cache_max_disk_mb", 512) * 1024 * 1024,
+            ttl=self.config.get("cache_ttl")
+        ))
+        
         # 统计信息
         self.stats = {
             "total_requests": 0,
@@ -170,7 +202,8 @@ class OCREngine:
             if not languages:
                 languages = ["ch_sim", "en"]
             
-            self.ocr_model = easyocr.Reader(languages, gpu=True)
+            # 在模型线程中加载，之后的推理也在同一线程执行
+            self.ocr_model = await self.worker_pool.load_model(lambda: easyocr.Reader(languages, gpu=True))
             self.engine = "easyocr"
             logger.info("EasyOCR初始化成功")
             return True
@@ -187,12 +220,12 @@ class OCREngine:
             # 设置语言
             lang = "ch" if "zh" in self.languages else "en"
             
-            self.ocr_model = PaddleOCR(
+            self.ocr_model = await self.worker_pool.load_model(lambda: PaddleOCR(
                 use_angle_cls=True,
                 lang=lang,
                 use_gpu=True,
                 show_log=False
-            )
+            ))
             self.engine = "paddleocr"
             logger.info("PaddleOCR初始化成功")
             return True
@@ -240,12 +273,24 @@ class OCREngine:
         
         Args:
             image_data: 图像数据
-            **kwargs: 其他参数
+            **kwargs: 其他参数，timeout 覆盖默认的请求超时（秒）
             
         Returns:
             Dict: OCR结果
         """
+        deadline = time.time() + (kwargs.pop("timeout", None) or self.worker_pool.request_timeout)
+        return await self._process_page(image_data, deadline, None, **kwargs)
+    
+    async def _process_page(self, image_data: bytes, deadline: float,
+                            stages: Optional[Dict[str, asyncio.Semaphore]], **kwargs) -> Dict[str, Any]:
+        """
+        单页OCR：解码 -> 预处理 -> OCR -> 后处理
+        
+        stages 为各阶段的并发限制（文档流水线使用），为None时不限制；
+        各阶段之间传递共享内存图像句柄，页面处理结束后统一释放
+        """
         start_time = time.time()
+        handles: List[SharedImageHandle] = []
         
         try:
             if not self.initialized or not self.enabled:
@@ -258,19 +303,46 @@ class OCREngine:
             # 更新统计
             self.stats["total_requests"] += 1
             
-            # 预处理图像
-            if self.preprocessing:
-                image_data = await self._preprocess_image(image_data)
+            # 查找缓存
+            cache_key = self._cache_key(image_data, kwargs)
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                self.stats["successful_extractions"] += 1
+                processing_time = time.time() - start_time
+                cached["cached"] = True
+                cached["processing_time"] = processing_time
+                self._update_average_time(processing_time)
+                return cached
             
             # 根据引擎类型进行OCR
-            if self.engine == "easyocr":
-                result = await self._extract_with_easyocr(image_data, **kwargs)
-            elif self.engine == "paddleocr":
-                result = await self._extract_with_paddleocr(image_data, **kwargs)
-            elif self.engine == "tesseract":
-                result = await self._extract_with_tesseract(image_data, **kwargs)
-            elif self.engine == "cloud_api":
-                result = await self._extract_with_cloud_api(image_data, **kwargs)
+            if self.engine == "cloud_api":
+                # 云端API接收编码后的图像：预处理后重新编码再上传
+                upload_data = image_data
+                if self.preprocessing:
+                    async with self._stage(stages, "preprocess"):
+                        upload_data = await self._preprocess_encoded_image(
+                            image_data, timeout=self._remaining(deadline))
+                result = await self._extract_with_cloud_api(upload_data, **kwargs)
+            elif self.engine in ("easyocr", "paddleocr", "tesseract"):
+                # 解码图像
+                async with self._stage(stages, "decode"):
+                    image = await self.worker_pool.run_cpu(decode_image_bytes, image_data,
+                                                           timeout=self._remaining(deadline))
+                    handles.append(image)
+                
+                # 预处理图像
+                if self.preprocessing:
+                    async with self._stage(stages, "preprocess"):
+                        image = await self._preprocess_image(image, timeout=self._remaining(deadline))
+                        handles.append(image)
+                
+                async with self._stage(stages, "ocr"):
+                    if self.engine == "easyocr":
+                        result = await self._extract_with_easyocr(image, timeout=self._remaining(deadline), **kwargs)
+                    elif self.engine == "paddleocr":
+                        result = await self._extract_with_paddleocr(image, timeout=self._remaining(deadline), **kwargs)
+                    else:
+                        result = await self._extract_with_tesseract(image, timeout=self._remaining(deadline), **kwargs)
             else:
                 return {
                     "success": False,
@@ -280,7 +352,8 @@ class OCREngine:
             
             # 后处理结果
             if result["success"]:
-                result = await self._postprocess_result(result, **kwargs)
+                async with self._stage(stages, "postprocess"):
+                    result = await self._postprocess_result(result, **kwargs)
                 self.stats["successful_extractions"] += 1
             else:
                 self.stats["failed_extractions"] += 1
@@ -290,8 +363,29 @@ class OCREngine:
             result["processing_time"] = processing_time
             self._update_average_time(processing_time)
             
+            if result["success"]:
+                await self.cache.aput(cache_key, result, image_bytes=len(image_data))
+            
             return result
             
+        except asyncio.TimeoutError:
+            logger.warning(f"OCR请求超时 ({time.time() - start_time:.1f}s)")
+            self.stats["failed_extractions"] += 1
+            return {
+                "success": False,
+                "error": "OCR请求超时",
+                "processing_time": time.time() - start_time
+            }
+            
+        except OCRQueueFullError as e:
+            logger.warning(f"OCR请求被拒绝: {e}")
+            self.stats["failed_extractions"] += 1
+            return {
+                "success": False,
+                "error": str(e),
+                "processing_time": time.time() - start_time
+            }
+            
         except Exception as e:
             logger.error(f"OCR文本提取失败: {e}")
             self.stats["failed_extractions"] += 1
@@ -300,49 +394,69 @@ class OCREngine:
                 "error": str(e),
                 "processing_time": time.time() - start_time
             }
+            
+        finally:
+            for handle in handles:
+                handle.release()
+    
+    def _cache_key(self, image_data: bytes, kwargs: Dict[str, Any]) -> str:
+        """缓存键：图像内容 + 影响结果的全部参数"""
+        return OCRResultCache.make_key(
+            image_data,
+            engine=self.engine,
+            languages=self.languages,
+            preprocessing=self.preprocessing,
+            output_format=self.output_format,
+            preserve_layout=self.preserve_layout,
+            confidence_threshold=self.confidence_threshold,
+            options=kwargs
+        )
     
-    async def _preprocess_image(self, image_data: bytes) -> bytes:
-        """预处理图像"""
+    def _stage(self, stages: Optional[Dict[str, asyncio.Semaphore]], name: str):
+        """获取阶段并发限制"""
+        return stages[name] if stages else contextlib.nullcontext()
+    
+    def _remaining(self, deadline: float) -> float:
+        """距请求截止时间的剩余秒数"""
+        return max(0.001, deadline - time.time())
+    
+    async def _preprocess_image(self, image: SharedImageHandle, timeout: Optional[float] = None) -> SharedImageHandle:
+        """预处理图像（在进程池中执行）"""
         try:
-            from PIL import Image, ImageEnhance, ImageFilter
-            import io
-            
-            # 打开图像
-            image = Image.open(io.BytesIO(image_data))
-            
-            # 转换为RGB
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+            return await self.worker_pool.run_cpu(preprocess_shared_image, image, timeout=timeout)
             
-            # 增强对比度
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(1.2)
+        except (asyncio.TimeoutError, OCRQueueFullError):
+            raise
             
-            # 锐化
-            image = image.filter(ImageFilter.SHARPEN)
+        except Exception as e:
+            logger.warning(f"图像预处理失败: {e}")
+            return image  # 返回原始图像
+    
+    async def _preprocess_encoded_image(self, image_data: bytes, timeout: Optional[float] = None) -> bytes:
+        """预处理编码后的图像并重新编码为PNG（在进程池中执行）"""
+        try:
+            return await self.worker_pool.run_cpu(preprocess_image_bytes, image_data, timeout=timeout)
             
-            # 保存处理后的图像
-            output = io.BytesIO()
-            image.save(output, format='PNG')
-            return output.getvalue()
+        except (asyncio.TimeoutError, OCRQueueFullError):
+            raise
             
         except Exception as e:
             logger.warning(f"图像预处理失败: {e}")
             return image_data  # 返回原始图像
     
-    async def _extract_with_easyocr(self, image_data: bytes, **kwargs) -> Dict[str, Any]:
+    def _easyocr_readtext(self, image: SharedImageHandle) -> list:
+        """EasyOCR推理（在模型线程中执行）"""
+        return self.ocr_model.readtext(image.to_array())
+    
+    def _paddleocr_ocr(self, image: SharedImageHandle) -> list:
+        """PaddleOCR推理（在模型线程中执行）"""
+        return self.ocr_model.ocr(image.to_array(), cls=True)
+    
+    async def _extract_with_easyocr(self, image: SharedImageHandle, timeout: Optional[float] = None, **kwargs) -> Dict[str, Any]:
         """使用EasyOCR提取文本"""
         try:
-            import numpy as np
-            from PIL import Image
-            import io
-            
-            # 转换图像格式
-            image = Image.open(io.BytesIO(image_data))
-            image_array = np.array(image)
-            
             # 执行OCR
-            results = self.ocr_model.readtext(image_array)
+            results = await self.worker_pool.run_model(self._easyocr_readtext, image, timeout=timeout)
             
             # 处理结果
             extracted_text = []
@@ -365,23 +479,18 @@ class OCREngine:
                 }
             }
             
+        except (asyncio.TimeoutError, OCRQueueFullError):
+            raise
+            
         except Exception as e:
             logger.error(f"EasyOCR提取失败: {e}")
             return {"success": False, "error": str(e)}
     
-    async def _extract_with_paddleocr(self, image_data: bytes, **kwargs) -> Dict[str, Any]:
+    async def _extract_with_paddleocr(self, image: SharedImageHandle, timeout: Optional[float] = None, **kwargs) -> Dict[str, Any]:
         """使用PaddleOCR提取文本"""
         try:
-            import numpy as np
-            from PIL import Image
-            import io
-            
-            # 转换图像格式
-            image = Image.open(io.BytesIO(image_data))
-            image_array = np.array(image)
-            
             # 执行OCR
-            results = self.ocr_model.ocr(image_array, cls=True)
+            results = await self.worker_pool.run_model(self._paddleocr_ocr, image, timeout=timeout)
             
             # 处理结果
             extracted_text = []
@@ -407,24 +516,21 @@ class OCREngine:
                 }
             }
             
+        except (asyncio.TimeoutError, OCRQueueFullError):
+            raise
+            
         except Exception as e:
             logger.error(f"PaddleOCR提取失败: {e}")
             return {"success": False, "error": str(e)}
     
-    async def _extract_with_tesseract(self, image_data: bytes, **kwargs) -> Dict[str, Any]:
+    async def _extract_with_tesseract(self, image: SharedImageHandle, timeout: Optional[float] = None, **kwargs) -> Dict[str, Any]:
         """使用Tesseract提取文本"""
         try:
-            from PIL import Image
-            import io
-            
-            # 转换图像格式
-            image = Image.open(io.BytesIO(image_data))
-            
             # 设置语言
             lang = "chi_sim+eng" if "zh" in self.languages else "eng"
             
-            # 执行OCR
-            text = self.ocr_model.image_to_string(image, lang=lang)
+            # 执行OCR（在进程池中执行）
+            text = await self.worker_pool.run_cpu(tesseract_image_to_string, image, lang, timeout=timeout)
             
             return {
                 "success": True,
@@ -436,6 +542,9 @@ class OCREngine:
                 }
             }
             
+        except (asyncio.TimeoutError, OCRQueueFullError):
+            raise
+            
         except Exception as e:
             logger.error(f"Tesseract提取失败: {e}")
             return {"success": False, "error": str(e)}
@@ -510,6 +619,52 @@ class OCREngine:
             (current_avg * (total_requests - 1) + processing_time) / total_requests
         )
     
+    def _pipeline_stages(self) -> Dict[str, asyncio.Semaphore]:
+        """文档流水线各阶段的并发限制"""
+        workers = self.worker_pool.process_workers
+        return {
+            "decode": asyncio.Semaphore(workers),
+            "preprocess": asyncio.Semaphore(workers),
+            # 模型引擎在单个模型线程中串行推理，多排一页避免线程空闲
+            "ocr": asyncio.Semaphore(workers if self.engine == "tesseract" else 2),
+            "postprocess": asyncio.Semaphore(workers)
+        }
+    
+    async def iter_document(self, image_list: List[bytes], ordered: bool = False,
+                            **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流水线处理多页文档，逐页产出结果
+        
+        各页的解码、预处理、OCR和后处理阶段相互重叠，每个阶段有独立的并发限制，
+        同时处理的页数不超过 pipeline_window。
+        
+        Args:
+            image_list: 图像数据列表
+            ordered: True 按页序产出，False 按完成顺序产出
+            **kwargs: 其他参数，timeout 为单页超时（秒）
+            
+        Yields:
+            Dict: 单页OCR结果，page 字段为页索引（从0开始）
+        """
+        timeout = kwargs.pop("timeout", None) or self.worker_pool.request_timeout
+        stages = self._pipeline_stages()
+        window = asyncio.Semaphore(self.pipeline_window)
+        
+        async def run_page(index: int, image_data: bytes) -> Dict[str, Any]:
+            async with window:
+                result = await self._process_page(image_data, time.time() + timeout, stages, **kwargs)
+            result["page"] = index
+            return result
+        
+        tasks = [asyncio.create_task(run_page(i, image_data)) for i, image_data in enumerate(image_list)]
+        try:
+            for next_result in (tasks if ordered else asyncio.as_completed(tasks)):
+                yield await next_result
+        finally:
+            # 调用方提前退出时取消剩余页
+            for task in tasks:
+                task.cancel()
+    
     async def process_document(self, image_list: List[bytes], **kwargs) -> Dict[str, Any]:
         """
         处理多页文档
@@ -522,17 +677,16 @@ class OCREngine:
             Dict: 处理结果
         """
         try:
-            results = []
-            total_text = []
+            results: List[Optional[Dict[str, Any]]] = [None] * len(image_list)
+            completed = 0
             
-            for i, image_data in enumerate(image_list):
-                logger.info(f"处理第 {i+1}/{len(image_list)} 页")
-                
-                result = await self.extract_text(image_data, **kwargs)
-                results.append(result)
-                
-                if result["success"]:
-                    total_text.append(result["text"])
+            async for result in self.iter_document(image_list, **kwargs):
+                completed += 1
+                logger.info(f"完成第 {result['page']+1} 页 ({completed}/{len(image_list)})")
+                results[result["page"]] = result
+            
+            # 按页序合并
+            total_text = [r["text"] for r in results if r["success"]]
             
             # 合并所有文本
             combined_text = "\n\n".join(total_text) if self.preserve_layout else " ".join(total_text)
@@ -568,7 +722,9 @@ class OCREngine:
             "engine": self.engine,
             "available_engines": self.available_engines,
             "languages": self.languages,
-            "statistics": self.stats
+            "statistics": self.stats,
+            "workers": self.worker_pool.get_stats(),
+            "cache": self.cache.get_stats()
         }
     
     async def shutdown(self):
@@ -576,6 +732,9 @@ class OCREngine:
         try:
             logger.info("关闭OCR引擎")
             
+            # 关闭工作池
+            self.worker_pool.shutdown()
+            
             # 清理模型
             if self.ocr_model:
                 del self.ocr_model
@@ -0,0 +1,264 @@
+"""
+OCR工作池 - 将阻塞的OCR调用移出事件循环
+
+- CPU密集的图像解码、预处理和Tesseract在进程池中执行，吞吐随核心数扩展
+- EasyOCR/PaddleOCR等模型引擎在一个常驻的预热线程中加载并执行推理，
+  模型只加载一次，推理期间（torch/paddle释放GIL）事件循环保持响应
+- 提交队列有界，超出容量立即拒绝；每个请求有超时，超时或取消时
+  尚未开始的任务会从队列移除
+- 解码后的像素写入共享内存，各阶段之间只传递 SharedImageHandle（名称、模式、尺寸），
+  不再把整幅像素pickle后经管道在进程间来回复制
+"""
+
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class OCRQueueFullError(RuntimeError):
+    """OCR提交队列已满"""
+
+
+@dataclass(frozen=True)
+class SharedImageHandle:
+    """
+    共享内存中的解码图像（灰度或RGB像素）
+
+    句柄本身只有几十字节，可在主进程、工作进程和模型线程之间传递；
+    共享内存由创建它的阶段分配，由主进程在页面处理结束后调用 release() 释放
+    """
+    name: str
+    mode: str
+    size: Tuple[int, int]
+
+    @property
+    def nbytes(self) -> int:
+        width, height = self.size
+        return width * height * (3 if self.mode == 'RGB' else 1)
+
+    @classmethod
+    def from_image(cls, image) -> "SharedImageHandle":
+        """将PIL图像的像素写入新分配的共享内存"""
+        data = image.tobytes()
+        shm = SharedMemory(create=True, size=max(1, len(data)))
+        try:
+            shm.buf[:len(data)] = data
+            return cls(shm.name, image.mode, image.size)
+        finally:
+            shm.close()
+
+    def to_image(self):
+        """从共享内存复制出PIL图像"""
+        from PIL import Image
+
+        shm = SharedMemory(name=self.name)
+        try:
+            view = shm.buf[:self.nbytes]
+            try:
+                return Image.frombytes(self.mode, self.size, view)
+            finally:
+                view.release()
+        finally:
+            shm.close()
+
+    def to_array(self):
+        """从共享内存复制出模型输入的RGB数组 (高, 宽, 3)"""
+        import numpy as np
+
+        width, height = self.size
+        shm = SharedMemory(name=self.name)
+        try:
+            channels = 3 if self.mode == 'RGB' else 1
+            pixels = np.ndarray((height, width, channels), dtype=np.uint8, buffer=shm.buf)
+            array = pixels.copy() if channels == 3 else np.repeat(pixels, 3, axis=2)
+            del pixels
+            return array
+        finally:
+            shm.close()
+
+    def release(self):
+        """释放共享内存（重复释放或已被释放时忽略）"""
+        try:
+            shm = SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _decode(image_data: bytes):
+    """解码为灰度或RGB的PIL图像"""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_data))
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    return image
+
+
+def _preprocess(image):
+    """对比度增强 + 锐化"""
+    from PIL import ImageEnhance, ImageFilter
+
+    # 增强对比度
+    enhancer = ImageEnhance.Contrast(image)
+    image = enhancer.enhance(1.2)
+
+    # 锐化
+    return image.filter(ImageFilter.SHARPEN)
+
+
+def decode_image_bytes(image_data: bytes) -> SharedImageHandle:
+    """解码图像并写入共享内存，在工作进程中执行"""
+    return SharedImageHandle.from_image(_decode(image_data))
+
+
+def preprocess_shared_image(handle: SharedImageHandle) -> SharedImageHandle:
+    """预处理共享内存中的图像，结果写入新的共享内存，在工作进程中执行"""
+    return SharedImageHandle.from_image(_preprocess(handle.to_image()))
+
+
+def preprocess_image_bytes(image_data: bytes) -> bytes:
+    """解码、预处理并重新编码为PNG（供接收编码图像的云端API使用），在工作进程中执行"""
+    image = _preprocess(_decode(image_data))
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+def tesseract_image_to_string(handle: SharedImageHandle, lang: str) -> str:
+    """Tesseract识别，在工作进程中执行"""
+    import pytesseract
+
+    return pytesseract.image_to_string(handle.to_image(), lang=lang)
+
+
+def _release_orphaned_result(future: Future):
+    # 超时或取消后才结束的任务，其结果已无人接收：释放其中的共享内存
+    if not future.cancelled() and future.exception() is None and isinstance(future.result(), SharedImageHandle):
+        future.result().release()
+
+
+class OCRWorkerPool:
+    """OCR工作池"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.process_workers = max(1, config.get("worker_processes") or os.cpu_count() or 1)
+        self.max_queue_size = config.get("max_queue_size", 32)
+        self.request_timeout = config.get("request_timeout", 120.0)
+
+        # 已提交但未完成的请求数（含正在执行的）
+        self.capacity = self.process_workers + self.max_queue_size
+        self.pending = 0
+
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._model_thread: Optional[ThreadPoolExecutor] = None
+
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "cancelled": 0
+        }
+
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            # 先启动资源跟踪进程，使工作进程与主进程共用同一个：
+            # 工作进程创建、主进程释放的共享内存才不会在工作进程退出时被误报泄漏
+            resource_tracker.ensure_running()
+            self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self._process_pool
+
+    @property
+    def model_thread(self) -> ThreadPoolExecutor:
+        # 单个常驻线程：模型在此加载并执行全部推理
+        if self._model_thread is None:
+            self._model_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr-model")
+        return self._model_thread
+
+    async def load_model(self, factory: Callable[[], Any]) -> Any:
+        """在模型线程中加载（预热）模型"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.model_thread, factory)
+
+    async def run_cpu(self, func: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """在进程池中执行CPU密集函数（函数和参数需可pickle）"""
+        return await self._submit(self.process_pool, func, args, timeout)
+
+    async def run_model(self, func: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """在模型线程中执行推理"""
+        return await self._submit(self.model_thread, func, args, timeout)
+
+    async def _submit(self, executor: Executor, func: Callable, args: tuple, timeout: Optional[float]) -> Any:
+        if self.pending >= self.capacity:
+            self.stats["rejected"] += 1
+            raise OCRQueueFullError(f"OCR队列已满 ({self.pending}/{self.capacity})")
+
+        loop = asyncio.get_running_loop()
+        future = executor.submit(func, *args)
+        self.pending += 1
+        self.stats["submitted"] += 1
+        # 名额在底层任务真正结束时才释放，超时后仍在执行的任务继续计入容量
+        future.add_done_callback(lambda f: self._on_done(loop, f))
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.request_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            if not future.cancel():
+                future.add_done_callback(_release_orphaned_result)
+            raise
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            if not future.cancel():
+                future.add_done_callback(_release_orphaned_result)
+            raise
+
+    def _on_done(self, loop: asyncio.AbstractEventLoop, future: Future):
+        try:
+            loop.call_soon_threadsafe(self._mark_done, future)
+        except RuntimeError:
+            # 事件循环已关闭
+            self._mark_done(future)
+
+    def _mark_done(self, future: Future):
+        self.pending -= 1
+        if future.cancelled():
+            return
+        if future.exception() is None:
+            self.stats["completed"] += 1
+        else:
+            self.stats["failed"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "process_workers": self.process_workers,
+            "max_queue_size": self.max_queue_size,
+            "request_timeout": self.request_timeout,
+            "pending": self.pending,
+            **self.stats
+        }
+
+    def shutdown(self):
+        """关闭工作池，取消尚未开始的任务"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+        if self._model_thread is not None:
+            self._model_thread.shutdown(wait=False, cancel_futures=True)
+            self._model_thread = None
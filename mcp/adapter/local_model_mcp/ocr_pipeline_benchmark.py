@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+OCR多页文档流水线基准测试
+
+用自带的保险表单样本（張家銓_1_*.jpg）循环组成N页文档，分别以1、2、4...个
+工作进程运行 OCREngine.process_document（流水线）和逐页 extract_text（顺序），
+报告 页/秒 随核心数的变化。
+
+需要可用的OCR引擎（EasyOCR/PaddleOCR/Tesseract）；不可用时只测量解码+预处理阶段。
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import List
+
+from ocr import OCREngine
+from ocr.ocr_workers import decode_image_bytes, preprocess_shared_image
+
+SAMPLE_DIR = Path(__file__).parent
+
+
+def load_pages(page_count: int) -> List[bytes]:
+    samples = [path.read_bytes() for path in sorted(SAMPLE_DIR.glob("張家銓_1_*.jpg"))]
+    if not samples:
+        raise SystemExit("❌ 未找到样本表单 張家銓_1_*.jpg")
+    return [samples[i % len(samples)] for i in range(page_count)]
+
+
+def worker_counts(max_workers: int) -> List[int]:
+    counts = []
+    count = 1
+    while count < max_workers:
+        counts.append(count)
+        count *= 2
+    counts.append(max_workers)
+    return counts
+
+
+async def run_ocr(pages: List[bytes], workers: int, engine_name: str) -> dict:
+    """完整OCR：流水线 vs 顺序"""
+    engine = OCREngine({"ocr": {"enabled": True, "engine": engine_name, "worker_processes": workers}})
+    if not await engine.initialize():
+        return {}
+
+    try:
+        # 预热工作进程
+        await engine.extract_text(pages[0])
+
+        start = time.time()
+        for image_data in pages:
+            await engine.extract_text(image_data)
+        sequential = time.time() - start
+
+        start = time.time()
+        result = await engine.process_document(pages)
+        pipelined = time.time() - start
+    finally:
+        await engine.shutdown()
+
+    return {
+        "engine": engine.engine,
+        "sequential_pages_per_second": len(pages) / sequential,
+        "pipelined_pages_per_second": len(pages) / pipelined,
+        "successful_pages": result["successful_pages"]
+    }
+
+
+async def run_stages(pages: List[bytes], workers: int) -> dict:
+    """仅解码+预处理阶段：流水线 vs 顺序"""
+    engine = OCREngine({"ocr": {"enabled": True, "worker_processes": workers}})
+    pool = engine.worker_pool
+    stages = engine._pipeline_stages()
+
+    async def page_stages(image_data: bytes, limited: bool):
+        handles = []
+        try:
+            if limited:
+                async with stages["decode"]:
+                    handles.append(await pool.run_cpu(decode_image_bytes, image_data))
+                async with stages["preprocess"]:
+                    handles.append(await pool.run_cpu(preprocess_shared_image, handles[0]))
+            else:
+                handles.append(await pool.run_cpu(decode_image_bytes, image_data))
+                handles.append(await pool.run_cpu(preprocess_shared_image, handles[0]))
+        finally:
+            for handle in handles:
+                handle.release()
+
+    try:
+        # 预热工作进程
+        await asyncio.gather(*(page_stages(pages[0], False) for _ in range(workers)))
+
+        start = time.time()
+        for image_data in pages:
+            await page_stages(image_data, False)
+        sequential = time.time() - start
+
+        window = asyncio.Semaphore(engine.pipeline_window)
+
+        async def windowed(image_data: bytes):
+            async with window:
+                return await page_stages(image_data, True)
+
+        start = time.time()
+        await asyncio.gather(*(windowed(image_data) for image_data in pages))
+        pipelined = time.time() - start
+    finally:
+        pool.shutdown()
+
+    return {
+        "engine": "解码+预处理",
+        "sequential_pages_per_second": len(pages) / sequential,
+        "pipelined_pages_per_second": len(pages) / pipelined,
+        "successful_pages": len(pages)
+    }
+
+
+async def main_async(page_count: int, max_workers: int, engine_name: str) -> None:
+    pages = load_pages(page_count)
+    print(f"🚀 OCR文档流水线基准测试 ({page_count} 页, CPU核心数 {os.cpu_count()})")
+
+    stages_only = False
+    for workers in worker_counts(max_workers):
+        result = {} if stages_only else await run_ocr(pages, workers, engine_name)
+        if not result:
+            if not stages_only:
+                print("⚠️ 没有可用的OCR引擎，仅测量解码+预处理阶段")
+                stages_only = True
+            result = await run_stages(pages, workers)
+
+        speedup = result["pipelined_pages_per_second"] / result["sequential_pages_per_second"]
+        print(
+            f"   {result['engine']:<10} 工作进程 {workers:>3}  "
+            f"顺序 {result['sequential_pages_per_second']:7.2f} 页/秒  "
+            f"流水线 {result['pipelined_pages_per_second']:7.2f} 页/秒  "
+            f"加速 {speedup:5.2f}x  成功 {result['successful_pages']}/{page_count}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OCR文档流水线基准测试")
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--engine", default="integrated", help="integrated/easyocr/paddleocr/tesseract")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main_async(args.pages, args.max_workers, args.engine))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+共享解码图像 - 一次解码，多个OCR引擎/预处理器共用
+
+图像只解码一次为NumPy数组，灰度、BGR/RGB、二值化和缩放视图在首次访问时
+派生并缓存。所有数组均为只读，各引擎直接使用同一缓冲区而不复制；
+每个实例记录解码次数和分配的字节数，便于按请求统计。
+"""
+
+import threading
+from typing import Any, Dict, Tuple, Union
+
+import cv2
+import numpy as np
+
+
+class SharedImage:
+    """共享解码图像"""
+
+    def __init__(self, data: np.ndarray, source: str = "<array>"):
+        self.source = source
+        self.decode_count = 0
+        self.bytes_allocated = 0
+        self._views: Dict[Any, np.ndarray] = {}
+        self._lock = threading.RLock()
+        self._base = self._track(data)
+
+    @classmethod
+    def from_path(cls, image_path: str) -> "SharedImage":
+        """从文件解码（np.fromfile + imdecode，支持非ASCII路径）"""
+        return cls.from_bytes(np.fromfile(image_path, dtype=np.uint8), source=image_path)
+
+    @classmethod
+    def from_bytes(cls, image_data: Union[bytes, np.ndarray], source: str = "<bytes>") -> "SharedImage":
+        """从编码后的图像数据解码"""
+        buffer = np.frombuffer(image_data, dtype=np.uint8) if isinstance(image_data, bytes) else image_data
+        # 保留原始通道数：灰度扫描件解码为二维数组，灰度视图即为原始缓冲区
+        decoded = cv2.imdecode(buffer, cv2.IMREAD_UNCHANGED)
+        if decoded is None:
+            raise ValueError(f"无法读取图像: {source}")
+        if decoded.ndim == 3 and decoded.shape[2] == 4:
+            decoded = cv2.cvtColor(decoded, cv2.COLOR_BGRA2BGR)
+
+        image = cls(decoded, source=source)
+        image.decode_count = 1
+        return image
+
+    @classmethod
+    def load(cls, image: Union[str, bytes, "SharedImage"]) -> "SharedImage":
+        """路径、字节或已解码图像统一转换为SharedImage"""
+        if isinstance(image, SharedImage):
+            return image
+        if isinstance(image, bytes):
+            return cls.from_bytes(image)
+        return cls.from_path(image)
+
+    def _track(self, array: np.ndarray) -> np.ndarray:
+        """记录分配并设为只读"""
+        self.bytes_allocated += array.nbytes
+        array.flags.writeable = False
+        return array
+
+    def _derive(self, key: Any, factory) -> np.ndarray:
+        view = self._views.get(key)
+        if view is None:
+            with self._lock:
+                view = self._views.get(key)
+                if view is None:
+                    view = self._track(factory())
+                    self._views[key] = view
+        return view
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self._base.shape
+
+    @property
+    def width(self) -> int:
+        return self._base.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self._base.shape[0]
+
+    @property
+    def bgr(self) -> np.ndarray:
+        """BGR视图（OpenCV/PaddleOCR）"""
+        if self._base.ndim == 3:
+            return self._base
+        return self._derive("bgr", lambda: cv2.cvtColor(self._base, cv2.COLOR_GRAY2BGR))
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """RGB视图（EasyOCR/PIL）"""
+        if self._base.ndim == 2:
+            return self._derive("rgb", lambda: cv2.cvtColor(self._base, cv2.COLOR_GRAY2RGB))
+        return self._derive("rgb", lambda: cv2.cvtColor(self._base, cv2.COLOR_BGR2RGB))
+
+    @property
+    def gray(self) -> np.ndarray:
+        """灰度视图"""
+        if self._base.ndim == 2:
+            return self._base
+        return self._derive("gray", lambda: cv2.cvtColor(self._base, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def binary(self) -> np.ndarray:
+        """二值化视图（Otsu）"""
+        return self._derive("binary", lambda: cv2.threshold(self.gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1])
+
+    def resized(self, size: Tuple[int, int], view: str = "gray") -> np.ndarray:
+        """
+        缩放视图
+
+        Args:
+            size: 目标尺寸 (宽, 高)
+            view: 源视图 ("gray", "bgr", "rgb", "binary")
+        """
+        source = getattr(self, view)
+        if (source.shape[1], source.shape[0]) == tuple(size):
+            return source
+        return self._derive(("resized", view, tuple(size)),
+                            lambda: cv2.resize(source, tuple(size), interpolation=cv2.INTER_CUBIC))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """解码与内存统计"""
+        return {
+            "source": self.source,
+            "decode_count": self.decode_count,
+            "bytes_allocated": self.bytes_allocated,
+            "derived_views": len(self._views)
+        }
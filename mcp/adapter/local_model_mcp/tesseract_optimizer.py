@@ -7,13 +7,15 @@ import cv2
 import numpy as np
 from PIL import Image
 import logging
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
 from dataclasses import dataclass, replace
 from enum import Enum
 import re
 import time
 import os
 
+from shared_image import SharedImage
+
 logger = logging.getLogger(__name__)
 
 class ContentType(Enum):
@@ -98,20 +100,21 @@ class TesseractOptimizer:
         
         return configs
     
-    def detect_content_type(self, image_path: str) -> ContentType:
+    def detect_content_type(self, image_path: Union[str, SharedImage]) -> ContentType:
         """
         检测图像的主要内容类型
         
         Args:
-            image_path: 图像路径
+            image_path: 图像路径或已解码的SharedImage
             
         Returns:
             ContentType: 检测到的内容类型
         """
-        logger.info(f"🔍 检测内容类型: {image_path}")
+        shared = SharedImage.load(image_path)
+        logger.info(f"🔍 检测内容类型: {shared.source}")
         
-        # 读取图像
-        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        # 共享的灰度视图
+        image = shared.gray
         
         # 基础OCR识别
         try:
@@ -198,17 +201,20 @@ class TesseractOptimizer:
         # 手写通常有更多不规则边缘
         return edge_density > 0.05
     
-    def optimize_for_content(self, image_path: str, content_type: ContentType = None) -> TesseractConfig:
+    def optimize_for_content(self, image_path: Union[str, SharedImage], content_type: ContentType = None) -> TesseractConfig:
         """
         为特定内容类型优化Tesseract配置
         
         Args:
-            image_path: 图像路径
+            image_path: 图像路径或已解码的SharedImage
             content_type: 内容类型，None则自动检测
             
         Returns:
             TesseractConfig: 优化后的配置
         """
+        # 内容检测和微调共用一次解码
+        image_path = SharedImage.load(image_path)
+        
         if content_type is None:
             content_type = self.detect_content_type(image_path)
         
@@ -221,9 +227,9 @@ class TesseractOptimizer:
         
         return optimized_config
     
-    def _fine_tune_config(self, image_path: str, config: TesseractConfig) -> TesseractConfig:
+    def _fine_tune_config(self, image_path: Union[str, SharedImage], config: TesseractConfig) -> TesseractConfig:
         """根据图像特征微调配置"""
-        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        image = SharedImage.load(image_path).gray
         
         # 分析图像质量
         image_quality = self._analyze_image_quality(image)
@@ -291,9 +297,11 @@ class TesseractOptimizer:
         
         return " ".join(cmd_parts)
     
-    def test_multiple_configs(self, image_path: str) -> Dict[str, Dict]:
+    def test_multiple_configs(self, image_path: Union[str, SharedImage]) -> Dict[str, Dict]:
         """测试多种配置的效果"""
-        logger.info(f"🧪 测试多种Tesseract配置: {image_path}")
+        # 所有配置共用一次解码
+        shared = SharedImage.load(image_path)
+        logger.info(f"🧪 测试多种Tesseract配置: {shared.source}")
         
         results = {}
         
@@ -308,11 +316,8 @@ class TesseractOptimizer:
                 # 执行OCR
                 start_time = time.time()
                 
-                # 使用PIL读取图像
-                image = Image.open(image_path)
-                
                 # 执行OCR
-                text = pytesseract.image_to_string(image, config=cmd)
+                text = pytesseract.image_to_string(shared.gray, config=cmd)
                 
                 processing_time = time.time() - start_time
                 
@@ -366,7 +371,7 @@ class TesseractOptimizer:
         
         return min(score, 1.0)
     
-    def get_best_config(self, image_path: str) -> Tuple[TesseractConfig, str]:
+    def get_best_config(self, image_path: Union[str, SharedImage]) -> Tuple[TesseractConfig, str]:
         """获取最佳配置"""
         results = self.test_multiple_configs(image_path)
         
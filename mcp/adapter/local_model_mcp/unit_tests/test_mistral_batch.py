@@ -0,0 +1,306 @@
+"""
+Mistral OCR批量处理测试
+使用本地桩HTTP服务器回放录制的响应，测试并发上限、共享连接池、令牌桶限速、
+429/5xx退避重试以及按顺序/按完成顺序流式产出
+"""
+
+import unittest
+import asyncio
+import base64
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+import sys
+
+from aiohttp import web
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from mistral_ocr_engine import MistralOCREngine
+from batch_http_client import BatchHTTPClient, BatchClientConfig, HTTPStatusError, TokenBucket
+
+
+def completion(text: str) -> dict:
+    """录制的chat/completions成功响应"""
+    content = json.dumps({
+        "extracted_text": text,
+        "confidence": 0.93,
+        "document_type": "表单",
+        "structured_data": {"fields": {}, "tables": []}
+    }, ensure_ascii=False)
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+async def finish_pending_tasks():
+    """等待循环中其他任务 (如调度过来的会话关闭) 完成"""
+    await asyncio.sleep(0)
+    current = asyncio.current_task()
+    await asyncio.gather(*[task for task in asyncio.all_tasks() if task is not current])
+
+
+class StubServer:
+    """回放录制响应的桩服务器：按图像内容查找响应序列，序列用完后返回成功响应"""
+
+    def __init__(self, recordings=None, delay: float = 0.02):
+        self.recordings = {key: list(responses) for key, responses in (recordings or {}).items()}
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = []
+        self.peers = set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        image_url = payload["messages"][0]["content"][1]["image_url"]["url"]
+        key = image_url.split(",", 1)[1]
+        self.requests.append(key)
+        self.peers.add(request.transport.get_extra_info("peername"))
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            responses = self.recordings.get(key)
+            status, body, headers = responses.pop(0) if responses else (200, None, {})
+            await asyncio.sleep(body.get("delay", self.delay) if isinstance(body, dict) else self.delay)
+            if status == 200:
+                return web.json_response(completion(key))
+            return web.Response(status=status, text=str(body), headers=headers)
+        finally:
+            self.in_flight -= 1
+
+    async def start(self) -> str:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/chat/completions", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+class TestMistralBatch(unittest.IsolatedAsyncioTestCase):
+    """Mistral OCR批量处理测试类"""
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.servers = []
+
+    async def asyncTearDown(self):
+        for server in self.servers:
+            await server.stop()
+        self.tmp.cleanup()
+
+    def make_images(self, count: int):
+        """图像内容即为桩服务器的查找键 (base64后)"""
+        paths = []
+        for i in range(count):
+            path = Path(self.tmp.name) / f"page_{i:03d}.jpg"
+            path.write_bytes(f"page-{i:03d}".encode())
+            paths.append(str(path))
+        return paths
+
+    async def start(self, recordings=None, delay: float = 0.02):
+        server = StubServer(recordings, delay)
+        self.servers.append(server)
+        return server, await server.start()
+
+    async def test_batch_respects_concurrency_and_keeps_order(self):
+        """测试批量请求同时在途数达到并发上限，复用连接池，结果与输入顺序一致"""
+        server, base_url = await self.start()
+        paths = self.make_images(20)
+
+        async with MistralOCREngine("key", base_url, concurrency=4) as engine:
+            results = await engine.batch_process(paths)
+
+        self.assertEqual(server.max_in_flight, 4)
+        self.assertLessEqual(len(server.peers), 4)
+        self.assertEqual(len(server.requests), 20)
+        keys = [base64.b64encode(Path(path).read_bytes()).decode() for path in paths]
+        self.assertEqual([r.text for r in results], keys)
+
+    async def test_retries_429_and_5xx_but_not_4xx(self):
+        """测试429/503按退避重试后成功，400直接失败并作为错误结果返回"""
+        paths = self.make_images(3)
+        keys = [base64.b64encode(Path(p).read_bytes()).decode() for p in paths]
+        server, base_url = await self.start({
+            keys[0]: [(429, "rate limited", {"Retry-After": "0"}), (503, "unavailable", {})],
+            keys[1]: [(400, "bad request", {})],
+        })
+
+        async with MistralOCREngine("key", base_url, concurrency=3) as engine:
+            engine.http.config.backoff_base = 0.01
+            results = await engine.batch_process(paths)
+            stats = engine.http.get_stats()
+
+        self.assertEqual(results[0].text, keys[0])
+        self.assertIn("400", results[1].metadata["error"])
+        self.assertEqual(results[2].text, keys[2])
+        self.assertEqual(server.requests.count(keys[0]), 3)
+        self.assertEqual(server.requests.count(keys[1]), 1)
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["status_counts"], {200: 2, 429: 1, 503: 1, 400: 1})
+
+    async def test_retries_exhausted(self):
+        """测试重试耗尽后抛出最后一次的HTTP错误"""
+        server, base_url = await self.start({"x": [(500, "boom", {})] * 5})
+
+        async with BatchHTTPClient(BatchClientConfig(max_retries=2, backoff_base=0.001)) as client:
+            with self.assertRaises(HTTPStatusError) as ctx:
+                await client.post_json(f"{base_url}/chat/completions", {
+                    "messages": [{"content": [{}, {"image_url": {"url": "data:,x"}}]}]
+                })
+
+        self.assertEqual(ctx.exception.status, 500)
+        self.assertEqual(server.requests.count("x"), 3)
+
+    async def test_process_image_max_retries_counts_attempts(self):
+        """测试 process_image 的 max_retries 为含首次请求的总尝试次数"""
+        paths = self.make_images(1)
+        key = base64.b64encode(Path(paths[0]).read_bytes()).decode()
+        server, base_url = await self.start({key: [(503, "unavailable", {})] * 5})
+
+        async with MistralOCREngine("key", base_url) as engine:
+            engine.http.config.backoff_base = 0.001
+            with self.assertRaises(HTTPStatusError):
+                await engine.process_image(paths[0], max_retries=3)
+            self.assertEqual(server.requests.count(key), 3)
+
+            await engine.process_image(paths[0], max_retries=3)
+        self.assertEqual(server.requests.count(key), 6)
+
+    async def test_token_bucket_limits_per_model(self):
+        """测试令牌桶按模型限速，不同模型互不影响"""
+        _, base_url = await self.start(delay=0)
+        payload = {"messages": [{"content": [{}, {"image_url": {"url": "data:,x"}}]}]}
+
+        async with BatchHTTPClient(BatchClientConfig(concurrency=8)) as client:
+            client.set_rate_limit("slow", 20, burst=1)
+            start = time.perf_counter()
+            await asyncio.gather(*[
+                client.post_json(f"{base_url}/chat/completions", payload, model="slow") for _ in range(6)
+            ])
+            slow_elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            await asyncio.gather(*[
+                client.post_json(f"{base_url}/chat/completions", payload, model="fast") for _ in range(6)
+            ])
+            fast_elapsed = time.perf_counter() - start
+
+        self.assertGreaterEqual(slow_elapsed, 0.24)
+        self.assertLess(fast_elapsed, slow_elapsed)
+        self.assertGreater(client.get_stats()["rate_limit_wait"], 0.2)
+
+    async def test_stream_as_completed(self):
+        """测试按完成顺序产出时慢请求不阻塞后续结果"""
+        paths = self.make_images(4)
+        slow_key = base64.b64encode(Path(paths[0]).read_bytes()).decode()
+        _, base_url = await self.start({slow_key: [(200, {"delay": 0.3}, {})]}, delay=0.01)
+
+        async with MistralOCREngine("key", base_url, concurrency=4) as engine:
+            streamed = [index async for index, _ in engine.iter_batch(paths)]
+            ordered = [index async for index, _ in engine.iter_batch(paths, ordered=True)]
+
+        self.assertEqual(streamed[-1], 0)
+        self.assertEqual(ordered, [0, 1, 2, 3])
+
+    async def test_token_bucket_burst(self):
+        """测试令牌桶初始容量允许突发"""
+        bucket = TokenBucket(rate=10, capacity=3)
+        waits = [await bucket.acquire() for _ in range(4)]
+        self.assertLess(max(waits[:3]), 0.01)
+        self.assertGreater(waits[3], 0.05)
+
+
+class TestBatchClientLoopChange(unittest.TestCase):
+    """连接池换事件循环测试类"""
+
+    def setUp(self):
+        # 桩服务器运行在独立线程的事件循环中，两个客户端循环访问同一地址
+        self.stub = StubServer(delay=0)
+        self.server_loop = asyncio.new_event_loop()
+        self.server_thread = threading.Thread(target=self.server_loop.run_forever, daemon=True)
+        self.server_thread.start()
+        self.base_url = asyncio.run_coroutine_threadsafe(self.stub.start(), self.server_loop).result(5)
+        self.payload = {"messages": [{"content": [{}, {"image_url": {"url": "data:,x"}}]}]}
+
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.stub.stop(), self.server_loop).result(5)
+        self.server_loop.call_soon_threadsafe(self.server_loop.stop)
+        self.server_thread.join(5)
+        self.server_loop.close()
+
+    def test_open_on_new_loop_closes_old_session(self):
+        """测试换循环后重建连接池并关闭旧连接池"""
+        client = BatchHTTPClient()
+
+        async def request():
+            await client.post_json(f"{self.base_url}/chat/completions", self.payload)
+            return client.session
+
+        first_loop = asyncio.new_event_loop()
+        try:
+            first_session = first_loop.run_until_complete(request())
+            second_loop = asyncio.new_event_loop()
+            try:
+                second_session = second_loop.run_until_complete(request())
+                self.assertIsNot(second_session, first_session)
+                self.assertFalse(second_session.closed)
+                second_loop.run_until_complete(client.close())
+            finally:
+                second_loop.close()
+            # 旧会话的关闭已调度到旧循环，旧循环再次运行时完成
+            first_loop.run_until_complete(finish_pending_tasks())
+            self.assertTrue(first_session.closed)
+        finally:
+            first_loop.close()
+        self.assertTrue(second_session.closed)
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_session_on_closed_loop_detached(self):
+        """测试原循环已关闭时分离连接器并记录，不调用aiohttp内部方法"""
+        client = BatchHTTPClient()
+        first_loop = asyncio.new_event_loop()
+        first_loop.run_until_complete(client.open())
+        session = client.session
+        connector = session.connector
+        first_loop.close()
+
+        with self.assertLogs("batch_http_client", level="WARNING"):
+            asyncio.run(client.open())
+        self.assertIsNone(session.connector)
+        self.assertFalse(connector.closed)
+        self.assertIsNot(client.session, session)
+        asyncio.run(client.close())
+
+    def test_close_from_other_loop(self):
+        """测试在另一个循环中关闭时仍关闭连接池，循环运行中时在原循环内关闭"""
+        client = BatchHTTPClient()
+        client_loop = asyncio.new_event_loop()
+        client_thread = threading.Thread(target=client_loop.run_forever, daemon=True)
+        client_thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(
+                client.post_json(f"{self.base_url}/chat/completions", self.payload), client_loop).result(5)
+            session = client.session
+
+            asyncio.run(client.close())
+            self.assertIsNone(client.session)
+            asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), client_loop).result(5)
+            self.assertTrue(session.closed)
+        finally:
+            client_loop.call_soon_threadsafe(client_loop.stop)
+            client_thread.join(5)
+            client_loop.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
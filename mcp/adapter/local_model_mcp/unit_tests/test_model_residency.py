@@ -0,0 +1,157 @@
+"""
+模型常驻管理测试
+测试内存预算内多模型常驻、LRU淘汰、默认模型固定、后台预加载以及切换/冷启动统计
+"""
+
+import unittest
+import asyncio
+from pathlib import Path
+import sys
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.model_manager import ModelManager
+
+
+class FakeModel:
+    """模拟本地模型：加载有固定延迟，记录加载与卸载"""
+
+    loads = []
+
+    def __init__(self, config):
+        self.config = config
+        self.current_mode = config.get("mode", "local")
+
+    async def initialize(self):
+        FakeModel.loads.append(self.config["model_name"])
+        await asyncio.sleep(0.02)
+        return True
+
+    async def generate(self, prompt, **kwargs):
+        await asyncio.sleep(kwargs.get("delay", 0))
+        return {"success": True, "text": f"{self.config['model_name']}: {prompt}"}
+
+    async def shutdown(self):
+        pass
+
+
+class FakeMemoryUtils:
+    """固定的系统可用内存"""
+
+    def __init__(self, available_gb: float):
+        self.available_gb = available_gb
+
+    async def get_memory_info(self):
+        return {"available_memory_gb": self.available_gb}
+
+
+class TestModelResidency(unittest.IsolatedAsyncioTestCase):
+    """模型常驻管理测试类"""
+
+    async def make_manager(self, memory_limit_gb=16, available_gb=64.0, preload=False):
+        FakeModel.loads = []
+        config = {
+            "models": {
+                "default_model": "qwen",
+                "qwen": {"enabled": True, "model_name": "qwen", "memory_gb": 5},
+                "mistral": {"enabled": True, "model_name": "mistral", "memory_gb": 8},
+                "llama": {"enabled": True, "model_name": "llama", "memory_gb": 6}
+            },
+            "performance": {"memory_limit_gb": memory_limit_gb, "preload_predicted": preload}
+        }
+        manager = ModelManager(config)
+        await manager.initialize()
+        manager.model_classes = {"qwen": FakeModel, "mistral": FakeModel, "llama": FakeModel}
+        manager.memory_utils = FakeMemoryUtils(available_gb)
+        await manager.load_model("qwen")
+        return manager
+
+    async def test_alternating_models_stay_warm(self):
+        """测试预算内交替请求不再反复加载卸载"""
+        manager = await self.make_manager()
+
+        for i in range(6):
+            result = await manager.text_generation("你好", "qwen" if i % 2 else "mistral")
+            self.assertTrue(result["success"])
+
+        stats = manager.get_residency_stats()
+        self.assertEqual(FakeModel.loads, ["qwen", "mistral"])
+        self.assertEqual((stats["cold_starts"], stats["hits"], stats["evictions"]), (2, 5, 0))
+        self.assertEqual(stats["switches"], 5)
+        self.assertEqual(stats["resident_memory_gb"], 13)
+        self.assertGreater(stats["cold_start_latency"]["mistral"]["average"], 0.01)
+
+    async def test_evicts_lru_but_keeps_pinned_default(self):
+        """测试超出预算时淘汰最久未使用的模型，默认模型固定不被淘汰"""
+        manager = await self.make_manager(memory_limit_gb=14)
+
+        await manager.text_generation("a", "mistral")
+        await manager.text_generation("b", "qwen")
+        await manager.text_generation("c", "llama")
+
+        self.assertEqual(set(manager.active_models), {"qwen", "llama"})
+        self.assertEqual(manager.get_residency_stats()["evictions"], 1)
+        self.assertTrue(manager.get_residency_stats()["residents"]["qwen"]["pinned"])
+
+    async def test_low_free_memory_triggers_eviction(self):
+        """测试系统可用内存不足时即使未超出预算也会淘汰"""
+        manager = await self.make_manager(available_gb=7.0)
+
+        await manager.text_generation("a", "llama")
+        await manager.text_generation("b", "mistral")
+
+        self.assertEqual(set(manager.active_models), {"qwen", "mistral"})
+
+    async def test_busy_model_not_evicted(self):
+        """测试正在推理的模型不会被淘汰"""
+        manager = await self.make_manager(memory_limit_gb=14)
+        await manager.load_model("mistral")
+
+        busy = asyncio.create_task(manager.text_generation("长任务", "mistral", delay=0.1))
+        await asyncio.sleep(0.01)
+        await manager.text_generation("c", "llama")
+
+        self.assertTrue((await busy)["success"])
+        self.assertIn("mistral", manager.active_models)
+        self.assertEqual(manager.get_residency_stats()["evictions"], 0)
+
+    async def test_cloud_model_skips_budget_and_eviction(self):
+        """测试云端模式的模型不触发淘汰，也不会被当作淘汰对象"""
+        manager = await self.make_manager(memory_limit_gb=12)
+        manager.model_configs["mistral"]["mode"] = "cloud"
+
+        await manager.text_generation("a", "mistral")
+        await manager.text_generation("b", "llama")
+        self.assertEqual(set(manager.active_models), {"qwen", "mistral", "llama"})
+        self.assertEqual(manager.get_residency_stats()["residents"]["mistral"]["memory_gb"], 0)
+
+        # 已知运行在云端的模型再次加载时不检查预算，不淘汰本地模型
+        await manager.unload_model("mistral")
+        await manager.text_generation("c", "mistral")
+        self.assertEqual(set(manager.active_models), {"qwen", "mistral", "llama"})
+        self.assertEqual(manager.get_residency_stats()["evictions"], 0)
+
+    async def test_preloads_predicted_model(self):
+        """测试根据请求历史在后台预加载下一个模型"""
+        manager = await self.make_manager(memory_limit_gb=14, preload=True)
+
+        await manager.text_generation("a", "qwen")
+        await manager.text_generation("b", "mistral")
+        await manager.text_generation("c", "qwen")
+        await manager.text_generation("d", "llama")     # 淘汰mistral
+        await manager.text_generation("e", "qwen")      # 预测下一个为mistral，后台预加载
+        await asyncio.sleep(0.05)
+
+        self.assertIn("mistral", manager.active_models)
+        stats = manager.get_residency_stats()
+        self.assertEqual(stats["preloads"], 1)
+
+        cold_starts = stats["cold_starts"]
+        await manager.text_generation("f", "mistral")
+        self.assertEqual(manager.get_residency_stats()["cold_starts"], cold_starts)
+        await manager.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
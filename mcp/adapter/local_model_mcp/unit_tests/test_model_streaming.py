@@ -0,0 +1,323 @@
+"""
+模型长连接与流式输出测试
+使用本地Ollama兼容桩服务器 (NDJSON) 和OpenAI兼容桩服务器 (SSE)，测试会话复用、
+流式增量输出、流式请求不受总时长限制、换事件循环时旧会话的关闭、
+LocalModelMCP的首个token延迟/生成速度统计，以及本地生成线程出错或卡死时的结束处理
+"""
+
+import unittest
+import asyncio
+import json
+import queue
+import tempfile
+import threading
+import time
+from pathlib import Path
+import sys
+
+import toml
+from unittest import mock
+from aiohttp import web
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parents[4]))
+
+from mcp.adapter.local_model_mcp.local_model_mcp import LocalModelMCP
+from mcp.adapter.local_model_mcp.models.qwen_model import QwenModel
+from mcp.adapter.local_model_mcp.models.mistral_model import MistralModel
+from mcp.adapter.local_model_mcp.models import model_session, qwen_model
+from mcp.adapter.local_model_mcp.models.model_session import BackendSessions
+
+TOKENS = ["你好", "，", "我是", "通义", "千问", "。"]
+
+
+class OllamaStub:
+    """Ollama兼容桩服务器：/api/tags、/api/chat (流式NDJSON)、/v1/chat/completions (SSE)"""
+
+    def __init__(self, token_delay: float = 0.03):
+        self.token_delay = token_delay
+        self.peers = set()
+        self.requests = []
+
+    async def tags(self, request):
+        self.peers.add(request.transport.get_extra_info("peername"))
+        return web.json_response({"models": [{"name": "qwen2.5:8b"}]})
+
+    async def chat(self, request):
+        self.peers.add(request.transport.get_extra_info("peername"))
+        payload = await request.json()
+        self.requests.append(payload)
+        if not payload.get("stream"):
+            return web.json_response({
+                "message": {"role": "assistant", "content": "".join(TOKENS)},
+                "done": True
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        for token in TOKENS:
+            await asyncio.sleep(self.token_delay)
+            line = {"message": {"role": "assistant", "content": token}, "done": False}
+            await response.write((json.dumps(line, ensure_ascii=False) + "\n").encode())
+        await response.write(json.dumps({"done": True, "eval_count": len(TOKENS)}).encode() + b"\n")
+        await response.write_eof()
+        return response
+
+    async def models(self, request):
+        return web.json_response({"data": []})
+
+    async def completions(self, request):
+        payload = await request.json()
+        self.requests.append(payload)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for token in TOKENS:
+            await asyncio.sleep(self.token_delay)
+            event = {"choices": [{"delta": {"content": token}}]}
+            await response.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/api/tags", self.tags)
+        app.router.add_post("/api/chat", self.chat)
+        app.router.add_get("/v1/models", self.models)
+        app.router.add_post("/v1/chat/completions", self.completions)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+
+class TestModelStreaming(unittest.IsolatedAsyncioTestCase):
+    """长连接与流式输出测试类"""
+
+    async def asyncSetUp(self):
+        self.stub = OllamaStub()
+        self.base_url = await self.stub.start()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    async def asyncTearDown(self):
+        await self.stub.runner.cleanup()
+        self.tmp.cleanup()
+
+    async def test_qwen_reuses_one_session(self):
+        """测试初始化检查和多次请求复用同一个本地会话和连接"""
+        model = QwenModel({"model_name": "qwen2.5:8b", "base_url": self.base_url})
+        self.assertTrue(await model.initialize())
+
+        for _ in range(3):
+            result = await model.chat_completion([{"role": "user", "content": "你好"}])
+            self.assertEqual(result["message"]["content"], "".join(TOKENS))
+
+        self.assertEqual(model.sessions.sessions_created, 1)
+        self.assertEqual(len(self.stub.peers), 1)
+        self.assertFalse(self.stub.requests[0]["stream"])
+        await model.shutdown()
+
+    async def test_qwen_streams_tokens_incrementally(self):
+        """测试流式输出逐个产出token，首个token早于完整回复"""
+        model = QwenModel({"model_name": "qwen2.5:8b", "base_url": self.base_url})
+        await model.initialize()
+
+        start = time.perf_counter()
+        arrivals = []
+        tokens = []
+        async for token in model.stream_chat_completion([{"role": "user", "content": "你好"}]):
+            arrivals.append(time.perf_counter() - start)
+            tokens.append(token)
+
+        self.assertEqual(tokens, TOKENS)
+        self.assertTrue(self.stub.requests[-1]["stream"])
+        self.assertLess(arrivals[0], arrivals[-1] - 0.1)
+        await model.shutdown()
+
+    async def test_stream_not_limited_by_total_timeout(self):
+        """测试流式请求只限制读取间隔，总时长超过单次请求超时仍能完成"""
+        model = QwenModel({"model_name": "qwen2.5:8b", "base_url": self.base_url})
+        await model.initialize()
+
+        # 整个流约0.2秒：总超时0.1秒会中断，读取间隔0.1秒不会
+        with mock.patch.object(qwen_model, "request_timeout", lambda seconds: model_session.request_timeout(0.1)), \
+                mock.patch.object(qwen_model, "stream_timeout", lambda seconds: model_session.stream_timeout(0.1)):
+            tokens = [token async for token in model.stream_chat_completion([{"role": "user", "content": "你好"}])]
+
+        self.assertEqual(tokens, TOKENS)
+        await model.shutdown()
+
+    async def test_mistral_cloud_sse_stream(self):
+        """测试云端模式解析OpenAI兼容的SSE流"""
+        model = MistralModel({"cloud_base_url": f"{self.base_url}/v1", "cloud_api_key": "key"})
+        model.initialized = True
+        model.current_mode = "cloud"
+
+        tokens = [token async for token in model.stream_chat_completion([{"role": "user", "content": "hi"}])]
+
+        self.assertEqual(tokens, TOKENS)
+        self.assertTrue(self.stub.requests[-1]["stream"])
+        await model.shutdown()
+
+    async def test_local_model_mcp_stream_stats(self):
+        """测试LocalModelMCP.chat_completion(stream=True)透传流并记录首个token延迟和生成速度"""
+        config_path = Path(self.tmp.name) / "config.toml"
+        config_path.write_text(toml.dumps({
+            "mcp_info": {"name": "local_model_mcp", "version": "1.0.0", "type": "local_model_provider"},
+            "models": {
+                "default_model": "qwen",
+                "qwen": {"enabled": True, "model_name": "qwen2.5:8b", "base_url": self.base_url},
+                "mistral": {"enabled": False}
+            },
+            "ocr": {"enabled": False},
+            "performance": {"preload_predicted": False}
+        }), encoding="utf-8")
+
+        mcp = LocalModelMCP(config_path)
+        result = await mcp.chat_completion([{"role": "user", "content": "你好"}], stream=True)
+        tokens = [token async for token in result["stream"]]
+
+        self.assertEqual(tokens, TOKENS)
+        stats = mcp.stats
+        self.assertEqual(stats["streaming_requests"], 1)
+        self.assertEqual(stats["total_tokens_generated"], len(TOKENS))
+        self.assertGreater(stats["average_time_to_first_token"], 0.02)
+        self.assertGreater(stats["average_tokens_per_second"], 5)
+        self.assertLess(stats["average_tokens_per_second"], 1 / 0.02)
+        await mcp.shutdown()
+
+
+class TestBackendSessions(unittest.TestCase):
+    """后端会话跨事件循环测试类"""
+
+    def test_loop_change_closes_old_session(self):
+        """测试换事件循环后重建会话，旧会话在其所属循环中关闭"""
+        sessions = BackendSessions()
+
+        async def get():
+            return sessions.get("local")
+
+        first_loop = asyncio.new_event_loop()
+        try:
+            first = first_loop.run_until_complete(get())
+            second = asyncio.run(get())
+            self.assertIsNot(second, first)
+            self.assertEqual(sessions.sessions_created, 2)
+            # 旧会话的关闭已调度到旧循环，旧循环再次运行时完成
+            first_loop.run_until_complete(asyncio.sleep(0.01))
+            self.assertTrue(first.closed)
+        finally:
+            first_loop.close()
+
+    def test_close_handles_foreign_sessions(self):
+        """测试close关闭其他循环中的会话，原循环已关闭时分离连接器并记录"""
+        sessions = BackendSessions()
+
+        async def get(backend):
+            return sessions.get(backend)
+
+        running_loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=running_loop.run_forever, daemon=True)
+        thread.start()
+        closed_loop = asyncio.new_event_loop()
+        try:
+            local = asyncio.run_coroutine_threadsafe(get("local"), running_loop).result(5)
+            cloud = closed_loop.run_until_complete(get("cloud"))
+            connector = cloud.connector
+            closed_loop.close()
+
+            with self.assertLogs(model_session.logger.name, level="WARNING"):
+                asyncio.run(sessions.close())
+            asyncio.run_coroutine_threadsafe(asyncio.sleep(0.01), running_loop).result(5)
+            self.assertTrue(local.closed)
+            self.assertIsNone(cloud.connector)
+            self.assertFalse(connector.closed)
+        finally:
+            running_loop.call_soon_threadsafe(running_loop.stop)
+            thread.join(5)
+            running_loop.close()
+
+
+class QueueStreamer:
+    """与TextIteratorStreamer相同的消费协议：队列中的文本，结束信号为None，等待超时抛出queue.Empty"""
+
+    def __init__(self, timeout=None):
+        self.text_queue = queue.Queue()
+        self.timeout = timeout
+
+    def put_text(self, text):
+        self.text_queue.put(text)
+
+    def end(self):
+        self.text_queue.put(None)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        value = self.text_queue.get(timeout=self.timeout)
+        if value is None:
+            raise StopIteration()
+        return value
+
+
+class FailingGenerateModel:
+    """输出一段文本后生成出错的桩模型"""
+
+    def generate(self, streamer, **kwargs):
+        streamer.put_text("部分")
+        raise RuntimeError("CUDA out of memory")
+
+
+class HangingGenerateModel:
+    """一直不输出也不结束的桩模型"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def generate(self, streamer, **kwargs):
+        self.release.wait(5)
+
+
+class StubTokenizer:
+    def encode(self, prompt, return_tensors=None):
+        return [[1, 2, 3]]
+
+
+class TestMistralLocalStreaming(unittest.IsolatedAsyncioTestCase):
+    """本地流式生成线程出错或卡死时消费方不会永久等待"""
+
+    def make_model(self, generator, timeout=5):
+        model = MistralModel({"stream_token_timeout": timeout})
+        model.initialized = True
+        model.current_mode = "local"
+        model.device = "cpu"
+        model.model = generator
+        model.tokenizer = StubTokenizer()
+        model._create_streamer = lambda: QueueStreamer(model.stream_token_timeout)
+        return model
+
+    async def test_generate_error_reraised(self):
+        """测试生成线程的异常在消费方重新抛出"""
+        model = self.make_model(FailingGenerateModel())
+        tokens = []
+        with self.assertRaisesRegex(RuntimeError, "out of memory"):
+            async for token in model.stream_chat_completion([{"role": "user", "content": "hi"}]):
+                tokens.append(token)
+        self.assertEqual(tokens, ["部分"])
+
+    async def test_stalled_generation_times_out(self):
+        """测试生成线程长时间没有输出时按超时结束"""
+        generator = HangingGenerateModel()
+        model = self.make_model(generator, timeout=0.1)
+        try:
+            with self.assertRaises(TimeoutError):
+                async for _ in model.stream_chat_completion([{"role": "user", "content": "hi"}]):
+                    pass
+        finally:
+            generator.release.set()
+
+
+if __name__ == "__main__":
+    unittest.main()
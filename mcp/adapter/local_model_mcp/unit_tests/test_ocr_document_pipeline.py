@@ -0,0 +1,97 @@
+"""
+OCR多页文档流水线测试
+测试各阶段重叠执行、按页序重组以及逐页流式产出
+"""
+
+import unittest
+import asyncio
+import io
+import time
+from pathlib import Path
+import sys
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ocr import OCREngine
+
+
+def make_page(width: int) -> bytes:
+    from PIL import Image
+
+    output = io.BytesIO()
+    Image.new("L", (width, 32), color=200).save(output, format="PNG")
+    return output.getvalue()
+
+
+class WidthReader:
+    """模拟EasyOCR Reader：按图像宽度返回页码文本，宽度越小越慢"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+
+    def readtext(self, image_array):
+        self.calls += 1
+        width = image_array.shape[1]
+        time.sleep(self.delay * (110 - width) / 10)
+        return [(None, f"第{width - 100}页", 0.9)]
+
+
+class TestDocumentPipeline(unittest.IsolatedAsyncioTestCase):
+    """文档流水线测试类"""
+
+    async def asyncSetUp(self):
+        self.engine = OCREngine({"ocr": {
+            "enabled": True,
+            "engine": "easyocr",
+            "confidence_threshold": 0.6,
+            "worker_processes": 2
+        }})
+        self.engine.initialized = True
+        self.engine.ocr_model = WidthReader(0.02)
+        self.pages = [make_page(100 + i) for i in range(6)]
+
+    async def asyncTearDown(self):
+        await self.engine.shutdown()
+
+    async def test_process_document_keeps_page_order(self):
+        """测试结果按页序重组"""
+        result = await self.engine.process_document(self.pages)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["successful_pages"], 6)
+        self.assertEqual([r["page"] for r in result["page_results"]], list(range(6)))
+        self.assertEqual(result["text"], "\n\n".join(f"第{i}页" for i in range(6)))
+
+    async def test_iter_document_streams_pages(self):
+        """测试逐页流式产出，ordered控制产出顺序"""
+        completion_order = [r["page"] async for r in self.engine.iter_document(self.pages)]
+        self.assertEqual(sorted(completion_order), list(range(6)))
+
+        page_order = [r["page"] async for r in self.engine.iter_document(self.pages, ordered=True)]
+        self.assertEqual(page_order, list(range(6)))
+
+    async def test_early_exit_cancels_remaining_pages(self):
+        """测试调用方提前退出时剩余页被取消"""
+        pages = self.pages * 4
+        stream = self.engine.iter_document(pages, ordered=True)
+        first = await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.2)
+
+        self.assertEqual(first["page"], 0)
+        self.assertLess(self.engine.ocr_model.calls, len(pages))
+        self.assertEqual(self.engine.worker_pool.get_stats()["pending"], 0)
+
+    async def test_disabled_engine_reports_each_page(self):
+        """测试引擎未初始化时每页返回错误"""
+        self.engine.initialized = False
+        result = await self.engine.process_document(self.pages[:2])
+
+        self.assertFalse(result["success"])
+        self.assertEqual(result["failed_pages"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+"""
+OCR结果缓存测试
+测试内容寻址键、内存LRU层、磁盘层按大小淘汰，以及OCREngine的缓存命中统计
+"""
+
+import unittest
+import io
+import tempfile
+import threading
+import time
+from pathlib import Path
+import sys
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from ocr import OCREngine
+from ocr_result_cache import OCRResultCache, OCRCacheConfig
+
+
+def make_png(color: int = 200) -> bytes:
+    from PIL import Image
+
+    output = io.BytesIO()
+    Image.new("L", (64, 32), color=color).save(output, format="PNG")
+    return output.getvalue()
+
+
+class CountingReader:
+    """模拟EasyOCR Reader：记录推理次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def readtext(self, image_array):
+        self.calls += 1
+        time.sleep(0.01)
+        return [(None, "保险单", 0.95)]
+
+
+class TestOCRResultCache(unittest.TestCase):
+    """OCR结果缓存测试类"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_content_and_params(self):
+        """测试键由图像内容和参数决定，参数顺序无关"""
+        key = OCRResultCache.make_key(b"image", engine="easyocr", languages=["zh"])
+
+        self.assertEqual(key, OCRResultCache.make_key(b"image", languages=["zh"], engine="easyocr"))
+        self.assertNotEqual(key, OCRResultCache.make_key(b"image2", engine="easyocr", languages=["zh"]))
+        self.assertNotEqual(key, OCRResultCache.make_key(b"image", engine="tesseract", languages=["zh"]))
+
+    def test_memory_lru_eviction(self):
+        """测试内存层按LRU淘汰，命中返回副本"""
+        cache = OCRResultCache(OCRCacheConfig(max_memory_entries=2))
+        cache.put("a", {"text": "A"}, image_bytes=10)
+        cache.put("b", {"text": "B"}, image_bytes=10)
+        cache.get("a")["text"] = "modified"
+        cache.put("c", {"text": "C"}, image_bytes=10)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a")["text"], "A")
+        stats = cache.get_stats()
+        self.assertEqual((stats["memory_hits"], stats["misses"], stats["bytes_saved"]), (2, 1, 20))
+
+    def test_disk_tier_survives_restart_and_evicts_by_size(self):
+        """测试磁盘层重启后仍可命中，并按总大小淘汰最久未访问的条目"""
+        config = OCRCacheConfig(max_memory_entries=1, cache_dir=self.tmp.name, max_disk_bytes=10 ** 6)
+        cache = OCRResultCache(config)
+        cache.put("k1", {"text": "一", "cost": 0.002}, image_bytes=100)
+        cache.put("k2", {"text": "二"}, image_bytes=100)
+
+        restarted = OCRResultCache(config)
+        self.assertEqual(restarted.get("k1")["text"], "一")
+        self.assertEqual(restarted.get_stats()["disk_hits"], 1)
+        self.assertAlmostEqual(restarted.get_stats()["cost_saved"], 0.002)
+
+        entry_size = restarted.get_stats()["disk_bytes"] // 2
+        small = OCRResultCache(OCRCacheConfig(cache_dir=self.tmp.name, max_disk_bytes=entry_size * 2 + 1))
+        small.get("k1")
+        small.put("k3", {"text": "三"})
+
+        self.assertEqual(small.get_stats()["disk_entries"], 2)
+        self.assertEqual(small.get_stats()["evictions"], 1)
+        self.assertIsNone(OCRResultCache(OCRCacheConfig(cache_dir=self.tmp.name)).get("k2"))
+
+    def test_ttl_expiry(self):
+        """测试过期条目视为未命中"""
+        cache = OCRResultCache(OCRCacheConfig(ttl=0.01))
+        cache.put("a", {"text": "A"})
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+
+
+class TestAsyncCacheIO(unittest.IsolatedAsyncioTestCase):
+    """事件循环中的缓存读写测试类"""
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    def record_threads(self, cache):
+        """记录磁盘读写和删除所在的线程"""
+        threads = []
+        for name in ("_load_file", "_write_file", "_unlink_pending"):
+            original = getattr(cache, name)
+
+            def wrapper(*args, _original=original, _name=name):
+                threads.append((_name, threading.current_thread()))
+                return _original(*args)
+
+            setattr(cache, name, wrapper)
+        return threads
+
+    async def test_disk_io_runs_off_event_loop(self):
+        """测试 aget/aput 的磁盘读写和淘汰删除不在事件循环线程中执行"""
+        config = OCRCacheConfig(max_memory_entries=1, cache_dir=self.tmp.name, max_disk_bytes=10 ** 6)
+        cache = OCRResultCache(config)
+        threads = self.record_threads(cache)
+
+        await cache.aput("k1", {"text": "一", "cost": 0.002}, image_bytes=100)
+        await cache.aput("k2", {"text": "二"}, image_bytes=100)
+        self.assertEqual((await cache.aget("k1"))["text"], "一")
+        self.assertEqual((await cache.aget("k2"))["text"], "二")
+        self.assertIsNone(await cache.aget("missing"))
+
+        stats = cache.get_stats()
+        self.assertEqual((stats["memory_hits"], stats["disk_hits"], stats["misses"]), (0, 2, 1))
+        self.assertEqual(stats["disk_entries"], 2)
+
+        entry_size = stats["disk_bytes"] // 2
+        cache.config.max_disk_bytes = entry_size * 2 + 1
+        await cache.aput("k3", {"text": "三"})
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+        self.assertEqual(len(list(Path(self.tmp.name).glob("*/*.json"))), 2)
+
+        self.assertEqual({name for name, _ in threads}, {"_load_file", "_write_file", "_unlink_pending"})
+        self.assertTrue(all(thread is not threading.main_thread() for _, thread in threads))
+
+    async def test_corrupt_entry_removed(self):
+        """测试损坏的磁盘条目视为未命中并被删除"""
+        cache = OCRResultCache(OCRCacheConfig(max_memory_entries=1, cache_dir=self.tmp.name))
+        await cache.aput("k1", {"text": "一"})
+        cache._memory.clear()
+        cache._path("k1").write_text("{broken", encoding="utf-8")
+
+        with self.assertLogs(level="WARNING"):
+            self.assertIsNone(await cache.aget("k1"))
+        self.assertFalse(cache._path("k1").exists())
+        self.assertEqual(cache.get_stats()["disk_entries"], 0)
+
+
+class TestOCREngineCache(unittest.IsolatedAsyncioTestCase):
+    """OCREngine缓存集成测试类"""
+
+    async def asyncSetUp(self):
+        self.engine = OCREngine({"ocr": {"enabled": True, "engine": "easyocr", "confidence_threshold": 0.6}})
+        self.engine.initialized = True
+        self.engine.ocr_model = CountingReader()
+
+    async def asyncTearDown(self):
+        await self.engine.shutdown()
+
+    async def test_resubmitted_image_served_from_cache(self):
+        """测试重复提交同一图像不再推理，统计通过get_status暴露"""
+        image = make_png()
+        first = await self.engine.extract_text(image)
+        second = await self.engine.extract_text(image)
+        await self.engine.extract_text(image, remove_special_chars=True)
+
+        self.assertNotIn("cached", first)
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["text"], first["text"])
+        self.assertEqual(self.engine.ocr_model.calls, 2)
+
+        cache_stats = (await self.engine.get_status())["cache"]
+        self.assertEqual(cache_stats["memory_hits"], 1)
+        self.assertEqual(cache_stats["misses"], 2)
+        self.assertEqual(cache_stats["bytes_saved"], len(image))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,215 @@
+"""
+OCR工作池测试
+测试阻塞OCR调用移出事件循环后的响应性、超时取消、有界提交队列，
+以及各阶段之间只传递共享内存图像句柄并在请求结束后释放
+"""
+
+import unittest
+import asyncio
+import io
+import os
+import pickle
+import time
+from pathlib import Path
+import sys
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ocr import OCREngine, OCRWorkerPool, OCRQueueFullError
+from ocr.ocr_workers import SharedImageHandle, decode_image_bytes, preprocess_shared_image
+
+
+def make_png(size=(64, 32)) -> bytes:
+    from PIL import Image
+
+    output = io.BytesIO()
+    Image.new("L", size, color=200).save(output, format="PNG")
+    return output.getvalue()
+
+
+def shared_memory_blocks() -> set:
+    """当前存在的共享内存块"""
+    return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+
+def slow_decode(image_data: bytes, delay: float) -> SharedImageHandle:
+    """延迟后解码，模拟超时后才完成的阶段"""
+    time.sleep(delay)
+    return decode_image_bytes(image_data)
+
+
+class SlowReader:
+    """模拟EasyOCR Reader：阻塞指定时间后返回检测结果"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def readtext(self, image_array):
+        time.sleep(self.delay)
+        return [(None, "保险单", 0.95), (None, "noise", 0.1)]
+
+
+class TestOCRWorkerPool(unittest.IsolatedAsyncioTestCase):
+    """OCR工作池测试类"""
+
+    async def asyncSetUp(self):
+        self.pool = OCRWorkerPool({"worker_processes": 2, "max_queue_size": 1, "request_timeout": 5})
+
+    async def asyncTearDown(self):
+        self.pool.shutdown()
+
+    async def test_event_loop_stays_responsive(self):
+        """测试模型推理期间事件循环保持响应"""
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await self.pool.run_model(time.sleep, 0.3)
+        task.cancel()
+
+        self.assertGreaterEqual(ticks, 10)
+        self.assertEqual(self.pool.get_stats()["completed"], 1)
+
+    async def test_timeout_cancels_queued_request(self):
+        """测试超时后排队中的请求被取消，名额在任务结束后释放"""
+        running = asyncio.create_task(self.pool.run_model(time.sleep, 0.2))
+        await asyncio.sleep(0.01)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.pool.run_model(time.sleep, 5, timeout=0.05)
+
+        await running
+        await asyncio.sleep(0.01)
+        stats = self.pool.get_stats()
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["pending"], 0)
+
+    async def test_bounded_queue_rejects(self):
+        """测试提交数超过工作者数+队列长度时立即拒绝"""
+        tasks = [asyncio.create_task(self.pool.run_model(time.sleep, 0.1)) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        with self.assertRaises(OCRQueueFullError):
+            await self.pool.run_model(time.sleep, 0.1)
+
+        await asyncio.gather(*tasks)
+        self.assertEqual(self.pool.get_stats()["rejected"], 1)
+
+    async def test_preprocess_in_process_pool(self):
+        """测试预处理在进程池中执行，阶段之间只传递共享内存句柄"""
+        before = shared_memory_blocks()
+        decoded = await self.pool.run_cpu(decode_image_bytes, make_png((640, 480)))
+        processed = await self.pool.run_cpu(preprocess_shared_image, decoded)
+        try:
+            self.assertEqual((processed.mode, processed.size), ("L", (640, 480)))
+            self.assertLess(len(pickle.dumps(processed)), 200)
+            self.assertEqual(processed.to_image().tobytes(), bytes([200]) * 640 * 480)
+            self.assertEqual(processed.to_array().shape, (480, 640, 3))
+            self.assertEqual(shared_memory_blocks() - before, {decoded.name, processed.name})
+        finally:
+            decoded.release()
+            processed.release()
+            processed.release()
+        self.assertEqual(shared_memory_blocks(), before)
+
+    async def test_result_after_timeout_released(self):
+        """测试超时后才完成的阶段，其结果的共享内存被释放"""
+        before = shared_memory_blocks()
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.pool.run_cpu(slow_decode, make_png(), 0.3, timeout=0.05)
+
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            if self.pool.get_stats()["pending"] == 0:
+                break
+        self.assertEqual(shared_memory_blocks(), before)
+
+
+class TestOCREngineOffload(unittest.IsolatedAsyncioTestCase):
+    """OCREngine工作池集成测试类"""
+
+    async def asyncSetUp(self):
+        self.engine = OCREngine({"ocr": {"enabled": True, "engine": "easyocr", "confidence_threshold": 0.6}})
+        self.engine.initialized = True
+
+    async def asyncTearDown(self):
+        await self.engine.shutdown()
+
+    async def test_extract_text_runs_in_model_thread(self):
+        """测试模型推理在模型线程中执行"""
+        self.engine.ocr_model = SlowReader(0.05)
+        result = await self.engine.extract_text(make_png())
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["text"], "保险单")
+        self.assertEqual((await self.engine.get_status())["workers"]["completed"], 3)
+
+    async def test_extract_text_releases_shared_images(self):
+        """测试请求成功或超时后，解码和预处理产生的共享内存均被释放"""
+        before = shared_memory_blocks()
+        self.engine.ocr_model = SlowReader(0.05)
+        self.assertTrue((await self.engine.extract_text(make_png()))["success"])
+        self.assertEqual(shared_memory_blocks(), before)
+
+        self.engine.ocr_model = SlowReader(0.5)
+        result = await self.engine.extract_text(make_png((65, 32)), timeout=0.2)
+        self.assertEqual(result["error"], "OCR请求超时")
+        self.assertEqual(shared_memory_blocks(), before)
+
+    async def test_cloud_api_uploads_preprocessed_image(self):
+        """测试云端API上传预处理后重新编码的图像，关闭预处理时上传原图"""
+        from PIL import Image
+
+        # 纯色图像预处理后不变，使用渐变图像
+        gradient = Image.linear_gradient("L").resize((64, 32))
+        output = io.BytesIO()
+        gradient.save(output, format="PNG")
+        image_data = output.getvalue()
+        for preprocessing in (True, False):
+            engine = OCREngine({"ocr": {"enabled": True, "engine": "cloud_api", "preprocessing": preprocessing}})
+            engine.initialized = True
+            uploads = []
+
+            async def fake_cloud_api(data, **kwargs):
+                uploads.append(data)
+                return {"success": True, "text": "保险单", "confidence": 0.9, "engine": "cloud_api"}
+
+            engine._extract_with_cloud_api = fake_cloud_api
+            try:
+                result = await engine.extract_text(image_data)
+            finally:
+                await engine.shutdown()
+
+            self.assertTrue(result["success"])
+            if preprocessing:
+                self.assertNotEqual(uploads[0], image_data)
+                decoded = decode_image_bytes(image_data)
+                processed = preprocess_shared_image(decoded)
+                try:
+                    expected = processed.to_image()
+                finally:
+                    decoded.release()
+                    processed.release()
+                uploaded = Image.open(io.BytesIO(uploads[0]))
+                self.assertEqual(uploaded.tobytes(), expected.tobytes())
+            else:
+                self.assertEqual(uploads, [image_data])
+
+    async def test_extract_text_timeout(self):
+        """测试单个请求超时返回错误结果"""
+        self.engine.ocr_model = SlowReader(1.0)
+        result = await self.engine.extract_text(make_png(), timeout=0.2)
+
+        self.assertFalse(result["success"])
+        self.assertEqual(result["error"], "OCR请求超时")
+        self.assertLess(result["processing_time"], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
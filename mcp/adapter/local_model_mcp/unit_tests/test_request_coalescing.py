@@ -0,0 +1,204 @@
+"""
+请求合并与微批次测试
+测试相同在途提示共享后端调用、支持批量的后端按窗口合并、不支持批量的后端立即调度以及直方图统计
+"""
+
+import unittest
+import asyncio
+import time
+from pathlib import Path
+import sys
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.model_manager import ModelManager
+from models.request_coalescer import RequestCoalescer
+
+
+class FakeModel:
+    """模拟后端：记录单条与批量调用，固定推理延迟"""
+
+    def __init__(self, config):
+        self.config = config
+        self.current_mode = "local"
+        self.calls = []
+        self.batch_calls = []
+        self.fail = False
+
+    async def initialize(self):
+        return True
+
+    async def generate(self, prompt, **kwargs):
+        self.calls.append(prompt)
+        await asyncio.sleep(0.05)
+        if self.fail:
+            raise RuntimeError("后端不可用")
+        return {"success": True, "text": f"{prompt}!", "tokens": 1}
+
+    async def shutdown(self):
+        pass
+
+
+class FakeBatchModel(FakeModel):
+    """模拟支持批量推理的后端"""
+
+    def supports_batch(self):
+        return True
+
+    async def generate_batch(self, prompts, **kwargs):
+        self.batch_calls.append(list(prompts))
+        await asyncio.sleep(0.05)
+        return [{"success": True, "text": f"{prompt}!", "tokens": 1} for prompt in prompts]
+
+
+class FakeShortBatchModel(FakeBatchModel):
+    """模拟批量结果少于提示数的后端"""
+
+    async def generate_batch(self, prompts, **kwargs):
+        return (await super().generate_batch(prompts, **kwargs))[:-1]
+
+
+class TestRequestCoalescing(unittest.IsolatedAsyncioTestCase):
+    """请求合并测试类"""
+
+    async def make_coalescer(self, model_class, batch_window=0.02, max_batch_size=8):
+        config = {
+            "models": {
+                "default_model": "qwen",
+                "qwen": {"enabled": True, "model_name": "qwen"}
+            },
+            "performance": {"preload_predicted": False}
+        }
+        self.manager = ModelManager(config)
+        await self.manager.initialize()
+        self.manager.model_classes = {"qwen": model_class}
+        await self.manager.load_model("qwen")
+        self.model = self.manager.residents["qwen"].instance
+        return RequestCoalescer(self.manager, batch_window=batch_window, max_batch_size=max_batch_size)
+
+    async def test_identical_prompts_share_one_call(self):
+        """测试相同的并发提示只调用一次后端"""
+        coalescer = await self.make_coalescer(FakeModel)
+
+        results = await asyncio.gather(*[coalescer.submit("生成模板", "qwen", temperature=0.2) for _ in range(10)])
+
+        self.assertEqual(self.model.calls, ["生成模板"])
+        self.assertTrue(all(result["text"] == "生成模板!" for result in results))
+        stats = coalescer.get_stats()
+        self.assertEqual((stats["requests"], stats["coalesced"], stats["backend_calls"]), (10, 9, 1))
+        self.assertEqual(stats["in_flight"], 0)
+
+        # 完成后再次提交会重新调用后端；参数不同也不会合并
+        await coalescer.submit("生成模板", "qwen", temperature=0.2)
+        await coalescer.submit("生成模板", "qwen", temperature=0.9)
+        self.assertEqual(len(self.model.calls), 3)
+
+    async def test_coalesced_callers_get_independent_results(self):
+        """测试合并的调用方各自得到结果副本，修改不影响其他调用方"""
+        coalescer = await self.make_coalescer(FakeModel)
+
+        async def submit_and_mutate(tag):
+            result = await coalescer.submit("生成模板", "qwen")
+            result["text"] += tag
+            result.setdefault("tags", []).append(tag)
+            return result
+
+        results = await asyncio.gather(*[submit_and_mutate(str(i)) for i in range(3)])
+
+        self.assertEqual(len(self.model.calls), 1)
+        self.assertEqual([result["text"] for result in results], ["生成模板!0", "生成模板!1", "生成模板!2"])
+        self.assertEqual([result["tags"] for result in results], [["0"], ["1"], ["2"]])
+
+    async def test_distinct_prompts_micro_batched(self):
+        """测试支持批量的后端在窗口内合并不同提示，结果按提示对应"""
+        coalescer = await self.make_coalescer(FakeBatchModel)
+
+        prompts = [f"提示{i}" for i in range(5)]
+        results = await asyncio.gather(*[coalescer.submit(prompt, "qwen") for prompt in prompts])
+
+        self.assertEqual(self.model.batch_calls, [prompts])
+        self.assertEqual([result["text"] for result in results], [f"{prompt}!" for prompt in prompts])
+        stats = coalescer.get_stats()
+        self.assertEqual(stats["batch_size"]["buckets"]["<=8"], 1)
+        self.assertEqual(stats["queue_time_ms"]["count"], 5)
+        self.assertGreaterEqual(stats["queue_time_ms"]["average"], 10)
+
+    async def test_full_batch_dispatched_without_waiting(self):
+        """测试达到最大批大小时立即调度，剩余提示进入下一个批次"""
+        coalescer = await self.make_coalescer(FakeBatchModel, batch_window=1.0, max_batch_size=4)
+
+        start = time.perf_counter()
+        first = [asyncio.create_task(coalescer.submit(f"p{i}", "qwen")) for i in range(4)]
+        await asyncio.gather(*first)
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+        late = asyncio.create_task(coalescer.submit("p4", "qwen"))
+        await asyncio.sleep(0)
+        await coalescer.shutdown()
+        await late
+        # 只有一个提示的批次走单条生成
+        self.assertEqual([len(batch) for batch in self.model.batch_calls], [4])
+        self.assertEqual(self.model.calls, ["p4"])
+
+    async def test_non_batch_backend_dispatched_immediately(self):
+        """测试不支持批量的后端不等待窗口，不同提示并发调用"""
+        coalescer = await self.make_coalescer(FakeModel, batch_window=1.0)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[coalescer.submit(f"p{i}", "qwen") for i in range(3)])
+
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(sorted(self.model.calls), ["p0", "p1", "p2"])
+        self.assertEqual(coalescer.get_stats()["batch_size"]["buckets"]["<=1"], 3)
+
+    async def test_backend_failure_reaches_every_caller(self):
+        """测试后端失败时所有共享调用方都拿到失败结果，且不残留在途记录"""
+        coalescer = await self.make_coalescer(FakeModel)
+        self.model.fail = True
+
+        results = await asyncio.gather(*[coalescer.submit("x", "qwen") for _ in range(3)])
+
+        self.assertEqual(len(self.model.calls), 1)
+        self.assertTrue(all(not result["success"] for result in results))
+        self.assertEqual(coalescer.get_stats()["in_flight"], 0)
+
+    async def test_cancelled_caller_does_not_cancel_shared_call(self):
+        """测试一个调用方取消后，其他共享调用方仍能拿到结果"""
+        coalescer = await self.make_coalescer(FakeModel)
+
+        first = asyncio.create_task(coalescer.submit("共享", "qwen"))
+        second = asyncio.create_task(coalescer.submit("共享", "qwen"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        self.assertTrue((await second)["success"])
+        self.assertEqual(len(self.model.calls), 1)
+
+    async def test_short_batch_result_fails_remaining_callers(self):
+        """测试批量结果数量不足时未得到结果的调用方收到异常而不是一直等待"""
+        coalescer = await self.make_coalescer(FakeShortBatchModel)
+
+        results = await asyncio.wait_for(asyncio.gather(
+            *[coalescer.submit(f"p{i}", "qwen") for i in range(3)], return_exceptions=True), 2)
+
+        self.assertEqual([result["text"] for result in results[:2]], ["p0!", "p1!"])
+        self.assertIsInstance(results[2], RuntimeError)
+        self.assertEqual(coalescer.get_stats()["in_flight"], 0)
+
+    async def test_cancelled_dispatch_fails_callers(self):
+        """测试调度任务被取消时共享调用方收到异常"""
+        coalescer = await self.make_coalescer(FakeModel)
+
+        callers = [asyncio.create_task(coalescer.submit("共享", "qwen")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for task in list(coalescer._tasks):
+            task.cancel()
+
+        results = await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), 2)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(coalescer.get_stats()["in_flight"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+共享解码图像测试
+测试一次解码、视图延迟派生与缓存，以及多引擎/预处理器/内容检测共用同一缓冲区
+"""
+
+import unittest
+import asyncio
+from pathlib import Path
+import sys
+
+import cv2
+import numpy as np
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from shared_image import SharedImage
+from image_preprocessor import ImagePreprocessor
+from tesseract_optimizer import TesseractOptimizer, TesseractConfig
+from multi_engine_ocr import MultiEngineOCRManager, OCREngine, EngineConfig
+
+
+def encode(image: np.ndarray) -> bytes:
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+class RecordingReader:
+    """模拟EasyOCR Reader：记录收到的数组"""
+
+    def __init__(self):
+        self.inputs = []
+
+    def readtext(self, image):
+        self.inputs.append(image)
+        return [(None, "保险单", 0.9)]
+
+
+class TestSharedImage(unittest.TestCase):
+    """共享解码图像测试类"""
+
+    def setUp(self):
+        self.gray_page = np.full((120, 80), 200, dtype=np.uint8)
+        self.gray_page[40:60, 10:70] = 20
+
+    def test_grayscale_views_are_zero_copy(self):
+        """测试灰度扫描件的灰度视图即为解码缓冲区，派生视图被缓存"""
+        image = SharedImage.from_bytes(encode(self.gray_page))
+
+        self.assertEqual(image.decode_count, 1)
+        self.assertEqual(image.shape, (120, 80))
+        self.assertIs(image.gray, image.gray)
+        self.assertIs(image.rgb, image.rgb)
+        self.assertIs(image.resized((40, 60)), image.resized((40, 60)))
+        self.assertIs(image.resized((80, 120)), image.gray)
+        self.assertEqual(set(np.unique(image.binary)), {0, 255})
+
+        stats = image.get_stats()
+        self.assertEqual(stats["derived_views"], 3)
+        self.assertEqual(stats["bytes_allocated"], 120 * 80 + 120 * 80 * 3 + 40 * 60 + 120 * 80)
+
+    def test_views_are_read_only(self):
+        """测试共享缓冲区只读"""
+        image = SharedImage.from_bytes(encode(cv2.cvtColor(self.gray_page, cv2.COLOR_GRAY2BGR)))
+
+        self.assertIs(image.bgr, image.bgr)
+        with self.assertRaises(ValueError):
+            image.gray[0, 0] = 0
+        with self.assertRaises(ValueError):
+            image.bgr[0, 0] = 0
+
+    def test_consumers_share_one_decode(self):
+        """测试预处理器和内容检测使用同一次解码"""
+        image = SharedImage.from_bytes(encode(self.gray_page))
+
+        processed = ImagePreprocessor().optimize_image(image)
+        TesseractOptimizer()._fine_tune_config(image, TesseractConfig())
+
+        self.assertEqual(processed.shape, (1200, 800))
+        self.assertEqual(image.decode_count, 1)
+        self.assertEqual(image.gray[50, 40], 20)
+
+    def test_manager_reports_decode_stats(self):
+        """测试多引擎管理器每次请求只解码一次并报告统计"""
+        manager = MultiEngineOCRManager()
+        reader = RecordingReader()
+        manager.engines[OCREngine.EASYOCR] = reader
+        manager.engine_configs[OCREngine.EASYOCR] = EngineConfig(priority=1, confidence_threshold=0.5)
+        manager.available_engines = [OCREngine.EASYOCR]
+
+        result = asyncio.run(manager.process_image(encode(self.gray_page)))
+
+        self.assertEqual(result.text, "保险单")
+        self.assertEqual(result.image_stats["decode_count"], 1)
+        self.assertEqual(result.image_stats["bytes_allocated"], 120 * 80 * 4)
+        self.assertFalse(reader.inputs[0].flags.writeable)
+
+
+if __name__ == "__main__":
+    unittest.main()
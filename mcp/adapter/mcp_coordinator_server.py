@@ -24,13 +24,19 @@ MCP Coordinator Server
 
 import asyncio
 import json
-import requests
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from datetime import datetime
 from pathlib import Path
 import logging
 
+try:
+    from .mcp_forwarding_pool import AsyncMCPForwarder, ForwardingConfig
+    from .mcp_health_prober import MCPHealthProber, HealthProberConfig
+except ImportError:
+    from mcp_forwarding_pool import AsyncMCPForwarder, ForwardingConfig
+    from mcp_health_prober import MCPHealthProber, HealthProberConfig
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -263,7 +269,8 @@ if __name__ == '__main__':
 class MCPCoordinator:
     """MCP中央协调器"""
     
-    def __init__(self):
+    def __init__(self, forwarding_config: ForwardingConfig = None,
+                 health_config: HealthProberConfig = None):
         self.coordinator_id = "mcp_coordinator"
         self.version = "1.0.0"
         self.status = "running"
@@ -283,6 +290,16 @@ class MCPCoordinator:
             }
         }
         
+        # 每MCP keep-alive连接池 + 并发上限 + 背压, 运行在后台事件循环中
+        self.forwarder = AsyncMCPForwarder(forwarding_config or ForwardingConfig())
+        
+        # 后台健康探测器, 健康检查端点直接读取其缓存的健康状态表
+        self.health_prober = MCPHealthProber(
+            self.health_check_mcp_async,
+            lambda: list(self.registered_mcps),
+            health_config or HealthProberConfig()
+        )
+        
         logger.info(f"✅ MCP Coordinator 初始化完成")
     
     def get_coordinator_info(self):
@@ -296,7 +313,8 @@ class MCPCoordinator:
                 "/coordinator/info",
                 "/coordinator/mcps",
                 "/coordinator/request",
-                "/coordinator/health-check"
+                "/coordinator/health-check",
+                "/coordinator/forwarding-stats"
             ]
         }
     
@@ -307,76 +325,88 @@ class MCPCoordinator:
             "registered_at": datetime.now().isoformat(),
             "status": "registered"
         }
+        if self.health_prober.running:
+            self.forwarder.start().call_soon_threadsafe(self.health_prober.notify_targets_changed)
         logger.info(f"✅ 注册MCP: {mcp_id}")
         return True
     
-    def health_check_mcp(self, mcp_id: str):
-        """检查MCP健康状态"""
+    async def health_check_mcp_async(self, mcp_id: str):
+        """检查MCP健康状态 (异步, 复用该MCP的连接池)"""
         if mcp_id not in self.registered_mcps:
             return {"success": False, "error": f"MCP {mcp_id} 未注册"}
         
         mcp_config = self.registered_mcps[mcp_id]
         try:
-            response = requests.get(f"{mcp_config['url']}/health", timeout=5)
-            if response.status_code == 200:
+            response = await self.forwarder.request(
+                mcp_id, mcp_config['url'], "GET", "/health", timeout=5
+            )
+            if response.get("rejected"):
+                return {"success": False, "status": self.registered_mcps[mcp_id].get("status"),
+                        "error": response["error"]}
+            if response["status"] == 200:
                 self.registered_mcps[mcp_id]["status"] = "healthy"
                 self.registered_mcps[mcp_id]["last_health_check"] = datetime.now().isoformat()
-                return {"success": True, "status": "healthy", "data": response.json()}
+                return {"success": True, "status": "healthy", "data": response["data"]}
             else:
                 self.registered_mcps[mcp_id]["status"] = "unhealthy"
-                return {"success": False, "status": "unhealthy", "error": f"HTTP {response.status_code}"}
+                return {"success": False, "status": "unhealthy", "error": f"HTTP {response['status']}"}
         except Exception as e:
             self.registered_mcps[mcp_id]["status"] = "unreachable"
-            return {"success": False, "status": "unreachable", "error": str(e)}
+            return {"success": False, "status": "unreachable", "error": str(e) or type(e).__name__}
     
-    def forward_request(self, mcp_id: str, action: str, params: dict = None):
-        """转发请求到指定MCP"""
+    def health_check_mcp(self, mcp_id: str, fresh: bool = False):
+        """
+        检查MCP健康状态
+        
+        默认返回探测器缓存的健康记录; fresh=True (或探测器未运行) 时通过探测器立即探测,
+        结果同时写入健康表
+        """
+        if mcp_id not in self.registered_mcps:
+            return {"success": False, "error": f"MCP {mcp_id} 未注册"}
+        if fresh or not self.health_prober.running:
+            record = self.forwarder.run_coroutine(self.health_prober.probe_one(mcp_id))
+            return record.to_dict()
+        return self.health_prober.get(mcp_id)
+    
+    async def forward_request_async(self, mcp_id: str, action: str, params: dict = None):
+        """转发请求到指定MCP (异步, 可在协调器事件循环中大量并发调用)"""
         if mcp_id not in self.registered_mcps:
             return {"success": False, "error": f"MCP {mcp_id} 未注册"}
         
         mcp_config = self.registered_mcps[mcp_id]
         
-        try:
-            # 构造MCP请求
-            mcp_request = {
-                "action": action,
-                "params": params or {},
-                "coordinator_id": self.coordinator_id,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            # 发送请求到MCP
-            response = requests.post(
-                f"{mcp_config['url']}/mcp/request",
-                json=mcp_request,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                logger.info(f"✅ 转发请求成功: {mcp_id}.{action}")
-                return result
-            else:
-                logger.error(f"❌ 转发请求失败: {mcp_id}.{action} - HTTP {response.status_code}")
-                return {
-                    "success": False,
-                    "error": f"MCP请求失败: HTTP {response.status_code}",
-                    "details": response.text
-                }
-                
-        except Exception as e:
-            logger.error(f"❌ 转发请求异常: {mcp_id}.{action} - {e}")
-            return {
-                "success": False,
-                "error": f"请求转发异常: {str(e)}"
-            }
+        # 构造MCP请求
+        mcp_request = {
+            "action": action,
+            "params": params or {},
+            "coordinator_id": self.coordinator_id,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+        return await self.forwarder.forward(mcp_id, mcp_config['url'], mcp_request)
     
-    def health_check_all(self):
-        """检查所有MCP健康状态"""
-        results = {}
-        for mcp_id in self.registered_mcps:
-            results[mcp_id] = self.health_check_mcp(mcp_id)
-        return results
+    def forward_request(self, mcp_id: str, action: str, params: dict = None):
+        """转发请求到指定MCP (同步包装, 供Flask端点调用)"""
+        return self.forwarder.run_coroutine(self.forward_request_async(mcp_id, action, params))
+    
+    def get_forwarding_stats(self):
+        """获取转发连接池统计"""
+        return self.forwarder.get_stats()
+    
+    def start_health_prober(self):
+        """在转发事件循环中启动后台健康探测"""
+        self.forwarder.run_coroutine(self.health_prober.start())
+    
+    def health_check_all(self, fresh: bool = False, timeout: float = None):
+        """
+        检查所有MCP健康状态
+        
+        默认直接返回后台探测器缓存的健康表; fresh=True (或探测器未运行) 时
+        在限定时间内并行探测所有MCP
+        """
+        if fresh or not self.health_prober.running:
+            return self.forwarder.run_coroutine(self.health_prober.probe_all(timeout))
+        return self.health_prober.snapshot()
 
 # 全局协调器实例
 coordinator = MCPCoordinator()
@@ -435,18 +465,25 @@ def forward_mcp_request(mcp_id):
 
 @app.route('/coordinator/health-check', methods=['GET'])
 def health_check_all():
-    """检查所有MCP健康状态"""
-    results = coordinator.health_check_all()
+    """检查所有MCP健康状态 (?fresh=1 时进行限时并行探测)"""
+    fresh = request.args.get('fresh', '0').lower() in ('1', 'true', 'yes')
+    results = coordinator.health_check_all(fresh=fresh)
     return jsonify({
         "coordinator_status": "healthy",
         "mcp_health_checks": results,
         "timestamp": datetime.now().isoformat()
     })
 
+@app.route('/coordinator/forwarding-stats', methods=['GET'])
+def get_forwarding_stats():
+    """获取转发连接池统计"""
+    return jsonify(coordinator.get_forwarding_stats())
+
 @app.route('/coordinator/health-check/<mcp_id>', methods=['GET'])
 def health_check_mcp(mcp_id):
-    """检查指定MCP健康状态"""
-    result = coordinator.health_check_mcp(mcp_id)
+    """检查指定MCP健康状态 (默认读取缓存, ?fresh=1 时立即探测)"""
+    fresh = request.args.get('fresh', '0').lower() in ('1', 'true', 'yes')
+    result = coordinator.health_check_mcp(mcp_id, fresh=fresh)
     return jsonify(result)
 
 @app.route('/health', methods=['GET'])
@@ -472,10 +509,13 @@ if __name__ == '__main__':
     print("  - GET  /coordinator/mcps           - 已注册MCP列表")
     print("  - POST /coordinator/register       - 注册新MCP")
     print("  - POST /coordinator/request/<mcp_id> - 转发MCP请求")
-    print("  - GET  /coordinator/health-check   - 检查所有MCP健康状态")
+    print("  - GET  /coordinator/health-check   - 检查所有MCP健康状态 (?fresh=1 实时探测)")
+    print("  - GET  /coordinator/forwarding-stats - 转发连接池统计")
     print("  - GET  /health                     - 协调器健康检查")
     print("=" * 60)
     print("运行在端口: 8089")
+    
+    coordinator.start_health_prober()
 >>>>>>> e26191443ef6976e959ec2d3a0417cc3c85946bc
     print("=" * 60)
     
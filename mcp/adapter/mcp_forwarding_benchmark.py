@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+MCP请求转发负载基准测试
+在本地启动若干个桩MCP服务器, 对比:
+  - legacy: 每次请求新建连接的阻塞 requests.post (线程池模拟Flask工作线程)
+  - pooled: AsyncMCPForwarder 每MCP keep-alive连接池 + 并发上限
+
+用法:
+    python mcp_forwarding_benchmark.py --mcps 4 --requests 5000 --concurrency 1000 --delay 0.01
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from aiohttp import web
+
+try:
+    from .mcp_forwarding_pool import AsyncMCPForwarder, ForwardingConfig
+except ImportError:
+    from mcp_forwarding_pool import AsyncMCPForwarder, ForwardingConfig
+
+
+async def start_stub_mcps(count: int, delay: float) -> List[web.AppRunner]:
+    """启动桩MCP服务器, 每个请求模拟delay秒的处理时间"""
+
+    async def handle_request(request: web.Request) -> web.Response:
+        payload = await request.json()
+        if delay:
+            await asyncio.sleep(delay)
+        return web.json_response({"success": True, "action": payload.get("action")})
+
+    async def handle_health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "healthy"})
+
+    runners = []
+    for _ in range(count):
+        app = web.Application()
+        app.router.add_post('/mcp/request', handle_request)
+        app.router.add_get('/health', handle_health)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        runners.append(runner)
+    return runners
+
+
+def stub_urls(runners: List[web.AppRunner]) -> Dict[str, str]:
+    urls = {}
+    for index, runner in enumerate(runners):
+        host, port = runner.addresses[0][:2]
+        urls[f"stub_mcp_{index}"] = f"http://{host}:{port}"
+    return urls
+
+
+def summarize(name: str, latencies: List[float], elapsed: float, failures: int) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    result = {
+        "name": name,
+        "requests": len(latencies) + failures,
+        "failures": failures,
+        "elapsed": elapsed,
+        "throughput": (len(latencies) + failures) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0
+    }
+    print(f"📊 {name:8s} 请求: {result['requests']:6d}  失败: {failures:5d}  "
+          f"耗时: {elapsed:7.2f}s  吞吐: {result['throughput']:9.1f} req/s  "
+          f"p50: {result['p50_ms']:7.2f}ms  p99: {result['p99_ms']:7.2f}ms")
+    return result
+
+
+async def run_pooled(urls: Dict[str, str], total: int, concurrency: int,
+                     config: ForwardingConfig) -> Dict[str, float]:
+    forwarder = AsyncMCPForwarder(config)
+    targets = list(urls.items())
+    latencies: List[float] = []
+    failures = 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(index: int):
+        nonlocal failures
+        mcp_id, url = targets[index % len(targets)]
+        async with gate:
+            start = time.perf_counter()
+            result = await forwarder.forward(mcp_id, url, {"action": "ping", "params": {"i": index}})
+            if result.get("success"):
+                latencies.append(time.perf_counter() - start)
+            else:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    await forwarder.close()
+    return summarize("pooled", latencies, elapsed, failures)
+
+
+def run_legacy(urls: Dict[str, str], total: int, workers: int) -> Dict[str, float]:
+    import requests
+
+    targets = list(urls.values())
+
+    def one(index: int):
+        start = time.perf_counter()
+        try:
+            response = requests.post(f"{targets[index % len(targets)]}/mcp/request",
+                                     json={"action": "ping", "params": {"i": index}}, timeout=30)
+            return time.perf_counter() - start if response.status_code == 200 else None
+        except Exception:
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    latencies = [r for r in results if r is not None]
+    return summarize("legacy", latencies, elapsed, total - len(latencies))
+
+
+async def main_async(args):
+    runners = await start_stub_mcps(args.mcps, args.delay)
+    urls = stub_urls(runners)
+    print(f"🚀 已启动 {len(urls)} 个桩MCP服务器, 处理延迟 {args.delay * 1000:.1f}ms")
+    try:
+        config = ForwardingConfig(
+            max_connections_per_mcp=args.connections,
+            max_concurrency_per_mcp=args.per_mcp_concurrency,
+            max_pending_per_mcp=max(args.requests, 1)
+        )
+        results = [await run_pooled(urls, args.requests, args.concurrency, config)]
+        if not args.skip_legacy:
+            loop = asyncio.get_running_loop()
+            legacy_total = min(args.requests, args.legacy_requests)
+            results.append(await loop.run_in_executor(
+                None, run_legacy, urls, legacy_total, args.legacy_workers))
+        return results
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP请求转发负载基准测试")
+    parser.add_argument("--mcps", type=int, default=4, help="桩MCP服务器数量")
+    parser.add_argument("--requests", type=int, default=5000, help="总请求数")
+    parser.add_argument("--concurrency", type=int, default=1000, help="pooled模式的总并发数")
+    parser.add_argument("--connections", type=int, default=32, help="每MCP keep-alive连接数")
+    parser.add_argument("--per-mcp-concurrency", type=int, default=256, help="每MCP在途请求上限")
+    parser.add_argument("--delay", type=float, default=0.01, help="桩服务器处理延迟 (秒)")
+    parser.add_argument("--legacy-workers", type=int, default=16, help="legacy模式线程数 (模拟Flask工作线程)")
+    parser.add_argument("--legacy-requests", type=int, default=1000, help="legacy模式请求数上限")
+    parser.add_argument("--skip-legacy", action="store_true", help="跳过legacy对比")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
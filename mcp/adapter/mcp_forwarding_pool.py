@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+MCP请求转发连接池
+为MCP Coordinator提供基于asyncio的异步转发通道
+
+- 每个目标MCP拥有独立的keep-alive连接池 (aiohttp TCPConnector)
+- 每个目标MCP的并发上限 (Semaphore) 与待处理队列上限 (背压)
+- 同一连接池内的多个在途请求复用keep-alive连接
+- 后台事件循环线程, 供同步的Flask端点共享同一组连接池
+"""
+
+import asyncio
+import json
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from typing import Any, Coroutine, Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ForwardingConfig:
+    """转发连接池配置"""
+    max_connections_per_mcp: int = 32      # 每个MCP的keep-alive连接数上限
+    max_concurrency_per_mcp: int = 64      # 每个MCP同时在途的请求数上限
+    max_pending_per_mcp: int = 1024        # 每个MCP排队+在途请求上限, 超过即拒绝 (背压)
+    queue_wait_timeout: float = 10.0       # 排队等待并发槽位的最长时间 (秒)
+    request_timeout: float = 30.0          # 单次请求总超时 (秒)
+    connect_timeout: float = 5.0           # 建立连接超时 (秒)
+    keepalive_timeout: float = 30.0        # 空闲连接保活时间 (秒)
+
+
+@dataclass
+class TargetStats:
+    """单个目标MCP的转发统计"""
+    total_requests: int = 0
+    successful_requests: int = 0
+    failed_requests: int = 0
+    rejected_requests: int = 0
+    in_flight: int = 0
+    pending: int = 0
+    peak_pending: int = 0
+    total_latency: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        completed = self.successful_requests + self.failed_requests
+        return {
+            "total_requests": self.total_requests,
+            "successful_requests": self.successful_requests,
+            "failed_requests": self.failed_requests,
+            "rejected_requests": self.rejected_requests,
+            "in_flight": self.in_flight,
+            "pending": self.pending,
+            "peak_pending": self.peak_pending,
+            "average_latency": self.total_latency / completed if completed else 0.0
+        }
+
+
+def _close_session_on_loop(session: aiohttp.ClientSession, loop: Optional[asyncio.AbstractEventLoop]):
+    """关闭属于另一个事件循环的会话 (不等待)"""
+    if session.closed:
+        return
+    if loop is not None and not loop.is_closed():
+        # 在会话所属的循环中关闭; 循环已停止时在其下次运行时完成
+        asyncio.run_coroutine_threadsafe(session.close(), loop)
+    else:
+        # 原循环已关闭, 无法再关闭其中的连接: 分离连接器交给回收,
+        # 调用方应在结束循环前 await close()
+        session.detach()
+        logger.warning("⚠️ 会话所属的事件循环已关闭, 已分离未关闭的连接器")
+
+
+class TargetPool:
+    """
+    单个目标MCP的连接池与并发控制
+
+    会话与信号量绑定创建它们的事件循环; 在另一个循环中使用时重建, 并关闭旧会话
+    """
+
+    def __init__(self, base_url: str, config: ForwardingConfig):
+        self.base_url = base_url.rstrip('/')
+        self.config = config
+        self.stats = TargetStats()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._session is not None:
+            _close_session_on_loop(self._session, self._loop)
+            self._session = None
+        self._loop = loop
+        self._semaphore = asyncio.Semaphore(self.config.max_concurrency_per_mcp)
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """当前事件循环的并发槽位"""
+        self._bind_loop()
+        return self._semaphore
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """惰性创建该目标专用的会话 (必须在事件循环内调用)"""
+        self._bind_loop()
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.config.max_connections_per_mcp,
+                keepalive_timeout=self.config.keepalive_timeout
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.config.request_timeout,
+                connect=self.config.connect_timeout
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def close(self):
+        session, self._session = self._session, None
+        if session is None or session.closed:
+            return
+        if self._loop is asyncio.get_running_loop():
+            await session.close()
+        else:
+            _close_session_on_loop(session, self._loop)
+
+
+class AsyncMCPForwarder:
+    """基于每MCP连接池的异步请求转发器"""
+
+    def __init__(self, config: Optional[ForwardingConfig] = None):
+        self.config = config or ForwardingConfig()
+        self._pools: Dict[str, TargetPool] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 连接池管理
+    # ------------------------------------------------------------------
+
+    def _get_pool(self, mcp_id: str, base_url: str) -> TargetPool:
+        pool = self._pools.get(mcp_id)
+        if pool is None or pool.base_url != base_url.rstrip('/'):
+            if pool is not None:
+                # MCP地址变更, 旧连接池在后台关闭
+                asyncio.ensure_future(pool.close())
+            pool = TargetPool(base_url, self.config)
+            self._pools[mcp_id] = pool
+        return pool
+
+    async def close(self):
+        """关闭所有连接池"""
+        pools = list(self._pools.values())
+        self._pools.clear()
+        for pool in pools:
+            await pool.close()
+
+    # ------------------------------------------------------------------
+    # 异步接口
+    # ------------------------------------------------------------------
+
+    async def request(self, mcp_id: str, base_url: str, method: str, path: str,
+                      json_data: Optional[dict] = None,
+                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        通过目标MCP的连接池发送请求
+
+        返回 {"status": HTTP状态码, "data": JSON或None, "text": 响应文本};
+        排队超限时返回 {"status": None, "rejected": True, "error": ...}
+        """
+        pool = self._get_pool(mcp_id, base_url)
+        stats = pool.stats
+        stats.total_requests += 1
+
+        if stats.pending >= self.config.max_pending_per_mcp:
+            stats.rejected_requests += 1
+            return {
+                "status": None,
+                "rejected": True,
+                "error": f"MCP {mcp_id} 待处理请求已满 ({self.config.max_pending_per_mcp})"
+            }
+
+        stats.pending += 1
+        stats.peak_pending = max(stats.peak_pending, stats.pending)
+        semaphore = pool.semaphore
+        try:
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.config.queue_wait_timeout)
+            except asyncio.TimeoutError:
+                stats.rejected_requests += 1
+                return {
+                    "status": None,
+                    "rejected": True,
+                    "error": f"MCP {mcp_id} 排队超时 ({self.config.queue_wait_timeout}s)"
+                }
+
+            stats.in_flight += 1
+            start_time = time.perf_counter()
+            try:
+                extra = {"timeout": aiohttp.ClientTimeout(total=timeout)} if timeout else {}
+                async with pool.session.request(
+                    method, f"{pool.base_url}{path}", json=json_data, **extra
+                ) as response:
+                    text = await response.text()
+                try:
+                    data = json.loads(text) if text else None
+                except ValueError:
+                    data = None
+                stats.successful_requests += 1
+                return {"status": response.status, "data": data, "text": text}
+            except Exception:
+                stats.failed_requests += 1
+                raise
+            finally:
+                stats.total_latency += time.perf_counter() - start_time
+                stats.in_flight -= 1
+                semaphore.release()
+        finally:
+            stats.pending -= 1
+
+    async def forward(self, mcp_id: str, base_url: str, mcp_request: dict) -> Dict[str, Any]:
+        """转发MCP请求到 {base_url}/mcp/request, 返回值与同步版本的forward_request一致"""
+        action = mcp_request.get("action")
+        try:
+            response = await self.request(mcp_id, base_url, "POST", "/mcp/request", json_data=mcp_request)
+        except Exception as e:
+            logger.error(f"❌ 转发请求异常: {mcp_id}.{action} - {e}")
+            return {"success": False, "error": f"请求转发异常: {str(e) or type(e).__name__}"}
+
+        if response.get("rejected"):
+            logger.warning(f"⚠️ 转发请求被拒绝: {mcp_id}.{action} - {response['error']}")
+            return {"success": False, "error": response["error"], "backpressure": True}
+
+        if response["status"] == 200 and response["data"] is not None:
+            logger.debug(f"✅ 转发请求成功: {mcp_id}.{action}")
+            return response["data"]
+
+        logger.error(f"❌ 转发请求失败: {mcp_id}.{action} - HTTP {response['status']}")
+        return {
+            "success": False,
+            "error": f"MCP请求失败: HTTP {response['status']}",
+            "details": response["text"]
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取所有目标MCP的转发统计"""
+        return {
+            "config": {
+                "max_connections_per_mcp": self.config.max_connections_per_mcp,
+                "max_concurrency_per_mcp": self.config.max_concurrency_per_mcp,
+                "max_pending_per_mcp": self.config.max_pending_per_mcp
+            },
+            "targets": {mcp_id: pool.stats.to_dict() for mcp_id, pool in self._pools.items()}
+        }
+
+    # ------------------------------------------------------------------
+    # 后台事件循环 (供同步调用方使用)
+    # ------------------------------------------------------------------
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """启动后台事件循环线程 (幂等)"""
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="mcp-forwarding-loop",
+                    daemon=True
+                )
+                self._thread.start()
+        return self._loop
+
+    def run_coroutine(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """在后台事件循环中执行协程并阻塞等待结果"""
+        loop = self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        return future.result(timeout)
+
+    async def _shutdown(self):
+        """取消后台循环中的其余任务 (如健康探测) 并关闭连接池"""
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.close()
+
+    def stop(self):
+        """关闭连接池并停止后台事件循环"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+MCP后台健康探测器
+在协调器的事件循环中并发探测所有已注册MCP, 维护内存中的健康状态表
+
+- 每个MCP独立的抖动探测间隔, 避免所有探测同时发出; 连续失败的MCP按指数退避降低探测频率
+- 记录最近N次探测延迟, 提供p50/p90/p99分位数
+- 端点直接读取缓存; fresh模式在限定时间内并行探测全部MCP
+"""
+
+import asyncio
+import random
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+ProbeFunc = Callable[[str], Awaitable[Dict[str, Any]]]
+
+
+@dataclass
+class HealthProberConfig:
+    """健康探测配置"""
+    interval: float = 15.0          # 平均探测间隔 (秒)
+    jitter: float = 0.2             # 间隔抖动比例, 实际间隔为 interval * (1 ± jitter)
+    probe_timeout: float = 5.0      # 单次探测超时 (秒)
+    fresh_timeout: float = 3.0      # fresh模式的整体时间上限 (秒)
+    max_backoff: float = 240.0      # 连续失败时探测间隔的上限 (秒)
+    latency_window: int = 100       # 保留的延迟样本数
+
+
+@dataclass
+class MCPHealthRecord:
+    """单个MCP的健康状态记录"""
+    mcp_id: str
+    status: str = "unknown"
+    success: bool = False
+    error: Optional[str] = None
+    data: Any = None
+    last_checked: Optional[str] = None
+    last_seen: Optional[str] = None
+    consecutive_failures: int = 0
+    total_probes: int = 0
+    next_probe_at: float = 0.0
+    latencies: Deque[float] = field(default_factory=deque)
+
+    def latency_percentiles(self) -> Dict[str, float]:
+        if not self.latencies:
+            return {}
+        ordered = sorted(self.latencies)
+
+        def pick(q: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+        return {"p50_ms": pick(0.50), "p90_ms": pick(0.90), "p99_ms": pick(0.99), "samples": len(ordered)}
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "success": self.success,
+            "status": self.status,
+            "last_checked": self.last_checked,
+            "last_seen": self.last_seen,
+            "consecutive_failures": self.consecutive_failures,
+            "total_probes": self.total_probes,
+            "latency": self.latency_percentiles()
+        }
+        if self.error:
+            result["error"] = self.error
+        if self.data is not None:
+            result["data"] = self.data
+        return result
+
+
+class MCPHealthProber:
+    """后台并发健康探测器"""
+
+    def __init__(self, probe: ProbeFunc, list_targets: Callable[[], Iterable[str]],
+                 config: Optional[HealthProberConfig] = None):
+        self.probe = probe
+        self.list_targets = list_targets
+        self.config = config or HealthProberConfig()
+        self.health_table: Dict[str, MCPHealthRecord] = {}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self._loop_task is not None and not self._loop_task.done()
+
+    # ------------------------------------------------------------------
+    # 探测
+    # ------------------------------------------------------------------
+
+    def _record(self, mcp_id: str) -> MCPHealthRecord:
+        record = self.health_table.get(mcp_id)
+        if record is None:
+            record = MCPHealthRecord(mcp_id=mcp_id, latencies=deque(maxlen=self.config.latency_window))
+            self.health_table[mcp_id] = record
+        return record
+
+    def _next_interval(self, consecutive_failures: int = 0) -> float:
+        """抖动后的探测间隔; 连续失败时每次翻倍, 不超过 max_backoff"""
+        jitter = self.config.jitter
+        interval = self.config.interval
+        if consecutive_failures:
+            interval = min(self.config.max_backoff, interval * 2 ** min(consecutive_failures, 16))
+        return interval * random.uniform(1 - jitter, 1 + jitter)
+
+    async def probe_one(self, mcp_id: str) -> MCPHealthRecord:
+        """探测单个MCP并更新健康表; 同一MCP的并发探测会合并为一次"""
+        task = self._in_flight.get(mcp_id)
+        if task is None:
+            task = asyncio.ensure_future(self._run_probe(mcp_id))
+            self._in_flight[mcp_id] = task
+            task.add_done_callback(lambda _t, key=mcp_id: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _run_probe(self, mcp_id: str) -> MCPHealthRecord:
+        record = self._record(mcp_id)
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self.probe(mcp_id), self.config.probe_timeout)
+        except asyncio.TimeoutError:
+            result = {"success": False, "status": "unreachable",
+                      "error": f"探测超时 ({self.config.probe_timeout}s)"}
+        except Exception as e:
+            result = {"success": False, "status": "unreachable", "error": str(e)}
+        latency = time.perf_counter() - start
+
+        now = datetime.now().isoformat()
+        record.total_probes += 1
+        record.last_checked = now
+        record.success = bool(result.get("success"))
+        record.status = result.get("status") or ("healthy" if record.success else "unreachable")
+        record.error = result.get("error")
+        record.data = result.get("data")
+        if record.status != "unreachable":
+            # 收到了HTTP响应, 记为可达并记录延迟
+            record.last_seen = now
+            record.latencies.append(latency)
+        record.consecutive_failures = 0 if record.success else record.consecutive_failures + 1
+        record.next_probe_at = time.monotonic() + self._next_interval(record.consecutive_failures)
+        return record
+
+    async def probe_all(self, timeout: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """限定时间内并行探测所有MCP; 超时未完成的沿用缓存并标记为pending"""
+        targets = list(self.list_targets())
+        if not targets:
+            return {}
+        tasks = {mcp_id: asyncio.ensure_future(self.probe_one(mcp_id)) for mcp_id in targets}
+        await asyncio.wait(tasks.values(), timeout=timeout or self.config.fresh_timeout)
+
+        results = {}
+        for mcp_id, task in tasks.items():
+            entry = self._record(mcp_id).to_dict()
+            if not task.done():
+                # 探测仍在后台进行, 完成后会更新健康表
+                entry["probe_pending"] = True
+            results[mcp_id] = entry
+        return results
+
+    # ------------------------------------------------------------------
+    # 后台循环
+    # ------------------------------------------------------------------
+
+    async def _probe_loop(self):
+        while True:
+            now = time.monotonic()
+            targets = list(self.list_targets())
+            for mcp_id in list(self.health_table):
+                if mcp_id not in targets:
+                    del self.health_table[mcp_id]
+
+            next_due = now + self.config.interval
+            for mcp_id in targets:
+                record = self._record(mcp_id)
+                if record.next_probe_at <= now and mcp_id not in self._in_flight:
+                    asyncio.ensure_future(self.probe_one(mcp_id))
+                    # 在探测完成前不会重复调度
+                    record.next_probe_at = now + self.config.probe_timeout + self._next_interval()
+                next_due = min(next_due, record.next_probe_at)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.05, next_due - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        """启动后台探测循环 (需在事件循环中调用, 幂等)"""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        # 首轮探测打散在一个抖动窗口内, 避免启动时集中探测
+        for mcp_id in self.list_targets():
+            self._record(mcp_id).next_probe_at = time.monotonic() + random.uniform(0, self.config.jitter * self.config.interval)
+        self._loop_task = asyncio.ensure_future(self._probe_loop())
+        logger.info(f"✅ MCP健康探测器已启动 (间隔 {self.config.interval}s ± {self.config.jitter * 100:.0f}%)")
+
+    def notify_targets_changed(self):
+        """注册表变更后唤醒探测循环, 让新MCP尽快得到首次探测"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+
+    def get(self, mcp_id: str) -> Dict[str, Any]:
+        """返回单个MCP的缓存健康状态 (不发起探测)"""
+        record = self.health_table.get(mcp_id) or MCPHealthRecord(mcp_id=mcp_id)
+        return record.to_dict()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """返回所有已注册MCP的缓存健康状态"""
+        results = {}
+        for mcp_id in list(self.list_targets()):
+            record = self.health_table.get(mcp_id) or MCPHealthRecord(mcp_id=mcp_id)
+            results[mcp_id] = record.to_dict()
+        return results
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+OCR结果缓存 - 内容寻址的两级缓存
+供 local_model_mcp 的 OCREngine 和 cloud_search_mcp 共用
+
+- 键为图像字节 + 引擎/语言/预处理/提示词等参数的SHA-256, 与文件名无关
+- 内存LRU层按条目数限制; 磁盘层按总字节数淘汰最久未访问的条目
+- 统计命中/未命中、免于重复处理的图像字节数, 以及云端调用节省的费用
+- 事件循环中使用 aget/aput: 磁盘读写与删除在线程池中执行; get/put 为同步版本
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OCRCacheConfig:
+    """OCR缓存配置"""
+    enabled: bool = True
+    max_memory_entries: int = 256           # 内存层最大条目数
+    cache_dir: Optional[str] = None         # 磁盘层目录, None表示只用内存层
+    max_disk_bytes: int = 512 * 1024 * 1024 # 磁盘层总大小上限
+    ttl: Optional[float] = None             # 条目有效期 (秒), None表示不过期
+
+
+class OCRResultCache:
+    """内容寻址的OCR结果缓存"""
+
+    def __init__(self, config: Optional[OCRCacheConfig] = None):
+        self.config = config or OCRCacheConfig()
+
+        # key -> (写入时间, 图像字节数, 结果)
+        self._memory: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        # key -> 文件大小, 按最近访问排序
+        self._disk_index: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        # 已移出索引、等待删除的文件
+        self._unlink_queue: List[Path] = []
+
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "bytes_saved": 0,
+            "cost_saved": 0.0
+        }
+
+        self.cache_dir = Path(self.config.cache_dir) if self.config.enabled and self.config.cache_dir else None
+        if self.cache_dir:
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(image_data: bytes, **params) -> str:
+        """由图像内容和处理参数生成缓存键"""
+        digest = hashlib.sha256(image_data)
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """查找缓存结果, 返回副本 (同步读取磁盘层)"""
+        if not self.config.enabled:
+            return None
+        entry = self._lookup_memory(key)
+        if entry is None and self._on_disk(key):
+            entry = self._disk_loaded(key, self._load_file(key))
+            self._unlink_pending()
+        return self._serve(entry)
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        """查找缓存结果, 返回副本; 磁盘层在线程池中读取, 不阻塞事件循环"""
+        if not self.config.enabled:
+            return None
+        entry = self._lookup_memory(key)
+        if entry is None and self._on_disk(key):
+            entry = self._disk_loaded(key, await asyncio.to_thread(self._load_file, key))
+            await self._aunlink_pending()
+        return self._serve(entry)
+
+    def put(self, key: str, result: Dict[str, Any], image_bytes: int = 0):
+        """写入缓存结果 (同步写入磁盘层)"""
+        entry = self._store_memory(key, result, image_bytes)
+        if entry is not None and self.cache_dir:
+            self._disk_stored(key, self._write_file(key, entry))
+            self._unlink_pending()
+
+    async def aput(self, key: str, result: Dict[str, Any], image_bytes: int = 0):
+        """写入缓存结果; 内存层立即可见, 磁盘层在线程池中写入"""
+        entry = self._store_memory(key, result, image_bytes)
+        if entry is not None and self.cache_dir:
+            self._disk_stored(key, await asyncio.to_thread(self._write_file, key, entry))
+            await self._aunlink_pending()
+
+    def _lookup_memory(self, key: str) -> Optional[Tuple[float, int, Dict[str, Any]]]:
+        entry = self._memory.get(key)
+        if entry is not None and not self._expired(entry[0]):
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return entry
+        if entry is not None:
+            del self._memory[key]
+        return None
+
+    def _on_disk(self, key: str) -> bool:
+        return self.cache_dir is not None and key in self._disk_index
+
+    def _serve(self, entry: Optional[Tuple[float, int, Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        _, image_bytes, result = entry
+        self.stats["bytes_saved"] += image_bytes
+        self.stats["cost_saved"] += result.get("cost", 0.0) or 0.0
+        return copy.deepcopy(result)
+
+    def _store_memory(self, key: str, result: Dict[str, Any],
+                      image_bytes: int) -> Optional[Tuple[float, int, Dict[str, Any]]]:
+        if not self.config.enabled:
+            return None
+        entry = (time.time(), image_bytes, copy.deepcopy(result))
+        self._remember(key, entry)
+        self.stats["stores"] += 1
+        return entry
+
+    def _remember(self, key: str, entry: Tuple[float, int, Dict[str, Any]]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.config.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _expired(self, created_at: float) -> bool:
+        return self.config.ttl is not None and time.time() - created_at > self.config.ttl
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _load_disk_index(self):
+        """启动时按访问时间重建磁盘索引"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+                files.append((stat.st_mtime, path.stem, stat.st_size))
+            except OSError:
+                continue
+        for _, key, size in sorted(files):
+            self._disk_index[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+        self._unlink_pending()
+
+    def _load_file(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取磁盘条目并更新访问时间 (可在工作线程中执行, 不修改索引)"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # 更新访问时间, 重启后仍按最近访问淘汰
+            os.utime(path)
+            return data
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取OCR缓存失败 {key[:12]}: {e}")
+            return None
+
+    def _disk_loaded(self, key: str, data: Optional[Dict[str, Any]]) -> Optional[Tuple[float, int, Dict[str, Any]]]:
+        """根据读取结果更新索引, 有效条目同时放入内存层"""
+        try:
+            entry = (data["created_at"], data["image_bytes"], data["result"])
+        except (TypeError, KeyError):
+            entry = None
+        if entry is None or self._expired(entry[0]):
+            self._remove_disk(key)
+            return None
+        if key in self._disk_index:
+            self._disk_index.move_to_end(key)
+        self.stats["disk_hits"] += 1
+        self._remember(key, entry)
+        return entry
+
+    def _write_file(self, key: str, entry: Tuple[float, int, Dict[str, Any]]) -> Optional[int]:
+        """序列化并写入磁盘条目, 返回文件大小 (可在工作线程中执行, 不修改索引)"""
+        created_at, image_bytes, result = entry
+        path = self._path(key)
+        try:
+            payload = json.dumps({
+                "created_at": created_at,
+                "image_bytes": image_bytes,
+                "result": result
+            }, ensure_ascii=False, default=str).encode("utf-8")
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再原子替换, 避免读到半写的条目
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            return len(payload)
+        except (OSError, TypeError) as e:
+            logger.warning(f"写入OCR缓存失败 {key[:12]}: {e}")
+            return None
+
+    def _disk_stored(self, key: str, size: Optional[int]):
+        if size is None:
+            return
+        self._disk_bytes += size - self._disk_index.pop(key, 0)
+        self._disk_index[key] = size
+        self._evict_disk()
+
+    def _remove_disk(self, key: str):
+        """移出索引, 文件稍后由 _unlink_pending 删除"""
+        self._disk_bytes -= self._disk_index.pop(key, 0)
+        self._unlink_queue.append(self._path(key))
+
+    def _unlink_pending(self):
+        while self._unlink_queue:
+            try:
+                self._unlink_queue.pop().unlink()
+            except OSError:
+                pass
+
+    async def _aunlink_pending(self):
+        if self._unlink_queue:
+            await asyncio.to_thread(self._unlink_pending)
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.config.max_disk_bytes and self._disk_index:
+            key = next(iter(self._disk_index))
+            self._remove_disk(key)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        """清空两级缓存"""
+        self._memory.clear()
+        for key in list(self._disk_index):
+            self._remove_disk(key)
+        self._unlink_pending()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            "enabled": self.config.enabled,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk_index),
+            "disk_bytes": self._disk_bytes,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            **self.stats
+        }
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Python源码解析缓存 - 按内容哈希共享的解析结果
+供 continuous_refactoring_mcp、development_intervention_mcp、pr_review_prevention
+和 mcp_registry_manager 共用, 同一文件在内容变化前只读取和解析一次
+
+- 键为源码字节的 blake2b 哈希, 与文件路径无关 (内容相同的副本共享同一解析结果)
+- 路径层记录 (mtime, 大小) -> 哈希, stat 未变化时不重新读取文件
+- 每个条目包含源码、行首偏移索引、AST 以及一次遍历得到的事实
+  (导入、函数及其圈复杂度、类名、模块文档字符串)
+- 内存层按估算字节数 (源码 + AST) 做LRU淘汰
+- 可选的磁盘层只保存事实 (JSON); AST 反序列化比重新解析更慢, 因此按需重新解析
+- 缓存只在本进程内共享: 进程池子进程用 parse_source 直接解析, 结果不回到父进程;
+  需要分发到进程池的调用方可先用 peek 找出父进程已解析的文件, 在父进程中处理这些文件
+"""
+
+import ast
+import bisect
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# AST 内存约为源码字符数的 30~40 倍, 按上限估算条目占用
+AST_BYTES_PER_CHAR = 36
+
+# 事实格式或解析器版本变化时, 磁盘上的旧事实自动失效
+FACTS_VERSION = f"1-py{sys.version_info[0]}.{sys.version_info[1]}"
+
+
+@dataclass
+class SourceCacheConfig:
+    """解析缓存配置"""
+    max_memory_bytes: int = 256 * 1024 * 1024  # 内存层估算占用上限
+    max_tracked_paths: int = 16384              # 路径 -> 哈希 记录上限
+    cache_dir: Optional[str] = None             # 磁盘层目录, None表示只用内存层
+
+
+@dataclass
+class ImportFact:
+    """一条 import / from ... import 语句"""
+    lineno: int
+    names: List[str]
+    module: Optional[str] = None    # 仅 from 导入
+    level: int = 0                  # 相对导入层级
+    is_from: bool = False
+
+
+@dataclass
+class FunctionFact:
+    """函数定义及其圈复杂度"""
+    name: str
+    lineno: int
+    end_lineno: Optional[int]
+    complexity: int
+    is_async: bool = False
+    class_name: Optional[str] = None
+
+
+@dataclass
+class ClassFact:
+    """类定义"""
+    name: str
+    lineno: int
+    bases: List[str] = field(default_factory=list)
+
+
+@dataclass
+class SourceFacts:
+    """一次AST遍历得到的事实, 按源码顺序排列"""
+    imports: List[ImportFact] = field(default_factory=list)
+    functions: List[FunctionFact] = field(default_factory=list)
+    classes: List[ClassFact] = field(default_factory=list)
+    docstring: Optional[str] = None
+    syntax_error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SourceFacts":
+        return cls(
+            imports=[ImportFact(**item) for item in data.get("imports", [])],
+            functions=[FunctionFact(**item) for item in data.get("functions", [])],
+            classes=[ClassFact(**item) for item in data.get("classes", [])],
+            docstring=data.get("docstring"),
+            syntax_error=data.get("syntax_error")
+        )
+
+
+def function_complexity(node: ast.AST) -> int:
+    """计算函数圈复杂度: 1 + 分支/循环/异常处理数 + 布尔运算的额外操作数"""
+    complexity = 1  # 基础复杂度
+
+    for child in ast.walk(node):
+        if isinstance(child, (ast.If, ast.While, ast.For, ast.Try)):
+            complexity += 1
+        elif isinstance(child, ast.BoolOp):
+            complexity += len(child.values) - 1
+
+    return complexity
+
+
+class _FactCollector(ast.NodeVisitor):
+    """按源码顺序 (前序遍历) 收集导入、函数和类"""
+
+    def __init__(self):
+        self.facts = SourceFacts()
+        self._class_stack: List[Optional[str]] = []
+
+    def visit_Import(self, node: ast.Import):
+        self.facts.imports.append(ImportFact(
+            lineno=node.lineno, names=[alias.name for alias in node.names]))
+        self.generic_visit(node)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        self.facts.imports.append(ImportFact(
+            lineno=node.lineno, names=[alias.name for alias in node.names],
+            module=node.module, level=node.level or 0, is_from=True))
+        self.generic_visit(node)
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self.facts.classes.append(ClassFact(
+            name=node.name, lineno=node.lineno,
+            bases=[ast.unparse(base) for base in node.bases]))
+        self._class_stack.append(node.name)
+        self.generic_visit(node)
+        self._class_stack.pop()
+
+    def _visit_function(self, node, is_async: bool):
+        self.facts.functions.append(FunctionFact(
+            name=node.name, lineno=node.lineno,
+            end_lineno=getattr(node, "end_lineno", None),
+            complexity=function_complexity(node), is_async=is_async,
+            class_name=self._class_stack[-1] if self._class_stack else None))
+        # 嵌套函数中的类不再归属外层类
+        self._class_stack.append(None)
+        self.generic_visit(node)
+        self._class_stack.pop()
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self._visit_function(node, is_async=False)
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
+        self._visit_function(node, is_async=True)
+
+
+def collect_source_facts(tree: ast.AST) -> SourceFacts:
+    """对已解析的AST做一次遍历, 收集事实"""
+    collector = _FactCollector()
+    collector.visit(tree)
+    if isinstance(tree, ast.Module):
+        collector.facts.docstring = ast.get_docstring(tree, clean=False)
+    return collector.facts
+
+
+class ParsedSource:
+    """单份源码的解析结果, 由所有内容相同的文件共享, 使用方不应修改"""
+
+    __slots__ = ("content_hash", "source", "lines", "line_starts", "facts", "_tree")
+
+    def __init__(self, content_hash: str, source: str, facts: SourceFacts,
+                 tree: Optional[ast.AST] = None):
+        self.content_hash = content_hash
+        self.source = source
+        self.lines = source.split('\n')
+        # 行首偏移, 用二分查找把匹配位置换算为行号
+        self.line_starts = [0]
+        for line in self.lines[:-1]:
+            self.line_starts.append(self.line_starts[-1] + len(line) + 1)
+        self.facts = facts
+        self._tree = tree
+
+    @property
+    def tree(self) -> Optional[ast.AST]:
+        """AST; 事实来自磁盘层时按需解析, 语法错误时为 None"""
+        if self._tree is None and self.facts.syntax_error is None:
+            try:
+                self._tree = ast.parse(self.source)
+            except SyntaxError:
+                return None
+        return self._tree
+
+    def line_number(self, offset: int) -> int:
+        """字符偏移所在的行号 (从1开始)"""
+        return bisect.bisect_right(self.line_starts, offset)
+
+    def line_text(self, line_number: int) -> str:
+        return self.lines[line_number - 1] if 0 < line_number <= len(self.lines) else ""
+
+    @property
+    def memory_cost(self) -> int:
+        return len(self.source) * (2 + AST_BYTES_PER_CHAR)
+
+
+class ParsedSourceCache:
+    """内容寻址的Python源码解析缓存 (线程安全)"""
+
+    def __init__(self, config: Optional[SourceCacheConfig] = None):
+        self.config = config or SourceCacheConfig()
+
+        # 内容哈希 -> 解析结果, 按最近访问排序
+        self._entries: "OrderedDict[str, ParsedSource]" = OrderedDict()
+        self._memory_bytes = 0
+        # 路径 -> (mtime_ns, 大小, 内容哈希)
+        self._paths: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.stats = {
+            "stat_hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "parses": 0,
+            "files_read": 0,
+            "evictions": 0
+        }
+
+        self.cache_dir = Path(self.config.cache_dir) if self.config.cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(data: bytes) -> str:
+        """由源码字节生成缓存键"""
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def get(self, file_path: Union[str, Path]) -> ParsedSource:
+        """
+        读取并解析文件; stat 未变化时直接返回缓存结果
+
+        Raises:
+            OSError: 文件无法读取
+            UnicodeDecodeError: 文件不是UTF-8编码
+        """
+        path = os.fspath(file_path)
+        stat = os.stat(path)
+        entry = self._stat_hit(path, stat)
+        if entry is not None:
+            return entry
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.stats["files_read"] += 1
+        entry = self._lookup(self.make_key(data), data)
+
+        with self._lock:
+            self._paths[path] = (stat.st_mtime_ns, stat.st_size, entry.content_hash)
+            self._paths.move_to_end(path)
+            while len(self._paths) > self.config.max_tracked_paths:
+                self._paths.popitem(last=False)
+        return entry
+
+    def peek(self, file_path: Union[str, Path]) -> Optional[ParsedSource]:
+        """stat 未变化且解析结果仍在内存层时返回该结果, 否则返回None (不读取文件)"""
+        path = os.fspath(file_path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return self._stat_hit(path, stat)
+
+    def _stat_hit(self, path: str, stat: os.stat_result) -> Optional[ParsedSource]:
+        with self._lock:
+            known = self._paths.get(path)
+            if known is not None and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+                entry = self._entries.get(known[2])
+                if entry is not None:
+                    self._entries.move_to_end(known[2])
+                    self._paths.move_to_end(path)
+                    self.stats["stat_hits"] += 1
+                    return entry
+        return None
+
+    def parse(self, source: str) -> ParsedSource:
+        """解析已在内存中的源码 (如进程池子任务已读取的文件内容)"""
+        data = source.encode('utf-8', 'surrogatepass')
+        return self._lookup(self.make_key(data), data, source)
+
+    def _lookup(self, key: str, data: bytes, source: Optional[str] = None) -> ParsedSource:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry
+
+        if source is None:
+            source = data.decode('utf-8')
+        facts = self._read_disk(key)
+        if facts is not None:
+            entry = ParsedSource(key, source, facts)
+            self.stats["disk_hits"] += 1
+        else:
+            entry = self._analyze(key, source)
+
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                # 其他线程已写入
+                return existing
+            self._entries[key] = entry
+            self._memory_bytes += entry.memory_cost
+            while self._memory_bytes > self.config.max_memory_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._memory_bytes -= evicted.memory_cost
+                self.stats["evictions"] += 1
+        return entry
+
+    def _analyze(self, key: str, source: str) -> ParsedSource:
+        self.stats["parses"] += 1
+        entry = _build_parsed_source(key, source)
+        self._write_disk(key, entry.facts)
+        return entry
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[SourceFacts]:
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != FACTS_VERSION:
+                return None
+            return SourceFacts.from_dict(data["facts"])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"读取解析缓存失败 {key[:12]}: {e}")
+            return None
+
+    def _write_disk(self, key: str, facts: SourceFacts):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        try:
+            payload = json.dumps({"version": FACTS_VERSION, "facts": facts.to_dict()},
+                                 ensure_ascii=False).encode('utf-8')
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再原子替换, 避免读到半写的条目
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"写入解析缓存失败 {key[:12]}: {e}")
+
+    def invalidate(self, file_path: Optional[Union[str, Path]] = None):
+        """忘记某个路径的 stat 记录 (下次重新读取); 不指定路径时清空内存层"""
+        with self._lock:
+            if file_path is not None:
+                self._paths.pop(os.fspath(file_path), None)
+                return
+            self._paths.clear()
+            self._entries.clear()
+            self._memory_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        hits = self.stats["stat_hits"] + self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["parses"]
+        return {
+            "entries": len(self._entries),
+            "tracked_paths": len(self._paths),
+            "memory_bytes": self._memory_bytes,
+            "persistent": self.cache_dir is not None,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            **self.stats
+        }
+
+
+def _build_parsed_source(key: str, source: str) -> ParsedSource:
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError) as e:
+        return ParsedSource(key, source, SourceFacts(syntax_error=str(e)))
+    return ParsedSource(key, source, collect_source_facts(tree), tree)
+
+
+def parse_source(source: str) -> ParsedSource:
+    """
+    不经过任何缓存直接解析源码
+
+    用于进程池子进程: 子进程内的缓存无法与父进程共享, 随进程退出丢弃, 填充它只会
+    在每个子进程中重复占用内存; 因此子进程也无法复用父进程中其他MCP已有的解析结果
+    """
+    data = source.encode('utf-8', 'surrogatepass')
+    return _build_parsed_source(ParsedSourceCache.make_key(data), source)
+
+
+_shared_cache: Optional[ParsedSourceCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_source_cache() -> ParsedSourceCache:
+    """
+    进程内共享的解析缓存
+
+    环境变量 PARSED_SOURCE_CACHE_DIR 指定磁盘层目录; 也可先调用
+    configure_shared_source_cache 替换配置
+    """
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ParsedSourceCache(SourceCacheConfig(
+                cache_dir=os.environ.get("PARSED_SOURCE_CACHE_DIR") or None))
+        return _shared_cache
+
+
+def configure_shared_source_cache(config: SourceCacheConfig) -> ParsedSourceCache:
+    """用新配置替换进程内共享的解析缓存"""
+    global _shared_cache
+    with _shared_lock:
+        _shared_cache = ParsedSourceCache(config)
+        return _shared_cache
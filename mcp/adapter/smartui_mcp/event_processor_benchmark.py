@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+SmartUI MCP - 事件处理器基准测试
+
+以固定速率（默认1k/10k/100k 事件/秒）向10个工作者的EventProcessor投递事件，
+报告实际处理吞吐（事件/秒）和分发延迟（入队到处理函数被调用）的p50/p99。
+--legacy 同时运行优化前的实现（每个优先级一个队列，空闲时为每个队列创建
+get任务并以1秒超时等待）作对比。
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from src.common import EventBusEvent, EventBusEventType
+from src.mcp_communication.event_listener import EventProcessor, EventPriority
+
+
+class LegacyEventProcessor(EventProcessor):
+    """优化前的实现：按优先级分组的多个队列 + 轮询式获取"""
+
+    def __init__(self, max_workers: int = 10, queue_size: int = 1000):
+        super().__init__(max_workers=max_workers, queue_size=queue_size)
+        self.event_queues = {priority: asyncio.Queue(maxsize=queue_size) for priority in EventPriority}
+
+    async def process_event(self, event: EventBusEvent, priority: EventPriority = EventPriority.NORMAL) -> None:
+        await self.event_queues[priority].put((event, priority))
+
+    async def _get_next_event(self) -> Optional[Tuple[EventBusEvent, EventPriority]]:
+        for priority in EventPriority:
+            try:
+                return self.event_queues[priority].get_nowait()
+            except asyncio.QueueEmpty:
+                continue
+
+        tasks = [asyncio.create_task(queue.get()) for queue in self.event_queues.values()]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED, timeout=1.0)
+        for task in pending:
+            task.cancel()
+        if done:
+            return await done.pop()
+        return None
+
+
+def percentile(samples: List[float], ratio: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+async def run_rate(processor_cls, rate: int, duration: float, workers: int) -> dict:
+    """按固定速率投递事件并统计吞吐与延迟"""
+    total = int(rate * duration)
+    processor = processor_cls(max_workers=workers, queue_size=total + 1)
+    latencies: List[float] = []
+
+    def handler(event: EventBusEvent) -> None:
+        latencies.append(time.monotonic() - event.data["enqueued_at"])
+
+    await processor.subscribe(EventBusEventType.USER_INTERACTION, handler)
+    await processor.start()
+
+    priorities = list(EventPriority)
+    start = time.monotonic()
+    sent = 0
+    while sent < total:
+        due = min(total, int(rate * (time.monotonic() - start)) + 1)
+        while sent < due:
+            event = EventBusEvent(
+                event_type=EventBusEventType.USER_INTERACTION,
+                data={"enqueued_at": time.monotonic()},
+                source="benchmark",
+                event_id=str(sent)
+            )
+            await processor.process_event(event, priorities[sent % len(priorities)])
+            sent += 1
+        await asyncio.sleep(0.001)
+
+    deadline = time.monotonic() + max(5.0, duration * 2)
+    while len(latencies) < total and time.monotonic() < deadline:
+        await asyncio.sleep(0.005)
+    elapsed = time.monotonic() - start
+    await processor.stop()
+
+    return {
+        "sent": total,
+        "processed": len(latencies),
+        "events_per_second": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000
+    }
+
+
+async def main_async(rates: List[int], duration: float, workers: int, legacy: bool) -> None:
+    print(f"🚀 事件处理器基准测试 ({workers} 个工作者, 每档 {duration}s)")
+    implementations = [("单优先级队列", EventProcessor)]
+    if legacy:
+        implementations.append(("多队列轮询(旧)", LegacyEventProcessor))
+
+    for rate in rates:
+        for label, processor_cls in implementations:
+            result = await run_rate(processor_cls, rate, duration, workers)
+            print(
+                f"   {label:<10} 目标 {rate:>7} 事件/秒  实际 {result['events_per_second']:>9.0f} 事件/秒  "
+                f"处理 {result['processed']}/{result['sent']}  "
+                f"p50 {result['p50_ms']:8.2f}ms  p99 {result['p99_ms']:8.2f}ms"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="事件处理器基准测试")
+    parser.add_argument("--rates", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--legacy", action="store_true", help="同时运行优化前的实现作对比")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main_async(args.rates, args.duration, args.workers, args.legacy))
+
+
+if __name__ == "__main__":
+    main()
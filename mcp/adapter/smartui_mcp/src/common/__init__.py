@@ -48,7 +48,8 @@ from .interfaces import (
 from .event_bus import (
     SmartUIEventBus, EventSubscription, EventBusMetrics,
     EventBusFactory, publish_event, subscribe_to_event,
-    event_handler, EventHandlerRegistry
+    event_handler, EventHandlerRegistry,
+    DispatchMode, OverflowPolicy, SubscriberQueue
 )
 
 # 通信协议
@@ -88,7 +89,7 @@ from .utils import (
     ConfigLoader, DataValidator, WeakRefDict,
     
     # 事件和锁
-    EventEmitter, AsyncLock,
+    EventEmitter, AsyncLock, AgingPriorityQueue,
     
     # 装饰器
     async_timeout, log_execution_time, memoize,
@@ -126,6 +127,7 @@ __all__ = [
     "SmartUIEventBus", "EventSubscription", "EventBusMetrics",
     "EventBusFactory", "publish_event", "subscribe_to_event",
     "event_handler", "EventHandlerRegistry",
+    "DispatchMode", "OverflowPolicy", "SubscriberQueue",
     
     # 通信协议
     "MessageType", "MessagePriority", "ComponentMessageType",
@@ -144,7 +146,7 @@ __all__ = [
     # 工具函数
     "AsyncCache", "Timer", "RateLimiter", "CircuitBreaker", "RetryPolicy",
     "PerformanceProfiler", "ConfigLoader", "DataValidator", "WeakRefDict",
-    "EventEmitter", "AsyncLock",
+    "EventEmitter", "AsyncLock", "AgingPriorityQueue",
     "async_timeout", "log_execution_time", "memoize",
     "generate_id", "deep_merge", "flatten_dict", "unflatten_dict",
     "safe_execute", "format_bytes", "format_duration",
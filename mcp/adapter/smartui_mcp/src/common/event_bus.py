@@ -7,7 +7,9 @@ SmartUI MCP 事件总线系统
 
 import asyncio
 import logging
-from typing import Dict, List, Optional, Callable, Any
+import time
+from enum import Enum
+from typing import Dict, List, Optional, Callable, Any, Hashable, Union
 from datetime import datetime, timedelta
 from collections import defaultdict, deque
 import weakref
@@ -19,6 +21,19 @@ from .interfaces import (
 )
 
 
+class DispatchMode(str, Enum):
+    """事件分发模式"""
+    DIRECT = "direct"    # 发布者等待所有订阅者处理完成
+    QUEUED = "queued"    # 发布者只入队，由每个订阅者的工作任务异步处理
+
+
+class OverflowPolicy(str, Enum):
+    """订阅者队列满时的处理策略"""
+    DROP_OLDEST = "drop_oldest"  # 丢弃最早的事件
+    BLOCK = "block"              # 发布者等待队列有空位
+    COALESCE = "coalesce"        # 按键合并：同键事件只保留最新的一个
+
+
 class EventSubscription:
     """事件订阅对象"""
     
@@ -38,6 +53,137 @@ class EventSubscription:
         self.created_at = datetime.now()
         self.last_triggered = None
         self.trigger_count = 0
+        self.queue: Optional["SubscriberQueue"] = None
+
+
+class SubscriberQueue:
+    """
+    订阅者的有界投递队列
+
+    publish只把事件放入队列，由独立的工作任务按顺序调用处理函数，
+    慢订阅者只会积压自己的队列，不会阻塞发布者和其他订阅者
+    """
+    
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        coalesce_key: Optional[Callable[[EventBusEvent], Hashable]] = None,
+        batch_size: int = 1,
+        batch_window: float = 0.05
+    ):
+        self.maxsize = max(1, maxsize)
+        self.overflow_policy = OverflowPolicy(overflow_policy)
+        self.coalesce_key = coalesce_key or (lambda event: event.source)
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        
+        # 队列项: [入队时间, 合并键, 事件]，合并时原位替换事件
+        self._items: deque = deque()
+        self._pending_by_key: Dict[Hashable, list] = {}
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.worker: Optional[asyncio.Task] = None
+        
+        # 统计
+        self.enqueued = 0
+        self.delivered = 0
+        self.batches = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+    
+    def __len__(self) -> int:
+        return len(self._items)
+    
+    async def put(self, event: EventBusEvent) -> None:
+        """入队；队列满时按溢出策略处理"""
+        key = None
+        if self.overflow_policy == OverflowPolicy.COALESCE:
+            key = self.coalesce_key(event)
+            pending = self._pending_by_key.get(key)
+            if pending is not None:
+                pending[2] = event
+                self.coalesced += 1
+                return
+        
+        if len(self._items) >= self.maxsize:
+            if self.overflow_policy == OverflowPolicy.BLOCK:
+                while len(self._items) >= self.maxsize:
+                    self._not_full.clear()
+                    await self._not_full.wait()
+            else:
+                self._drop(self._items.popleft())
+        
+        item = [time.monotonic(), key, event]
+        self._items.append(item)
+        if key is not None:
+            self._pending_by_key[key] = item
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, len(self._items))
+        self._idle.clear()
+        self._not_empty.set()
+    
+    def _drop(self, item: list) -> None:
+        if item[1] is not None:
+            self._pending_by_key.pop(item[1], None)
+        self.dropped += 1
+    
+    async def get_batch(self) -> List[list]:
+        """取出下一批队列项（批量模式下最多等待batch_window凑满一批）"""
+        while not self._items:
+            self._idle.set()
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        
+        if self.batch_size > 1 and len(self._items) < self.batch_size and self.batch_window > 0:
+            deadline = time.monotonic() + self.batch_window
+            while len(self._items) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._not_empty.clear()
+                try:
+                    await asyncio.wait_for(self._not_empty.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+        
+        batch = []
+        while self._items and len(batch) < self.batch_size:
+            item = self._items.popleft()
+            if item[1] is not None:
+                self._pending_by_key.pop(item[1], None)
+            batch.append(item)
+        self._not_full.set()
+        
+        lag = time.monotonic() - batch[0][0]
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        return batch
+    
+    async def join(self) -> None:
+        """等待队列清空且当前批次处理完成"""
+        await self._idle.wait()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": len(self._items),
+            "max_queue_depth": self.max_depth,
+            "queue_size": self.maxsize,
+            "overflow_policy": self.overflow_policy.value,
+            "batch_size": self.batch_size,
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "lag_ms": self.last_lag * 1000,
+            "max_lag_ms": self.max_lag * 1000
+        }
 
 
 class EventBusMetrics:
@@ -65,12 +211,24 @@ class SmartUIEventBus(IEventBus):
         self,
         max_history_size: int = 1000,
         cleanup_interval: int = 3600,
-        enable_metrics: bool = True
+        enable_metrics: bool = True,
+        dispatch_mode: Union[DispatchMode, str] = DispatchMode.DIRECT,
+        queue_size: int = 1000,
+        overflow_policy: Union[OverflowPolicy, str] = OverflowPolicy.DROP_OLDEST,
+        batch_event_types: Optional[Dict[EventBusEventType, int]] = None,
+        batch_window: float = 0.05
     ):
         self.max_history_size = max_history_size
         self.cleanup_interval = cleanup_interval
         self.enable_metrics = enable_metrics
         
+        # 分发配置（queued模式下每个订阅者一个有界队列和一个工作任务）
+        self.dispatch_mode = DispatchMode(dispatch_mode)
+        self.queue_size = queue_size
+        self.overflow_policy = OverflowPolicy(overflow_policy)
+        self.batch_event_types = dict(batch_event_types or {})  # 高频事件类型 -> 批量大小
+        self.batch_window = batch_window
+        
         # 订阅管理
         self._subscriptions: Dict[EventBusEventType, List[EventSubscription]] = defaultdict(list)
         self._subscription_by_id: Dict[str, EventSubscription] = {}
@@ -109,6 +267,14 @@ class SmartUIEventBus(IEventBus):
                 self.logger.debug(f"No subscribers for event type: {event.event_type}")
                 return
             
+            if self.dispatch_mode == DispatchMode.QUEUED:
+                # 只入队，不等待订阅者处理
+                for subscription in list(subscriptions):
+                    if subscription.filter_func and not subscription.filter_func(event):
+                        continue
+                    await subscription.queue.put(event)
+                return
+            
             # 异步处理所有订阅者
             tasks = []
             for subscription in subscriptions:
@@ -138,32 +304,41 @@ class SmartUIEventBus(IEventBus):
         subscription: EventSubscription
     ) -> None:
         """处理单个订阅"""
+        # 应用过滤器
+        if subscription.filter_func and not subscription.filter_func(event):
+            return
+        
+        await self._deliver(event, subscription)
+    
+    async def _deliver(
+        self,
+        payload: Union[EventBusEvent, List[EventBusEvent]],
+        subscription: EventSubscription
+    ) -> None:
+        """调用处理函数（批量模式下payload为事件列表）"""
         start_time = datetime.now()
+        event_count = len(payload) if isinstance(payload, list) else 1
         
         try:
-            # 应用过滤器
-            if subscription.filter_func and not subscription.filter_func(event):
-                return
-            
             # 调用处理函数
             if asyncio.iscoroutinefunction(subscription.handler):
-                await subscription.handler(event)
+                await subscription.handler(payload)
             else:
-                subscription.handler(event)
+                subscription.handler(payload)
             
             # 更新订阅统计
             subscription.last_triggered = datetime.now()
-            subscription.trigger_count += 1
+            subscription.trigger_count += event_count
             
             # 更新指标
             if self._metrics:
                 processing_time = (datetime.now() - start_time).total_seconds()
-                self._metrics.events_processed += 1
+                self._metrics.events_processed += event_count
                 
                 # 更新平均处理时间
                 total_events = self._metrics.events_processed
                 self._metrics.average_processing_time = (
-                    (self._metrics.average_processing_time * (total_events - 1) + processing_time) / total_events
+                    (self._metrics.average_processing_time * (total_events - event_count) + processing_time * event_count) / total_events
                 )
                 
                 # 更新峰值处理时间
@@ -175,16 +350,41 @@ class SmartUIEventBus(IEventBus):
                 f"Error processing subscription {subscription.subscription_id}: {e}"
             )
             if self._metrics:
-                self._metrics.events_failed += 1
+                self._metrics.events_failed += event_count
+    
+    async def _subscription_worker(self, subscription: EventSubscription) -> None:
+        """订阅者工作任务：按顺序消费该订阅者的队列"""
+        queue = subscription.queue
+        while True:
+            batch = await queue.get_batch()
+            events = [item[2] for item in batch]
+            queue.delivered += len(events)
+            queue.batches += 1
+            await self._deliver(events if queue.batch_size > 1 else events[0], subscription)
+    
+    async def drain(self) -> None:
+        """等待所有订阅者队列处理完毕（queued模式）"""
+        for subscription in list(self._subscription_by_id.values()):
+            if subscription.queue is not None:
+                await subscription.queue.join()
     
     async def subscribe(
         self,
         event_type: EventBusEventType,
         handler: EventHandler,
         filter_func: Optional[Callable[[EventBusEvent], bool]] = None,
-        subscriber_name: Optional[str] = None
+        subscriber_name: Optional[str] = None,
+        queue_size: Optional[int] = None,
+        overflow_policy: Optional[Union[OverflowPolicy, str]] = None,
+        coalesce_key: Optional[Callable[[EventBusEvent], Hashable]] = None,
+        batch_size: Optional[int] = None
     ) -> str:
-        """订阅事件"""
+        """
+        订阅事件
+        
+        queued模式下可为订阅者单独指定队列大小、溢出策略、合并键；
+        batch_size > 1 时处理函数每次收到一个事件列表
+        """
         subscription_id = str(uuid.uuid4())
         
         subscription = EventSubscription(
@@ -195,6 +395,16 @@ class SmartUIEventBus(IEventBus):
             subscriber_name=subscriber_name
         )
         
+        if self.dispatch_mode == DispatchMode.QUEUED:
+            subscription.queue = SubscriberQueue(
+                maxsize=queue_size or self.queue_size,
+                overflow_policy=overflow_policy or self.overflow_policy,
+                coalesce_key=coalesce_key,
+                batch_size=batch_size or self.batch_event_types.get(event_type, 1),
+                batch_window=self.batch_window
+            )
+            subscription.queue.worker = asyncio.create_task(self._subscription_worker(subscription))
+        
         # 添加到订阅列表
         self._subscriptions[event_type].append(subscription)
         self._subscription_by_id[subscription_id] = subscription
@@ -226,6 +436,10 @@ class SmartUIEventBus(IEventBus):
         # 从ID映射中移除
         del self._subscription_by_id[subscription_id]
         
+        # 停止工作任务
+        if subscription.queue is not None and subscription.queue.worker:
+            subscription.queue.worker.cancel()
+        
         # 更新指标
         if self._metrics:
             self._metrics.subscriptions_removed += 1
@@ -288,7 +502,17 @@ class SmartUIEventBus(IEventBus):
             "peak_processing_time": self._metrics.peak_processing_time,
             "last_reset": self._metrics.last_reset.isoformat(),
             "active_subscriptions": len(self._subscription_by_id),
-            "event_history_size": len(self._event_history)
+            "event_history_size": len(self._event_history),
+            "dispatch_mode": self.dispatch_mode.value,
+            "subscribers": {
+                subscription_id: {
+                    "subscriber_name": sub.subscriber_name,
+                    "event_type": sub.event_type.value,
+                    **sub.queue.get_stats()
+                }
+                for subscription_id, sub in self._subscription_by_id.items()
+                if sub.queue is not None
+            }
         }
     
     async def reset_metrics(self) -> None:
@@ -336,7 +560,11 @@ class SmartUIEventBus(IEventBus):
             except asyncio.CancelledError:
                 pass
         
-        # 取消所有处理任务
+        # 取消所有处理任务和订阅者工作任务
+        for subscription in self._subscription_by_id.values():
+            if subscription.queue is not None and subscription.queue.worker:
+                self._processing_tasks[f"worker_{subscription.subscription_id}"] = subscription.queue.worker
+        
         for task in self._processing_tasks.values():
             task.cancel()
         
@@ -365,14 +593,16 @@ class EventBusFactory:
         cls,
         max_history_size: int = 1000,
         cleanup_interval: int = 3600,
-        enable_metrics: bool = True
+        enable_metrics: bool = True,
+        **dispatch_options
     ) -> SmartUIEventBus:
-        """获取事件总线单例实例"""
+        """获取事件总线单例实例（dispatch_options透传分发配置）"""
         if cls._instance is None:
             cls._instance = SmartUIEventBus(
                 max_history_size=max_history_size,
                 cleanup_interval=cleanup_interval,
-                enable_metrics=enable_metrics
+                enable_metrics=enable_metrics,
+                **dispatch_options
             )
         return cls._instance
     
@@ -477,6 +707,9 @@ __all__ = [
     'EventBusFactory',
     'EventSubscription',
     'EventBusMetrics',
+    'DispatchMode',
+    'OverflowPolicy',
+    'SubscriberQueue',
     'publish_event',
     'subscribe_to_event',
     'event_handler',
@@ -8,9 +8,10 @@ import asyncio
 import logging
 import json
 import hashlib
+import itertools
 import time
 import uuid
-from typing import Dict, List, Optional, Any, Union, Callable, TypeVar, Generic
+from typing import Dict, List, Optional, Any, Union, Callable, TypeVar, Generic, Tuple
 from datetime import datetime, timedelta
 from pathlib import Path
 import weakref
@@ -422,6 +423,65 @@ class AsyncLock:
             yield
 
 
+class AgingPriorityQueue(asyncio.PriorityQueue):
+    """
+    带老化的优先级队列
+    
+    排序键为 优先级 × aging_interval + 入队时间：同一优先级先进先出，
+    每多等待aging_interval秒相当于提升一个优先级，低优先级项不会饿死。
+    排序键在入队时确定，堆无需重排；消费者直接await get_item()，
+    由asyncio.Queue负责唤醒，不需要轮询
+    """
+    
+    def __init__(self, aging_interval: float = 1.0, level_capacity: int = 0):
+        super().__init__()
+        self.aging_interval = aging_interval
+        self.level_capacity = level_capacity  # 每个优先级的容量，0表示不限
+        self._level_counts: Dict[int, int] = {}
+        self._level_space: Dict[int, asyncio.Event] = {}
+        self._sequence = itertools.count()
+    
+    def _put(self, entry) -> None:
+        super()._put(entry)
+        self._level_counts[entry[2]] = self._level_counts.get(entry[2], 0) + 1
+    
+    def _get(self):
+        entry = super()._get()
+        self._level_counts[entry[2]] -= 1
+        space = self._level_space.get(entry[2])
+        if space is not None:
+            space.set()
+        return entry
+    
+    def level_size(self, priority: int) -> int:
+        """指定优先级当前排队的数量"""
+        return self._level_counts.get(int(priority), 0)
+    
+    def level_full(self, priority: int) -> bool:
+        """指定优先级是否已满"""
+        return 0 < self.level_capacity <= self.level_size(priority)
+    
+    def put_item_nowait(self, item: Any, priority: int) -> None:
+        """入队（优先级已满时抛出asyncio.QueueFull）"""
+        if self.level_full(priority):
+            raise asyncio.QueueFull
+        now = time.monotonic()
+        self.put_nowait((int(priority) * self.aging_interval + now, next(self._sequence), int(priority), now, item))
+    
+    async def put_item(self, item: Any, priority: int) -> None:
+        """入队，优先级已满时等待空位"""
+        while self.level_full(priority):
+            space = self._level_space.setdefault(int(priority), asyncio.Event())
+            space.clear()
+            await space.wait()
+        self.put_item_nowait(item, priority)
+    
+    async def get_item(self) -> Tuple[Any, int, float]:
+        """取出下一项，返回 (项, 优先级, 排队时间秒)"""
+        _, _, priority, enqueued_at, item = await self.get()
+        return item, priority, time.monotonic() - enqueued_at
+
+
 class DataValidator:
     """数据验证器"""
     
@@ -20,7 +20,7 @@ import re
 from ..common import (
     EventBusEvent, EventBusEventType,
     publish_event, event_handler, EventHandlerRegistry,
-    AsyncCache, Timer, generate_id, log_execution_time
+    AsyncCache, Timer, generate_id, log_execution_time, AgingPriorityQueue
 )
 
 
@@ -88,16 +88,14 @@ class EventProcessingResult:
 class EventProcessor:
     """事件处理器"""
     
-    def __init__(self, max_workers: int = 10, queue_size: int = 1000):
+    def __init__(self, max_workers: int = 10, queue_size: int = 1000, aging_interval: float = 1.0):
         self.max_workers = max_workers
         self.queue_size = queue_size
+        self.aging_interval = aging_interval
         self.logger = logging.getLogger(f"{__name__}.EventProcessor")
         
-        # 事件队列（按优先级分组）
-        self.event_queues: Dict[EventPriority, asyncio.Queue] = {
-            priority: asyncio.Queue(maxsize=queue_size)
-            for priority in EventPriority
-        }
+        # 事件队列（单个带老化的优先级队列，每个优先级最多queue_size个事件）
+        self.event_queue = AgingPriorityQueue(aging_interval=aging_interval, level_capacity=queue_size)
         
         # 工作者任务
         self.worker_tasks: List[asyncio.Task] = []
@@ -112,9 +110,11 @@ class EventProcessor:
         self.failed_events = 0
         self.total_processing_time = 0.0
         self.processing_results: deque = deque(maxlen=1000)  # 保留最近1000个处理结果
+        self.dropped_events = 0
+        self.dispatch_latencies: deque = deque(maxlen=10000)  # 入队到被工作者取出的时间
         
         # 缓存
-        self.filter_cache = AsyncCache(default_ttl=300)
+        self.filter_cache = AsyncCache(ttl=300)
         
         self.logger.info("Event Processor initialized")
     
@@ -199,19 +199,17 @@ class EventProcessor:
     async def process_event(self, event: EventBusEvent, priority: EventPriority = EventPriority.NORMAL) -> None:
         """处理事件"""
         try:
-            # 将事件加入对应优先级的队列
-            queue = self.event_queues[priority]
-            
-            # 如果队列满了，丢弃低优先级事件
-            if queue.full():
+            # 如果该优先级已满，丢弃低优先级事件
+            if self.event_queue.level_full(priority):
                 if priority in [EventPriority.LOW, EventPriority.BACKGROUND]:
+                    self.dropped_events += 1
                     self.logger.warning(f"Dropping {priority.name} priority event due to full queue")
                     return
                 else:
                     # 对于高优先级事件，等待队列有空间
-                    await queue.put((event, priority))
+                    await self.event_queue.put_item(event, priority)
             else:
-                await queue.put((event, priority))
+                self.event_queue.put_item_nowait(event, priority)
                 
         except Exception as e:
             self.logger.error(f"Error queuing event {event.event_id}: {e}")
@@ -238,43 +236,10 @@ class EventProcessor:
         self.logger.debug(f"Worker {worker_name} stopped")
     
     async def _get_next_event(self) -> Optional[Tuple[EventBusEvent, EventPriority]]:
-        """获取下一个事件（按优先级）"""
-        # 按优先级顺序检查队列
-        for priority in EventPriority:
-            queue = self.event_queues[priority]
-            try:
-                # 非阻塞检查
-                return queue.get_nowait()
-            except asyncio.QueueEmpty:
-                continue
-        
-        # 如果所有队列都为空，等待任意队列有事件
-        tasks = [
-            asyncio.create_task(queue.get())
-            for queue in self.event_queues.values()
-        ]
-        
-        try:
-            done, pending = await asyncio.wait(
-                tasks,
-                return_when=asyncio.FIRST_COMPLETED,
-                timeout=1.0  # 1秒超时
-            )
-            
-            # 取消未完成的任务
-            for task in pending:
-                task.cancel()
-            
-            # 返回第一个完成的结果
-            if done:
-                return await done.pop()
-            
-        except asyncio.TimeoutError:
-            # 超时，取消所有任务
-            for task in tasks:
-                task.cancel()
-        
-        return None
+        """获取下一个事件（按优先级，等待过久的事件逐级提升）"""
+        event, priority, waited = await self.event_queue.get_item()
+        self.dispatch_latencies.append(waited)
+        return event, EventPriority(priority)
     
     async def _handle_event(self, event: EventBusEvent, priority: EventPriority) -> None:
         """处理单个事件"""
@@ -424,6 +389,17 @@ class EventProcessor:
         """添加自定义过滤器函数"""
         await self.filter_cache.set(filter_id, filter_func)
     
+    def _latency_percentiles(self) -> Dict[str, float]:
+        """分发延迟百分位（毫秒）"""
+        samples = sorted(self.dispatch_latencies)
+        if not samples:
+            return {"p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        return {
+            "p50_ms": samples[len(samples) // 2] * 1000,
+            "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+            "max_ms": samples[-1] * 1000
+        }
+    
     async def get_statistics(self) -> Dict[str, Any]:
         """获取处理器统计信息"""
         return {
@@ -434,10 +410,12 @@ class EventProcessor:
             "failed_events": self.failed_events,
             "success_rate": self.processed_events / (self.processed_events + self.failed_events) if (self.processed_events + self.failed_events) > 0 else 0.0,
             "average_processing_time": self.total_processing_time / self.processed_events if self.processed_events > 0 else 0.0,
+            "dropped_events": self.dropped_events,
             "queue_sizes": {
-                priority.name: queue.qsize()
-                for priority, queue in self.event_queues.items()
+                priority.name: self.event_queue.level_size(priority)
+                for priority in EventPriority
             },
+            "dispatch_latency": self._latency_percentiles(),
             "recent_results": [
                 asdict(result) for result in list(self.processing_results)[-10:]
             ]
@@ -691,7 +669,8 @@ class EventListenerSystem:
         # 事件处理器
         self.event_processor = EventProcessor(
             max_workers=self.config.get("max_workers", 10),
-            queue_size=self.config.get("queue_size", 1000)
+            queue_size=self.config.get("queue_size", 1000),
+            aging_interval=self.config.get("aging_interval", 1.0)
         )
         
         # SmartUI事件监听器
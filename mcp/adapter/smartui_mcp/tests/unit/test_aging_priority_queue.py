@@ -0,0 +1,70 @@
+"""
+SmartUI MCP - 老化优先级队列单元测试
+
+测试EventProcessor使用的AgingPriorityQueue：优先级顺序、老化防饿死、
+按优先级容量限制以及消费者直接等待。
+"""
+
+import pytest
+import asyncio
+
+from src.common.utils import AgingPriorityQueue
+
+
+class TestAgingPriorityQueue:
+    """老化优先级队列测试类"""
+
+    @pytest.mark.asyncio
+    async def test_priority_then_fifo_order(self):
+        """测试高优先级先出，同优先级先进先出"""
+        queue = AgingPriorityQueue(aging_interval=60)
+        for item, priority in [("low_1", 4), ("high_1", 2), ("low_2", 4), ("critical", 1), ("high_2", 2)]:
+            queue.put_item_nowait(item, priority)
+
+        order = [(await queue.get_item())[0] for _ in range(5)]
+        assert order == ["critical", "high_1", "high_2", "low_1", "low_2"]
+
+    @pytest.mark.asyncio
+    async def test_aging_prevents_starvation(self):
+        """测试等待超过老化间隔的低优先级事件先于新的高优先级事件"""
+        queue = AgingPriorityQueue(aging_interval=0.01)
+        queue.put_item_nowait("background", 5)
+        await asyncio.sleep(0.06)
+        queue.put_item_nowait("critical", 1)
+
+        item, priority, waited = await queue.get_item()
+        assert item == "background"
+        assert priority == 5
+        assert waited >= 0.05
+
+    @pytest.mark.asyncio
+    async def test_level_capacity(self):
+        """测试每个优先级独立计数，满时非阻塞入队报错、阻塞入队等待"""
+        queue = AgingPriorityQueue(level_capacity=1)
+        queue.put_item_nowait("a", 3)
+        queue.put_item_nowait("b", 4)
+        assert queue.level_full(3)
+        assert queue.level_size(4) == 1
+
+        with pytest.raises(asyncio.QueueFull):
+            queue.put_item_nowait("c", 3)
+
+        blocked = asyncio.create_task(queue.put_item("c", 3))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+
+        assert (await queue.get_item())[0] == "a"
+        await asyncio.wait_for(blocked, timeout=1)
+        assert queue.level_size(3) == 1
+
+    @pytest.mark.asyncio
+    async def test_waiting_consumer_woken_immediately(self):
+        """测试空闲消费者直接等待，入队后立即被唤醒"""
+        queue = AgingPriorityQueue()
+        consumer = asyncio.create_task(queue.get_item())
+        await asyncio.sleep(0.01)
+
+        queue.put_item_nowait("event", 3)
+        item, _, waited = await asyncio.wait_for(consumer, timeout=0.1)
+        assert item == "event"
+        assert waited < 0.05
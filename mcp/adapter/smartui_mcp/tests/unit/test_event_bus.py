@@ -0,0 +1,159 @@
+"""
+SmartUI MCP - 事件总线单元测试
+
+测试queued分发模式：每订阅者有界队列、溢出策略、批量投递及指标。
+"""
+
+import pytest
+import asyncio
+
+from src.common.interfaces import EventBusEvent, EventBusEventType
+from src.common.event_bus import SmartUIEventBus, DispatchMode, OverflowPolicy
+
+
+def make_event(source: str = "test", **data) -> EventBusEvent:
+    return EventBusEvent(
+        event_type=EventBusEventType.USER_INTERACTION,
+        data=data,
+        source=source
+    )
+
+
+class TestQueuedDispatch:
+    """queued分发模式测试类"""
+
+    @pytest.fixture
+    async def event_bus(self):
+        bus = SmartUIEventBus(cleanup_interval=0, dispatch_mode=DispatchMode.QUEUED, queue_size=4)
+        yield bus
+        await bus.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_publish_not_blocked_by_slow_subscriber(self, event_bus):
+        """测试慢订阅者不阻塞发布者和其他订阅者"""
+        release = asyncio.Event()
+        fast_received = []
+
+        async def slow_handler(event):
+            await release.wait()
+
+        await event_bus.subscribe(EventBusEventType.USER_INTERACTION, slow_handler, subscriber_name="slow")
+        await event_bus.subscribe(EventBusEventType.USER_INTERACTION, fast_received.append, subscriber_name="fast")
+
+        await asyncio.wait_for(event_bus.publish(make_event(value=1)), timeout=0.5)
+        await asyncio.sleep(0.01)
+        assert len(fast_received) == 1
+
+        release.set()
+        await event_bus.drain()
+
+    @pytest.mark.asyncio
+    async def test_drop_oldest_policy(self, event_bus):
+        """测试队列满时丢弃最早的事件"""
+        release = asyncio.Event()
+        received = []
+
+        async def handler(event):
+            await release.wait()
+            received.append(event.data["value"])
+
+        await event_bus.subscribe(EventBusEventType.USER_INTERACTION, handler)
+        await event_bus.publish(make_event(value=0))
+        await asyncio.sleep(0)  # 工作任务取走第一个事件
+        for value in range(1, 8):
+            await event_bus.publish(make_event(value=value))
+
+        release.set()
+        await event_bus.drain()
+        assert received == [0, 4, 5, 6, 7]
+
+        metrics = await event_bus.get_metrics()
+        stats = next(iter(metrics["subscribers"].values()))
+        assert stats["dropped"] == 3
+        assert stats["max_queue_depth"] == 4
+        assert stats["queue_depth"] == 0
+        assert stats["max_lag_ms"] > 0
+
+    @pytest.mark.asyncio
+    async def test_block_policy_applies_backpressure(self, event_bus):
+        """测试block策略在队列满时让发布者等待"""
+        release = asyncio.Event()
+        received = []
+
+        async def handler(event):
+            await release.wait()
+            received.append(event.data["value"])
+
+        await event_bus.subscribe(EventBusEventType.USER_INTERACTION, handler,
+                                  queue_size=2, overflow_policy=OverflowPolicy.BLOCK)
+        await event_bus.publish(make_event(value=0))
+        await asyncio.sleep(0)
+        await event_bus.publish(make_event(value=1))
+        await event_bus.publish(make_event(value=2))
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(asyncio.shield(event_bus.publish(make_event(value=3))), timeout=0.05)
+
+        release.set()
+        await asyncio.sleep(0.01)
+        await event_bus.drain()
+        assert received == [0, 1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_coalesce_by_key(self, event_bus):
+        """测试按键合并只保留最新事件"""
+        release = asyncio.Event()
+        received = []
+
+        async def handler(event):
+            await release.wait()
+            received.append((event.source, event.data["value"]))
+
+        await event_bus.subscribe(EventBusEventType.USER_INTERACTION, handler,
+                                  overflow_policy=OverflowPolicy.COALESCE)
+        await event_bus.publish(make_event("warmup", value=0))
+        await asyncio.sleep(0)
+        for value in range(5):
+            await event_bus.publish(make_event("cursor", value=value))
+            await event_bus.publish(make_event("scroll", value=value))
+
+        release.set()
+        await event_bus.drain()
+        assert received == [("warmup", 0), ("cursor", 4), ("scroll", 4)]
+        metrics = await event_bus.get_metrics()
+        assert next(iter(metrics["subscribers"].values()))["coalesced"] == 8
+
+    @pytest.mark.asyncio
+    async def test_batch_delivery_for_high_rate_types(self):
+        """测试高频事件类型按批投递"""
+        bus = SmartUIEventBus(
+            cleanup_interval=0,
+            dispatch_mode="queued",
+            batch_event_types={EventBusEventType.USER_INTERACTION: 10},
+            batch_window=0.05
+        )
+        batches = []
+        try:
+            await bus.subscribe(EventBusEventType.USER_INTERACTION, batches.append)
+            for value in range(25):
+                await bus.publish(make_event(value=value))
+            await asyncio.sleep(0.1)
+            await bus.drain()
+        finally:
+            await bus.shutdown()
+
+        assert [len(batch) for batch in batches] == [10, 10, 5]
+        assert [event.data["value"] for batch in batches for event in batch] == list(range(25))
+
+    @pytest.mark.asyncio
+    async def test_direct_mode_unchanged(self):
+        """测试默认direct模式仍在publish返回前完成处理"""
+        bus = SmartUIEventBus(cleanup_interval=0)
+        received = []
+        try:
+            await bus.subscribe(EventBusEventType.USER_INTERACTION, received.append)
+            await bus.publish(make_event(value=1))
+            assert len(received) == 1
+            assert (await bus.get_metrics())["subscribers"] == {}
+        finally:
+            await bus.shutdown()
@@ -0,0 +1 @@
+"""测试模块初始化文件"""
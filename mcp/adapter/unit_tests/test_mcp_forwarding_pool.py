@@ -0,0 +1,176 @@
+"""
+MCP请求转发连接池测试
+使用本地桩MCP服务器测试每目标并发上限、keep-alive会话复用、事件循环切换后的重建以及关闭
+"""
+
+import unittest
+import asyncio
+import threading
+from pathlib import Path
+import sys
+
+from aiohttp import web
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_forwarding_pool import AsyncMCPForwarder, ForwardingConfig
+
+
+async def finish_pending_tasks():
+    """等待循环中其他任务 (如调度过来的会话关闭) 完成"""
+    await asyncio.sleep(0)
+    current = asyncio.current_task()
+    await asyncio.gather(*[task for task in asyncio.all_tasks() if task is not current])
+
+
+class MCPStub:
+    """桩MCP服务器：记录同时在途的请求数和客户端连接"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.peers = set()
+
+    async def handle(self, request):
+        self.peers.add(request.transport.get_extra_info("peername"))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        payload = await request.json()
+        return web.json_response({"success": True, "echo": payload.get("action")})
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/mcp/request", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+
+class TestAsyncMCPForwarder(unittest.IsolatedAsyncioTestCase):
+    """转发连接池测试类"""
+
+    async def asyncSetUp(self):
+        self.stub = MCPStub()
+        self.base_url = await self.stub.start()
+
+    async def asyncTearDown(self):
+        await self.stub.runner.cleanup()
+
+    async def test_concurrency_limited_per_target(self):
+        """测试同一目标同时在途的请求不超过并发上限"""
+        forwarder = AsyncMCPForwarder(ForwardingConfig(max_concurrency_per_mcp=3))
+        results = await asyncio.gather(*[
+            forwarder.forward("stub_mcp", self.base_url, {"action": f"a{i}"}) for i in range(10)
+        ])
+        stats = forwarder.get_stats()["targets"]["stub_mcp"]
+        await forwarder.close()
+
+        self.assertEqual([r["echo"] for r in results], [f"a{i}" for i in range(10)])
+        self.assertEqual(self.stub.peak, 3)
+        self.assertEqual((stats["successful_requests"], stats["in_flight"], stats["pending"]), (10, 0, 0))
+
+    async def test_backpressure_rejects_when_pending_full(self):
+        """测试待处理请求超过上限时立即拒绝"""
+        forwarder = AsyncMCPForwarder(ForwardingConfig(max_concurrency_per_mcp=1, max_pending_per_mcp=2))
+        results = await asyncio.gather(*[
+            forwarder.forward("stub_mcp", self.base_url, {"action": "x"}) for _ in range(4)
+        ])
+        stats = forwarder.get_stats()["targets"]["stub_mcp"]
+        await forwarder.close()
+
+        self.assertEqual(sum(1 for r in results if r.get("backpressure")), 2)
+        self.assertEqual(stats["rejected_requests"], 2)
+        self.assertEqual(stats["successful_requests"], 2)
+
+    async def test_session_reused_and_closed(self):
+        """测试连续请求复用同一个会话和keep-alive连接，close后会话关闭"""
+        forwarder = AsyncMCPForwarder()
+        for _ in range(5):
+            await forwarder.forward("stub_mcp", self.base_url, {"action": "ping"})
+        pool = forwarder._pools["stub_mcp"]
+        session = pool.session
+        await forwarder.forward("stub_mcp", self.base_url, {"action": "ping"})
+        self.assertIs(pool.session, session)
+        self.assertEqual(len(self.stub.peers), 1)
+
+        await forwarder.close()
+        self.assertTrue(session.closed)
+        self.assertEqual(forwarder.get_stats()["targets"], {})
+
+
+class TestForwarderAcrossLoops(unittest.TestCase):
+    """同一个转发器先后在不同事件循环中使用 (如同步接口的多次 asyncio.run)"""
+
+    def setUp(self):
+        # 桩服务器运行在独立线程的事件循环中，两次 asyncio.run 访问同一地址
+        self.stub = MCPStub(delay=0.01)
+        self.server_loop = asyncio.new_event_loop()
+        self.server_thread = threading.Thread(target=self.server_loop.run_forever, daemon=True)
+        self.server_thread.start()
+        self.base_url = asyncio.run_coroutine_threadsafe(self.stub.start(), self.server_loop).result(5)
+
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.stub.runner.cleanup(), self.server_loop).result(5)
+        self.server_loop.call_soon_threadsafe(self.server_loop.stop)
+        self.server_thread.join(5)
+        self.server_loop.close()
+
+    def test_rebinds_after_loop_change(self):
+        """测试换循环后重建会话与信号量，旧会话被关闭，并发上限仍然生效"""
+        forwarder = AsyncMCPForwarder(ForwardingConfig(max_concurrency_per_mcp=2))
+
+        async def run_batch():
+            results = await asyncio.gather(*[
+                forwarder.forward("stub_mcp", self.base_url, {"action": "ping"}) for _ in range(6)
+            ])
+            pool = forwarder._pools["stub_mcp"]
+            return results, pool, pool.session, pool.semaphore
+
+        first_loop = asyncio.new_event_loop()
+        try:
+            first_results, first_pool, first_session, first_semaphore = first_loop.run_until_complete(run_batch())
+            second_loop = asyncio.new_event_loop()
+            try:
+                second_results, second_pool, second_session, second_semaphore = \
+                    second_loop.run_until_complete(run_batch())
+                second_loop.run_until_complete(forwarder.close())
+            finally:
+                second_loop.close()
+            # 旧会话的关闭已调度到旧循环，旧循环再次运行时完成
+            first_loop.run_until_complete(finish_pending_tasks())
+        finally:
+            first_loop.close()
+
+        self.assertTrue(all(r["success"] for r in first_results + second_results))
+        self.assertIs(second_pool, first_pool)
+        self.assertTrue(first_session.closed)
+        self.assertIsNot(second_session, first_session)
+        self.assertIsNot(second_semaphore, first_semaphore)
+        self.assertTrue(second_session.closed)
+        self.assertEqual(self.stub.peak, 2)
+
+    def test_session_on_closed_loop_detached(self):
+        """测试原循环已关闭时分离连接器并记录，不调用aiohttp内部方法"""
+        forwarder = AsyncMCPForwarder()
+        first_loop = asyncio.new_event_loop()
+        first_loop.run_until_complete(forwarder.forward("stub_mcp", self.base_url, {"action": "ping"}))
+        session = forwarder._pools["stub_mcp"]._session
+        connector = session.connector
+        first_loop.close()
+
+        with self.assertLogs("mcp_forwarding_pool", level="WARNING"):
+            asyncio.run(forwarder.close())
+        self.assertIsNone(session.connector)
+        self.assertFalse(connector.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+MCP后台健康探测器测试
+使用不访问网络的桩探测函数，测试抖动探测间隔、连续失败的退避、并发探测合并、
+限时fresh探测以及状态读取只使用健康表
+"""
+
+import unittest
+import asyncio
+import time
+from pathlib import Path
+import sys
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_health_prober import MCPHealthProber, HealthProberConfig
+
+
+class StubProbe:
+    """记录调用的桩探测函数，按MCP返回健康、失败或挂起"""
+
+    def __init__(self, failing=(), hanging=(), delay: float = 0.0):
+        self.failing = set(failing)
+        self.hanging = set(hanging)
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, mcp_id):
+        self.calls.append((mcp_id, time.monotonic()))
+        if mcp_id in self.hanging:
+            await asyncio.sleep(60)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if mcp_id in self.failing:
+            raise ConnectionError("connection refused")
+        return {"success": True, "status": "healthy", "data": {"mcp": mcp_id}}
+
+    def count(self, mcp_id):
+        return sum(1 for called, _ in self.calls if called == mcp_id)
+
+
+class TestMCPHealthProber(unittest.IsolatedAsyncioTestCase):
+    """健康探测器测试类"""
+
+    async def asyncSetUp(self):
+        self.targets = ["alpha_mcp", "beta_mcp"]
+        self.probers = []
+
+    async def asyncTearDown(self):
+        for prober in self.probers:
+            await prober.stop()
+
+    def make_prober(self, probe, **config):
+        prober = MCPHealthProber(probe, lambda: list(self.targets), HealthProberConfig(**config))
+        self.probers.append(prober)
+        return prober
+
+    async def test_probe_interval(self):
+        """测试后台循环按抖动间隔重复探测每个MCP"""
+        probe = StubProbe()
+        prober = self.make_prober(probe, interval=0.1, jitter=0.2)
+        await prober.start()
+        await asyncio.sleep(0.55)
+        await prober.stop()
+
+        for mcp_id in self.targets:
+            self.assertGreaterEqual(probe.count(mcp_id), 3)
+            self.assertLessEqual(probe.count(mcp_id), 7)
+            times = [at for called, at in probe.calls if called == mcp_id]
+            gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+            self.assertGreaterEqual(min(gaps), 0.08 - 0.02)
+        self.assertTrue(prober.get("alpha_mcp")["success"])
+
+        intervals = [prober._next_interval() for _ in range(200)]
+        self.assertGreaterEqual(min(intervals), 0.08)
+        self.assertLessEqual(max(intervals), 0.12)
+
+    async def test_backoff_on_failure(self):
+        """测试连续失败的MCP探测间隔翻倍并受上限约束，恢复后回到正常间隔"""
+        probe = StubProbe(failing=["beta_mcp"])
+        prober = self.make_prober(probe, interval=0.05, jitter=0.0, max_backoff=0.4)
+        await prober.start()
+        await asyncio.sleep(0.8)
+        await prober.stop()
+
+        self.assertGreater(probe.count("alpha_mcp"), probe.count("beta_mcp") * 2)
+        record = prober.health_table["beta_mcp"]
+        self.assertGreaterEqual(record.consecutive_failures, 2)
+        self.assertEqual(record.status, "unreachable")
+        self.assertEqual([prober._next_interval(failures) for failures in range(5)],
+                         [0.05, 0.1, 0.2, 0.4, 0.4])
+
+        probe.failing.clear()
+        await prober.probe_one("beta_mcp")
+        self.assertEqual(record.consecutive_failures, 0)
+        self.assertLessEqual(record.next_probe_at - time.monotonic(), 0.05)
+
+    async def test_status_reads_table_without_probing(self):
+        """测试读取状态只使用健康表，不发起探测"""
+        probe = StubProbe()
+        prober = self.make_prober(probe)
+        self.assertEqual(prober.get("alpha_mcp")["status"], "unknown")
+        self.assertEqual(set(prober.snapshot()), set(self.targets))
+        self.assertEqual(probe.calls, [])
+
+        await prober.probe_one("alpha_mcp")
+        cached = prober.get("alpha_mcp")
+        self.assertEqual(cached["total_probes"], 1)
+        self.assertEqual(cached["data"], {"mcp": "alpha_mcp"})
+        self.assertEqual(prober.snapshot()["alpha_mcp"], cached)
+        self.assertEqual(len(probe.calls), 1)
+
+    async def test_concurrent_probes_coalesced(self):
+        """测试同一MCP的并发探测合并为一次，结果写入健康表"""
+        probe = StubProbe(delay=0.05)
+        prober = self.make_prober(probe)
+        records = await asyncio.gather(*[prober.probe_one("alpha_mcp") for _ in range(5)])
+
+        self.assertEqual(probe.count("alpha_mcp"), 1)
+        self.assertTrue(all(record is records[0] for record in records))
+        self.assertEqual(prober.get("alpha_mcp")["latency"]["samples"], 1)
+
+    async def test_fresh_probe_bounded_time(self):
+        """测试fresh探测在时间上限内返回，未完成的MCP标记为pending"""
+        probe = StubProbe(hanging=["beta_mcp"])
+        prober = self.make_prober(probe, fresh_timeout=0.2, probe_timeout=10)
+        start = time.perf_counter()
+        results = await prober.probe_all()
+
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertTrue(results["alpha_mcp"]["success"])
+        self.assertTrue(results["beta_mcp"]["probe_pending"])
+        for task in list(prober._in_flight.values()):
+            task.cancel()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,12 +6,21 @@
 
 import os
 import ast
+import sys
 import json
 import logging
+from pathlib import Path
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 import asyncio
 
+# 导入共享的源码解析缓存
+try:
+    from mcp.adapter.parsed_source_cache import get_shared_source_cache, function_complexity
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parents[3] / "adapter"))
+    from parsed_source_cache import get_shared_source_cache, function_complexity
+
 logger = logging.getLogger(__name__)
 
 class ContinuousRefactoringMcp:
@@ -21,6 +30,7 @@ class ContinuousRefactoringMcp:
         self.config = config or {}
         self.name = "ContinuousRefactoringMCP"
         self.is_running = False
+        self.source_cache = get_shared_source_cache()
         
         # 重构规则
         self.refactoring_rules = {
@@ -75,23 +85,23 @@ class ContinuousRefactoringMcp:
         issues = []
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                tree = ast.parse(content)
+            parsed = self.source_cache.get(file_path)
+            if parsed.facts.syntax_error:
+                raise SyntaxError(parsed.facts.syntax_error)
             
-            # 检查函数复杂度
-            for node in ast.walk(tree):
-                if isinstance(node, ast.FunctionDef):
-                    complexity = self._calculate_complexity(node)
-                    if complexity > self.refactoring_rules["code_complexity"]["threshold"]:
-                        issues.append({
-                            "type": "high_complexity",
-                            "file": file_path,
-                            "function": node.name,
-                            "line": node.lineno,
-                            "complexity": complexity,
-                            "severity": self.refactoring_rules["code_complexity"]["severity"]
-                        })
+            # 检查函数复杂度 (复杂度在解析时已计算)
+            for function in parsed.facts.functions:
+                if function.is_async:
+                    continue
+                if function.complexity > self.refactoring_rules["code_complexity"]["threshold"]:
+                    issues.append({
+                        "type": "high_complexity",
+                        "file": file_path,
+                        "function": function.name,
+                        "line": function.lineno,
+                        "complexity": function.complexity,
+                        "severity": self.refactoring_rules["code_complexity"]["severity"]
+                    })
         
         except Exception as e:
             logger.warning(f"分析文件失败 {file_path}: {e}")
@@ -100,22 +110,15 @@ class ContinuousRefactoringMcp:
     
     def _calculate_complexity(self, node: ast.FunctionDef) -> int:
         """计算函数复杂度"""
-        complexity = 1  # 基础复杂度
-        
-        for child in ast.walk(node):
-            if isinstance(child, (ast.If, ast.While, ast.For, ast.Try)):
-                complexity += 1
-            elif isinstance(child, ast.BoolOp):
-                complexity += len(child.values) - 1
-        
-        return complexity
+        return function_complexity(node)
     
     async def get_status(self) -> Dict[str, Any]:
         """获取状态"""
         return {
             "status": "running" if self.is_running else "stopped",
             "name": self.name,
-            "rules_count": len(self.refactoring_rules)
+            "rules_count": len(self.refactoring_rules),
+            "source_cache": self.source_cache.get_stats()
         }
     
     async def health_check(self) -> Dict[str, Any]:
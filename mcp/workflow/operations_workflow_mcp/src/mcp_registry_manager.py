@@ -6,6 +6,7 @@ MCP注册管理器 - 负责管理和协调所有小型MCP适配器
 
 import os
 import json
+import re
 import importlib
 import sys
 from pathlib import Path
@@ -15,6 +16,13 @@ import logging
 from dataclasses import dataclass, asdict
 from enum import Enum
 
+# 导入共享的源码解析缓存
+try:
+    from mcp.adapter.parsed_source_cache import get_shared_source_cache
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parents[3] / "adapter"))
+    from parsed_source_cache import get_shared_source_cache
+
 logger = logging.getLogger(__name__)
 
 class MCPType(Enum):
@@ -57,6 +65,7 @@ class MCPRegistryManager:
         self.repo_root = Path(repo_root)
         self.registry: Dict[str, MCPRegistration] = {}
         self.active_instances: Dict[str, Any] = {}
+        self.source_cache = get_shared_source_cache()
         self.registry_file = self.repo_root / "mcp" / "workflow" / "operations_workflow_mcp" / "config" / "mcp_registry.json"
         
         # 确保配置目录存在
@@ -178,21 +187,30 @@ class MCPRegistryManager:
     def _analyze_python_file(self, py_file: Path) -> Dict:
         """分析Python文件"""
         try:
-            with open(py_file, 'r', encoding='utf-8') as f:
-                content = f.read()
+            parsed = self.source_cache.get(py_file)
+            content = parsed.source
+            facts = parsed.facts
             
-            # 简单的类名提取
-            import re
-            class_matches = re.findall(r'class\s+(\w+MCP)\s*[:\(]', content)
-            main_class = class_matches[0] if class_matches else None
+            if facts.syntax_error is None:
+                # 使用解析时收集的类、函数和文档字符串
+                class_names = [c.name for c in facts.classes if c.name.endswith("MCP") and c.name != "MCP"]
+                main_class = class_names[0] if class_names else None
+                method_names = [f.name for f in facts.functions]
+                description = facts.docstring.strip() if facts.docstring else ""
+            else:
+                # 无法解析时退回简单的正则提取
+                class_matches = re.findall(r'class\s+(\w+MCP)\s*[:\(]', content)
+                main_class = class_matches[0] if class_matches else None
+                method_names = re.findall(r'def\s+(\w+)', content)
+                description = ""
             
-            # 提取文档字符串作为描述
-            doc_match = re.search(r'"""(.*?)"""', content, re.DOTALL)
-            description = doc_match.group(1).strip() if doc_match else ""
+            if not description:
+                # 提取文档字符串作为描述
+                doc_match = re.search(r'"""(.*?)"""', content, re.DOTALL)
+                description = doc_match.group(1).strip() if doc_match else ""
             
             # 简单的能力提取（基于方法名）
-            method_matches = re.findall(r'def\s+(\w+)', content)
-            capabilities = [method for method in method_matches if not method.startswith('_')]
+            capabilities = [method for method in method_names if not method.startswith('_')]
             
             return {
                 "main_class": main_class,
@@ -11,11 +11,14 @@ import time
 import hashlib
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Iterator, Optional
 from dataclasses import dataclass, asdict
 from enum import Enum
 import logging
 
+from segmented_log_store import migrate_directory, open_log_store
+from similarity_index import InteractionSimilarityIndex
+
 class InteractionType(Enum):
     """交互類型枚舉"""
     TECHNICAL_ANALYSIS = "technical_analysis"
@@ -69,11 +72,24 @@ class Deliverable:
 class InteractionLogManager:
     """交互日誌管理器"""
     
-    def __init__(self, base_dir: str = "/home/ubuntu/Powerauto.ai/interaction_logs"):
+    def __init__(self, base_dir: str = "/home/ubuntu/Powerauto.ai/interaction_logs",
+                 use_log_store: bool = True):
+        """
+        Args:
+            base_dir: 根目錄
+            use_log_store: 交互日誌寫入分段追加存儲 (base_dir/log_store)；
+                           False 時沿用每條交互一個JSON文件的舊格式
+        """
         self.base_dir = Path(base_dir)
         self.setup_logging()
         self.setup_directory_structure()
         self.current_session_id = self.generate_session_id()
+        self.log_store = open_log_store(self.base_dir / "log_store") if use_log_store else None
+        # 日誌保存後的回調 (如RAG索引增量添加)，參數為可序列化的日誌字典
+        self.log_listeners: List[Callable[[Dict[str, Any]], None]] = []
+        
+        if self.log_store is not None:
+            self.migrate_legacy_logs()
         
     def setup_directory_structure(self):
         """設置目錄結構"""
@@ -311,19 +327,106 @@ class InteractionLogManager:
         """保存交互日誌"""
         log_id = hashlib.md5(f"{log_entry.session_id}{log_entry.timestamp}".encode()).hexdigest()[:12]
         
-        # 按類型分類保存
-        log_dir = self.base_dir / "logs" / log_entry.interaction_type.value
-        log_file = log_dir / f"{log_id}.json"
-        
         # 轉換為可序列化的字典
         log_dict = asdict(log_entry)
         log_dict['interaction_type'] = log_entry.interaction_type.value
         
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(log_dict, f, indent=2, ensure_ascii=False)
+        if self.log_store is not None:
+            log_dict['log_id'] = log_id
+            self.log_store.append(log_dict)
+        else:
+            # 按類型分類保存
+            log_dir = self.base_dir / "logs" / log_entry.interaction_type.value
+            log_file = log_dir / f"{log_id}.json"
+            
+            with open(log_file, 'w', encoding='utf-8') as f:
+                json.dump(log_dict, f, indent=2, ensure_ascii=False)
+        
+        for listener in self.log_listeners:
+            try:
+                listener({**log_dict, 'log_id': log_id})
+            except Exception as e:
+                self.logger.warning(f"日誌回調失敗: {e}")
         
         return log_id
     
+    def iter_interaction_logs(self, interaction_type: Optional[str] = None,
+                              session_id: Optional[str] = None,
+                              since: Optional[str] = None,
+                              until: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        流式讀取交互日誌
+        
+        Args:
+            interaction_type: 交互類型
+            session_id: 會話ID
+            since: 起始時間 (ISO格式，含)
+            until: 結束時間 (ISO格式，不含)
+        
+        Yields:
+            Dict[str, Any]: 交互日誌字典
+        """
+        if self.log_store is not None:
+            yield from self.log_store.iter_records(interaction_type, session_id, since, until)
+            return
+        
+        logs_dir = self.base_dir / "logs"
+        type_dirs = [logs_dir / interaction_type] if interaction_type else sorted(logs_dir.iterdir())
+        for type_dir in type_dirs:
+            if not type_dir.is_dir():
+                continue
+            for log_file in type_dir.glob("*.json"):
+                try:
+                    with open(log_file, 'r', encoding='utf-8') as f:
+                        log_data = json.load(f)
+                except (OSError, ValueError) as e:
+                    self.logger.warning(f"無法讀取日誌文件 {log_file}: {e}")
+                    continue
+                timestamp = log_data.get('timestamp', '')
+                if ((session_id is None or log_data.get('session_id') == session_id) and
+                        (since is None or timestamp >= since) and
+                        (until is None or timestamp < until)):
+                    yield log_data
+    
+    def count_interaction_logs(self) -> Dict[str, int]:
+        """各交互類型的日誌數量"""
+        if self.log_store is not None:
+            counts = self.log_store.count_by_type()
+            return {t.value: counts.get(t.value, 0) for t in InteractionType}
+        
+        counts = {}
+        for t in InteractionType:
+            log_dir = self.base_dir / "logs" / t.value
+            counts[t.value] = len(list(log_dir.glob("*.json"))) if log_dir.exists() else 0
+        return counts
+    
+    def migrate_legacy_logs(self) -> Optional[Dict[str, int]]:
+        """
+        首次打開分段存儲時將舊格式日誌導入 (保留原文件)，完成後寫入標記文件不再重複
+        
+        Returns:
+            Optional[Dict[str, int]]: 本次遷移統計，已遷移過時返回 None
+        """
+        marker = self.base_dir / "log_store" / "legacy_migrated.json"
+        if marker.exists():
+            return None
+        
+        stats = migrate_directory(self.base_dir / "logs", self.log_store)
+        with open(marker, 'w', encoding='utf-8') as f:
+            json.dump({**stats, 'migrated_at': datetime.now().isoformat()}, f, indent=2)
+        if stats['migrated'] or stats['failed']:
+            self.logger.info(f"✅ 舊格式交互日誌已導入分段存儲: {stats['migrated']} 條導入, "
+                             f"{stats['failed']} 條無法讀取")
+        return stats
+    
+    def has_legacy_logs(self) -> bool:
+        """是否存在未遷移的舊格式日誌文件"""
+        for t in InteractionType:
+            log_dir = self.base_dir / "logs" / t.value
+            if log_dir.exists() and next(log_dir.glob("*.json"), None) is not None:
+                return True
+        return False
+    
     def save_deliverables(self, deliverables: List[Dict]):
         """保存交付件"""
         for deliverable in deliverables:
@@ -485,25 +588,107 @@ class InteractionLogManager:
 class KiloCodeRAGIntegration:
     """KiloCode RAG整合系統"""
     
-    def __init__(self, log_manager: InteractionLogManager):
+    def __init__(self, log_manager: InteractionLogManager, index_on_log: bool = True):
+        """
+        Args:
+            log_manager: 交互日誌管理器
+            index_on_log: 新記錄的交互是否自動增量加入索引
+        """
         self.log_manager = log_manager
         self.rag_dir = log_manager.base_dir / "rag"
         self.setup_rag_system()
+        if index_on_log:
+            log_manager.log_listeners.append(self.index_log)
     
     def setup_rag_system(self):
         """設置RAG系統"""
         self.logger = logging.getLogger(__name__)
         self.logger.info("🔍 設置KiloCode RAG系統...")
+        self.index = InteractionSimilarityIndex(self.rag_dir / "index")
+        self._indexed_log_ids = None
+    
+    @staticmethod
+    def document_text(log_data: Dict[str, Any]) -> str:
+        """交互的可檢索文本：請求、響應和交付件"""
+        parts = [log_data.get('user_request', ''), log_data.get('agent_response', '')]
+        for deliverable in log_data.get('deliverables', []):
+            parts.append(deliverable.get('name', ''))
+            parts.append(deliverable.get('content', ''))
+        return '\n'.join(parts)
+    
+    @staticmethod
+    def document_metadata(log_data: Dict[str, Any]) -> Dict[str, Any]:
+        """索引中保存的元數據 (完整日誌仍從日誌存儲讀取)"""
+        return {
+            'log_id': log_data.get('log_id', ''),
+            'session_id': log_data.get('session_id', ''),
+            'interaction_type': log_data.get('interaction_type', ''),
+            'timestamp': log_data.get('timestamp', ''),
+            'user_request': log_data.get('user_request', '')[:200],
+            'deliverables': [
+                {'name': d.get('name', ''), 'type': d.get('type', ''),
+                 'template_potential': d.get('template_potential', 0)}
+                for d in log_data.get('deliverables', [])
+            ]
+        }
     
-    def index_interactions(self):
-        """索引所有交互日誌"""
-        # 實現RAG索引邏輯
-        pass
-    
-    def search_similar_interactions(self, query: str) -> List[Dict]:
-        """搜索相似交互"""
-        # 實現相似性搜索
-        pass
+    def _known_log_ids(self) -> set:
+        if self._indexed_log_ids is None:
+            self._indexed_log_ids = {metadata['log_id'] for metadata in self.index.iter_metadata()}
+        return self._indexed_log_ids
+    
+    def index_log(self, log_data: Dict[str, Any]):
+        """增量索引一條交互日誌"""
+        self.index.add(self.document_text(log_data), self.document_metadata(log_data))
+        if self._indexed_log_ids is not None:
+            self._indexed_log_ids.add(log_data.get('log_id', ''))
+    
+    def index_interactions(self, batch_size: int = 1000) -> int:
+        """索引所有尚未加入索引的交互日誌，返回新增數量"""
+        known = self._known_log_ids()
+        batch = []
+        added = 0
+        for log_data in self.log_manager.iter_interaction_logs():
+            log_id = log_data.get('log_id') or hashlib.md5(
+                f"{log_data.get('session_id', '')}{log_data.get('timestamp', '')}".encode()).hexdigest()[:12]
+            if log_id in known:
+                continue
+            log_data['log_id'] = log_id
+            known.add(log_id)
+            batch.append((self.document_text(log_data), self.document_metadata(log_data)))
+            if len(batch) >= batch_size:
+                added += len(self.index.add_many(batch))
+                batch = []
+        if batch:
+            added += len(self.index.add_many(batch))
+        self.index.flush()
+        
+        self.logger.info(f"✅ RAG索引已更新: 新增 {added} 條，共 {len(self.index)} 條")
+        return added
+    
+    def search_similar_interactions(self, query: str, top_k: int = 5,
+                                    interaction_type: Optional[str] = None) -> List[Dict]:
+        """
+        搜索相似交互
+        
+        Args:
+            query: 查詢文本
+            top_k: 返回數量
+            interaction_type: 只返回指定類型的交互
+        
+        Returns:
+            List[Dict]: 按相似度降序的交互元數據，包含 score
+        """
+        # 按類型過濾時多取候選
+        candidates = self.index.search(query, top_k if interaction_type is None else top_k * 10)
+        results = []
+        for hit in candidates:
+            if interaction_type is not None and hit.metadata.get('interaction_type') != interaction_type:
+                continue
+            results.append({**hit.metadata, 'score': hit.score})
+            if len(results) >= top_k:
+                break
+        return results
 
 class ReadinessChecker:
     """系統準備狀態檢查器"""
@@ -568,15 +753,7 @@ class ReadinessChecker:
     def check_log_coverage(self) -> Dict[str, Any]:
         """檢查日誌覆蓋度"""
         log_types = [t.value for t in InteractionType]
-        coverage = {}
-        
-        for log_type in log_types:
-            log_dir = self.log_manager.base_dir / "logs" / log_type
-            if log_dir.exists():
-                log_count = len(list(log_dir.glob("*.json")))
-                coverage[log_type] = log_count
-            else:
-                coverage[log_type] = 0
+        coverage = self.log_manager.count_interaction_logs()
         
         total_logs = sum(coverage.values())
         covered_types = len([t for t, count in coverage.items() if count > 0])
@@ -626,7 +803,7 @@ class ReadinessChecker:
         return {
             'status': 'pass' if rag_dir.exists() else 'warning',
             'embeddings_ready': (rag_dir / "embeddings").exists(),
-            'index_ready': (rag_dir / "index").exists()
+            'index_ready': (rag_dir / "index" / "manifest.json").exists()
         }
     
     def calculate_overall_status(self, components: Dict[str, Any]) -> str:
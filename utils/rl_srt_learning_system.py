@@ -14,7 +14,7 @@ import threading
 import numpy as np
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Iterator, Optional, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
 import logging
@@ -103,26 +103,20 @@ class RLSRTLearningEngine:
         training_experiences = []
         
         # 遍歷所有交互日誌
-        logs_dir = self.log_manager.base_dir / "logs"
-        
-        for interaction_type_dir in logs_dir.iterdir():
-            if interaction_type_dir.is_dir():
-                for log_file in interaction_type_dir.glob("*.json"):
-                    try:
-                        with open(log_file, 'r', encoding='utf-8') as f:
-                            log_data = json.load(f)
-                        
-                        # 轉換為學習經驗
-                        experience = self.convert_log_to_experience(log_data)
-                        if experience:
-                            training_experiences.append(experience)
-                            
-                    except Exception as e:
-                        self.logger.warning(f"無法處理日誌文件 {log_file}: {e}")
+        training_experiences.extend(self.iter_training_experiences())
         
         self.logger.info(f"✅ 從日誌中提取了 {len(training_experiences)} 個學習經驗")
         return training_experiences
     
+    def iter_training_experiences(self, interaction_type: Optional[str] = None,
+                                  since: Optional[str] = None) -> Iterator[LearningExperience]:
+        """流式讀取交互日誌並逐條轉換為學習經驗，不在內存中保留全部日誌"""
+        for log_data in self.log_manager.iter_interaction_logs(interaction_type=interaction_type, since=since):
+            # 轉換為學習經驗
+            experience = self.convert_log_to_experience(log_data)
+            if experience:
+                yield experience
+    
     def convert_log_to_experience(self, log_data: Dict) -> Optional[LearningExperience]:
         """將日誌數據轉換為學習經驗"""
         try:
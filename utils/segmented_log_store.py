@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+PowerAutomation 分段追加日誌存儲
+
+交互日誌以換行分隔的緊湊JSON記錄追加寫入按大小輪轉的段文件，每個段旁有一個小型索引文件
+(每條記錄一行：偏移、長度、日誌ID、會話、類型、時間)，用於按會話、類型和時間範圍定位記錄，
+取代每條交互一個JSON文件的目錄樹。
+
+目錄結構:
+    segments/segment_000001.jsonl   記錄 (每行一條)
+    segments/segment_000001.idx     側邊索引 (每行一個JSON數組)
+
+同一進程內按目錄共用一個存儲實例 (open_log_store)；多個實例或進程寫入同一目錄時，
+以活動段文件上的排他鎖串行化追加，偏移取自加鎖後的文件末尾。
+讀取可與寫入並行 (只讀取索引中已提交的記錄)。
+"""
+
+import os
+import json
+import argparse
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 無 fcntl，只依賴進程內的共用實例
+    fcntl = None
+
+@dataclass
+class LogIndexEntry:
+    """側邊索引條目"""
+    segment: int
+    offset: int
+    length: int
+    log_id: str
+    session_id: str
+    interaction_type: str
+    timestamp: str
+
+    def to_row(self) -> list:
+        return [self.offset, self.length, self.log_id, self.session_id,
+                self.interaction_type, self.timestamp]
+
+    @classmethod
+    def from_row(cls, segment: int, row: list) -> 'LogIndexEntry':
+        return cls(segment, *row)
+
+class SegmentedLogStore:
+    """按大小輪轉的分段追加日誌存儲"""
+
+    SEGMENT_PREFIX = "segment_"
+
+    def __init__(self, root: str, segment_max_bytes: int = 64 * 1024 * 1024, fsync: bool = False):
+        """
+        Args:
+            root: 存儲目錄
+            segment_max_bytes: 段文件超過此大小後輪轉到新段
+            fsync: 每次追加後是否強制落盤
+        """
+        self.root = Path(root)
+        self.segments_dir = self.root / "segments"
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self.entries: List[LogIndexEntry] = []
+        self.by_log_id: Dict[str, int] = {}
+        self.by_session: Dict[str, List[int]] = {}
+        self.by_type: Dict[str, List[int]] = {}
+        # 段號 -> (最早時間, 最晚時間)，按時間查詢時跳過不相交的段
+        self.segment_ranges: Dict[int, List[str]] = {}
+
+        self._active_segment = 0
+        self._active_size = 0
+        self._data_file = None
+        self._index_file = None
+        self._load()
+
+    # ------------------------------------------------------------------ 路徑
+
+    def _data_path(self, segment: int) -> Path:
+        return self.segments_dir / f"{self.SEGMENT_PREFIX}{segment:06d}.jsonl"
+
+    def _index_path(self, segment: int) -> Path:
+        return self.segments_dir / f"{self.SEGMENT_PREFIX}{segment:06d}.idx"
+
+    def segments(self) -> List[int]:
+        """已有的段號 (升序)"""
+        return sorted(int(path.stem[len(self.SEGMENT_PREFIX):])
+                      for path in self.segments_dir.glob(f"{self.SEGMENT_PREFIX}*.jsonl"))
+
+    # ------------------------------------------------------------------ 加載與恢復
+
+    def _load(self):
+        """加載所有段的側邊索引；最後一個段做崩潰恢復"""
+        segments = self.segments()
+        for segment in segments:
+            committed = self._load_index(segment)
+            if segment == segments[-1]:
+                self._recover_tail(segment, committed)
+
+        self._active_segment = segments[-1] if segments else 1
+        self._active_size = (self._data_path(self._active_segment).stat().st_size
+                             if segments else 0)
+
+    def _load_index(self, segment: int) -> int:
+        """加載段索引，返回索引覆蓋到的數據文件位置"""
+        committed = 0
+        index_path = self._index_path(segment)
+        if not index_path.exists():
+            return committed
+        valid_bytes = 0
+        with open(index_path, 'rb') as f:
+            for line in f:
+                try:
+                    row = json.loads(line) if line.endswith(b'\n') else None
+                except ValueError:
+                    row = None
+                if row is None:
+                    # 寫入中斷的最後一行，截斷後由 _recover_tail 從數據文件補回
+                    with open(index_path, 'r+b') as index_file:
+                        index_file.truncate(valid_bytes)
+                    break
+                entry = LogIndexEntry.from_row(segment, row)
+                self._add_entry(entry)
+                committed = entry.offset + entry.length
+                valid_bytes += len(line)
+        return committed
+
+    def _recover_tail(self, segment: int, committed: int):
+        """補全崩潰時已寫入數據但未寫入索引的記錄，截斷不完整的最後一行"""
+        data_path = self._data_path(segment)
+        index_path = self._index_path(segment)
+
+        if data_path.stat().st_size == committed:
+            return
+
+        with open(data_path, 'r+b') as data_file, open(index_path, 'a', encoding='utf-8') as index_file:
+            data_file.seek(committed)
+            offset = committed
+            for line in data_file:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                entry = self._entry_for(record, segment, offset, len(line))
+                self._add_entry(entry)
+                index_file.write(json.dumps(entry.to_row(), ensure_ascii=False) + '\n')
+                offset += len(line)
+            data_file.truncate(offset)
+
+    def _add_entry(self, entry: LogIndexEntry):
+        position = len(self.entries)
+        self.entries.append(entry)
+        self.by_log_id[entry.log_id] = position
+        self.by_session.setdefault(entry.session_id, []).append(position)
+        self.by_type.setdefault(entry.interaction_type, []).append(position)
+
+        time_range = self.segment_ranges.get(entry.segment)
+        if time_range is None:
+            self.segment_ranges[entry.segment] = [entry.timestamp, entry.timestamp]
+        else:
+            time_range[0] = min(time_range[0], entry.timestamp)
+            time_range[1] = max(time_range[1], entry.timestamp)
+
+    @staticmethod
+    def _entry_for(record: Dict[str, Any], segment: int, offset: int, length: int) -> LogIndexEntry:
+        return LogIndexEntry(
+            segment=segment,
+            offset=offset,
+            length=length,
+            log_id=record.get('log_id', ''),
+            session_id=record.get('session_id', ''),
+            interaction_type=record.get('interaction_type', ''),
+            timestamp=record.get('timestamp', '')
+        )
+
+    # ------------------------------------------------------------------ 寫入
+
+    def append(self, record: Dict[str, Any]) -> LogIndexEntry:
+        """
+        追加一條記錄
+
+        Args:
+            record: 可序列化的日誌字典，應包含 log_id、session_id、interaction_type、timestamp
+
+        Returns:
+            LogIndexEntry: 記錄的索引條目
+        """
+        data = (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+        with self._lock:
+            while True:
+                if self._data_file is None:
+                    self._open_active()
+                self._lock_active()
+                try:
+                    # 其他實例或進程可能已追加，偏移以加鎖後的文件末尾為準
+                    offset = self._data_file.seek(0, os.SEEK_END)
+                    if not offset or offset + len(data) <= self.segment_max_bytes:
+                        return self._write_locked(record, data, offset)
+                finally:
+                    self._unlock_active()
+                self._rotate()
+
+    def _write_locked(self, record: Dict[str, Any], data: bytes, offset: int) -> LogIndexEntry:
+        entry = self._entry_for(record, self._active_segment, offset, len(data))
+        self._data_file.write(data)
+        self._data_file.flush()
+        # 先寫數據再寫索引：崩潰時最多丟失索引行，重新打開時從數據恢復
+        self._index_file.write(json.dumps(entry.to_row(), ensure_ascii=False) + '\n')
+        self._index_file.flush()
+        if self.fsync:
+            os.fsync(self._data_file.fileno())
+            os.fsync(self._index_file.fileno())
+
+        self._active_size = offset + len(data)
+        self._add_entry(entry)
+        return entry
+
+    def _lock_active(self):
+        if fcntl is not None:
+            fcntl.flock(self._data_file.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_active(self):
+        if fcntl is not None:
+            fcntl.flock(self._data_file.fileno(), fcntl.LOCK_UN)
+
+    def append_many(self, records: Iterable[Dict[str, Any]]) -> int:
+        """批量追加記錄，返回追加數量"""
+        count = 0
+        for record in records:
+            self.append(record)
+            count += 1
+        return count
+
+    def _open_active(self):
+        self._data_file = open(self._data_path(self._active_segment), 'ab')
+        self._index_file = open(self._index_path(self._active_segment), 'a', encoding='utf-8')
+
+    def _rotate(self):
+        self._close_files()
+        self._active_segment += 1
+        self._active_size = 0
+
+    def _close_files(self):
+        for handle in (self._data_file, self._index_file):
+            if handle is not None:
+                handle.close()
+        self._data_file = self._index_file = None
+
+    def close(self):
+        """關閉當前段文件"""
+        with self._lock:
+            self._close_files()
+
+    # ------------------------------------------------------------------ 讀取
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, log_id: str) -> Optional[Dict[str, Any]]:
+        """按日誌ID讀取單條記錄"""
+        position = self.by_log_id.get(log_id)
+        if position is None:
+            return None
+        entry = self.entries[position]
+        with open(self._data_path(entry.segment), 'rb') as f:
+            f.seek(entry.offset)
+            return json.loads(f.read(entry.length))
+
+    def query(self, interaction_type: Optional[str] = None, session_id: Optional[str] = None,
+              since: Optional[str] = None, until: Optional[str] = None) -> List[LogIndexEntry]:
+        """
+        按索引篩選記錄 (不讀取數據文件)
+
+        Args:
+            interaction_type: 交互類型
+            session_id: 會話ID
+            since: 起始時間 (ISO格式，含)
+            until: 結束時間 (ISO格式，不含)
+
+        Returns:
+            List[LogIndexEntry]: 按寫入順序排列的索引條目
+        """
+        with self._lock:
+            count = len(self.entries)
+            if session_id is not None:
+                positions = list(self.by_session.get(session_id, []))
+            elif interaction_type is not None:
+                positions = list(self.by_type.get(interaction_type, []))
+            else:
+                positions = None
+
+            skipped_segments = {
+                segment for segment, (earliest, latest) in self.segment_ranges.items()
+                if (since is not None and latest < since) or (until is not None and earliest >= until)
+            }
+
+        candidates = (self.entries[position] for position in positions) if positions is not None \
+            else (self.entries[position] for position in range(count))
+        return [
+            entry for entry in candidates
+            if entry.segment not in skipped_segments
+            and (interaction_type is None or entry.interaction_type == interaction_type)
+            and (session_id is None or entry.session_id == session_id)
+            and (since is None or entry.timestamp >= since)
+            and (until is None or entry.timestamp < until)
+        ]
+
+    def iter_records(self, interaction_type: Optional[str] = None, session_id: Optional[str] = None,
+                     since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        流式讀取記錄，每次只解析一條；無篩選條件時按段順序讀取整個文件
+
+        Args:
+            interaction_type / session_id / since / until: 同 query
+
+        Yields:
+            Dict[str, Any]: 日誌記錄
+        """
+        if interaction_type is None and session_id is None and since is None and until is None:
+            yield from self._iter_all()
+            return
+
+        current_segment, handle = None, None
+        try:
+            for entry in self.query(interaction_type, session_id, since, until):
+                if entry.segment != current_segment:
+                    if handle is not None:
+                        handle.close()
+                    handle = open(self._data_path(entry.segment), 'rb')
+                    current_segment = entry.segment
+                handle.seek(entry.offset)
+                yield json.loads(handle.read(entry.length))
+        finally:
+            if handle is not None:
+                handle.close()
+
+    def _iter_all(self) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            # 只讀取已提交 (已寫入索引) 的部分，避免讀到正在寫入的行
+            committed: Dict[int, int] = {}
+            for entry in self.entries:
+                committed[entry.segment] = entry.offset + entry.length
+
+        for segment in sorted(committed):
+            remaining = committed[segment]
+            with open(self._data_path(segment), 'rb') as f:
+                for line in f:
+                    if remaining <= 0:
+                        break
+                    remaining -= len(line)
+                    yield json.loads(line)
+
+    def count_by_type(self) -> Dict[str, int]:
+        """各交互類型的記錄數"""
+        with self._lock:
+            return {interaction_type: len(positions) for interaction_type, positions in self.by_type.items()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """存儲統計"""
+        segments = self.segments()
+        return {
+            'records': len(self.entries),
+            'segments': len(segments),
+            'active_segment': self._active_segment,
+            'total_bytes': sum(self._data_path(segment).stat().st_size for segment in segments),
+            'sessions': len(self.by_session),
+            'types': self.count_by_type()
+        }
+
+_shared_stores: Dict[Path, SegmentedLogStore] = {}
+_shared_stores_lock = threading.Lock()
+
+def open_log_store(root: str, **kwargs) -> SegmentedLogStore:
+    """
+    獲取目錄對應的共用存儲實例
+
+    同一進程內多個 InteractionLogManager 指向同一目錄時共用內存索引，
+    彼此追加的記錄立即可查。
+
+    Args:
+        root: 存儲目錄
+        **kwargs: 首次創建時傳給 SegmentedLogStore 的參數
+
+    Returns:
+        SegmentedLogStore: 該目錄的存儲實例
+    """
+    key = Path(root).resolve()
+    with _shared_stores_lock:
+        store = _shared_stores.get(key)
+        if store is None:
+            store = _shared_stores[key] = SegmentedLogStore(key, **kwargs)
+        return store
+
+def migrate_directory(logs_dir: str, store: SegmentedLogStore, remove_source: bool = False) -> Dict[str, int]:
+    """
+    將按類型分目錄、每條交互一個JSON文件的舊日誌遷移到分段存儲
+
+    已存在於存儲中的日誌ID會被跳過，因此中斷後可以重複執行。
+
+    Args:
+        logs_dir: 舊日誌目錄 (logs/<interaction_type>/<log_id>.json)
+        store: 目標存儲
+        remove_source: 遷移成功後是否刪除原文件
+
+    Returns:
+        Dict[str, int]: migrated、skipped、failed 數量
+    """
+    stats = {'migrated': 0, 'skipped': 0, 'failed': 0}
+    logs_path = Path(logs_dir)
+    if not logs_path.exists():
+        return stats
+
+    for type_dir in sorted(path for path in logs_path.iterdir() if path.is_dir()):
+        # 按時間順序追加，使段的時間範圍盡量緊湊
+        pending = []
+        with os.scandir(type_dir) as it:
+            for item in it:
+                if not item.name.endswith('.json'):
+                    continue
+                log_id = item.name[:-len('.json')]
+                if log_id in store.by_log_id:
+                    stats['skipped'] += 1
+                    continue
+                try:
+                    with open(item.path, 'r', encoding='utf-8') as f:
+                        record = json.load(f)
+                except (OSError, ValueError):
+                    stats['failed'] += 1
+                    continue
+                record['log_id'] = log_id
+                record.setdefault('interaction_type', type_dir.name)
+                pending.append((record.get('timestamp', ''), item.path, record))
+
+        pending.sort(key=lambda item: item[0])
+        for _, path, record in pending:
+            store.append(record)
+            stats['migrated'] += 1
+            if remove_source:
+                os.remove(path)
+
+    return stats
+
+def main():
+    """命令行入口：遷移舊日誌目錄或查看存儲統計"""
+    parser = argparse.ArgumentParser(description="PowerAutomation 分段日誌存儲工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="將 logs/<類型>/*.json 遷移到分段存儲")
+    migrate_parser.add_argument("base_dir", help="InteractionLogManager 的 base_dir")
+    migrate_parser.add_argument("--remove-source", action="store_true", help="遷移後刪除原JSON文件")
+    migrate_parser.add_argument("--segment-mb", type=int, default=64, help="段文件大小上限 (MB)")
+
+    stats_parser = subparsers.add_parser("stats", help="查看存儲統計")
+    stats_parser.add_argument("base_dir", help="InteractionLogManager 的 base_dir")
+
+    args = parser.parse_args()
+    base_dir = Path(args.base_dir)
+
+    if args.command == "migrate":
+        store = SegmentedLogStore(base_dir / "log_store", segment_max_bytes=args.segment_mb * 1024 * 1024)
+        stats = migrate_directory(base_dir / "logs", store, remove_source=args.remove_source)
+        store.close()
+        print(f"✅ 遷移完成: {stats['migrated']} 條遷移, {stats['skipped']} 條已存在, {stats['failed']} 條失敗")
+    else:
+        store = SegmentedLogStore(base_dir / "log_store")
+        print(json.dumps(store.get_stats(), indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
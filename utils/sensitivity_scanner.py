@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+PowerAutomation 預編譯敏感內容掃描器
+
+將多個分類的正則模式預先編譯成組合正則，一次掃描返回所有分類命中和匹配區間，
+供隱私分類、複雜度分析和數據脫敏共用，避免大型代碼內容被重複掃描。
+"""
+
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 正則元字符開頭的模式無法以首字符快速定位
+_META_CHARS = set('\\[(.^$*+?{|')
+
+@dataclass
+class ScanMatch:
+    """單個匹配"""
+    category: str
+    start: int
+    end: int
+    text: str
+
+@dataclass
+class ScanResult:
+    """掃描結果：按出現位置排序的匹配 (不同分類的匹配可能重疊) 和各分類命中數"""
+    matches: List[ScanMatch] = field(default_factory=list)
+    counts: Counter = field(default_factory=Counter)
+    line_count: int = 0
+
+    def has(self, *categories: str) -> bool:
+        """是否命中任一分類"""
+        return any(self.counts[category] for category in categories)
+
+    def categories(self) -> List[str]:
+        """命中的分類"""
+        return [category for category, count in self.counts.items() if count]
+
+    def spans(self, categories: Optional[Iterable[str]] = None) -> List[ScanMatch]:
+        """指定分類的不重疊匹配區間 (重疊時保留先出現的匹配)"""
+        wanted = set(categories) if categories is not None else None
+        spans = []
+        last_end = -1
+        for match in self.matches:
+            if wanted is not None and match.category not in wanted:
+                continue
+            if match.start >= last_end:
+                spans.append(match)
+                last_end = match.end
+        return spans
+
+def _lower_pattern(pattern: str) -> str:
+    """將模式中的字面字符轉為小寫，轉義序列保持不變 (如 \\S、\\W)"""
+    chars = []
+    escaped = False
+    for char in pattern:
+        chars.append(char if escaped else char.lower())
+        escaped = char == '\\' and not escaped
+    return ''.join(chars)
+
+class CompiledScanner:
+    """預編譯的多分類掃描器
+
+    - 內容先小寫化一次，模式中的字面字符同樣轉為小寫，避免 re.IGNORECASE 的逐字符比較開銷
+    - 字面字符開頭的模式按首字符分組組合為一個正則 (如 a(?:pi...|ccess...)|s(?:...))，
+      CPython 的 re 可按首字符集合跳過不可能匹配的位置，每個位置只需嘗試一組分支
+    - 以字符類或斷言開頭的模式 (如郵箱、電話、IP) 組合為另一個正則，兩者混合會令首字符優化失效，
+      因此分兩次線性掃描；純ASCII內容使用 re.ASCII 版本 (結果相同，\\b、\\d 更快)
+    - 每個起始位置對每個分類取其第一個能匹配的模式，下一次查找從該位置之後開始，
+      因此較長的匹配不會遮蔽其內部或同一位置起始的其他分類匹配 (如 "def sk-xxx" 中的密鑰、
+      以IP地址開頭的郵箱)
+    - 區分大小寫的分類 (如函數定義 def\s+\w+) 不做小寫化，單獨組合後在原始內容上掃描
+    """
+
+    def __init__(self, categories: Dict[str, List[str]], case_sensitive: Iterable[str] = ()):
+        """
+        Args:
+            categories: {分類: [正則模式]}，按優先級排序，匹配時忽略大小寫
+            case_sensitive: 需要區分大小寫匹配的分類
+        """
+        self.categories = {category: list(patterns) for category, patterns in categories.items()}
+        self.case_sensitive = set(case_sensitive)
+
+        literal, structured, exact = [], [], []
+        for category, patterns in self.categories.items():
+            for pattern in patterns:
+                if category in self.case_sensitive:
+                    exact.append((category, pattern))
+                elif self._is_literal_led(pattern):
+                    literal.append((category, _lower_pattern(pattern)))
+                else:
+                    structured.append((category, _lower_pattern(pattern)))
+
+        # 首字符 -> [(分類, 單獨編譯的模式)]，用於判斷組合正則的匹配來自哪個模式
+        grouped: Dict[str, List[str]] = {}
+        self._literal_index: Dict[str, List[Tuple[str, re.Pattern]]] = {}
+        for category, pattern in literal:
+            grouped.setdefault(pattern[0], []).append(pattern[1:])
+            self._literal_index.setdefault(pattern[0], []).append((category, re.compile(pattern)))
+        self._literal_combined = re.compile('|'.join(
+            re.escape(first) + '(?:' + '|'.join(f'(?:{rest})' for rest in rests) + ')'
+            for first, rests in grouped.items()
+        )) if grouped else None
+
+        self._structured = [(category, re.compile(pattern)) for category, pattern in structured]
+        self._structured_combined = self._combine(structured, 0)
+        self._structured_combined_ascii = self._combine(structured, re.ASCII)
+
+        self._exact = [(category, re.compile(pattern)) for category, pattern in exact]
+        self._exact_combined = self._combine(exact, 0)
+
+        # 小寫化改變長度時 (少數Unicode字符) 在原始內容上以忽略大小寫方式分兩次掃描
+        self._passes = (literal, structured)
+        self._fallback = None
+
+    @staticmethod
+    def _is_literal_led(pattern: str) -> bool:
+        # 首字符必須是固定字面字符：不能是元字符、不能被量詞修飾、也不能有頂層分支
+        return (bool(pattern) and pattern[0] not in _META_CHARS
+                and pattern[1:2] not in ('*', '?', '{') and '|' not in pattern)
+
+    @staticmethod
+    def _combine(patterns: List[Tuple[str, str]], flags: int) -> Optional[re.Pattern]:
+        if not patterns:
+            return None
+        return re.compile('|'.join(f'(?:{pattern})' for _, pattern in patterns), flags)
+
+    @staticmethod
+    def _attribute(candidates: List[Tuple[str, re.Pattern]], text: str, start: int) -> List[Tuple[str, int]]:
+        # 每個分類取第一個能在該位置匹配的模式 (與該分類各模式組成的分支正則一致)，返回 [(分類, 結束位置)]
+        found: Dict[str, int] = {}
+        for category, pattern in candidates:
+            if category not in found:
+                match = pattern.match(text, start)
+                if match:
+                    found[category] = match.end()
+        return list(found.items())
+
+    def scan(self, content: str) -> ScanResult:
+        """
+        掃描內容
+
+        Args:
+            content: 待掃描內容
+
+        Returns:
+            ScanResult: 所有分類命中和匹配區間 (相對原始內容)
+        """
+        result = ScanResult(line_count=content.count('\n') + 1)
+        matches = result.matches
+        lowered = content.lower()
+
+        if len(lowered) != len(content):
+            if self._fallback is None:
+                self._fallback = [
+                    (self._combine(patterns, re.IGNORECASE),
+                     [(category, re.compile(pattern, re.IGNORECASE)) for category, pattern in patterns])
+                    for patterns in self._passes if patterns
+                ]
+            for combined, candidates in self._fallback:
+                self._collect(combined, content, content, matches, lambda start, candidates=candidates: candidates)
+        else:
+            if self._literal_combined is not None:
+                self._collect(self._literal_combined, lowered, content, matches,
+                              lambda start: self._literal_index.get(lowered[start], []))
+            if self._structured_combined is not None:
+                combined = self._structured_combined_ascii if content.isascii() else self._structured_combined
+                self._collect(combined, lowered, content, matches, lambda start: self._structured)
+
+        if self._exact_combined is not None:
+            self._collect(self._exact_combined, content, content, matches, lambda start: self._exact)
+
+        matches.sort(key=lambda match: (match.start, -match.end))
+        result.counts.update(match.category for match in matches)
+        return result
+
+    def _collect(self, combined: re.Pattern, text: str, content: str,
+                 matches: List[ScanMatch], candidates) -> None:
+        """逐個起始位置查找組合正則的匹配；同一分類內的匹配不重疊 (與 re.findall 計數一致)"""
+        last_end: Dict[str, int] = {}
+        search = combined.search
+        match = search(text)
+        while match:
+            start = match.start()
+            for category, end in self._attribute(candidates(start), text, start):
+                if start >= last_end.get(category, 0):
+                    matches.append(ScanMatch(category, start, end, content[start:end]))
+                    last_end[category] = end
+            match = search(text, start + 1)
+
+    def anonymize(self, content: str, result: Optional[ScanResult] = None,
+                  categories: Optional[Iterable[str]] = None) -> Tuple[str, Dict[str, str]]:
+        """
+        按掃描得到的匹配區間脫敏，相同原文使用相同佔位符
+
+        Args:
+            content: 原始內容
+            result: 已有的掃描結果，為空時重新掃描
+            categories: 需要脫敏的分類，默認全部
+
+        Returns:
+            Tuple[str, Dict[str, str]]: (脫敏後內容, {佔位符: 原文})
+        """
+        result = result or self.scan(content)
+        placeholders: Dict[Tuple[str, str], str] = {}
+        mapping: Dict[str, str] = {}
+        parts = []
+        position = 0
+
+        for match in result.spans(categories):
+            key = (match.category, match.text)
+            placeholder = placeholders.get(key)
+            if placeholder is None:
+                placeholder = f"[{match.category.upper()}_{len(placeholders) + 1}]"
+                placeholders[key] = placeholder
+                mapping[placeholder] = match.text
+            parts.append(content[position:match.start])
+            parts.append(placeholder)
+            position = match.end
+
+        parts.append(content[position:])
+        return ''.join(parts), mapping
+
+    @staticmethod
+    def restore(content: str, mapping: Dict[str, str]) -> str:
+        """將佔位符恢復為原文"""
+        for placeholder, original in mapping.items():
+            content = content.replace(placeholder, original)
+        return content
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+PowerAutomation 交互相似度索引
+
+本地離線的相似交互檢索：請求、響應和交付件文本經哈希n-gram特徵 (詞、相鄰詞對和中文字對)
+投影到固定維度的帶符號向量，L2歸一化後存入記憶體映射的NumPy矩陣，以內積 (餘弦相似度) 排序。
+數據量較大時用球面k-means把向量分到若干倒排列表 (IVF)，查詢只掃描與查詢最接近的nprobe個列表；
+訓練默認在後台線程執行，不阻塞寫入 (訓練完成前使用精確檢索或舊的倒排列表)。
+
+目錄結構:
+    manifest.json     維度、容量、倒排列表訓練狀態
+    vectors.npy       float32 向量矩陣 [容量, 維度] (記憶體映射)
+    assignments.npy   int32 每行所屬的倒排列表 (記憶體映射)
+    centroids.npy     float32 倒排列表中心 [列表數, 維度]
+    meta.jsonl        每行一條元數據；完整的行數即有效向量數
+"""
+
+import os
+import re
+import json
+import math
+import zlib
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9_]+|[\u4e00-\u9fff]')
+
+@dataclass
+class SimilarityHit:
+    """檢索結果"""
+    row: int
+    score: float
+    metadata: Dict[str, Any]
+
+class HashedNgramVectorizer:
+    """哈希n-gram向量化：無需詞表，新增文檔不影響已有向量"""
+
+    def __init__(self, dim: int = 256, max_chars: int = 20000):
+        """
+        Args:
+            dim: 向量維度 (2的冪)
+            max_chars: 每個文檔參與向量化的最大字符數
+        """
+        if dim & (dim - 1):
+            raise ValueError(f"dim 必須是2的冪: {dim}")
+        self.dim = dim
+        self.max_chars = max_chars
+
+    def features(self, text: str) -> Counter:
+        """詞 (中文按字) 和相鄰詞對"""
+        tokens = _TOKEN_PATTERN.findall(text[:self.max_chars].lower())
+        features = Counter(tokens)
+        features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        return features
+
+    def transform(self, text: str) -> np.ndarray:
+        """文本 -> L2歸一化的float32向量 (無特徵時為零向量)"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        mask = self.dim - 1
+        for feature, count in self.features(text).items():
+            # crc32 跨進程穩定 (內建 hash 會隨機化)；最高位決定符號以減少碰撞偏差
+            h = zlib.crc32(feature.encode('utf-8'))
+            weight = 1.0 + math.log(count)
+            vector[h & mask] += -weight if h & 0x80000000 else weight
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+
+class InteractionSimilarityIndex:
+    """記憶體映射的相似度索引，支持增量添加和IVF近似檢索"""
+
+    def __init__(self, index_dir: str, dim: int = 256, min_train_size: int = 20000,
+                 nprobe: int = 32, background_training: bool = True):
+        """
+        Args:
+            index_dir: 索引目錄
+            dim: 向量維度 (已有索引以manifest為準)
+            min_train_size: 向量數達到此值後訓練倒排列表，之前使用精確檢索
+            nprobe: 查詢時掃描的倒排列表數
+            background_training: 達到訓練規模時在後台線程訓練；False 時在觸發訓練的寫入中同步訓練
+        """
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.min_train_size = min_train_size
+        self.nprobe = nprobe
+        self.background_training = background_training
+        self._lock = threading.RLock()
+        # 串行化訓練；k-means 在 _lock 之外計算，期間寫入和查詢不受影響
+        self._train_lock = threading.Lock()
+        self._training_thread: Optional[threading.Thread] = None
+
+        self.manifest = {'dim': dim, 'capacity': 0, 'trained_count': 0, 'nlist': 0}
+        manifest_path = self.index_dir / "manifest.json"
+        if manifest_path.exists():
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest.update(json.load(f))
+        self.vectorizer = HashedNgramVectorizer(self.manifest['dim'])
+
+        self.vectors: Optional[np.memmap] = None
+        self.assignments: Optional[np.memmap] = None
+        self.centroids: Optional[np.ndarray] = None
+        self._open_matrices()
+
+        # 元數據按行偏移隨機讀取，不常駐內存
+        self._meta_offsets: List[int] = []
+        self._meta_size = 0
+        self._load_meta()
+        self._meta_file = open(self.index_dir / "meta.jsonl", 'ab')
+
+        # 倒排列表：按列表排序的行號和每個列表的起始位置；之後新增的行先放在 _extra_rows
+        self._list_rows = np.empty(0, dtype=np.int32)
+        self._list_offsets = np.zeros(1, dtype=np.int64)
+        self._extra_rows: List[int] = []
+        if self.centroids is not None:
+            self._build_lists()
+
+    # ------------------------------------------------------------------ 持久化
+
+    @property
+    def dim(self) -> int:
+        return self.manifest['dim']
+
+    def __len__(self) -> int:
+        return len(self._meta_offsets)
+
+    def _open_matrices(self):
+        vectors_path = self.index_dir / "vectors.npy"
+        if vectors_path.exists():
+            self.vectors = np.load(vectors_path, mmap_mode='r+')
+            self.assignments = np.load(self.index_dir / "assignments.npy", mmap_mode='r+')
+        centroids_path = self.index_dir / "centroids.npy"
+        if centroids_path.exists() and self.manifest['nlist']:
+            self.centroids = np.load(centroids_path)
+
+    def _load_meta(self):
+        meta_path = self.index_dir / "meta.jsonl"
+        if not meta_path.exists():
+            return
+        capacity = self.manifest['capacity']
+        offset = 0
+        with open(meta_path, 'rb') as f:
+            for line in f:
+                # 只有完整的行且向量已分配才有效 (向量先於元數據寫入)
+                if not line.endswith(b'\n') or len(self._meta_offsets) >= capacity:
+                    break
+                self._meta_offsets.append(offset)
+                offset += len(line)
+        self._meta_size = offset
+        if meta_path.stat().st_size != offset:
+            with open(meta_path, 'r+b') as f:
+                f.truncate(offset)
+
+    def _save_manifest(self):
+        temp_path = self.index_dir / "manifest.json.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(temp_path, self.index_dir / "manifest.json")
+
+    def _ensure_capacity(self, needed: int):
+        capacity = self.manifest['capacity']
+        if needed <= capacity:
+            return
+        new_capacity = max(1024, capacity * 2, needed)
+        count = len(self)
+        for name, dtype, width in (("vectors", np.float32, self.dim), ("assignments", np.int32, None)):
+            shape = (new_capacity, width) if width else (new_capacity,)
+            temp_path = self.index_dir / f"{name}.tmp.npy"
+            grown = np.lib.format.open_memmap(temp_path, mode='w+', dtype=dtype, shape=shape)
+            old = getattr(self, name)
+            if old is not None and count:
+                grown[:count] = old[:count]
+            if name == "assignments":
+                grown[count:] = -1
+            grown.flush()
+            del grown
+            setattr(self, name, None)
+            del old
+            os.replace(temp_path, self.index_dir / f"{name}.npy")
+        self.manifest['capacity'] = new_capacity
+        self._save_manifest()
+        self._open_matrices()
+
+    def flush(self):
+        """將記憶體映射和元數據寫回磁盤"""
+        with self._lock:
+            if self.vectors is not None:
+                self.vectors.flush()
+                self.assignments.flush()
+            self._meta_file.flush()
+
+    def close(self):
+        self.wait_for_training()
+        self.flush()
+        self._meta_file.close()
+
+    # ------------------------------------------------------------------ 寫入
+
+    def add(self, text: str, metadata: Dict[str, Any]) -> int:
+        """添加一個文檔，返回行號"""
+        return self.add_many([(text, metadata)])[0]
+
+    def add_many(self, documents: Iterable[Tuple[str, Dict[str, Any]]]) -> List[int]:
+        """批量添加文檔，返回行號"""
+        documents = list(documents)
+        if not documents:
+            return []
+        vectors = np.stack([self.vectorizer.transform(text) for text, _ in documents])
+        return self.add_vectors(vectors, [metadata for _, metadata in documents])
+
+    def add_vectors(self, vectors: np.ndarray, metadatas: List[Dict[str, Any]]) -> List[int]:
+        """添加已向量化的文檔 (需已L2歸一化)"""
+        with self._lock:
+            start = len(self)
+            end = start + len(vectors)
+            self._ensure_capacity(end)
+
+            self.vectors[start:end] = vectors
+            if self.centroids is not None:
+                self.assignments[start:end] = self._assign(vectors)
+                self._extra_rows.extend(range(start, end))
+
+            lines = [(json.dumps(metadata, ensure_ascii=False) + '\n').encode('utf-8') for metadata in metadatas]
+            for line in lines:
+                self._meta_offsets.append(self._meta_size)
+                self._meta_size += len(line)
+            self._meta_file.write(b''.join(lines))
+            self._meta_file.flush()
+
+            if self._needs_training():
+                self._schedule_training()
+            elif len(self._extra_rows) > max(50000, len(self) // 10):
+                self._build_lists()
+            return list(range(start, end))
+
+    # ------------------------------------------------------------------ 倒排列表
+
+    def _needs_training(self) -> bool:
+        if self._training_thread is not None and self._training_thread.is_alive():
+            return False
+        count = len(self)
+        trained = self.manifest['trained_count']
+        # 首次達到訓練規模，或數據量增長到上次訓練的4倍後按新規模重新訓練
+        return count >= self.min_train_size and (trained == 0 or count >= trained * 4)
+
+    def _schedule_training(self):
+        if not self.background_training:
+            self.train()
+            return
+        self._training_thread = threading.Thread(target=self._train_in_background,
+                                                 name="similarity-index-train", daemon=True)
+        self._training_thread.start()
+
+    def _train_in_background(self):
+        try:
+            self.train()
+        except Exception as e:
+            logger.error(f"❌ 倒排列表訓練失敗: {e}")
+
+    def wait_for_training(self, timeout: Optional[float] = None) -> bool:
+        """等待後台訓練結束，返回是否已無進行中的訓練"""
+        thread = self._training_thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def train(self, iterations: int = 10, seed: int = 0):
+        """用球面k-means訓練倒排列表中心 (約 2√n 個) 並重新分配所有行"""
+        with self._train_lock:
+            with self._lock:
+                count = len(self)
+                if count == 0:
+                    return
+                # 前 count 行不會再改變；擴容時舊映射在引用釋放前保持有效
+                vectors = self.vectors
+            nlist = max(1, min(2048, int(2 * math.sqrt(count))))
+            rng = np.random.default_rng(seed)
+            sample_size = min(count, max(nlist * 32, 65536))
+            sample = np.asarray(vectors[np.sort(rng.choice(count, size=sample_size, replace=False))])
+
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = self._assign(sample, centroids)
+                order = np.argsort(labels, kind='stable')
+                present, starts = np.unique(labels[order], return_index=True)
+                sums = np.add.reduceat(sample[order], starts, axis=0)
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                # 空列表保留原中心
+                filled = norms[:, 0] > 0
+                centroids[present[filled]] = sums[filled] / norms[filled]
+            labels = self._assign(vectors[:count], centroids)
+
+            with self._lock:
+                self.centroids = centroids
+                np.save(self.index_dir / "centroids.npy", centroids)
+                self.assignments[:count] = labels
+                # 訓練期間新增的行
+                total = len(self)
+                if total > count:
+                    self.assignments[count:total] = self._assign(self.vectors[count:total])
+                self.assignments.flush()
+
+                self.manifest['nlist'] = nlist
+                self.manifest['trained_count'] = count
+                self._save_manifest()
+                self._build_lists()
+
+    def _assign(self, vectors: np.ndarray, centroids: Optional[np.ndarray] = None) -> np.ndarray:
+        """最接近的中心，分塊計算以限制臨時矩陣大小"""
+        centroids = self.centroids if centroids is None else centroids
+        labels = np.empty(len(vectors), dtype=np.int32)
+        step = max(1, (1 << 24) // len(centroids))
+        for chunk_start in range(0, len(vectors), step):
+            chunk = np.asarray(vectors[chunk_start:chunk_start + step], dtype=np.float32)
+            labels[chunk_start:chunk_start + step] = np.argmax(chunk @ centroids.T, axis=1)
+        return labels
+
+    def _build_lists(self):
+        count = len(self)
+        assignments = np.asarray(self.assignments[:count])
+        self._list_rows = np.argsort(assignments, kind='stable').astype(np.int32)
+        counts = np.bincount(assignments, minlength=len(self.centroids))
+        self._list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._extra_rows = []
+
+    # ------------------------------------------------------------------ 查詢
+
+    def search(self, query: str, top_k: int = 5, nprobe: Optional[int] = None,
+               exact: bool = False) -> List[SimilarityHit]:
+        """
+        檢索最相似的文檔
+
+        Args:
+            query: 查詢文本
+            top_k: 返回數量
+            nprobe: 掃描的倒排列表數，默認使用初始化參數
+            exact: 強制精確檢索 (掃描全部向量)
+
+        Returns:
+            List[SimilarityHit]: 按相似度降序排列
+        """
+        rows, scores = self.search_vector(self.vectorizer.transform(query), top_k, nprobe, exact)
+        return [SimilarityHit(int(row), float(score), self.get_metadata(int(row)))
+                for row, score in zip(rows, scores)]
+
+    def search_vector(self, vector: np.ndarray, top_k: int = 5, nprobe: Optional[int] = None,
+                      exact: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """按向量檢索，返回 (行號, 相似度)"""
+        with self._lock:
+            count = len(self)
+            if count == 0 or not np.any(vector):
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+            if exact or self.centroids is None:
+                return self._exact_search(vector, top_k, count)
+
+            probe = min(nprobe or self.nprobe, len(self.centroids))
+            lists = np.argpartition(-(self.centroids @ vector), probe - 1)[:probe]
+            candidates = [self._list_rows[self._list_offsets[i]:self._list_offsets[i + 1]] for i in lists]
+            if self._extra_rows:
+                extra = np.asarray(self._extra_rows, dtype=np.int32)
+                candidates.append(extra[np.isin(self.assignments[extra], lists)])
+            rows = np.sort(np.concatenate(candidates))
+            if len(rows) == 0:
+                return self._exact_search(vector, top_k, count)
+            scores = self.vectors[rows] @ vector
+            return self._top(rows, scores, top_k)
+
+    def _exact_search(self, vector: np.ndarray, top_k: int, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        best_rows, best_scores = [], []
+        for chunk_start in range(0, count, 65536):
+            chunk_end = min(count, chunk_start + 65536)
+            scores = self.vectors[chunk_start:chunk_end] @ vector
+            rows, scores = self._top(np.arange(chunk_start, chunk_end), scores, top_k)
+            best_rows.append(rows)
+            best_scores.append(scores)
+        return self._top(np.concatenate(best_rows), np.concatenate(best_scores), top_k)
+
+    @staticmethod
+    def _top(rows: np.ndarray, scores: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if len(scores) > top_k:
+            selected = np.argpartition(-scores, top_k - 1)[:top_k]
+            rows, scores = rows[selected], scores[selected]
+        order = np.argsort(-scores, kind='stable')
+        return rows[order], scores[order]
+
+    def iter_metadata(self) -> Iterator[Dict[str, Any]]:
+        """按行號順序讀取全部元數據，只打開一次meta.jsonl"""
+        with self._lock:
+            count = len(self)
+            self._meta_file.flush()
+        with open(self.index_dir / "meta.jsonl", 'rb') as f:
+            for _ in range(count):
+                yield json.loads(f.readline())
+
+    def get_metadata(self, row: int) -> Dict[str, Any]:
+        """讀取某行的元數據"""
+        with self._lock:
+            start = self._meta_offsets[row]
+            end = self._meta_offsets[row + 1] if row + 1 < len(self._meta_offsets) else self._meta_size
+            self._meta_file.flush()
+        with open(self.index_dir / "meta.jsonl", 'rb') as f:
+            f.seek(start)
+            return json.loads(f.read(end - start))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """索引統計"""
+        return {
+            'documents': len(self),
+            'dim': self.dim,
+            'capacity': self.manifest['capacity'],
+            'nlist': self.manifest['nlist'],
+            'trained_count': self.manifest['trained_count'],
+            'pending_rows': len(self._extra_rows),
+            'training': not self.wait_for_training(0),
+            'nprobe': self.nprobe
+        }
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+PowerAutomation 交互相似度索引基準測試
+
+生成按主題分佈的合成交互文本，測量向量化/寫入吞吐、精確檢索與IVF近似檢索的延遲，
+並以精確檢索的前k個結果為基準計算近似檢索在不同nprobe下的召回率。
+"""
+
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+
+from similarity_index import InteractionSimilarityIndex
+
+ACTIONS = ["write", "debug", "refactor", "test", "document", "optimize", "review", "design", "deploy", "analyze"]
+
+
+def make_corpus(size: int, topics: int, seed: int) -> List[str]:
+    """每個主題有一個基礎請求，文檔替換其中約三成的詞並附加少量公共詞，模擬模板化的交互"""
+    rng = random.Random(seed)
+    common = [f"w{i}" for i in range(5000)]
+    bases = [[f"t{t}_{i}" for i in range(20)] for t in range(topics)]
+    corpus = []
+    for _ in range(size):
+        words = list(bases[rng.randrange(topics)])
+        for position in rng.sample(range(len(words)), k=6):
+            words[position] = rng.choice(common)
+        words.extend(rng.choices(common, k=5))
+        corpus.append(f"{rng.choice(ACTIONS)} {' '.join(words)}")
+    return corpus
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="交互相似度索引基準測試")
+    parser.add_argument("--size", type=int, default=200000, help="文檔數")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--topics", type=int, default=2000)
+    args = parser.parse_args()
+
+    index_dir = tempfile.mkdtemp(prefix="similarity_index_bench_")
+    try:
+        print(f"🚀 交互相似度索引基準測試 ({args.size:,} 條文檔, top-{args.top_k})")
+        corpus = make_corpus(args.size, args.topics, seed=1)
+        index = InteractionSimilarityIndex(index_dir, min_train_size=min(20000, args.size))
+
+        start = time.perf_counter()
+        for batch_start in range(0, args.size, 5000):
+            batch = corpus[batch_start:batch_start + 5000]
+            index.add_many((text, {"row": batch_start + i}) for i, text in enumerate(batch))
+        index.wait_for_training()
+        build_seconds = time.perf_counter() - start
+        index.flush()
+        print(f"   寫入: {build_seconds:.1f}s ({args.size / build_seconds:,.0f} 條/秒，含IVF訓練), "
+              f"{index.get_stats()['nlist']} 個倒排列表")
+
+        # 重新打開，驗證記憶體映射持久化
+        index.close()
+        start = time.perf_counter()
+        index = InteractionSimilarityIndex(index_dir)
+        print(f"   重新打開: {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        # 查詢：在已有文檔基礎上替換部分詞，模擬相似的新請求
+        rng = random.Random(2)
+        queries = []
+        for _ in range(args.queries):
+            words = corpus[rng.randrange(args.size)].split()
+            for position in rng.sample(range(len(words)), k=len(words) // 3):
+                words[position] = f"w{rng.randrange(5000)}"
+            queries.append(index.vectorizer.transform(" ".join(words)))
+
+        exact_latency, truth = [], []
+        for vector in queries:
+            start = time.perf_counter()
+            rows, _ = index.search_vector(vector, args.top_k, exact=True)
+            exact_latency.append(time.perf_counter() - start)
+            truth.append(set(rows.tolist()))
+        print(f"   {'模式':<14}{'召回率':>8}  {'p50':>9}  {'p95':>9}")
+        print(f"   {'精確':<14}{1.0:>8.3f}  {percentile(exact_latency, 50):>7.2f}ms  "
+              f"{percentile(exact_latency, 95):>7.2f}ms")
+
+        for nprobe in (1, 4, 8, 16, 32, 64):
+            latency, hits = [], 0
+            for vector, expected in zip(queries, truth):
+                start = time.perf_counter()
+                rows, _ = index.search_vector(vector, args.top_k, nprobe=nprobe)
+                latency.append(time.perf_counter() - start)
+                hits += len(expected & set(rows.tolist()))
+            recall = hits / sum(len(expected) for expected in truth)
+            print(f"   {'IVF nprobe=' + str(nprobe):<14}{recall:>8.3f}  {percentile(latency, 50):>7.2f}ms  "
+                  f"{percentile(latency, 95):>7.2f}ms")
+
+        vectorize = []
+        for text in corpus[:args.queries]:
+            start = time.perf_counter()
+            index.vectorizer.transform(text)
+            vectorize.append(time.perf_counter() - start)
+        print(f"   查詢向量化 p50: {percentile(vectorize, 50):.2f}ms")
+        index.close()
+        print("✅ 基準測試完成")
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,11 +11,13 @@ import json
 import time
 import hashlib
 import re
+import random
 import asyncio
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from dataclasses import dataclass, asdict, replace
 from enum import Enum
 import logging
 from cryptography.fernet import Fernet
@@ -23,6 +25,7 @@ import uuid
 
 # 導入基礎組件
 from interaction_log_manager import InteractionLogManager, InteractionType
+from sensitivity_scanner import CompiledScanner, ScanResult
 
 class ProcessingLocation(Enum):
     """處理位置枚舉"""
@@ -56,6 +59,8 @@ class RoutingDecision:
     estimated_tokens: int
     reasoning: str
     fallback_options: List[ProcessingLocation]
+    # 隱私和質量都允許的另一條路徑，探索時改走該路徑以更新其成本模型
+    exploration_option: Optional[ProcessingLocation] = None
 
 @dataclass
 class CostMetrics:
@@ -96,33 +101,37 @@ class PrivacyClassifier:
                 r'internal\s+only', r'classified'
             ]
         }
+        self.business_keywords = ['business', 'company', 'client', 'customer', 'revenue', 'profit']
+        self.high_sensitive_categories = ['api_keys', 'passwords', 'personal_data', 'infrastructure']
+        self.medium_sensitive_categories = ['business_secrets', 'business_keywords']
+        self.scanner = CompiledScanner(self.scan_categories())
+    
+    def scan_categories(self) -> Dict[str, List[str]]:
+        """掃描分類 (按優先級排序)"""
+        return {
+            **self.sensitive_patterns,
+            'business_keywords': [re.escape(keyword) for keyword in self.business_keywords]
+        }
         
-    def classify_sensitivity(self, content: str) -> PrivacySensitivity:
-        """分類內容隱私敏感度"""
-        content_lower = content.lower()
+    def classify_sensitivity(self, content: str, scan: Optional[ScanResult] = None) -> PrivacySensitivity:
+        """分類內容隱私敏感度，可傳入已有的掃描結果避免重複掃描"""
+        scan = scan or self.scanner.scan(content)
         
         # 檢測高敏感內容
-        high_sensitive_categories = ['api_keys', 'passwords', 'personal_data', 'infrastructure']
-        for category in high_sensitive_categories:
-            patterns = self.sensitive_patterns[category]
-            for pattern in patterns:
-                if re.search(pattern, content, re.IGNORECASE):
-                    return PrivacySensitivity.HIGH_SENSITIVE
-        
-        # 檢測中等敏感內容
-        medium_sensitive_categories = ['business_secrets']
-        for category in medium_sensitive_categories:
-            patterns = self.sensitive_patterns[category]
-            for pattern in patterns:
-                if re.search(pattern, content, re.IGNORECASE):
-                    return PrivacySensitivity.MEDIUM_SENSITIVE
-        
-        # 檢測業務邏輯關鍵詞
-        business_keywords = ['business', 'company', 'client', 'customer', 'revenue', 'profit']
-        if any(keyword in content_lower for keyword in business_keywords):
+        if scan.has(*self.high_sensitive_categories):
+            return PrivacySensitivity.HIGH_SENSITIVE
+        
+        # 檢測中等敏感內容和業務邏輯關鍵詞
+        if scan.has(*self.medium_sensitive_categories):
             return PrivacySensitivity.MEDIUM_SENSITIVE
             
         return PrivacySensitivity.LOW_SENSITIVE
+    
+    def anonymize(self, content: str, scan: Optional[ScanResult] = None) -> Tuple[str, Dict[str, str]]:
+        """按掃描得到的敏感區間脫敏，返回 (脫敏內容, {佔位符: 原文})"""
+        return self.scanner.anonymize(
+            content, scan, self.high_sensitive_categories + ['business_secrets']
+        )
 
 class TaskComplexityAnalyzer:
     """任務複雜度分析器"""
@@ -150,21 +159,35 @@ class TaskComplexityAnalyzer:
                 'max_functions': float('inf')
             }
         }
+        self.scanner = CompiledScanner(self.scan_categories(), self.case_sensitive_categories())
     
-    def analyze_complexity(self, content: str, task_type: str) -> TaskComplexity:
-        """分析任務複雜度"""
-        content_lower = content.lower()
-        lines_count = len(content.split('\n'))
-        functions_count = len(re.findall(r'def\s+\w+', content))
+    def scan_categories(self) -> Dict[str, List[str]]:
+        """掃描分類：各複雜度關鍵詞和函數定義"""
+        categories = {
+            f'complexity_{complexity}': [re.escape(keyword) for keyword in indicators['keywords']]
+            for complexity, indicators in self.complexity_indicators.items()
+        }
+        categories['function_defs'] = [r'def\s+\w+']
+        return categories
+    
+    def case_sensitive_categories(self) -> List[str]:
+        """區分大小寫的掃描分類：函數定義只匹配小寫的 def 關鍵字"""
+        return ['function_defs']
+    
+    def analyze_complexity(self, content: str, task_type: str,
+                           scan: Optional[ScanResult] = None) -> TaskComplexity:
+        """分析任務複雜度，可傳入已有的掃描結果避免重複掃描"""
+        scan = scan or self.scanner.scan(content)
+        lines_count = scan.line_count
+        functions_count = scan.counts['function_defs']
         
         # 基於關鍵詞判斷
         for complexity, indicators in self.complexity_indicators.items():
-            keywords = indicators['keywords']
-            if any(keyword in content_lower for keyword in keywords):
+            if scan.has(f'complexity_{complexity}'):
                 # 進一步檢查代碼規模
                 if (lines_count <= indicators['max_lines'] and 
                     functions_count <= indicators['max_functions']):
-                    return TaskComplexity(complexity.upper())
+                    return TaskComplexity(complexity)
         
         # 基於代碼規模判斷
         if lines_count <= 50 and functions_count <= 3:
@@ -214,11 +237,25 @@ class LocalCapabilityAssessor:
             InteractionType.SYSTEM_DESIGN: 'architecture_design',
             InteractionType.DOCUMENTATION: 'comment_generation'
         }
+        
+        # 能力評分版本，每次更新遞增，用於使路由決策緩存失效
+        self.version = 0
     
     def assess_capability(self, task_type: str) -> float:
         """評估本地處理能力 - 兼容方法"""
         # 簡化版本，直接返回基礎能力評分
         return self.local_model_capabilities.get(task_type, 0.5)
+    
+    def update_capability(self, task_type: str, success_rate: float) -> float:
+        """根據觀察到的成功率更新能力評分"""
+        current = self.local_model_capabilities.get(task_type, 0.5)
+        # 簡單的學習更新
+        updated = (current * 0.8) + (success_rate * 0.2)
+        self.local_model_capabilities[task_type] = min(0.95, max(0.1, updated))
+        self.version += 1
+        return self.local_model_capabilities[task_type]
+    
+    def assess_local_capability(self, task_type: InteractionType, complexity: TaskComplexity) -> float:
         """評估本地處理能力"""
         base_capability = self.local_model_capabilities.get(
             self.task_capability_mapping.get(task_type, 'function_generation'), 0.5
@@ -262,6 +299,12 @@ class CostCalculator:
             'chars_per_token': 4,  # 平均字符數
             'response_multiplier': 1.5  # 響應通常比輸入長50%
         }
+        
+        # 雲端延遲估算 (尚無觀測數據時使用)
+        self.latency_estimation = {
+            'cloud_overhead_seconds': 1.0,
+            'cloud_tokens_per_second': 60
+        }
     
     def estimate_tokens(self, content: str) -> Tuple[int, int]:
         """估算輸入和輸出token數"""
@@ -269,6 +312,16 @@ class CostCalculator:
         output_tokens = int(input_tokens * self.token_estimation['response_multiplier'])
         return input_tokens, output_tokens
     
+    def split_tokens(self, total_tokens: int) -> Tuple[int, int]:
+        """按響應倍數將總token數拆分為輸入和輸出"""
+        input_tokens = int(total_tokens / (1 + self.token_estimation['response_multiplier']))
+        return input_tokens, total_tokens - input_tokens
+    
+    def estimate_cloud_latency(self, total_tokens: int) -> float:
+        """估算雲端處理延遲 (秒)"""
+        estimation = self.latency_estimation
+        return estimation['cloud_overhead_seconds'] + total_tokens / estimation['cloud_tokens_per_second']
+    
     def calculate_cloud_cost(self, input_tokens: int, output_tokens: int, 
                            model: str = 'claude_3_sonnet') -> float:
         """計算雲端處理成本"""
@@ -289,6 +342,149 @@ class CostCalculator:
         
         return electricity_cost + depreciation_cost
 
+class _EWLinear:
+    """指數加權的一元線性回歸：y ≈ 截距 + 斜率 × x，舊觀測按decay衰減"""
+    
+    def __init__(self, decay: float):
+        self.decay = decay
+        self.samples = 0
+        self.w = self.sx = self.sy = self.sxx = self.sxy = 0.0
+    
+    def observe(self, x: float, y: float):
+        d = self.decay
+        self.w = self.w * d + 1
+        self.sx = self.sx * d + x
+        self.sy = self.sy * d + y
+        self.sxx = self.sxx * d + x * x
+        self.sxy = self.sxy * d + x * y
+        self.samples += 1
+    
+    def predict(self, x: float) -> float:
+        mean_x = self.sx / self.w
+        mean_y = self.sy / self.w
+        variance = self.sxx / self.w - mean_x * mean_x
+        if variance <= 1e-9 * max(1.0, mean_x * mean_x):
+            # 觀測的x幾乎相同，無法估計斜率，按比例外推
+            return mean_y * x / mean_x if mean_x > 0 else mean_y
+        slope = (self.sxy / self.w - mean_x * mean_y) / variance
+        return max(0.0, mean_y + slope * (x - mean_x))
+
+class OnlineCostModel:
+    """按處理位置在線學習的成本和延遲模型
+    
+    每個ProcessingLocation各自維護成本和延遲的指數加權線性回歸 (自變量為估算token數)，
+    觀測數不足時使用先驗估算；每次觀測前先記錄當時預測與實際值的誤差。
+    """
+    
+    def __init__(self, prior: Callable[[ProcessingLocation, int], Tuple[float, float]],
+                 decay: float = 0.95, min_samples: int = 3):
+        """
+        Args:
+            prior: (處理位置, token數) -> (成本USD, 延遲秒) 的先驗估算
+            decay: 舊觀測的衰減係數
+            min_samples: 使用學習結果所需的最少觀測數
+        """
+        self.prior = prior
+        self.decay = decay
+        self.min_samples = min_samples
+        self.models = {location: {'cost': _EWLinear(decay), 'latency': _EWLinear(decay)}
+                       for location in ProcessingLocation}
+        self.errors = {location: {'cost_abs': 0.0, 'latency_abs': 0.0, 'latency_pct': 0.0, 'count': 0}
+                       for location in ProcessingLocation}
+    
+    def is_learned(self, location: ProcessingLocation) -> bool:
+        return self.models[location]['cost'].samples >= self.min_samples
+    
+    def predict(self, location: ProcessingLocation, tokens: int) -> Tuple[float, float]:
+        """預測成本 (USD) 和延遲 (秒)"""
+        if not self.is_learned(location):
+            return self.prior(location, tokens)
+        models = self.models[location]
+        return models['cost'].predict(tokens), models['latency'].predict(tokens)
+    
+    def observe(self, location: ProcessingLocation, tokens: int, cost: float, latency: float):
+        """記錄實際結果並更新模型"""
+        predicted_cost, predicted_latency = self.predict(location, tokens)
+        errors = self.errors[location]
+        errors['cost_abs'] += abs(predicted_cost - cost)
+        errors['latency_abs'] += abs(predicted_latency - latency)
+        errors['latency_pct'] += abs(predicted_latency - latency) / max(latency, 1e-3)
+        errors['count'] += 1
+        
+        models = self.models[location]
+        models['cost'].observe(tokens, cost)
+        models['latency'].observe(tokens, latency)
+    
+    def get_report(self) -> Dict[str, Any]:
+        """各處理位置的觀測數和預測誤差"""
+        report = {}
+        for location in ProcessingLocation:
+            errors = self.errors[location]
+            count = errors['count']
+            report[location.value] = {
+                'samples': self.models[location]['cost'].samples,
+                'learned': self.is_learned(location),
+                'cost_mae_usd': errors['cost_abs'] / count if count else None,
+                'latency_mae_seconds': errors['latency_abs'] / count if count else None,
+                'latency_mape': errors['latency_pct'] / count if count else None
+            }
+        return report
+
+@dataclass
+class _CachedDecision:
+    decision: RoutingDecision
+    created_at: float
+    capability_version: int
+
+class RoutingDecisionCache:
+    """路由決策緩存：鍵為內容指紋和任務類型，按TTL過期，能力評分更新後失效"""
+    
+    def __init__(self, ttl_seconds: float = 300, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[Tuple[str, str], _CachedDecision]' = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidated': 0}
+    
+    @staticmethod
+    def fingerprint(content: str) -> str:
+        return hashlib.sha256(content.encode('utf-8', 'surrogatepass')).hexdigest()
+    
+    def get(self, key: Tuple[str, str], capability_version: int) -> Optional[RoutingDecision]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        if entry.capability_version != capability_version:
+            self.stats['invalidated'] += 1
+        elif time.time() - entry.created_at > self.ttl_seconds:
+            self.stats['expired'] += 1
+        else:
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry.decision
+        del self.entries[key]
+        self.stats['misses'] += 1
+        return None
+    
+    def put(self, key: Tuple[str, str], decision: RoutingDecision, capability_version: int):
+        self.entries[key] = _CachedDecision(decision, time.time(), capability_version)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def invalidate(self):
+        self.stats['invalidated'] += len(self.entries)
+        self.entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'entries': len(self.entries),
+            'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+            'ttl_seconds': self.ttl_seconds
+        }
+
 class SmartRouter:
     """智慧路由器核心"""
     
@@ -299,6 +495,12 @@ class SmartRouter:
         self.capability_assessor = LocalCapabilityAssessor()
         self.cost_calculator = CostCalculator()
         
+        # 隱私和複雜度共用一次掃描
+        self.scanner = CompiledScanner({
+            **self.privacy_classifier.scan_categories(),
+            **self.complexity_analyzer.scan_categories()
+        }, self.complexity_analyzer.case_sensitive_categories())
+        
         # 路由配置
         self.config = {
             'privacy_mode': 'STRICT',  # STRICT, BALANCED, PERMISSIVE
@@ -306,8 +508,17 @@ class SmartRouter:
             'quality_threshold': 0.7,
             'max_cloud_cost_per_request': 0.50,  # USD
             'local_processing_timeout': 30,  # seconds
+            'optimize_for': 'cost',  # cost: 選擇預測成本更低的路徑, latency: 選擇預測延遲更低的路徑
+            'decision_cache_ttl': 300,  # seconds
+            'exploration_rate': 0.05,  # 按此概率改走備選路徑，使未被選中的路徑也有觀測
         }
         
+        # 路由決策緩存和按處理位置在線學習的成本/延遲模型
+        self.decision_cache = RoutingDecisionCache(self.config['decision_cache_ttl'])
+        self.cost_model = OnlineCostModel(self._prior_estimate)
+        self._recent_scans: 'OrderedDict[str, ScanResult]' = OrderedDict()
+        self._rng = random.Random()
+        
         # 統計數據
         self.routing_stats = {
             'total_requests': 0,
@@ -315,44 +526,137 @@ class SmartRouter:
             'cloud_processed': 0,
             'hybrid_processed': 0,
             'total_cost_saved': 0.0,
-            'privacy_violations': 0
+            'privacy_violations': 0,
+            'explorations': 0
         }
         
         self.logger = logging.getLogger(__name__)
     
-    def route_request(self, user_request: str, context: Dict = None) -> RoutingDecision:
+    def route_request(self, user_request: str, context: Dict = None,
+                      scan: Optional[ScanResult] = None) -> RoutingDecision:
         """智慧路由決策"""
         self.routing_stats['total_requests'] += 1
         
-        # 1. 分析請求特徵
-        privacy_level = self.privacy_classifier.classify_sensitivity(user_request)
-        task_type = self.log_manager.classify_interaction(user_request, "")
-        complexity = self.complexity_analyzer.analyze_complexity(user_request, task_type.value)
-        
-        # 2. 評估本地處理能力
-        local_capability = self.capability_assessor.assess_local_capability(task_type, complexity)
+        # 0. 相同內容和任務類型在TTL內且能力評分未更新時直接復用決策
+        fingerprint = RoutingDecisionCache.fingerprint(user_request)
+        cache_key = (fingerprint, str((context or {}).get('task_type', '')))
+        decision = self.decision_cache.get(cache_key, self.capability_assessor.version)
         
-        # 3. 計算成本
-        input_tokens, output_tokens = self.cost_calculator.estimate_tokens(user_request)
-        cloud_cost = self.cost_calculator.calculate_cloud_cost(input_tokens, output_tokens)
-        local_cost = self.cost_calculator.calculate_local_cost(30)  # 假設30秒處理時間
+        if decision is None:
+            # 1. 分析請求特徵 (一次掃描同時得到隱私和複雜度命中)
+            scan = scan or self.scan(user_request, fingerprint)
+            privacy_level = self.privacy_classifier.classify_sensitivity(user_request, scan)
+            task_type = self.log_manager.classify_interaction(user_request, "")
+            complexity = self.complexity_analyzer.analyze_complexity(user_request, task_type.value, scan)
+            
+            # 2. 評估本地處理能力
+            local_capability = self.capability_assessor.assess_local_capability(task_type, complexity)
+            
+            # 3. 預測各處理位置的成本和延遲
+            input_tokens, output_tokens = self.cost_calculator.estimate_tokens(user_request)
+            estimated_tokens = input_tokens + output_tokens
+            estimates = {
+                location: self.cost_model.predict(location, estimated_tokens)
+                for location in ProcessingLocation
+            }
+            
+            # 4. 路由決策邏輯
+            decision = self._make_routing_decision(
+                privacy_level, complexity, local_capability, estimates, estimated_tokens
+            )
+            decision.exploration_option = self._exploration_option(decision, local_capability)
+            self.decision_cache.put(cache_key, decision, self.capability_assessor.version)
         
-        # 4. 路由決策邏輯
-        decision = self._make_routing_decision(
-            privacy_level, complexity, local_capability, 
-            cloud_cost, local_cost, input_tokens + output_tokens
-        )
+        # 5. 偶爾改走備選路徑 (緩存中保留原決策)
+        decision = self._maybe_explore(decision)
         
-        # 5. 記錄決策
+        # 6. 記錄決策
         self._log_routing_decision(decision, user_request, context)
         
         return decision
     
+    def _exploration_option(self, decision: RoutingDecision,
+                            local_capability: float) -> Optional[ProcessingLocation]:
+        """本地和雲端都可接受時返回未被選中的一方；高敏感數據和本地能力不足時不探索"""
+        if (decision.privacy_level == PrivacySensitivity.HIGH_SENSITIVE or
+                local_capability < self.config['quality_threshold']):
+            return None
+        if decision.processing_location == ProcessingLocation.LOCAL_PREFERRED:
+            if decision.privacy_level == PrivacySensitivity.MEDIUM_SENSITIVE:
+                return ProcessingLocation.CLOUD_ANONYMIZED
+            return ProcessingLocation.CLOUD_ALLOWED
+        if decision.processing_location in (ProcessingLocation.CLOUD_ALLOWED,
+                                            ProcessingLocation.CLOUD_ANONYMIZED):
+            return ProcessingLocation.LOCAL_PREFERRED
+        return None
+    
+    def _maybe_explore(self, decision: RoutingDecision) -> RoutingDecision:
+        """按exploration_rate改走備選路徑，否則模型只從被選中的路徑學習，另一路徑的估算永遠停留在舊值"""
+        alternative = decision.exploration_option
+        if alternative is None or self._rng.random() >= self.config['exploration_rate']:
+            return decision
+        
+        self.routing_stats['explorations'] += 1
+        estimated_cost, _ = self.cost_model.predict(alternative, decision.estimated_tokens)
+        return replace(
+            decision,
+            processing_location=alternative,
+            estimated_cost=estimated_cost,
+            reasoning=f"Exploring {alternative.value} to refresh its cost estimate "
+                      f"(greedy choice: {decision.processing_location.value})",
+            fallback_options=[decision.processing_location],
+            exploration_option=None
+        )
+    
+    def scan(self, content: str, fingerprint: Optional[str] = None) -> ScanResult:
+        """掃描請求內容，最近的掃描結果按指紋保留供脫敏復用"""
+        fingerprint = fingerprint or RoutingDecisionCache.fingerprint(content)
+        scan = self._recent_scans.get(fingerprint)
+        if scan is None:
+            scan = self.scanner.scan(content)
+            self._recent_scans[fingerprint] = scan
+            while len(self._recent_scans) > 8:
+                self._recent_scans.popitem(last=False)
+        return scan
+    
+    def _prior_estimate(self, location: ProcessingLocation, tokens: int) -> Tuple[float, float]:
+        """尚無觀測數據時的成本和延遲估算"""
+        local_latency = self.config['local_processing_timeout']  # 假設本地處理耗時
+        local_cost = self.cost_calculator.calculate_local_cost(local_latency)
+        cloud_latency = self.cost_calculator.estimate_cloud_latency(tokens)
+        cloud_cost = self.cost_calculator.calculate_cloud_cost(*self.cost_calculator.split_tokens(tokens))
+        
+        if location in (ProcessingLocation.LOCAL_ONLY, ProcessingLocation.LOCAL_PREFERRED):
+            return local_cost, local_latency
+        if location == ProcessingLocation.HYBRID_PROCESSING:
+            return local_cost + cloud_cost * 0.5, max(local_latency, cloud_latency)
+        return cloud_cost, cloud_latency
+    
+    def record_outcome(self, decision: RoutingDecision, processing_time: float, actual_cost: float):
+        """記錄實際處理結果，更新對應處理位置的成本和延遲模型"""
+        location = decision.processing_location
+        tokens = decision.estimated_tokens
+        
+        if location in (ProcessingLocation.LOCAL_ONLY, ProcessingLocation.LOCAL_PREFERRED):
+            cloud_cost, _ = self.cost_model.predict(ProcessingLocation.CLOUD_ALLOWED, tokens)
+            self.routing_stats['total_cost_saved'] += max(0.0, cloud_cost - actual_cost)
+        
+        self.cost_model.observe(location, tokens, actual_cost, processing_time)
+    
+    def update_capability_assessment(self, task_type: str, success_rate: float) -> float:
+        """更新本地能力評估，已緩存的路由決策隨之失效"""
+        return self.capability_assessor.update_capability(task_type, success_rate)
+    
     def _make_routing_decision(self, privacy_level: PrivacySensitivity,
                              complexity: TaskComplexity, local_capability: float,
-                             cloud_cost: float, local_cost: float,
+                             estimates: Dict[ProcessingLocation, Tuple[float, float]],
                              estimated_tokens: int) -> RoutingDecision:
-        """核心路由決策邏輯"""
+        """核心路由決策邏輯，estimates為各處理位置預測的 (成本, 延遲)"""
+        local_cost, local_latency = estimates[ProcessingLocation.LOCAL_PREFERRED]
+        cloud_location = (ProcessingLocation.CLOUD_ANONYMIZED
+                          if privacy_level == PrivacySensitivity.MEDIUM_SENSITIVE
+                          else ProcessingLocation.CLOUD_ALLOWED)
+        cloud_cost, cloud_latency = estimates[cloud_location]
         
         # 隱私優先規則
         if privacy_level == PrivacySensitivity.HIGH_SENSITIVE:
@@ -380,6 +684,31 @@ class SmartRouter:
                     fallback_options=[]
                 )
         
+        # 延遲優化規則：本地能力足夠時選擇預測延遲更低的路徑
+        if (self.config['optimize_for'] == 'latency' and
+                local_capability >= self.config['quality_threshold']):
+            if local_latency <= cloud_latency:
+                return RoutingDecision(
+                    processing_location=ProcessingLocation.LOCAL_PREFERRED,
+                    privacy_level=privacy_level,
+                    task_complexity=complexity,
+                    confidence_score=local_capability,
+                    estimated_cost=local_cost,
+                    estimated_tokens=estimated_tokens,
+                    reasoning=f"Local processing is faster ({local_latency:.1f}s vs {cloud_latency:.1f}s)",
+                    fallback_options=[cloud_location]
+                )
+            return RoutingDecision(
+                processing_location=cloud_location,
+                privacy_level=privacy_level,
+                task_complexity=complexity,
+                confidence_score=0.8 if cloud_location == ProcessingLocation.CLOUD_ANONYMIZED else 0.9,
+                estimated_cost=cloud_cost,
+                estimated_tokens=estimated_tokens,
+                reasoning=f"Cloud processing is faster ({cloud_latency:.1f}s vs {local_latency:.1f}s)",
+                fallback_options=[ProcessingLocation.LOCAL_PREFERRED]
+            )
+        
         # 成本優化規則
         if self.config['cost_optimization']:
             cost_savings = cloud_cost - local_cost
@@ -495,12 +824,16 @@ class SmartRouter:
             'local_percentage': (self.routing_stats['local_processed'] / total) * 100,
             'cloud_percentage': (self.routing_stats['cloud_processed'] / total) * 100,
             'hybrid_percentage': (self.routing_stats['hybrid_processed'] / total) * 100,
-            'average_cost_savings': self.routing_stats['total_cost_saved'] / total
+            'average_cost_savings': self.routing_stats['total_cost_saved'] / total,
+            'decision_cache': self.decision_cache.get_stats()
         }
     
     def update_config(self, new_config: Dict):
         """更新路由配置"""
         self.config.update(new_config)
+        # 決策規則可能改變，已緩存的決策全部失效
+        self.decision_cache.invalidate()
+        self.decision_cache.ttl_seconds = self.config['decision_cache_ttl']
         self.logger.info(f"Router configuration updated: {new_config}")
 
 class SmartRoutingManager:
@@ -529,26 +862,35 @@ class SmartRoutingManager:
     
     def process_request(self, user_request: str, context: Dict = None) -> Dict:
         """處理用戶請求"""
-        # 1. 路由決策
+        # 1. 路由決策 (命中決策緩存時不重新分析)
         routing_decision = self.smart_router.route_request(user_request, context)
         
         # 2. 根據決策處理請求
         if routing_decision.processing_location == ProcessingLocation.LOCAL_ONLY:
             response = self._process_locally(user_request, routing_decision)
         elif routing_decision.processing_location == ProcessingLocation.CLOUD_ANONYMIZED:
-            response = self._process_cloud_anonymized(user_request, routing_decision)
+            # 脫敏復用路由時的掃描區間
+            scan = self.smart_router.scan(user_request)
+            response = self._process_cloud_anonymized(user_request, routing_decision, scan)
         elif routing_decision.processing_location == ProcessingLocation.CLOUD_ALLOWED:
             response = self._process_cloud(user_request, routing_decision)
         else:
             response = self._process_hybrid(user_request, routing_decision)
         
-        # 3. 記錄完整交互
+        # 3. 用實際耗時和成本更新該處理位置的預測模型
+        self.smart_router.record_outcome(
+            routing_decision,
+            response['metrics']['processing_time'],
+            response['metrics'].get('actual_cost', 0)
+        )
+        
+        # 4. 記錄完整交互
         self.interaction_log_manager.log_interaction(
             user_request=user_request,
             agent_response=response['content'],
             deliverables=[],
             context={
-                'routing_decision': asdict(routing_decision),
+                'routing_decision': self._decision_to_dict(routing_decision),
                 'processing_metrics': response['metrics'],
                 'original_context': context or {}
             }
@@ -565,6 +907,18 @@ class SmartRoutingManager:
             }
         }
     
+    @staticmethod
+    def _decision_to_dict(decision: RoutingDecision) -> Dict:
+        """轉換為可序列化的字典"""
+        decision_dict = asdict(decision)
+        decision_dict['processing_location'] = decision.processing_location.value
+        decision_dict['privacy_level'] = decision.privacy_level.value
+        decision_dict['task_complexity'] = decision.task_complexity.value
+        decision_dict['fallback_options'] = [option.value for option in decision.fallback_options]
+        if decision.exploration_option is not None:
+            decision_dict['exploration_option'] = decision.exploration_option.value
+        return decision_dict
+    
     def _process_locally(self, request: str, decision: RoutingDecision) -> Dict:
         """本地處理"""
         start_time = time.time()
@@ -585,18 +939,19 @@ class SmartRoutingManager:
             }
         }
     
-    def _process_cloud_anonymized(self, request: str, decision: RoutingDecision) -> Dict:
+    def _process_cloud_anonymized(self, request: str, decision: RoutingDecision,
+                                  scan: Optional[ScanResult] = None) -> Dict:
         """雲端匿名化處理"""
         start_time = time.time()
         
-        # 1. 數據脫敏 (簡化實現)
-        anonymized_request = self._anonymize_content(request)
+        # 1. 數據脫敏 (復用路由時的掃描區間)
+        anonymized_request, mapping = self._anonymize_content(request, scan)
         
         # 2. 雲端處理 (模擬)
         response_content = f"[CLOUD_ANON] Processed anonymized request"
         
-        # 3. 恢復數據 (簡化實現)
-        final_response = self._restore_content(response_content)
+        # 3. 恢復數據
+        final_response = self._restore_content(response_content, mapping)
         
         processing_time = time.time() - start_time
         
@@ -648,16 +1003,13 @@ class SmartRoutingManager:
             }
         }
     
-    def _anonymize_content(self, content: str) -> str:
-        """內容匿名化 (簡化實現)"""
-        # 實際實現中會使用更複雜的匿名化算法
-        anonymized = re.sub(r'\b[A-Za-z_][A-Za-z0-9_]*\b', 'VAR_X', content)
-        return anonymized
+    def _anonymize_content(self, content: str, scan: Optional[ScanResult] = None) -> Tuple[str, Dict[str, str]]:
+        """內容匿名化：敏感區間替換為佔位符，返回 (脫敏內容, 映射表)"""
+        return self.smart_router.privacy_classifier.anonymize(content, scan)
     
-    def _restore_content(self, anonymized_content: str) -> str:
-        """恢復匿名化內容 (簡化實現)"""
-        # 實際實現中會使用映射表恢復
-        return anonymized_content.replace('VAR_X', 'restored_var')
+    def _restore_content(self, anonymized_content: str, mapping: Dict[str, str]) -> str:
+        """按映射表恢復匿名化內容"""
+        return CompiledScanner.restore(anonymized_content, mapping)
     
     def get_dashboard_data(self) -> Dict:
         """獲取儀表板數據"""
@@ -679,7 +1031,9 @@ class SmartRoutingManager:
                 'average_response_time': 2.5,  # 秒
                 'local_success_rate': 92.3,   # %
                 'cloud_success_rate': 98.7    # %
-            }
+            },
+            'decision_cache': self.smart_router.decision_cache.get_stats(),
+            'cost_model': self.smart_router.cost_model.get_report()
         }
 
 # 使用示例
@@ -741,10 +1095,17 @@ class SmartRoutingSystem:
     
     def __init__(self):
         self.privacy_classifier = PrivacyClassifier()
+        self.complexity_analyzer = TaskComplexityAnalyzer()
         self.capability_assessor = LocalCapabilityAssessor()
         self.interaction_log = InteractionLogManager()
         self.logger = logging.getLogger(__name__)
         
+        # 隱私和複雜度共用一次掃描
+        self.scanner = CompiledScanner({
+            **self.privacy_classifier.scan_categories(),
+            **self.complexity_analyzer.scan_categories()
+        }, self.complexity_analyzer.case_sensitive_categories())
+        
         # 路由統計
         self.routing_stats = {
             "total_requests": 0,
@@ -761,11 +1122,12 @@ class SmartRoutingSystem:
             
             # 分析隱私敏感度
             content = request_data.get("content", "")
-            privacy_level = self.privacy_classifier.classify_sensitivity(content)
+            scan = self.scanner.scan(content)
+            privacy_level = self.privacy_classifier.classify_sensitivity(content, scan)
             
             # 分析任務複雜度
             task_type = request_data.get("task_type", "general")
-            complexity = self.privacy_classifier.analyze_complexity(content, task_type)
+            complexity = self.complexity_analyzer.analyze_complexity(content, task_type, scan)
             
             # 評估本地處理能力
             local_capability = self.capability_assessor.assess_capability(task_type)
@@ -835,9 +1197,5 @@ class SmartRoutingSystem:
     
     async def update_capability_assessment(self, task_type: str, success_rate: float):
         """更新本地能力評估"""
-        if hasattr(self.capability_assessor, 'local_model_capabilities'):
-            current = self.capability_assessor.local_model_capabilities.get(task_type, 0.5)
-            # 簡單的學習更新
-            updated = (current * 0.8) + (success_rate * 0.2)
-            self.capability_assessor.local_model_capabilities[task_type] = min(0.95, max(0.1, updated))
+        self.capability_assessor.update_capability(task_type, success_rate)
 
@@ -0,0 +1 @@
+"""測試模塊初始化文件"""
@@ -0,0 +1,183 @@
+"""
+分段追加日誌存儲測試
+測試追加與讀取、段輪轉、崩潰恢復、舊日誌遷移、多個寫入者共用目錄，以及舊格式日誌在首次打開時導入
+"""
+
+import unittest
+import json
+import shutil
+import tempfile
+from pathlib import Path
+import sys
+
+# 添加項目路徑
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from segmented_log_store import SegmentedLogStore, migrate_directory, open_log_store
+from interaction_log_manager import InteractionLogManager
+from rl_srt_learning_system import RLSRTLearningEngine
+
+
+def make_record(i, interaction_type="code_generation", session_id="s1"):
+    return {
+        "log_id": f"log_{i:04d}",
+        "session_id": session_id,
+        "interaction_type": interaction_type,
+        "timestamp": f"2025-06-01T00:{i // 60:02d}:{i % 60:02d}",
+        "user_request": f"request {i}",
+        "agent_response": "x" * 50
+    }
+
+
+def write_legacy_log(base_dir, i, interaction_type="code_generation"):
+    record = make_record(i, interaction_type)
+    record.pop("log_id")
+    record.update({"deliverables": [], "context": {}, "performance_metrics": {}, "tags": []})
+    log_dir = Path(base_dir) / "logs" / interaction_type
+    log_dir.mkdir(parents=True, exist_ok=True)
+    with open(log_dir / f"legacy_{i:04d}.json", "w", encoding="utf-8") as f:
+        json.dump(record, f)
+
+
+class TestSegmentedLogStore(unittest.TestCase):
+    """分段追加日誌存儲測試類"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = Path(self.temp_dir) / "log_store"
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_append_get_and_query(self):
+        """測試追加後按ID讀取、按會話/類型/時間篩選"""
+        store = SegmentedLogStore(self.root)
+        for i in range(10):
+            store.append(make_record(i, "testing" if i % 2 else "code_generation", f"s{i % 3}"))
+        self.assertEqual(len(store), 10)
+        self.assertEqual(store.get("log_0003")["user_request"], "request 3")
+        self.assertIsNone(store.get("missing"))
+        self.assertEqual([e.log_id for e in store.query(session_id="s1")], ["log_0001", "log_0004", "log_0007"])
+        self.assertEqual(store.count_by_type(), {"code_generation": 5, "testing": 5})
+        since = make_record(5)["timestamp"]
+        self.assertEqual([r["log_id"] for r in store.iter_records(interaction_type="testing", since=since)],
+                         ["log_0005", "log_0007", "log_0009"])
+        self.assertEqual(len(list(store.iter_records())), 10)
+        store.close()
+
+        reopened = SegmentedLogStore(self.root)
+        self.assertEqual(len(reopened), 10)
+        self.assertEqual(reopened.get("log_0009")["user_request"], "request 9")
+
+    def test_rotation(self):
+        """測試段文件超過上限後輪轉，跨段讀取不受影響"""
+        store = SegmentedLogStore(self.root, segment_max_bytes=1024)
+        for i in range(40):
+            store.append(make_record(i))
+        store.close()
+        self.assertGreater(len(store.segments()), 1)
+        for segment in store.segments():
+            self.assertLessEqual(store._data_path(segment).stat().st_size, 1024)
+
+        reopened = SegmentedLogStore(self.root, segment_max_bytes=1024)
+        self.assertEqual([r["log_id"] for r in reopened.iter_records()], [f"log_{i:04d}" for i in range(40)])
+        self.assertEqual(reopened.get("log_0039")["log_id"], "log_0039")
+
+    def test_recover_truncated_tail_and_index(self):
+        """測試崩潰後截斷不完整的數據行，並從數據文件補回缺失或損壞的索引行"""
+        store = SegmentedLogStore(self.root)
+        for i in range(5):
+            store.append(make_record(i))
+        store.close()
+        data_path, index_path = store._data_path(1), store._index_path(1)
+
+        # 最後兩條只寫入了數據，索引最後一行寫了一半
+        lines = index_path.read_bytes().splitlines(keepends=True)
+        index_path.write_bytes(b"".join(lines[:3]) + lines[3][:5])
+        # 數據末尾有一條寫入中斷的記錄
+        with open(data_path, "ab") as f:
+            f.write(b'{"log_id":"log_0005","session')
+
+        recovered = SegmentedLogStore(self.root)
+        self.assertEqual(len(recovered), 5)
+        self.assertEqual(recovered.get("log_0004")["user_request"], "request 4")
+        self.assertTrue(data_path.read_bytes().endswith(b"}\n"))
+        self.assertEqual(len(index_path.read_bytes().splitlines()), 5)
+
+        recovered.append(make_record(6))
+        recovered.close()
+        self.assertEqual(len(SegmentedLogStore(self.root)), 6)
+
+    def test_migrate_directory(self):
+        """測試舊目錄遷移可重複執行，已遷移的日誌被跳過"""
+        logs_dir = Path(self.temp_dir) / "logs"
+        for i in range(3):
+            write_legacy_log(self.temp_dir, i)
+        write_legacy_log(self.temp_dir, 3, "testing")
+        (logs_dir / "testing" / "broken.json").write_text("{", encoding="utf-8")
+
+        store = SegmentedLogStore(self.root)
+        self.assertEqual(migrate_directory(logs_dir, store), {"migrated": 4, "skipped": 0, "failed": 1})
+        self.assertEqual(migrate_directory(logs_dir, store), {"migrated": 0, "skipped": 4, "failed": 1})
+        self.assertEqual(store.get("legacy_0003")["interaction_type"], "testing")
+
+        stats = migrate_directory(logs_dir, store, remove_source=True)
+        self.assertEqual(stats["skipped"], 4)
+        self.assertTrue((logs_dir / "code_generation" / "legacy_0000.json").exists())
+        store.close()
+
+    def test_two_writers_same_directory(self):
+        """測試兩個實例交替寫入同一目錄時偏移不重疊"""
+        first = SegmentedLogStore(self.root)
+        second = SegmentedLogStore(self.root)
+        for i in range(20):
+            (first if i % 2 else second).append(make_record(i))
+        self.assertEqual(first.get("log_0001")["log_id"], "log_0001")
+        self.assertEqual(second.get("log_0018")["log_id"], "log_0018")
+        first.close()
+        second.close()
+
+        reopened = SegmentedLogStore(self.root)
+        self.assertEqual(len(reopened), 20)
+        for i in range(20):
+            self.assertEqual(reopened.get(f"log_{i:04d}")["user_request"], f"request {i}")
+
+    def test_open_log_store_shared(self):
+        """測試同一目錄在進程內共用一個實例"""
+        store = open_log_store(self.root)
+        self.assertIs(open_log_store(str(self.root) + "/"), store)
+        store.append(make_record(0))
+        self.assertEqual(open_log_store(self.root).get("log_0000")["log_id"], "log_0000")
+        store.close()
+
+
+class TestLegacyLogsWithLogStore(unittest.TestCase):
+    """已有舊格式日誌的目錄在默認使用分段存儲時仍可統計和讀取"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        for i in range(3):
+            write_legacy_log(self.temp_dir, i)
+        write_legacy_log(self.temp_dir, 3, "testing")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_legacy_logs_counted_and_iterated(self):
+        """測試首次打開時導入舊日誌，之後的管理器不重複導入"""
+        manager = InteractionLogManager(self.temp_dir)
+        counts = manager.count_interaction_logs()
+        self.assertEqual((counts["code_generation"], counts["testing"]), (3, 1))
+        self.assertEqual(sorted(log["log_id"] for log in manager.iter_interaction_logs()),
+                         ["legacy_0000", "legacy_0001", "legacy_0002", "legacy_0003"])
+        self.assertEqual(len(list(RLSRTLearningEngine(manager).iter_training_experiences())), 4)
+
+        again = InteractionLogManager(self.temp_dir)
+        self.assertIs(again.log_store, manager.log_store)
+        self.assertIsNone(again.migrate_legacy_logs())
+        self.assertEqual(sum(again.count_interaction_logs().values()), 4)
+        manager.log_store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
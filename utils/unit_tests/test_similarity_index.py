@@ -0,0 +1,135 @@
+"""
+交互相似度索引測試
+測試添加與檢索、重新打開索引、元數據批量讀取，以及達到訓練規模後在後台訓練倒排列表
+"""
+
+import unittest
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+import sys
+
+import numpy as np
+
+# 添加項目路徑
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from similarity_index import InteractionSimilarityIndex
+
+TOPICS = ["database migration schema", "react component styling", "docker deployment pipeline",
+          "unit test coverage report", "memory leak profiling"]
+
+
+def make_documents(count, offset=0):
+    return [(f"{TOPICS[i % len(TOPICS)]} item{i}", {"log_id": f"log_{i:04d}"})
+            for i in range(offset, offset + count)]
+
+
+class TestSimilarityIndex(unittest.TestCase):
+    """交互相似度索引測試類"""
+
+    def setUp(self):
+        self.index_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.index_dir, ignore_errors=True)
+
+    def test_add_and_search(self):
+        """測試檢索返回同主題的文檔"""
+        index = InteractionSimilarityIndex(self.index_dir)
+        rows = index.add_many(make_documents(20))
+        self.assertEqual(rows, list(range(20)))
+
+        hits = index.search("docker deployment", top_k=4)
+        self.assertEqual(len(hits), 4)
+        self.assertTrue(all(hit.row % len(TOPICS) == 2 for hit in hits))
+        self.assertEqual(hits[0].metadata, {"log_id": f"log_{hits[0].row:04d}"})
+        self.assertEqual(index.search("", top_k=4), [])
+        index.close()
+
+    def test_reopen(self):
+        """測試重新打開後向量和元數據完整，可繼續追加"""
+        index = InteractionSimilarityIndex(self.index_dir)
+        index.add_many(make_documents(10))
+        expected = [(hit.row, hit.score) for hit in index.search("memory leak", top_k=3)]
+        index.close()
+
+        reopened = InteractionSimilarityIndex(self.index_dir)
+        self.assertEqual(len(reopened), 10)
+        self.assertEqual([(hit.row, hit.score) for hit in reopened.search("memory leak", top_k=3)], expected)
+        self.assertEqual(reopened.add("memory leak profiling again", {"log_id": "extra"}), 10)
+        self.assertEqual([m["log_id"] for m in reopened.iter_metadata()],
+                         [f"log_{i:04d}" for i in range(10)] + ["extra"])
+        reopened.close()
+
+    def test_truncated_metadata_ignored(self):
+        """測試元數據最後一行不完整時重新打開會丟棄該行"""
+        index = InteractionSimilarityIndex(self.index_dir)
+        index.add_many(make_documents(3))
+        index.close()
+        with open(Path(self.index_dir) / "meta.jsonl", "ab") as f:
+            f.write(b'{"log_id": "torn')
+
+        reopened = InteractionSimilarityIndex(self.index_dir)
+        self.assertEqual(len(reopened), 3)
+        self.assertEqual(reopened.add("new", {"log_id": "new"}), 3)
+        self.assertEqual(reopened.get_metadata(3), {"log_id": "new"})
+        reopened.close()
+
+    def test_training_threshold(self):
+        """測試未達訓練規模時使用精確檢索，達到後訓練倒排列表"""
+        index = InteractionSimilarityIndex(self.index_dir, min_train_size=50, background_training=False)
+        index.add_many(make_documents(49))
+        self.assertEqual(index.get_stats()["nlist"], 0)
+        self.assertIsNone(index.centroids)
+
+        index.add_many(make_documents(1, offset=49))
+        stats = index.get_stats()
+        self.assertEqual(stats["trained_count"], 50)
+        self.assertEqual(stats["nlist"], int(2 * np.sqrt(50)))
+        self.assertTrue(np.all(np.asarray(index.assignments[:50]) >= 0))
+
+        # 新增的行先放在待合併列表，檢索仍能找到
+        row = index.add("database migration schema item50", {"log_id": "log_0050"})
+        self.assertEqual(index.get_stats()["pending_rows"], 1)
+        hits = index.search("database migration schema item50", top_k=1, nprobe=len(index.centroids))
+        self.assertEqual(hits[0].row, row)
+        index.close()
+
+        reopened = InteractionSimilarityIndex(self.index_dir, min_train_size=50)
+        self.assertEqual(reopened.get_stats()["trained_count"], 50)
+        self.assertIsNotNone(reopened.centroids)
+        reopened.close()
+
+    def test_training_runs_in_background(self):
+        """測試觸發訓練的寫入不等待訓練完成"""
+        index = InteractionSimilarityIndex(self.index_dir, min_train_size=50)
+        started, release = threading.Event(), threading.Event()
+        assign = index._assign
+
+        def slow_assign(vectors, centroids=None):
+            # k-means 迭代在索引鎖之外執行
+            if centroids is not None:
+                started.set()
+                release.wait(5)
+            return assign(vectors, centroids)
+
+        index._assign = slow_assign
+        index.add_many(make_documents(50))
+        self.assertTrue(started.wait(5))
+        self.assertTrue(index.get_stats()["training"])
+
+        # 訓練期間寫入和檢索不被阻塞，也不會重複觸發訓練
+        index.add_many(make_documents(10, offset=50))
+        self.assertEqual(len(index.search("react component", top_k=3)), 3)
+
+        release.set()
+        self.assertTrue(index.wait_for_training(5))
+        self.assertEqual(index.get_stats()["trained_count"], 50)
+        self.assertTrue(np.all(np.asarray(index.assignments[:60]) >= 0))
+        index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+"""
+智慧路由系統測試
+測試在線成本模型的估算與更新、路由決策緩存，以及按概率探索備選路徑
+"""
+
+import unittest
+import shutil
+import tempfile
+import time
+from pathlib import Path
+import sys
+
+# 添加項目路徑
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from interaction_log_manager import InteractionLogManager
+from smart_routing_system import (
+    SmartRouter, SmartRoutingManager, OnlineCostModel, RoutingDecisionCache, RoutingDecision,
+    ProcessingLocation, PrivacySensitivity, TaskComplexity
+)
+
+LOW_SENSITIVE_REQUEST = "Explain this code: def f(x): return x*2"
+MEDIUM_SENSITIVE_REQUEST = "Summarize the customer revenue report"
+HIGH_SENSITIVE_REQUEST = "password=secret123 please check the login flow"
+
+
+def prior(location, tokens):
+    return 0.001 * tokens, 10.0
+
+
+def make_decision(location=ProcessingLocation.CLOUD_ALLOWED, tokens=100):
+    return RoutingDecision(
+        processing_location=location,
+        privacy_level=PrivacySensitivity.LOW_SENSITIVE,
+        task_complexity=TaskComplexity.SIMPLE,
+        confidence_score=0.9,
+        estimated_cost=0.0,
+        estimated_tokens=tokens,
+        reasoning="test",
+        fallback_options=[]
+    )
+
+
+class TestOnlineCostModel(unittest.TestCase):
+    """在線成本模型測試類"""
+
+    def test_prior_until_min_samples(self):
+        """測試觀測數不足時使用先驗估算"""
+        model = OnlineCostModel(prior, min_samples=3)
+        model.observe(ProcessingLocation.CLOUD_ALLOWED, 100, 5.0, 1.0)
+        model.observe(ProcessingLocation.CLOUD_ALLOWED, 200, 5.0, 1.0)
+        self.assertFalse(model.is_learned(ProcessingLocation.CLOUD_ALLOWED))
+        self.assertEqual(model.predict(ProcessingLocation.CLOUD_ALLOWED, 100), (0.1, 10.0))
+
+    def test_learns_linear_relation(self):
+        """測試學習成本和延遲隨token數的線性關係"""
+        model = OnlineCostModel(prior, min_samples=3)
+        for tokens in (100, 200, 300, 400):
+            model.observe(ProcessingLocation.CLOUD_ALLOWED, tokens, 0.01 + 0.0001 * tokens, 0.5 + 0.01 * tokens)
+        cost, latency = model.predict(ProcessingLocation.CLOUD_ALLOWED, 1000)
+        self.assertAlmostEqual(cost, 0.11, places=6)
+        self.assertAlmostEqual(latency, 10.5, places=6)
+        # 其他處理位置不受影響
+        self.assertEqual(model.predict(ProcessingLocation.LOCAL_PREFERRED, 1000), (1.0, 10.0))
+
+    def test_constant_tokens_scale_proportionally(self):
+        """測試觀測的token數相同時按比例外推"""
+        model = OnlineCostModel(prior, min_samples=3)
+        for _ in range(3):
+            model.observe(ProcessingLocation.LOCAL_PREFERRED, 100, 0.02, 4.0)
+        cost, latency = model.predict(ProcessingLocation.LOCAL_PREFERRED, 200)
+        self.assertAlmostEqual(cost, 0.04)
+        self.assertAlmostEqual(latency, 8.0)
+
+    def test_errors_recorded_before_update(self):
+        """測試誤差按更新前的預測計算"""
+        model = OnlineCostModel(prior, min_samples=3)
+        model.observe(ProcessingLocation.CLOUD_ALLOWED, 100, 0.3, 6.0)
+        report = model.get_report()[ProcessingLocation.CLOUD_ALLOWED.value]
+        self.assertEqual(report['samples'], 1)
+        self.assertAlmostEqual(report['cost_mae_usd'], 0.2)
+        self.assertAlmostEqual(report['latency_mae_seconds'], 4.0)
+        self.assertIsNone(model.get_report()[ProcessingLocation.LOCAL_ONLY.value]['cost_mae_usd'])
+
+
+class TestRoutingDecisionCache(unittest.TestCase):
+    """路由決策緩存測試類"""
+
+    def test_hit_and_capability_invalidation(self):
+        """測試命中以及能力評分版本變化後失效"""
+        cache = RoutingDecisionCache()
+        decision = make_decision()
+        cache.put(("fp", ""), decision, capability_version=1)
+        self.assertIs(cache.get(("fp", ""), 1), decision)
+        self.assertIsNone(cache.get(("fp", ""), 2))
+        self.assertIsNone(cache.get(("fp", ""), 1))
+        stats = cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['invalidated']), (1, 2, 1))
+
+    def test_ttl_expiry(self):
+        """測試超過TTL的決策過期"""
+        cache = RoutingDecisionCache(ttl_seconds=10)
+        cache.put(("fp", ""), make_decision(), 0)
+        cache.entries[("fp", "")].created_at = time.time() - 11
+        self.assertIsNone(cache.get(("fp", ""), 0))
+        self.assertEqual(cache.get_stats()['expired'], 1)
+        self.assertEqual(cache.get_stats()['entries'], 0)
+
+    def test_max_entries(self):
+        """測試超過上限時淘汰最久未訪問的條目"""
+        cache = RoutingDecisionCache(max_entries=2)
+        cache.put(("a", ""), make_decision(), 0)
+        cache.put(("b", ""), make_decision(), 0)
+        cache.get(("a", ""), 0)
+        cache.put(("c", ""), make_decision(), 0)
+        self.assertEqual(list(cache.entries), [("a", ""), ("c", "")])
+
+
+class TestSmartRouter(unittest.TestCase):
+    """智慧路由器探索與模型更新測試類"""
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.router = SmartRouter(InteractionLogManager(self.log_dir))
+        self.router.config['exploration_rate'] = 0.0
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def test_record_outcome_updates_routed_location(self):
+        """測試只更新實際處理位置的模型"""
+        decision = self.router.route_request(LOW_SENSITIVE_REQUEST)
+        self.router.record_outcome(decision, 2.0, 0.0)
+        samples = {location: self.router.cost_model.models[location]['cost'].samples
+                   for location in ProcessingLocation}
+        self.assertEqual(samples[decision.processing_location], 1)
+        self.assertEqual(sum(samples.values()), 1)
+
+    def test_no_exploration_at_zero_rate(self):
+        """測試探索概率為0時始終走原決策"""
+        decisions = [self.router.route_request(LOW_SENSITIVE_REQUEST) for _ in range(20)]
+        self.assertEqual({d.processing_location for d in decisions}, {ProcessingLocation.LOCAL_PREFERRED})
+        self.assertEqual(self.router.routing_stats['explorations'], 0)
+
+    def test_exploration_routes_to_alternative(self):
+        """測試探索時改走備選路徑，結果更新備選路徑的模型，緩存保留原決策"""
+        greedy = self.router.route_request(LOW_SENSITIVE_REQUEST)
+        self.assertEqual(greedy.processing_location, ProcessingLocation.LOCAL_PREFERRED)
+        self.assertEqual(greedy.exploration_option, ProcessingLocation.CLOUD_ALLOWED)
+
+        self.router.config['exploration_rate'] = 1.0
+        explored = self.router.route_request(LOW_SENSITIVE_REQUEST)
+        self.assertEqual(explored.processing_location, ProcessingLocation.CLOUD_ALLOWED)
+        self.assertEqual(explored.fallback_options, [ProcessingLocation.LOCAL_PREFERRED])
+        self.assertIsNone(explored.exploration_option)
+        self.assertEqual(explored.estimated_cost,
+                         self.router.cost_model.predict(ProcessingLocation.CLOUD_ALLOWED,
+                                                        explored.estimated_tokens)[0])
+        self.assertEqual(self.router.routing_stats['explorations'], 1)
+        self.assertEqual(self.router.decision_cache.get_stats()['hits'], 1)
+
+        self.router.record_outcome(explored, 1.5, 0.002)
+        self.assertEqual(self.router.cost_model.models[ProcessingLocation.CLOUD_ALLOWED]['cost'].samples, 1)
+        self.assertEqual(self.router.cost_model.models[ProcessingLocation.LOCAL_PREFERRED]['cost'].samples, 0)
+
+        self.router.config['exploration_rate'] = 0.0
+        self.assertEqual(self.router.route_request(LOW_SENSITIVE_REQUEST).processing_location,
+                         ProcessingLocation.LOCAL_PREFERRED)
+
+    def test_exploration_respects_privacy(self):
+        """測試中敏感請求只探索脫敏雲端，高敏感請求從不探索"""
+        self.router.config['exploration_rate'] = 1.0
+        medium = self.router.route_request(MEDIUM_SENSITIVE_REQUEST)
+        self.assertEqual(medium.privacy_level, PrivacySensitivity.MEDIUM_SENSITIVE)
+        self.assertEqual(medium.processing_location, ProcessingLocation.CLOUD_ANONYMIZED)
+
+        for _ in range(5):
+            high = self.router.route_request(HIGH_SENSITIVE_REQUEST)
+            self.assertEqual(high.processing_location, ProcessingLocation.LOCAL_ONLY)
+        self.assertEqual(self.router.routing_stats['explorations'], 1)
+
+    def test_no_exploration_below_quality_threshold(self):
+        """測試本地能力不足時不探索本地路徑"""
+        decision = make_decision(ProcessingLocation.CLOUD_ALLOWED)
+        self.assertIsNone(self.router._exploration_option(decision, 0.5))
+        self.assertEqual(self.router._exploration_option(decision, 0.75), ProcessingLocation.LOCAL_PREFERRED)
+
+    def test_decision_serializable(self):
+        """測試探索選項轉換為字符串"""
+        decision = self.router.route_request(LOW_SENSITIVE_REQUEST)
+        self.assertEqual(SmartRoutingManager._decision_to_dict(decision)['exploration_option'],
+                         ProcessingLocation.CLOUD_ALLOWED.value)
+
+
+if __name__ == "__main__":
+    unittest.main()